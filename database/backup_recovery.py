@@ -3,6 +3,8 @@ import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any
+from database.connection_factory import connect as db_connect
+from database.schema_cache import schema_cache
 
 class BackupRecoveryManager:
     """Gerenciador de recuperação pós-backup para todas as entidades híbridas."""
@@ -41,7 +43,7 @@ class BackupRecoveryManager:
             'needs_recovery': False
         }
         
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             
             # Verificar se change_log existe
@@ -58,23 +60,16 @@ class BackupRecoveryManager:
             for table, required_columns in self.hybrid_tables.items():
                 print(f"\nVerificando tabela: {table}")
                 
-                # Verificar se a tabela existe
-                cursor.execute("""
-                    SELECT name FROM sqlite_master 
-                    WHERE type='table' AND name=?
-                """, (table,))
+                # Colunas pelo cache de esquema (vazio se a tabela não existir)
+                existing_columns = schema_cache.colunas(self.db_path, table, conn)
                 
-                if not cursor.fetchone():
+                if not existing_columns:
                     print(f"AVISO: Tabela {table} nao encontrada")
                     # Considerar ausência de tabela como necessitando recuperação
                     issues['missing_columns'][table] = required_columns
                     issues['needs_recovery'] = True
                     continue
                 
-                # Verificar colunas existentes
-                cursor.execute(f"PRAGMA table_info({table})")
-                existing_columns = [col[1] for col in cursor.fetchall()]
-                
                 missing_cols = []
                 for col in required_columns:
                     if col not in existing_columns:
@@ -131,7 +126,7 @@ class BackupRecoveryManager:
         }
         
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
                 # 1. Criar tabela change_log se não existir
@@ -170,6 +165,9 @@ class BackupRecoveryManager:
                         recovery_results['errors'].append(error_msg)
                 
                 conn.commit()
+            # Cache de colunas descartado só após o commit das colunas adicionadas
+            for table in recovery_results['columns_added']:
+                schema_cache.invalidar(self.db_path, table)
                 
         except Exception as e:
             recovery_results['success'] = False
@@ -314,7 +312,7 @@ class BackupRecoveryManager:
             'overall_health': 'healthy'
         }
         
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             
             for table in self.hybrid_tables.keys():
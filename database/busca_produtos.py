@@ -0,0 +1,121 @@
+"""
+Busca de produtos com SQLite FTS5 (tabela produtos_fts).
+
+As buscas por código/nome/descrição usavam LIKE '%termo%', que não
+aproveita índice nenhum (idx_produtos_busca inclusive) e varre a tabela a
+cada consulta. produtos_fts é uma tabela FTS5 de conteúdo externo sobre
+produtos(codigo, nome, descricao), mantida por triggers, com:
+
+- tokenização unicode61 sem diacríticos ('acucar' encontra 'Açúcar');
+- índices de prefixo de 2 e 3 caracteres, para a busca enquanto se digita
+  ('arr' encontra 'Arroz'); cada palavra digitada vira um prefixo e todas
+  precisam aparecer;
+- ordenação por bm25, com peso maior para código e nome.
+
+Se o SQLite não tiver FTS5, a tabela não é criada e as telas continuam com
+LIKE (ver Database.tem_busca_fts).
+"""
+import re
+import sqlite3
+
+TABELA_FTS = 'produtos_fts'
+
+TRIGGERS = ('trg_produtos_fts_insert', 'trg_produtos_fts_delete', 'trg_produtos_fts_update')
+
+# Pesos de bm25 para (codigo, nome, descricao)
+PESOS_BM25 = (10.0, 5.0, 1.0)
+
+_RE_PALAVRA = re.compile(r"\w+", re.UNICODE)
+
+_DDL_TABELA = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        codigo, nome, descricao,
+        content='produtos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+"""
+
+_DDL_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_produtos_fts_insert AFTER INSERT ON produtos BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, codigo, nome, descricao)
+        VALUES (NEW.id, NEW.codigo, NEW.nome, NEW.descricao);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_produtos_fts_delete AFTER DELETE ON produtos BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, codigo, nome, descricao)
+        VALUES ('delete', OLD.id, OLD.codigo, OLD.nome, OLD.descricao);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_produtos_fts_update
+        AFTER UPDATE OF codigo, nome, descricao ON produtos BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, codigo, nome, descricao)
+        VALUES ('delete', OLD.id, OLD.codigo, OLD.nome, OLD.descricao);
+        INSERT INTO {TABELA_FTS}(rowid, codigo, nome, descricao)
+        VALUES (NEW.id, NEW.codigo, NEW.nome, NEW.descricao);
+    END""",
+)
+
+
+def criar_busca_produtos(cursor) -> bool:
+    """Cria produtos_fts e seus triggers; reconstrói o índice quando algo faltava.
+
+    Retorna False se o SQLite não suportar FTS5.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABELA_FTS,))
+    existia = cursor.fetchone() is not None
+    cursor.execute("""
+        SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({})
+    """.format(', '.join('?' * len(TRIGGERS))), TRIGGERS)
+    triggers_completos = cursor.fetchone()[0] == len(TRIGGERS)
+
+    try:
+        cursor.execute(_DDL_TABELA)
+    except sqlite3.OperationalError as e:
+        print(f"[BUSCA] FTS5 indisponível, busca de produtos segue com LIKE: {e}")
+        return False
+    for ddl in _DDL_TRIGGERS:
+        cursor.execute(ddl)
+
+    # Sem a tabela ou com triggers ausentes o índice pode estar defasado
+    if not existia or not triggers_completos:
+        cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+        print(f"[BUSCA] Índice {TABELA_FTS} reconstruído")
+    return True
+
+
+def expressao_fts(termo) -> str:
+    """Converte o texto digitado numa consulta MATCH: cada palavra vira um prefixo ("arr"*)."""
+    palavras = _RE_PALAVRA.findall(str(termo or ''))
+    return ' '.join(f'"{p}"*' for p in palavras)
+
+
+def filtrar_por_termo(produtos, termo, ids_fts=None):
+    """Produtos cujo código ou nome contém o termo, na ordem de relevância do índice.
+
+    O FTS só casa prefixos de palavras: o final de um código de barras ou um
+    trecho no meio do nome não o encontram. Por isso o filtro continua sendo
+    o trecho, e ids_fts (de Database.buscar_ids_produtos) só ordena: o que o
+    índice trouxe vem primeiro, o resto na ordem original. Achados do índice
+    que o trecho não pega (busca sem acento) também entram.
+    """
+    termo = str(termo or '').strip().lower()
+    posicao = {pid: i for i, pid in enumerate(ids_fts or [])}
+    encontrados = [
+        p for p in produtos
+        if p['id'] in posicao or termo in (p.get('nome') or '').lower() or termo in (p.get('codigo') or '').lower()
+    ]
+    return sorted(encontrados, key=lambda p: posicao.get(p['id'], len(posicao)))
+
+
+def juncao_fts(termo, alias: str = 'p'):
+    """Partes de SQL para filtrar e ordenar produtos pelo índice.
+
+    Retorna (join, condicao, ordem, params), para uso como:
+    ``SELECT ... FROM produtos p {join} WHERE {condicao} ... ORDER BY {ordem}``.
+    """
+    pesos = ', '.join(str(p) for p in PESOS_BM25)
+    return (
+        f"JOIN {TABELA_FTS} ON {TABELA_FTS}.rowid = {alias}.id",
+        f"{TABELA_FTS} MATCH ?",
+        f"bm25({TABELA_FTS}, {pesos})",
+        (expressao_fts(termo),),
+    )
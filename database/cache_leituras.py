@@ -0,0 +1,183 @@
+"""
+Cache em memória das leituras de cadastros (produtos, usuários, clientes,
+categorias e formas de pagamento).
+
+As views repetiam as mesmas consultas a cada navegação (ProdutosView,
+TodasVendasView, DividasView, AbastecimentoView). As entradas são guardadas
+por consulta (SQL + parâmetros, ou uma chave do repositório) junto com a
+versão de dados das tabelas envolvidas no momento da leitura.
+
+Cada tabela tem um contador de versão incrementado em toda escrita local
+(Database.execute/executemany detectam o comando; repositórios, checkout e
+pulls de sincronização chamam ``invalidar``). Uma entrada cuja versão não
+confere é descartada; o TTL cobre escritas feitas por fora desses caminhos.
+O tamanho total é limitado: ao passar do limite saem as entradas usadas há
+mais tempo.
+"""
+import functools
+import inspect
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Tabelas cujas leituras podem ser guardadas
+TABELAS_CACHEAVEIS = frozenset({'produtos', 'usuarios', 'clientes', 'categorias', 'formas_pagamento'})
+
+TTL_PADRAO_S = 60.0
+LIMITE_BYTES_PADRAO = 16 * 1024 * 1024
+
+_RE_TABELAS_LIDAS = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)', re.IGNORECASE)
+_RE_TABELA_ESCRITA = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+([A-Za-z_]\w*)',
+    re.IGNORECASE,
+)
+_RE_DDL = re.compile(r'^\s*(?:ALTER|CREATE|DROP)\b', re.IGNORECASE)
+
+
+def tabelas_lidas(sql: str) -> Optional[frozenset]:
+    """Tabelas de um SELECT se todas forem cacheáveis; None caso contrário."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    tabelas = frozenset(t.lower() for t in _RE_TABELAS_LIDAS.findall(sql))
+    if not tabelas or not tabelas <= TABELAS_CACHEAVEIS:
+        return None
+    return tabelas
+
+
+def tabela_escrita(sql: str) -> Optional[str]:
+    """Tabela alterada por um INSERT/UPDATE/DELETE ('*' para DDL)."""
+    if _RE_DDL.match(sql):
+        return '*'
+    m = _RE_TABELA_ESCRITA.match(sql)
+    return m.group(1).lower() if m else None
+
+
+def _tamanho(valor, profundidade: int = 3) -> int:
+    """Estimativa barata do tamanho em bytes de um resultado (listas de linhas)."""
+    tamanho = sys.getsizeof(valor)
+    if profundidade <= 0:
+        return tamanho
+    if isinstance(valor, dict):
+        for k, v in valor.items():
+            tamanho += sys.getsizeof(k) + _tamanho(v, profundidade - 1)
+    elif isinstance(valor, (list, tuple)) or hasattr(valor, 'keys'):
+        # sqlite3.Row também é iterável
+        for v in valor:
+            tamanho += _tamanho(v, profundidade - 1)
+    return tamanho
+
+
+class CacheLeituras:
+    """Resultados de consultas com TTL, versão por tabela e limite de memória (LRU)."""
+
+    def __init__(self, ttl: float = TTL_PADRAO_S, limite_bytes: int = LIMITE_BYTES_PADRAO,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.limite_bytes = limite_bytes
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        # chave -> (versões das tabelas, expira_em, valor, tamanho)
+        self._entradas: 'OrderedDict[Hashable, Tuple[tuple, float, Any, int]]' = OrderedDict()
+        self._versoes: Dict[str, int] = {}
+        self._bytes = 0
+        self._stats = {'acertos': 0, 'faltas': 0, 'expiradas': 0, 'obsoletas': 0,
+                       'despejos': 0, 'invalidacoes': 0}
+
+    def _versao(self, tabelas: Iterable[str]) -> tuple:
+        return tuple(sorted((t, self._versoes.get(t, 0)) for t in tabelas))
+
+    def obter(self, chave: Hashable, tabelas: Iterable[str], carregar: Callable[[], Any]) -> Any:
+        """Valor em cache para a chave ou o resultado de carregar(), que passa a ser guardado."""
+        tabelas = tuple(tabelas)
+        with self._lock:
+            versao = self._versao(tabelas)
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                if entrada[0] != versao:
+                    self._stats['obsoletas'] += 1
+                    self._remover(chave)
+                elif entrada[1] <= self._relogio():
+                    self._stats['expiradas'] += 1
+                    self._remover(chave)
+                else:
+                    self._entradas.move_to_end(chave)
+                    self._stats['acertos'] += 1
+                    return entrada[2]
+            self._stats['faltas'] += 1
+
+        valor = carregar()
+        tamanho = _tamanho(valor)
+        with self._lock:
+            # Escrita durante a leitura: o resultado pode já estar desatualizado
+            if self._versao(tabelas) != versao or tamanho > self.limite_bytes:
+                return valor
+            self._remover(chave)
+            self._entradas[chave] = (versao, self._relogio() + self.ttl, valor, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.limite_bytes and self._entradas:
+                antiga = next(iter(self._entradas))
+                self._remover(antiga)
+                self._stats['despejos'] += 1
+        return valor
+
+    def _remover(self, chave: Hashable):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= entrada[3]
+
+    def invalidar(self, *tabelas: str):
+        """Incrementa a versão das tabelas (todas, se nenhuma for informada)."""
+        with self._lock:
+            alvo = tabelas or tuple(TABELAS_CACHEAVEIS)
+            for tabela in alvo:
+                self._versoes[tabela] = self._versoes.get(tabela, 0) + 1
+            if not tabelas:
+                self._entradas.clear()
+                self._bytes = 0
+            self._stats['invalidacoes'] += 1
+
+    def invalidar_por_sql(self, sql: str):
+        """Invalida a tabela escrita por um comando SQL, se for cacheável."""
+        tabela = tabela_escrita(sql)
+        if tabela == '*':
+            self.invalidar()
+        elif tabela in TABELAS_CACHEAVEIS:
+            self.invalidar(tabela)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entradas'] = len(self._entradas)
+            stats['bytes'] = self._bytes
+            consultas = stats['acertos'] + stats['faltas']
+            stats['taxa_acerto'] = stats['acertos'] / consultas if consultas else 0.0
+        return stats
+
+
+# Instância global para ser usada em toda a aplicação
+cache_leituras = CacheLeituras()
+
+
+def invalida_cache(*tabelas: str):
+    """Decorador: invalida as tabelas ao fim do método (síncrono ou async), mesmo com erro."""
+    def decorador(funcao):
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envoltorio_async(*args, **kwargs):
+                try:
+                    return await funcao(*args, **kwargs)
+                finally:
+                    cache_leituras.invalidar(*tabelas)
+            return envoltorio_async
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                cache_leituras.invalidar(*tabelas)
+        return envoltorio
+    return decorador
@@ -0,0 +1,212 @@
+"""
+Finalização de venda (checkout) em uma única transação.
+
+O PDV fazia, para cada linha do carrinho, consultas separadas de preço de
+custo e venda_por_peso, o INSERT do item e o UPDATE do estoque — cerca de
+cinco idas ao banco por linha com a interface bloqueada. Aqui o checkout:
+
+- lê todos os produtos do carrinho com um único SELECT ... WHERE id IN (...);
+- insere os itens com executemany;
+- baixa o estoque de todos os produtos com um único UPDATE (CASE por id);
+- confirma tudo de uma vez (ou desfaz tudo em caso de erro).
+
+Como antes, a venda não entra no change_log: fica com synced = 0 até o
+envio imediato ou a fase de vendas antigas do sync. Uma entrada CREATE
+faria a mesma venda ser enviada de novo pelo push do change_log.
+
+As latências de cada checkout ficam em metricas_checkout (p50/p95/p99).
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from database.cache_leituras import cache_leituras
+from utils.metricas import percentil
+
+# Produtos por comando (mantém o número de parâmetros abaixo de 999)
+LOTE_PRODUTOS = 300
+
+
+def _lotes(sequencia, tamanho=LOTE_PRODUTOS):
+    for i in range(0, len(sequencia), tamanho):
+        yield sequencia[i:i + tamanho]
+
+
+def calcular_peso_kg(item: Dict[str, Any], venda_por_peso: bool) -> float:
+    """Peso do item; para produtos vendidos por peso sem peso informado, subtotal / preço."""
+    peso = float(item.get('peso_kg', 0) or 0)
+    if venda_por_peso and peso <= 0:
+        try:
+            preco_unitario = float(item.get('preco') or 0)
+            if preco_unitario > 0:
+                peso = round(float(item.get('subtotal') or 0) / preco_unitario, 3)
+        except (TypeError, ValueError):
+            pass
+    return peso
+
+
+class MetricasCheckout:
+    """Latências dos últimos checkouts, para acompanhar o tempo no caixa."""
+
+    def __init__(self, amostras: int = 500):
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=amostras)
+        self._total = 0
+
+    def registrar(self, duracao_ms: float):
+        with self._lock:
+            self._latencias.append(duracao_ms)
+            self._total += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            amostras = list(self._latencias)
+            total = self._total
+        return {
+            'vendas': total,
+            'amostras': len(amostras),
+            'p50_ms': percentil(amostras, 50),
+            'p95_ms': percentil(amostras, 95),
+            'p99_ms': percentil(amostras, 99),
+            'max_ms': max(amostras) if amostras else 0.0,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._latencias.clear()
+            self._total = 0
+
+
+class CheckoutService:
+    """Grava venda, itens, baixa de estoque e change_log numa transação."""
+
+    def __init__(self, db, metricas: MetricasCheckout = None):
+        self.db = db
+        self.metricas = metricas or metricas_checkout
+
+    def _carregar_produtos(self, cursor, ids: List[int]) -> Dict[int, tuple]:
+        """id -> (preco_custo, venda_por_peso, uuid) para todos os produtos do carrinho."""
+        produtos = {}
+        for lote in _lotes(ids):
+            cursor.execute(f"""
+                SELECT id, COALESCE(preco_custo, 0), COALESCE(venda_por_peso, 0), uuid
+                FROM produtos WHERE id IN ({', '.join('?' * len(lote))})
+            """, lote)
+            for linha in cursor.fetchall():
+                produtos[linha[0]] = (float(linha[1] or 0), int(linha[2] or 0) == 1, linha[3])
+        return produtos
+
+    @staticmethod
+    def _baixar_estoque(cursor, decrementos: Dict[int, float]):
+        """Um UPDATE por lote de produtos: estoque = estoque - CASE id WHEN ... END."""
+        ids = list(decrementos)
+        for lote in _lotes(ids):
+            casos = ' '.join('WHEN ? THEN ?' for _ in lote)
+            params = [v for pid in lote for v in (pid, decrementos[pid])]
+            params.extend(lote)
+            cursor.execute(f"""
+                UPDATE produtos
+                SET estoque = estoque - CASE id {casos} ELSE 0 END,
+                    updated_at = CURRENT_TIMESTAMP,
+                    synced = 0
+                WHERE id IN ({', '.join('?' * len(lote))})
+            """, params)
+
+    def finalizar(self, usuario_id: int, itens: List[Dict[str, Any]], forma_pagamento: str,
+                  total: float, valor_recebido: float = 0.0) -> Dict[str, Any]:
+        """Registra a venda completa e retorna id, uuid e os itens no formato da API.
+
+        Cada item do carrinho tem id, quantidade, preco, subtotal e, opcionalmente,
+        peso_kg. Em caso de erro nada é gravado e a exceção é propagada.
+        """
+        inicio = time.perf_counter()
+        ids = list(dict.fromkeys(item['id'] for item in itens))
+
+        with self.db._lock:
+            conn = self.db.conn
+            cursor = conn.cursor()
+            try:
+                produtos = self._carregar_produtos(cursor, ids)
+
+                venda_id, venda_uuid, _ = self.db._inserir_venda(cursor, {
+                    'usuario_id': usuario_id,
+                    'total': total,
+                    'forma_pagamento': forma_pagamento,
+                    'valor_recebido': valor_recebido,
+                    'troco': valor_recebido - total,
+                })
+
+                linhas_itens = []
+                decrementos: Dict[int, float] = {}
+                itens_payload = []
+                for item in itens:
+                    preco_custo, por_peso, produto_uuid = produtos.get(item['id'], (0.0, False, None))
+                    if item['id'] not in produtos:
+                        print(f"⚠️ Produto {item['id']} não encontrado ao buscar preco_custo - usando 0.0")
+                    peso_kg = calcular_peso_kg(item, por_peso)
+                    quantidade = float(item.get('quantidade', 0) or 0)
+
+                    linhas_itens.append((
+                        venda_id, item['id'], item['quantidade'], item['preco'],
+                        preco_custo, item['subtotal'], peso_kg
+                    ))
+                    # Produtos por peso baixam o peso; os demais, a quantidade
+                    decrementos[item['id']] = decrementos.get(item['id'], 0.0) + (
+                        peso_kg if peso_kg > 0 else quantidade
+                    )
+
+                    if produto_uuid:
+                        # Backend espera quantidade inteira; frações seguem em peso_kg
+                        payload = {
+                            'produto_id': str(produto_uuid),
+                            'quantidade': int(quantidade) if quantidade >= 1 else 1,
+                            'preco_unitario': float(item.get('preco') or 0.0),
+                            'subtotal': float(item.get('subtotal') or 0.0),
+                        }
+                        if peso_kg > 0:
+                            payload['peso_kg'] = peso_kg
+                        itens_payload.append(payload)
+
+                cursor.executemany("""
+                    INSERT INTO itens_venda (
+                        venda_id, produto_id, quantidade,
+                        preco_unitario, preco_custo_unitario,
+                        subtotal, peso_kg
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, linhas_itens)
+
+                self._baixar_estoque(cursor, decrementos)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        cache_leituras.invalidar('produtos')
+
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        self.metricas.registrar(duracao_ms)
+        print(f"[CHECKOUT] Venda {venda_id}: {len(itens)} itens em {duracao_ms:.1f} ms")
+        return {
+            'venda_id': venda_id,
+            'uuid': venda_uuid,
+            'itens_payload': itens_payload,
+            'duracao_ms': duracao_ms,
+        }
+
+    def marcar_sincronizada(self, venda_id: int):
+        """Marca a venda como sincronizada após o envio imediato ao servidor."""
+        with self.db._lock:
+            conn = self.db.conn
+            try:
+                conn.execute("UPDATE vendas SET synced = 1 WHERE id = ?", (venda_id,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def get_stats(self) -> dict:
+        return self.metricas.get_stats()
+
+
+# Métricas compartilhadas por todos os caixas abertos no processo
+metricas_checkout = MetricasCheckout()
@@ -0,0 +1,161 @@
+"""
+Compactação das mudanças pendentes do change_log antes do push.
+
+Cada edição grava uma linha no change_log: um produto com o preço editado
+dez vezes e depois excluído gerava onze requisições. Antes de enviar, as
+mudanças pendentes de cada (entity_type, entity_id) são reduzidas à menor
+operação equivalente:
+
+- CREATE + UPDATE*  -> CREATE com o estado final;
+- UPDATE + UPDATE*  -> um UPDATE com o estado final;
+- qualquer + DELETE -> DELETE;
+- DELETE + CREATE   -> UPDATE com o estado final (a entidade ainda existe
+  no servidor, que responderia 409 a um novo CREATE);
+- CREATE + ... + DELETE -> nada (a entidade nunca chegou ao servidor).
+
+A linha mais antiga de cada entidade é mantida (com a operação e os dados
+resultantes), preservando a ordem de envio; as demais são removidas, já que
+nunca foram enviadas. Tudo numa única transação por tipo de entidade.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from database.connection_factory import connect as db_connect
+
+
+def _dados(mudanca) -> dict:
+    try:
+        return json.loads(mudanca.get('data_json') or '{}') or {}
+    except (TypeError, ValueError):
+        return {}
+
+
+def consolidar(mudancas: List[dict]):
+    """Agrupa as mudanças por entidade, na ordem em que a entidade apareceu.
+
+    Retorna (itens, descartadas): cada item tem operation, entity_id, data e
+    os change_ids que representa; descartadas são ids de CREATE seguido de
+    DELETE, que não precisam ir ao servidor.
+    """
+    itens: Dict[str, dict] = {}
+    descartadas: List[int] = []
+    for mudanca in mudancas:
+        chave = str(mudanca['entity_id'])
+        operacao = mudanca['operation']
+        atual = itens.get(chave)
+        if atual is None:
+            itens[chave] = {
+                'operation': operacao, 'entity_id': mudanca['entity_id'], 'data': _dados(mudanca),
+                'change_ids': [mudanca['id']],
+            }
+            continue
+
+        atual['change_ids'].append(mudanca['id'])
+        if operacao == 'DELETE':
+            if atual['operation'] == 'CREATE':
+                # Nunca existiu no servidor
+                descartadas.extend(atual['change_ids'])
+                del itens[chave]
+            else:
+                atual['operation'], atual['data'] = 'DELETE', _dados(mudanca)
+        elif atual['operation'] == 'DELETE':
+            # Recriado depois de excluído: o DELETE nunca foi enviado, então no
+            # servidor a entidade continua existindo e o CREATE vira UPDATE
+            atual['operation'] = 'UPDATE' if operacao == 'CREATE' else operacao
+            atual['data'] = _dados(mudanca)
+        else:
+            # CREATE/UPDATE + UPDATE: os campos mais novos prevalecem
+            atual['data'] = {**atual['data'], **_dados(mudanca)}
+    return list(itens.values()), descartadas
+
+
+class MetricasCompactacao:
+    """Totais acumulados das compactações (para status/diagnóstico)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def registrar(self, relatorio: dict):
+        with self._lock:
+            self._execucoes += 1
+            self._lidas += relatorio['antes']
+            self._eliminadas += relatorio['eliminadas']
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'execucoes': self._execucoes,
+                'mudancas_lidas': self._lidas,
+                'operacoes_eliminadas': self._eliminadas,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._execucoes = 0
+            self._lidas = 0
+            self._eliminadas = 0
+
+
+def _compactar(db_path, entity_type: str):
+    with db_connect(db_path) as conn:
+        linhas = conn.execute("""
+            SELECT id, entity_id, operation, data_json
+            FROM change_log
+            WHERE status = 'pending' AND entity_type = ?
+            ORDER BY datetime(created_at) ASC, id ASC
+        """, (entity_type,)).fetchall()
+        mudancas = [
+            {'id': l[0], 'entity_id': l[1], 'operation': l[2], 'data_json': l[3]} for l in linhas
+        ]
+        itens, descartadas = consolidar(mudancas)
+
+        agora = datetime.now().isoformat()
+        remover = list(descartadas)
+        for item in itens:
+            if len(item['change_ids']) == 1:
+                continue
+            mantida, *absorvidas = item['change_ids']
+            conn.execute(
+                "UPDATE change_log SET operation = ?, data_json = ?, updated_at = ? WHERE id = ?",
+                (item['operation'], json.dumps(item['data']), agora, mantida)
+            )
+            remover.extend(absorvidas)
+        if remover:
+            conn.executemany("DELETE FROM change_log WHERE id = ?", [(i,) for i in remover])
+        conn.commit()
+    return itens, mudancas, descartadas
+
+
+def compactar_change_log(db_path, entity_type: str, metricas=None) -> dict:
+    """Compacta as mudanças pendentes de um tipo de entidade.
+
+    Retorna o relatório {antes, depois, eliminadas, canceladas}, onde
+    canceladas conta as entidades criadas e excluídas sem nunca terem sido
+    enviadas.
+    """
+    try:
+        itens, mudancas, descartadas = _compactar(db_path, entity_type)
+    except sqlite3.Error as e:
+        print(f"[SYNC][COMPACTACAO] Falha ao compactar {entity_type}: {e}")
+        itens, mudancas, descartadas = [], [], []
+
+    descartadas = set(descartadas)
+    relatorio = {
+        'antes': len(mudancas),
+        'depois': len(itens),
+        'eliminadas': len(mudancas) - len(itens),
+        'canceladas': len({m['entity_id'] for m in mudancas if m['id'] in descartadas}),
+    }
+    if relatorio['eliminadas']:
+        print(f"[SYNC][COMPACTACAO] {entity_type}: {relatorio['antes']} -> {relatorio['depois']} mudanças "
+              f"({relatorio['eliminadas']} operações eliminadas, {relatorio['canceladas']} criadas e excluídas)")
+    (metricas or metricas_compactacao).registrar(relatorio)
+    return relatorio
+
+
+# Instância global
+metricas_compactacao = MetricasCompactacao()
@@ -0,0 +1,186 @@
+"""
+Fábrica central de conexões SQLite para repositórios, sincronização e scripts.
+
+Substitui as chamadas avulsas a sqlite3.connect(...): as conexões são abertas
+uma única vez com as PRAGMAs padrão (WAL, synchronous=NORMAL, cache, mmap,
+temp_store em memória) e reaproveitadas entre chamadas. O objeto devolvido se
+comporta como uma sqlite3.Connection, inclusive no uso com "with", mas ao sair
+do bloco (ou em close()) a conexão volta para a fábrica em vez de ser fechada.
+"""
+import os
+import sqlite3
+import threading
+
+from database.connection_pool import configurar_conexao
+
+
+class PooledConnection:
+    """Conexão emprestada pela fábrica.
+
+    Comporta-se como sqlite3.Connection (cursor, execute, commit, "with"...),
+    mas close() e a saída do bloco "with" devolvem a conexão para reutilização
+    em vez de fechá-la. O row_factory definido aqui vale apenas para os
+    cursores criados por este empréstimo.
+    """
+
+    _ATRIBUTOS_PROPRIOS = ('_conn', '_fabrica', '_chave', '_geracao', 'row_factory')
+
+    def __init__(self, fabrica, chave: str, conn: sqlite3.Connection, geracao: int):
+        object.__setattr__(self, '_fabrica', fabrica)
+        object.__setattr__(self, '_chave', chave)
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_geracao', geracao)
+        object.__setattr__(self, 'row_factory', None)
+
+    def cursor(self) -> sqlite3.Cursor:
+        cursor = self._conexao().cursor()
+        cursor.row_factory = self.row_factory
+        return cursor
+
+    def execute(self, sql, params=()):
+        cursor = self.cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+    def executemany(self, sql, params_list):
+        cursor = self.cursor()
+        cursor.executemany(sql, params_list)
+        return cursor
+
+    def _conexao(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return self._conn
+
+    def close(self):
+        """Devolve a conexão à fábrica, descartando trabalho não confirmado."""
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        self._fabrica._devolver(self._chave, conn, self._geracao)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Mesma semântica de sqlite3.Connection (commit/rollback), seguida da devolução
+        conn = self._conn
+        if conn is None:
+            return False
+        try:
+            if exc_type is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._conexao(), name)
+
+    def __setattr__(self, name, value):
+        if name in self._ATRIBUTOS_PROPRIOS:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conexao(), name, value)
+
+
+class ConnectionFactory:
+    """Mantém conexões ociosas por arquivo de banco e contabiliza aberturas/reusos.
+
+    Cada chamada a connect() empresta uma conexão exclusiva; chamadas
+    aninhadas recebem conexões diferentes, preservando o isolamento de
+    transações que existia quando cada bloco abria a sua própria conexão.
+    """
+
+    def __init__(self, timeout: float = 30.0, max_ociosas: int = 4):
+        self.timeout = timeout
+        self.max_ociosas = max_ociosas
+        self._lock = threading.Lock()
+        self._ociosas = {}  # caminho absoluto -> [conexões livres]
+        self._stats = {'aberturas': 0, 'reutilizacoes': 0, 'descartes': 0, 'emprestadas': 0}
+        # Incrementada por invalidate(); conexões de gerações anteriores são fechadas
+        self._geracao = 0
+
+    def _abrir(self, chave: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(chave, timeout=self.timeout, check_same_thread=False)
+        return configurar_conexao(conn, row_factory=None)
+
+    def connect(self, db_path) -> PooledConnection:
+        """Empresta uma conexão configurada para o banco informado."""
+        chave = os.path.abspath(str(db_path))
+        with self._lock:
+            livres = self._ociosas.get(chave)
+            conn = livres.pop() if livres else None
+            geracao = self._geracao
+            self._stats['emprestadas'] += 1
+            if conn is not None:
+                self._stats['reutilizacoes'] += 1
+            else:
+                self._stats['aberturas'] += 1
+
+        if conn is None:
+            try:
+                conn = self._abrir(chave)
+            except Exception:
+                with self._lock:
+                    self._stats['emprestadas'] -= 1
+                raise
+        return PooledConnection(self, chave, conn, geracao)
+
+    def _devolver(self, chave: str, conn: sqlite3.Connection, geracao: int):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            reutilizavel = True
+        except sqlite3.Error:
+            reutilizavel = False
+
+        with self._lock:
+            self._stats['emprestadas'] -= 1
+            livres = self._ociosas.setdefault(chave, [])
+            if reutilizavel and geracao == self._geracao and len(livres) < self.max_ociosas:
+                livres.append(conn)
+                return
+            self._stats['descartes'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def invalidate(self):
+        """Fecha as conexões ociosas e impede o reuso das emprestadas (ex.: após restaurar backup)."""
+        with self._lock:
+            self._geracao += 1
+            ociosas = [c for livres in self._ociosas.values() for c in livres]
+            self._ociosas.clear()
+        for conn in ociosas:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> dict:
+        """Contadores de aberturas e reutilizações desde o início do processo."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['ociosas'] = sum(len(livres) for livres in self._ociosas.values())
+        total = stats['aberturas'] + stats['reutilizacoes']
+        stats['taxa_reuso'] = (stats['reutilizacoes'] / total) if total else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for chave in ('aberturas', 'reutilizacoes', 'descartes'):
+                self._stats[chave] = 0
+
+
+# Instância global para ser usada em toda a aplicação
+connection_factory = ConnectionFactory()
+
+
+def connect(db_path) -> PooledConnection:
+    """Atalho para connection_factory.connect(db_path)."""
+    return connection_factory.connect(db_path)
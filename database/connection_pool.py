@@ -0,0 +1,184 @@
+"""
+Pool de conexões SQLite usado pelo singleton Database.
+
+Cada thread recebe sua própria conexão de leitura e todas as escritas passam
+por uma única conexão serializada por lock. O modo WAL é ativado na abertura
+para que as leituras (PDV, monitor de status) não fiquem bloqueadas enquanto
+a sincronização em background grava no banco.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Comandos que podem ir para a conexão de leitura da thread
+_PREFIXOS_LEITURA = ('SELECT', 'WITH', 'PRAGMA TABLE_INFO', 'PRAGMA INDEX_LIST', 'EXPLAIN')
+
+
+# PRAGMAs aplicadas a toda conexão aberta pelo sistema (pool do Database e
+# fábrica de conexões dos repositórios)
+PRAGMAS_PADRAO = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",      # ~20 MB de cache de páginas
+    "PRAGMA mmap_size=268435456",    # 256 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def configurar_conexao(conn: sqlite3.Connection, row_factory=sqlite3.Row) -> sqlite3.Connection:
+    """Aplica as PRAGMAs padrão do sistema a uma conexão recém-aberta."""
+    conn.row_factory = row_factory
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.DatabaseError as e:
+        # Bancos em mídia somente leitura ou montagens de rede podem recusar WAL
+        print(f"[POOL] Não foi possível ativar WAL: {e}")
+    for pragma in PRAGMAS_PADRAO:
+        conn.execute(pragma)
+    return conn
+
+
+def is_consulta_leitura(sql: str) -> bool:
+    """Indica se o comando pode ser executado numa conexão de leitura."""
+    return sql.lstrip().upper().startswith(_PREFIXOS_LEITURA)
+
+
+class ConnectionPool:
+    """Gerencia uma conexão de escrita serializada e uma conexão de leitura por thread."""
+
+    def __init__(self, db_path, row_factory=sqlite3.Row, timeout: float = 30.0):
+        self.db_path = str(db_path)
+        self.row_factory = row_factory
+        self.timeout = timeout
+
+        self.writer_lock = threading.RLock()
+        self._writer = None
+        self._readers = {}  # ident da thread -> (thread, conexão)
+        self._readers_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'leituras': 0,
+            'escritas': 0,
+            'leituras_no_escritor': 0,
+            'leitores_abertos': 0,
+            'leitores_descartados': 0,
+            'espera_escrita_total': 0.0,
+            'espera_escrita_max': 0.0,
+        }
+
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        return configurar_conexao(conn, self.row_factory)
+
+    # ------------------------------------------------------------------
+    # Conexão de escrita
+    # ------------------------------------------------------------------
+    @property
+    def writer_connection(self) -> sqlite3.Connection:
+        """Conexão de escrita compartilhada (aberta sob demanda)."""
+        if self._writer is None:
+            with self.writer_lock:
+                if self._writer is None:
+                    self._writer = self._abrir()
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """Adquire a conexão de escrita com exclusividade, registrando o tempo de espera."""
+        inicio = time.perf_counter()
+        with self.writer_lock:
+            espera = time.perf_counter() - inicio
+            with self._stats_lock:
+                self._stats['escritas'] += 1
+                self._stats['espera_escrita_total'] += espera
+                if espera > self._stats['espera_escrita_max']:
+                    self._stats['espera_escrita_max'] = espera
+            yield self.writer_connection
+
+    # ------------------------------------------------------------------
+    # Conexões de leitura
+    # ------------------------------------------------------------------
+    def _reader_da_thread(self) -> sqlite3.Connection:
+        thread = threading.current_thread()
+        entrada = self._readers.get(thread.ident)
+        if entrada is not None and entrada[0] is thread:
+            return entrada[1]
+
+        conn = self._abrir()
+        with self._readers_lock:
+            self._descartar_leitores_orfaos()
+            self._readers[thread.ident] = (thread, conn)
+            with self._stats_lock:
+                self._stats['leitores_abertos'] += 1
+        return conn
+
+    def _descartar_leitores_orfaos(self):
+        """Fecha conexões de threads que já terminaram (chamado com _readers_lock)."""
+        for ident, (thread, conn) in list(self._readers.items()):
+            if not thread.is_alive():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                del self._readers[ident]
+                with self._stats_lock:
+                    self._stats['leitores_descartados'] += 1
+
+    @contextmanager
+    def reader(self):
+        """Retorna a conexão adequada para leitura.
+
+        Se a conexão de escrita estiver com uma transação aberta, a leitura é
+        feita nela para enxergar as alterações ainda não confirmadas, como
+        acontecia quando havia uma única conexão.
+        """
+        writer = self._writer
+        if writer is not None and writer.in_transaction:
+            with self.writer_lock:
+                with self._stats_lock:
+                    self._stats['leituras_no_escritor'] += 1
+                yield writer
+            return
+
+        with self._stats_lock:
+            self._stats['leituras'] += 1
+        yield self._reader_da_thread()
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+    def checkpoint(self):
+        """Transfere o conteúdo do WAL para o arquivo principal (antes de copiar o .db)."""
+        with self.writer() as conn:
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close_all(self):
+        """Fecha todas as conexões do pool (escrita e leitura)."""
+        with self._readers_lock:
+            for _, conn in self._readers.values():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._readers.clear()
+        with self.writer_lock:
+            if self._writer is not None:
+                try:
+                    self._writer.close()
+                except Exception:
+                    pass
+                self._writer = None
+
+    def get_stats(self) -> dict:
+        """Estatísticas do pool: tamanho atual, contadores e tempos de espera."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['leitores_ativos'] = len(self._readers)
+        stats['pool_size'] = stats['leitores_ativos'] + (1 if self._writer is not None else 0)
+        escritas = stats['escritas'] or 1
+        stats['espera_escrita_media'] = stats['espera_escrita_total'] / escritas
+        return stats
@@ -7,6 +7,15 @@ import hashlib
 from datetime import datetime
 import platform
 import shutil
+import time
+from database.connection_pool import ConnectionPool, is_consulta_leitura
+from database.connection_factory import connection_factory
+from database.periodos import filtro_periodo, filtro_dia_atual, filtro_mes_atual
+from database.resumo_vendas import reconstruir_resumo
+from database.schema_cache import schema_cache, altera_esquema
+from database.cache_leituras import cache_leituras, tabelas_lidas
+from database.schema_migrations import executar_migracoes, formatar_relatorio
+from database.busca_produtos import TABELA_FTS, expressao_fts, juncao_fts
 
 class Database:
     _instance = None
@@ -32,9 +41,10 @@ class Database:
             # Caminho único e fixo para o banco de dados
             self.db_path = app_data_db_dir / 'sistema.db'
             
-            # Conexão com o banco de dados
-            self.conn = sqlite3.connect(str(self.db_path.absolute()), check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
+            # Pool de conexões: uma conexão de leitura por thread e um escritor serializado
+            self._pool = ConnectionPool(self.db_path.absolute())
+            # Métodos que usam "with self._lock" passam a serializar com o escritor do pool
+            self._lock = self._pool.writer_lock
             
             # Inicializa as tabelas
             self._init_database()
@@ -42,6 +52,31 @@ class Database:
             
             print(f"[DATABASE] Banco de dados inicializado em: {self.db_path}")
 
+    @property
+    def conn(self):
+        """Conexão de escrita do pool (mantida para o código que usa db.conn diretamente)."""
+        return self._pool.writer_connection
+
+    def colunas(self, tabela):
+        """Colunas da tabela a partir do cache de esquema (sem PRAGMA a cada chamada)."""
+        return schema_cache.colunas(self.db_path, tabela)
+
+    def get_pool_stats(self):
+        """Retorna estatísticas do pool de conexões (tamanho, leituras, espera do escritor)."""
+        stats = self._pool.get_stats()
+        # Aberturas/reusos das conexões usadas por repositórios, sync e scripts
+        stats['fabrica'] = connection_factory.get_stats()
+        return stats
+
+    def checkpoint(self):
+        """Consolida o WAL no arquivo principal. Chamar antes de copiar o arquivo .db."""
+        try:
+            self._pool.checkpoint()
+            return True
+        except Exception as e:
+            print(f"Erro ao executar checkpoint do WAL: {e}")
+            return False
+
     def registrar_fechamento(self, dados_fechamento):
         """
         Registra um novo fechamento de caixa no banco de dados.
@@ -117,12 +152,10 @@ class Database:
     def recarregar_conexao(self):
         """Fecha a conexão atual e reconecta ao banco de dados"""
         try:
-            if hasattr(self, 'conn'):
-                self.conn.close()
-            
-            # Reconecta ao banco de dados
-            self.conn = sqlite3.connect(str(self.db_path.absolute()), check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
+            # Fecha escritor e leitores; o pool reabre sob demanda
+            self._pool.close_all()
+            connection_factory.invalidate()
+            schema_cache.invalidar(self.db_path)
             
             # Verifica se o banco de dados está íntegro
             self._init_database()
@@ -132,7 +165,35 @@ class Database:
             return False
             
     def _init_database(self):
-        """Inicializa o banco de dados criando as tabelas necessárias se não existirem"""
+        """Aplica as migrações pendentes e carrega o cache de colunas.
+
+        Num banco já atualizado o custo é uma consulta a schema_version.
+        """
+        inicio = time.perf_counter()
+        try:
+            relatorio = executar_migracoes(self)
+        except Exception as e:
+            print(f"Erro ao inicializar banco de dados: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+        # Esquema final conhecido: carregar o cache de colunas usado nos caminhos quentes
+        inicio_cache = time.perf_counter()
+        try:
+            schema_cache.invalidar(self.db_path)
+            schema_cache.carregar(self.db_path, self.conn)
+        except Exception as e:
+            print(f"Erro ao carregar cache do esquema: {e}")
+        relatorio['cache_ms'] = (time.perf_counter() - inicio_cache) * 1000
+        relatorio['total_ms'] = (time.perf_counter() - inicio) * 1000
+
+        self.relatorio_inicializacao = relatorio
+        print(f"[STARTUP] {formatar_relatorio(relatorio)}")
+        return relatorio
+
+    def _criar_esquema_base(self):
+        """Cria as tabelas do esquema legado (migração 1 de database.schema_migrations)"""
         try:
             cursor = self.conn.cursor()
             
@@ -1134,18 +1195,31 @@ class Database:
             self.conn.commit()
             print("Banco de dados inicializado com sucesso!")
             
-            # Verificar e corrigir esquema se necessário (especialmente após restauração)
-            try:
-                self.verificar_e_corrigir_esquema_pos_restauracao()
-            except Exception as e:
-                print("Banco de dados inicializado com sucesso!")
-            
         except Exception as e:
             print(f"Erro ao inicializar banco de dados: {e}")
             import traceback
             traceback.print_exc()
             raise
 
+    def _criar_indices_periodo(self, cursor):
+        """Cria os índices usados pelos filtros de data em vendas e itens_venda"""
+        indices = (
+            "CREATE INDEX IF NOT EXISTS idx_vendas_data_status ON vendas(data_venda, status)",
+            "CREATE INDEX IF NOT EXISTS idx_vendas_usuario_data ON vendas(usuario_id, data_venda)",
+            "CREATE INDEX IF NOT EXISTS idx_itens_venda_venda ON itens_venda(venda_id)",
+            "CREATE INDEX IF NOT EXISTS idx_itens_venda_produto ON itens_venda(produto_id)",
+        )
+        for sql in indices:
+            try:
+                cursor.execute(sql)
+            except sqlite3.Error as e:
+                print(f"Erro ao criar índice: {e}")
+        try:
+            # Atualiza as estatísticas do planejador para os novos índices
+            cursor.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+
     def _verificar_migracao_valor_total(self, cursor):
         """Verifica e corrige automaticamente backups antigos sem valor_total"""
         try:
@@ -1351,6 +1425,7 @@ class Database:
                             ADD COLUMN {coluna} {definicao}
                         """)
                         self.conn.commit()
+                        schema_cache.invalidar(self.db_path)
                         print(f"Coluna '{coluna}' adicionada com sucesso!")
                     except sqlite3.OperationalError as e:
                         if "duplicate column name" not in str(e):
@@ -1387,10 +1462,13 @@ class Database:
             return False
 
     def execute(self, sql, params=()):
-        with self._lock:
-            cursor = self.conn.cursor()
+        with self._pool.writer() as conn:
+            cursor = conn.cursor()
             cursor.execute(sql, params)
-            self.conn.commit()
+            conn.commit()
+            if altera_esquema(sql):
+                schema_cache.invalidar(self.db_path)
+            cache_leituras.invalidar_por_sql(sql)
             return cursor.lastrowid
             
     def executemany(self, sql, params_list):
@@ -1404,27 +1482,51 @@ class Database:
         Returns:
             int: Número de linhas afetadas
         """
-        with self._lock:
-            cursor = self.conn.cursor()
+        with self._pool.writer() as conn:
+            cursor = conn.cursor()
             cursor.executemany(sql, params_list)
-            self.conn.commit()
+            conn.commit()
+            cache_leituras.invalidar_por_sql(sql)
             return cursor.rowcount
 
+    def _conexao_para(self, sql):
+        """Escolhe a conexão do pool: leitor da thread para consultas, escritor para o resto."""
+        return self._pool.reader() if is_consulta_leitura(sql) else self._pool.writer()
+
     def fetchone(self, sql, params=None, dictionary=False):
         """Executa uma consulta e retorna uma única linha"""
         try:
-            cursor = self.conn.cursor()
-            if dictionary:
-                cursor.row_factory = lambda c, r: {col[0]: r[idx] for idx, col in enumerate(c.description)}
-            cursor.execute(sql, params or ())
-            return cursor.fetchone()
+            with self._conexao_para(sql) as conn:
+                cursor = conn.cursor()
+                if dictionary:
+                    cursor.row_factory = lambda c, r: {col[0]: r[idx] for idx, col in enumerate(c.description)}
+                cursor.execute(sql, params or ())
+                row = cursor.fetchone()
+                # Encerrar o statement para não manter a transação de leitura aberta
+                cursor.close()
+                return row
         except Exception as e:
             return None
 
     def fetchall(self, sql, params=(), dictionary=False):
-        """Executa uma consulta e retorna todas as linhas"""
-        with self._lock:
-            cursor = self.conn.cursor()
+        """Executa uma consulta e retorna todas as linhas.
+
+        Consultas somente sobre cadastros (ver database/cache_leituras) são
+        servidas do cache enquanto as tabelas não forem alteradas.
+        """
+        tabelas = tabelas_lidas(sql)
+        if tabelas is None:
+            return self._fetchall(sql, params, dictionary)
+        linhas = cache_leituras.obter(
+            (self.db_path, sql, tuple(params or ()), dictionary), tabelas,
+            lambda: self._fetchall(sql, params, dictionary),
+        )
+        # Cópias: quem chama pode alterar a lista ou os dicts
+        return [dict(l) for l in linhas] if dictionary else list(linhas)
+
+    def _fetchall(self, sql, params=(), dictionary=False):
+        with self._conexao_para(sql) as conn:
+            cursor = conn.cursor()
             if dictionary:
                 cursor.row_factory = lambda c, r: {col[0]: r[idx] for idx, col in enumerate(c.description)}
             cursor.execute(sql, params)
@@ -1459,9 +1561,13 @@ class Database:
     def close_all_connections(self):
         """Fecha todas as conexões com o banco de dados"""
         try:
-            if hasattr(self, 'conn') and self.conn:
-                self.conn.close()
-                self.conn = None
+            if hasattr(self, '_pool'):
+                self._pool.close_all()
+            # Conexões ociosas dos repositórios também seguram o arquivo
+            connection_factory.invalidate()
+            # O arquivo pode ser substituído (restauração); o esquema deixa de ser conhecido
+            schema_cache.invalidar(self.db_path)
+            cache_leituras.invalidar()
             # Força a coleta de lixo para liberar recursos
             import gc
             gc.collect()
@@ -1515,8 +1621,6 @@ class Database:
             
             # 5. Criar uma nova conexão
             print("Criando nova conexão...")
-            self.conn = sqlite3.connect(db_path, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
             cursor = self.conn.cursor()
             
             # 6. Criar o esquema do banco de dados
@@ -1875,6 +1979,7 @@ class Database:
                             self.conn.rollback()
                             return None
 
+                    cache_leituras.invalidar('usuarios')
                     print("[LOGIN][REMOTE] Autenticação OK (sincronizada localmente)")
                     return {
                         'id': uid_atual,
@@ -2057,69 +2162,76 @@ class Database:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.conn.close()
+        self._pool.close_all()
 
     def __del__(self):
         try:
-            if hasattr(self, 'conn'):
-                self.conn.commit()  # Garante que as últimas alterações sejam salvas
-                self.conn.close()
+            if hasattr(self, '_pool'):
+                if self._pool._writer is not None:
+                    self._pool._writer.commit()  # Garante que as últimas alterações sejam salvas
+                self._pool.close_all()
         except:
             pass
 
     def insert_venda(self, venda_data):
         """Insere uma nova venda e retorna seu ID"""
         try:
-            cursor = self.conn.cursor()
-            from datetime import datetime
-            import uuid
-            data_atual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            venda_uuid = str(uuid.uuid4())
-            
-            # Descobrir colunas existentes na tabela vendas
-            cursor.execute("PRAGMA table_info(vendas)")
-            cols = [row[1] for row in cursor.fetchall()]
-            
-            # Campos sempre presentes
-            fields = [
-                'usuario_id', 'total', 'forma_pagamento',
-                'valor_recebido', 'troco', 'data_venda'
-            ]
-            values = [
-                venda_data['usuario_id'],
-                venda_data['total'],
-                venda_data['forma_pagamento'],
-                venda_data['valor_recebido'],
-                venda_data['troco'],
-                data_atual
-            ]
-            
-            # Campos opcionais conforme existência na tabela
-            if 'uuid' in cols:
-                fields.append('uuid')
-                values.append(venda_uuid)
-            if 'synced' in cols:
-                fields.append('synced')
-                values.append(0)
-            if 'created_at' in cols:
-                fields.append('created_at')
-                values.append(data_atual)
-            if 'updated_at' in cols:
-                fields.append('updated_at')
-                values.append(data_atual)
-            
-            placeholders = ', '.join(['?'] * len(fields))
-            fields_sql = ', '.join(fields)
-            sql = f"INSERT INTO vendas ({fields_sql}) VALUES ({placeholders})"
-            cursor.execute(sql, tuple(values))
-            
+            venda_id, _, _ = self._inserir_venda(self.conn.cursor(), venda_data)
             self.conn.commit()
-            return cursor.lastrowid
+            return venda_id
             
         except Exception as e:
             self.conn.rollback()
             raise
 
+    def _inserir_venda(self, cursor, venda_data):
+        """Insere a venda no cursor informado, sem confirmar.
+
+        Retorna (id, uuid, data_venda). Usado por insert_venda e pelo checkout,
+        que grava venda, itens e estoque na mesma transação.
+        """
+        from datetime import datetime
+        import uuid
+        data_atual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        venda_uuid = str(uuid.uuid4())
+        
+        # Descobrir colunas existentes na tabela vendas
+        cols = self.colunas('vendas')
+        
+        # Campos sempre presentes
+        fields = [
+            'usuario_id', 'total', 'forma_pagamento',
+            'valor_recebido', 'troco', 'data_venda'
+        ]
+        values = [
+            venda_data['usuario_id'],
+            venda_data['total'],
+            venda_data['forma_pagamento'],
+            venda_data['valor_recebido'],
+            venda_data['troco'],
+            data_atual
+        ]
+        
+        # Campos opcionais conforme existência na tabela
+        if 'uuid' in cols:
+            fields.append('uuid')
+            values.append(venda_uuid)
+        if 'synced' in cols:
+            fields.append('synced')
+            values.append(0)
+        if 'created_at' in cols:
+            fields.append('created_at')
+            values.append(data_atual)
+        if 'updated_at' in cols:
+            fields.append('updated_at')
+            values.append(data_atual)
+        
+        placeholders = ', '.join(['?'] * len(fields))
+        fields_sql = ', '.join(fields)
+        sql = f"INSERT INTO vendas ({fields_sql}) VALUES ({placeholders})"
+        cursor.execute(sql, tuple(values))
+        return cursor.lastrowid, (venda_uuid if 'uuid' in cols else None), data_atual
+
     def insert_item_venda(self, item_data):
         """Insere um item de venda"""
         try:
@@ -2286,46 +2398,73 @@ class Database:
     def get_vendas_periodo(self, data_inicio, data_fim):
         """Retorna vendas de um período específico"""
         try:
-            return self.fetchall("""
+            filtro, params = filtro_periodo('v.data_venda', data_inicio, data_fim)
+            return self.fetchall(f"""
                 SELECT 
                     v.*,
                     u.nome as vendedor
                 FROM vendas v
                 JOIN usuarios u ON v.usuario_id = u.id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE {filtro}
                     AND (v.status IS NULL OR v.status = 'Ativa')
                 ORDER BY v.data_venda DESC
-            """, (data_inicio, data_fim))
+            """, params)
         except Exception as e:
             return []
 
+    def get_resumo_vendas(self, periodo=None, usuario_id=None):
+        """Soma o resumo diário de vendas (vendas_resumo_diario).
+
+        periodo: 'dia' (hoje), 'mes' (mês atual) ou None (todo o histórico).
+        Retorna num_vendas, total_bruto, custo, lucro, num_anuladas e total_anulado.
+        """
+        filtros = []
+        params = []
+        if periodo == 'dia':
+            filtros.append("dia = DATE('now')")
+        elif periodo == 'mes':
+            filtros.append(filtro_mes_atual('dia'))
+        elif periodo is not None:
+            raise ValueError(f"Período inválido: {periodo}")
+        if usuario_id is not None:
+            filtros.append("usuario_id = ?")
+            params.append(usuario_id)
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+        result = self.fetchone(f"""
+            SELECT 
+                COALESCE(SUM(num_vendas), 0) as num_vendas,
+                COALESCE(SUM(total_bruto), 0) as total_bruto,
+                COALESCE(SUM(custo), 0) as custo,
+                COALESCE(SUM(lucro), 0) as lucro,
+                COALESCE(SUM(num_anuladas), 0) as num_anuladas,
+                COALESCE(SUM(total_anulado), 0) as total_anulado
+            FROM vendas_resumo_diario
+            {where}
+        """, tuple(params))
+        return dict(result)
+
+    def reconstruir_resumo_vendas(self):
+        """Recalcula vendas_resumo_diario a partir de vendas/itens_venda. Retorna o número de linhas."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                linhas = reconstruir_resumo(cursor)
+                self.conn.commit()
+                print(f"[RESUMO] vendas_resumo_diario reconstruído ({linhas} linhas)")
+                return linhas
+            except Exception:
+                self.conn.rollback()
+                raise
+
     def get_total_vendas_hoje(self):
         """Retorna o total de vendas do dia"""
         try:
             print("\n=== CALCULANDO TOTAL DE VENDAS HOJE ===")
-            query = """
-                SELECT 
-                    COALESCE(SUM(
-                        CASE 
-                            WHEN status = 'Anulada' THEN 0 
-                            ELSE total 
-                        END
-                    ), 0) as total,
-                    COUNT(*) as total_registros,
-                    SUM(CASE WHEN status = 'Anulada' THEN 1 ELSE 0 END) as total_anuladas
-                FROM vendas
-                WHERE DATE(data_venda) = DATE('now')
-            """
-            print(f"Executando query: {query}")
-            
-            result = self.fetchone(query)
-            
-            if result:
-                print(f"Resultado da query: total={result['total']}, registros={result['total_registros']}, anuladas={result['total_anuladas']}")
-                return result['total']
-            else:
-                print("Nenhum resultado retornado para vendas de hoje")
-                return 0
+            resumo = self.get_resumo_vendas('dia')
+            print(f"Resultado: total={resumo['total_bruto']}, "
+                  f"registros={resumo['num_vendas'] + resumo['num_anuladas']}, anuladas={resumo['num_anuladas']}")
+            return resumo['total_bruto']
                 
         except Exception as e:
             print(f"Erro ao buscar total de vendas hoje: {e}")
@@ -2336,19 +2475,7 @@ class Database:
     def get_total_vendas_mes(self):
         """Retorna o total de vendas do mês atual"""
         try:
-            query = """
-                SELECT COALESCE(SUM(
-                    CASE 
-                        WHEN status = 'Anulada' THEN 0 
-                        ELSE total 
-                    END
-                ), 0) as total
-                FROM vendas
-                WHERE strftime('%Y-%m', data_venda) = strftime('%Y-%m', 'now')
-            """
-            
-            result = self.fetchone(query)
-            return result['total'] if result['total'] else 0
+            return self.get_resumo_vendas('mes')['total_bruto']
         except Exception as e:
             print(f"Erro ao buscar total de vendas do mês: {e}")
             return 0
@@ -2357,19 +2484,7 @@ class Database:
         """Retorna o total de vendas do mês atual MENOS os saques realizados"""
         try:
             # Total de vendas do mês
-            query_vendas = """
-                SELECT COALESCE(SUM(
-                    CASE 
-                        WHEN status = 'Anulada' THEN 0 
-                        ELSE total 
-                    END
-                ), 0) as total
-                FROM vendas
-                WHERE strftime('%Y-%m', data_venda) = strftime('%Y-%m', 'now')
-            """
-            
-            result_vendas = self.fetchone(query_vendas)
-            total_vendas = result_vendas['total'] if result_vendas and result_vendas['total'] else 0
+            total_vendas = self.get_resumo_vendas('mes')['total_bruto']
             
             # Total de saques de vendas do mês
             query_saques = """
@@ -2397,56 +2512,14 @@ class Database:
     def get_lucro_total(self):
         """Retorna o lucro total (vendas - custo)"""
         try:
-            # Verificar se a coluna status existe
-            colunas = self.fetchall("PRAGMA table_info(vendas)")
-            tem_status = any(col['name'] == 'status' for col in colunas)
-            
-            # Ajustar a query baseado na existência da coluna status
-            where_status = "AND (v.status IS NULL OR v.status = 'Ativa')" if tem_status else ""
-            
-            result = self.fetchone(f"""
-                SELECT 
-                    COALESCE(SUM(
-                        iv.subtotal - (
-                            iv.preco_custo_unitario * CASE 
-                                WHEN COALESCE(iv.peso_kg, 0) > 0 THEN iv.peso_kg 
-                                ELSE iv.quantidade 
-                            END
-                        )
-                    ), 0) as lucro
-                FROM vendas v
-                JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE 1=1 {where_status}
-            """)
-            return result['lucro'] if result else 0
+            return self.get_resumo_vendas()['lucro']
         except Exception as e:
             return 0
 
     def get_lucro_mes(self):
         """Retorna o lucro do mês atual"""
         try:
-            query = """
-                SELECT COALESCE(SUM(
-                    CASE 
-                        WHEN v.status = 'Anulada' THEN 0 
-                        ELSE (
-                            iv.subtotal - (
-                                iv.preco_custo_unitario * CASE 
-                                    WHEN COALESCE(iv.peso_kg, 0) > 0 THEN iv.peso_kg 
-                                    ELSE iv.quantidade 
-                                END
-                            )
-                        )
-                    END
-                ), 0) as lucro
-                FROM vendas v
-                JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE strftime('%Y-%m', v.data_venda) = strftime('%Y-%m', 'now')
-                AND (v.origem IS NULL OR v.origem != 'divida_quitada' OR v.origem = 'divida_quitada')
-            """
-            
-            result = self.fetchone(query)
-            return result['lucro'] if result['lucro'] else 0
+            return self.get_resumo_vendas('mes')['lucro']
         except Exception as e:
             print(f"Erro ao calcular lucro do mês: {e}")
             return 0
@@ -2455,27 +2528,7 @@ class Database:
         """Retorna o lucro do mês atual MENOS os saques de lucro realizados"""
         try:
             # Lucro bruto do mês
-            query_lucro = """
-                SELECT COALESCE(SUM(
-                    CASE 
-                        WHEN v.status = 'Anulada' THEN 0 
-                        ELSE (
-                            iv.subtotal - (
-                                iv.preco_custo_unitario * CASE 
-                                    WHEN COALESCE(iv.peso_kg, 0) > 0 THEN iv.peso_kg 
-                                    ELSE iv.quantidade 
-                                END
-                            )
-                        )
-                    END
-                ), 0) as lucro
-                FROM vendas v
-                JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE strftime('%Y-%m', v.data_venda) = strftime('%Y-%m', 'now')
-            """
-            
-            result_lucro = self.fetchone(query_lucro)
-            lucro_bruto = result_lucro['lucro'] if result_lucro and result_lucro['lucro'] else 0
+            lucro_bruto = self.get_resumo_vendas('mes')['lucro']
             
             # Total de saques de lucro do mês
             query_saques = """
@@ -2504,42 +2557,10 @@ class Database:
         """Retorna o lucro do dia atual"""
         try:
             print("\n=== INÍCIO CÁLCULO LUCRO DIA ===")
-            
-            # Primeiro, verificar se existem vendas hoje
-            query_vendas = """
-                SELECT v.id, v.valor_total, v.status, v.data_venda, v.origem,
-                       SUM(
-                           iv.subtotal - (
-                               iv.preco_custo_unitario * CASE 
-                                   WHEN COALESCE(iv.peso_kg, 0) > 0 THEN iv.peso_kg 
-                                   ELSE iv.quantidade 
-                               END
-                           )
-                       ) as lucro
-                FROM vendas v
-                JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) = DATE('now')
-                AND (v.status IS NULL OR v.status != 'Anulada')
-                GROUP BY v.id
-                ORDER BY v.data_venda DESC
-            """
-            vendas_hoje = self.fetchall(query_vendas)
-            print(f"Encontradas {len(vendas_hoje)} vendas hoje")
-            
-            lucro_total = 0.0
-            
-            # Somar o lucro de todas as vendas
-            for venda in vendas_hoje:
-                lucro_venda = venda['lucro'] or 0
-                lucro_total += lucro_venda
-                print(f"[DEBUG] Venda {venda['id']} - Lucro: MT {lucro_venda:.2f}")
-                
-                # Se for uma venda de dívida, adicionar ao lucro total
-                if venda['origem'] == 'divida_quitada' if 'origem' in venda and venda['origem'] is not None else False:
-                    print(f"[DEBUG] Venda {venda['id']} é uma dívida quitada")
-            
-            print(f"[DEBUG] Lucro total do dia: MT {lucro_total:.2f}")
-            return lucro_total
+            resumo = self.get_resumo_vendas('dia')
+            print(f"Encontradas {resumo['num_vendas']} vendas hoje")
+            print(f"[DEBUG] Lucro total do dia: MT {resumo['lucro']:.2f}")
+            return resumo['lucro']
             
         except Exception as e:
             print(f"[ERRO] Erro ao calcular lucro do dia: {str(e)}")
@@ -2550,14 +2571,14 @@ class Database:
     def get_vendas_nao_fechadas(self, usuario_id):
         """Retorna vendas não incluídas em nenhum fechamento"""
         try:
-            return self.fetchall("""
+            return self.fetchall(f"""
                 SELECT 
                     forma_pagamento,
                     COUNT(*) as quantidade,
                     SUM(valor_total) as total
                 FROM vendas 
                 WHERE usuario_id = ?
-                AND DATE(data_venda) = DATE('now')
+                AND {filtro_dia_atual('data_venda')}
                 AND id NOT IN (
                     SELECT venda_id FROM vendas_fechamentos
                     WHERE venda_id IS NOT NULL
@@ -2630,12 +2651,12 @@ class Database:
     def get_total_vendas_congelador_hoje(self):
         """Retorna o total de vendas do congelador para hoje"""
         try:
-            result = self.fetchone("""
+            result = self.fetchone(f"""
                 SELECT COALESCE(SUM(v.valor_total), 0) as total
                 FROM vendas v
                 JOIN itens_venda iv ON v.id = iv.venda_id
                 JOIN produtos p ON iv.produto_id = p.id
-                WHERE DATE(v.data_venda) = DATE('now')
+                WHERE {filtro_dia_atual('v.data_venda')}
                 AND p.venda_por_peso = 1
                 AND (v.status IS NULL OR v.status != 'Anulada')
             """)
@@ -2704,9 +2725,9 @@ class Database:
         try:
             print("\n=== Recriando banco de dados ===")
             
-            # Fechar conexão existente
-            if self.conn:
-                self.conn.close()
+            # Fechar conexões existentes
+            self._pool.close_all()
+            connection_factory.invalidate()
             
             # Remover arquivo do banco
             import os
@@ -2714,8 +2735,7 @@ class Database:
                 os.remove(str(self.db_path))
                 print("Arquivo do banco removido")
             
-            # Recriar conexão e inicializar banco
-            self.conn = self._create_connection()
+            # Inicializar banco (o pool reabre a conexão sob demanda)
             self._init_database()
             print("Banco de dados recriado com sucesso!")
             print("=== Fim da recriação do banco ===\n")
@@ -2809,6 +2829,7 @@ class Database:
             ''')
 
             self.conn.commit()
+            schema_cache.invalidar(self.db_path)
             return True
         except Exception as e:
             print(f"Erro ao garantir schema de abastecimento: {e}")
@@ -2821,7 +2842,7 @@ class Database:
     def get_vendas_hoje(self):
         """Retorna todas as vendas do dia atual para depuração"""
         try:
-            query = """
+            query = f"""
                 SELECT 
                     v.id as venda_id,
                     v.data_venda,
@@ -2844,7 +2865,7 @@ class Database:
                     ) as lucro_item
                 FROM vendas v
                 LEFT JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) = DATE('now')
+                WHERE {filtro_dia_atual('v.data_venda')}
                 ORDER BY v.data_venda DESC
             """
             
@@ -3094,6 +3115,23 @@ class Database:
         if not termo:
             return None
             
+        if self.tem_busca_fts() and expressao_fts(termo):
+            # Código idêntico primeiro; depois o melhor resultado do índice FTS5
+            juncao, condicao, ordem, params = juncao_fts(termo)
+            produto = self.fetchone(f"""
+                SELECT p.*, c.nome as categoria_nome
+                FROM produtos p
+                {juncao}
+                LEFT JOIN categorias c ON p.categoria_id = c.id
+                WHERE {condicao}
+                AND p.ativo = 1
+                ORDER BY (LOWER(p.codigo) = ?) DESC, {ordem}
+                LIMIT 1
+            """, params + (termo.strip().lower(),), dictionary=True)
+            if produto:
+                return produto
+            # O FTS só casa prefixos: trechos do meio ou do fim (ex.: final do código de barras) vão pelo LIKE
+
         # Remove espaços extras e converte para minúsculas para busca case-insensitive
         termo = f"%{termo.strip().lower()}%"
         
@@ -3106,6 +3144,32 @@ class Database:
             LIMIT 1
         """, (termo, termo), dictionary=True)
 
+    def tem_busca_fts(self):
+        """Indica se o índice produtos_fts existe (SQLite com FTS5)"""
+        return bool(self.colunas(TABELA_FTS))
+
+    def buscar_ids_produtos(self, termo, limite=None):
+        """IDs dos produtos ativos que casam com o termo, do mais ao menos relevante.
+
+        Retorna None quando o índice FTS5 não está disponível, para a tela
+        usar o filtro antigo.
+        """
+        if not self.tem_busca_fts():
+            return None
+        if not expressao_fts(termo):
+            return []
+        juncao, condicao, ordem, params = juncao_fts(termo)
+        sql = f"""
+            SELECT p.id FROM produtos p
+            {juncao}
+            WHERE {condicao} AND p.ativo = 1
+            ORDER BY {ordem}
+        """
+        if limite is not None:
+            sql += " LIMIT ?"
+            params += (int(limite),)
+        return [linha[0] for linha in self.fetchall(sql, params)]
+
     def verificar_consistencia_saques(self):
         """
         Verifica a consistência entre os totais de vendas/lucro e os saques registrados.
@@ -3116,12 +3180,12 @@ class Database:
             self.conn.execute("BEGIN TRANSACTION")
             
             # 1. Verificar consistência de vendas
-            vendas_saques = self.fetchone("""
+            vendas_saques = self.fetchone(f"""
                 SELECT 
                     (SELECT COALESCE(SUM(valor_total), 0) 
                      FROM vendas 
                      WHERE status = 'Concluída' 
-                     AND DATE(data_venda) = DATE('now')) as total_vendas,
+                     AND {filtro_dia_atual('data_venda')}) as total_vendas,
                     
                     (SELECT COALESCE(SUM(valor), 0) 
                      FROM retiradas_caixa 
@@ -3130,7 +3194,7 @@ class Database:
             """)
             
             # 2. Verificar consistência de lucro
-            lucro_saques = self.fetchone("""
+            lucro_saques = self.fetchone(f"""
                 SELECT 
                     (SELECT COALESCE(SUM(
                         CASE
@@ -3147,7 +3211,7 @@ class Database:
                     ), 0)
                     FROM vendas v
                     JOIN itens_venda iv ON v.id = iv.venda_id
-                    WHERE DATE(v.data_venda) = DATE('now')) as total_lucro,
+                    WHERE {filtro_dia_atual('v.data_venda')}) as total_lucro,
                     
                     (SELECT COALESCE(SUM(valor), 0) 
                      FROM retiradas_caixa 
@@ -3551,6 +3615,7 @@ class Database:
             
             # Commit das alterações
             self.conn.commit()
+            schema_cache.invalidar(self.db_path)
             
             print("Verificação e correção de esquema concluída")
             return True
@@ -0,0 +1,128 @@
+"""
+Hash do conteúdo sincronizado de cada linha (coluna hash_conteudo).
+
+Os pulls de produtos, usuários e clientes comparavam timestamps (ou nem
+isso, no caso dos clientes) e regravavam linhas idênticas, atualizando
+updated_at a cada ciclo. Cada tabela sincronizada guarda agora o hash dos
+campos vindos do servidor, gravado no pull e recalculado nas escritas
+locais; no pull seguinte, hash igual significa linha inalterada e nada é
+gravado.
+
+Linhas sem hash (anteriores à migração) seguem pela comparação antiga.
+"""
+import hashlib
+import json
+import sqlite3
+from typing import Any, Dict, Optional
+
+# Campos cobertos pelo hash, como gravados no banco local
+CAMPOS_HASH = {
+    'produtos': ('codigo', 'nome', 'descricao', 'preco_custo', 'preco_venda', 'categoria_id',
+                 'fornecedor_id', 'estoque_minimo', 'estoque_servidor', 'venda_por_peso', 'unidade_medida'),
+    'usuarios': ('nome', 'usuario', 'nivel', 'is_admin', 'ativo', 'salario',
+                 'pode_abastecer', 'pode_gerenciar_despesas'),
+    'clientes': ('nome', 'telefone', 'endereco'),
+}
+
+# Entram no hash só quando presentes (a senha nem sempre vem do servidor)
+_CAMPOS_OPCIONAIS = {'usuarios': ('senha',)}
+
+_NUMERICOS = {
+    'preco_custo', 'preco_venda', 'categoria_id', 'fornecedor_id', 'estoque_minimo', 'estoque_servidor',
+    'venda_por_peso', 'nivel', 'is_admin', 'ativo', 'salario', 'pode_abastecer', 'pode_gerenciar_despesas',
+}
+
+# Tabelas que recebem a coluna (vendas usa hash próprio, ver repositories/ingestao_vendas)
+TABELAS_COM_HASH = ('produtos', 'usuarios', 'clientes', 'vendas')
+
+SCRIPT_COLUNAS = ''.join(f"ALTER TABLE {t} ADD COLUMN hash_conteudo TEXT;\n" for t in TABELAS_COM_HASH)
+
+
+def digest(conteudo: Dict[str, Any]) -> str:
+    """sha1 da serialização canônica (chaves ordenadas) de um dict."""
+    texto = json.dumps(conteudo, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def _normalizar(campo: str, valor):
+    if valor is None or valor == '':
+        return None
+    if campo in _NUMERICOS:
+        # 1, 1.0, '1.00' e True representam o mesmo valor
+        try:
+            return round(float(valor), 4)
+        except (TypeError, ValueError):
+            return str(valor)
+    return str(valor)
+
+
+def hash_conteudo(entidade: str, dados: Dict[str, Any]) -> str:
+    """Hash dos campos sincronizados de uma linha (dict com os nomes das colunas)."""
+    campos = CAMPOS_HASH[entidade] + tuple(c for c in _CAMPOS_OPCIONAIS.get(entidade, ()) if dados.get(c))
+    return digest({c: _normalizar(c, dados.get(c)) for c in campos})
+
+
+def dados_servidor(entidade: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Item do servidor com os valores que o pull grava em cada coluna."""
+    if entidade == 'produtos':
+        return {
+            **item,
+            'descricao': item.get('descricao', ''),
+            'estoque_servidor': item.get('estoque', item.get('estoque_atual', 0)),
+            'estoque_minimo': item.get('estoque_minimo', 0),
+            'venda_por_peso': 1 if item.get('venda_por_peso') in (1, True, '1', 'true', 'True') else 0,
+            'unidade_medida': item.get('unidade_medida', 'un'),
+        }
+    if entidade == 'usuarios':
+        return {
+            **item,
+            'nivel': item.get('nivel', 1),
+            'is_admin': item.get('is_admin', 0),
+            'ativo': item.get('ativo', 1),
+            'salario': item.get('salario', 0.0),
+            'pode_abastecer': 1 if item.get('pode_abastecer', False) else 0,
+            'pode_gerenciar_despesas': 1 if item.get('pode_gerenciar_despesas', False) else 0,
+            'senha': item.get('senha') or item.get('senha_hash'),
+        }
+    return {**item, 'telefone': item.get('telefone', ''), 'endereco': item.get('endereco', '')}
+
+
+def hash_servidor(entidade: str, item: Dict[str, Any]) -> str:
+    return hash_conteudo(entidade, dados_servidor(entidade, item))
+
+
+def hashes_locais(conn, entidade: str) -> Dict[str, str]:
+    """uuid -> hash_conteudo das linhas locais com hash (vazio se a coluna não existir)."""
+    try:
+        return dict(conn.execute(
+            f"SELECT uuid, hash_conteudo FROM {entidade} "
+            "WHERE COALESCE(uuid, '') <> '' AND hash_conteudo IS NOT NULL"
+        ).fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+
+def gravar_hash(conn, entidade: str, registro_id: int, valor: Optional[str]) -> bool:
+    """Grava o hash de uma linha; False se o banco ainda não tem a coluna."""
+    try:
+        conn.execute(f"UPDATE {entidade} SET hash_conteudo = ? WHERE id = ?", (valor, registro_id))
+        return True
+    except sqlite3.OperationalError:
+        # Banco ainda sem a coluna: o pull segue pela comparação antiga
+        return False
+
+
+def atualizar_hash(conn, entidade: str, registro_id: int) -> Optional[str]:
+    """Recalcula o hash de uma linha a partir das colunas, após uma escrita local."""
+    # Campos opcionais ficam de fora: a senha local é sempre um hash, e o servidor pode não enviá-la
+    campos = CAMPOS_HASH[entidade]
+    try:
+        row = conn.execute(
+            f"SELECT {', '.join(campos)} FROM {entidade} WHERE id = ?", (registro_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if row is None:
+        return None
+    valor = hash_conteudo(entidade, dict(zip(campos, tuple(row))))
+    return valor if gravar_hash(conn, entidade, registro_id, valor) else None
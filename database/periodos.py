@@ -0,0 +1,55 @@
+"""
+Filtros de período sobre colunas de data (data_venda, etc.).
+
+Consultas como ``DATE(v.data_venda) BETWEEN ? AND ?`` ou
+``strftime('%Y-%m', data_venda) = ...`` envolvem a coluna numa função e obrigam
+o SQLite a varrer a tabela inteira. Os helpers abaixo geram o intervalo
+semiaberto equivalente (``coluna >= início AND coluna < fim``), que usa os
+índices compostos criados sobre vendas(data_venda, ...).
+
+A comparação é textual: funciona tanto para '2024-05-01 10:00:00' quanto para
+'2024-05-01T10:00:00', pois o prefixo 'YYYY-MM-DD' é o mesmo.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple, Union
+
+DataLike = Union[str, date, datetime]
+
+
+def _para_data(valor: DataLike) -> date:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(str(valor).strip()[:10], '%Y-%m-%d').date()
+
+
+def limites_periodo(data_inicio: DataLike, data_fim: Optional[DataLike] = None) -> Tuple[str, str]:
+    """Converte um período fechado [início, fim] em limites semiabertos [início, fim + 1 dia)."""
+    inicio = _para_data(data_inicio)
+    fim = _para_data(data_fim) if data_fim is not None else inicio
+    return inicio.isoformat(), (fim + timedelta(days=1)).isoformat()
+
+
+def filtro_periodo(coluna: str, data_inicio: DataLike,
+                   data_fim: Optional[DataLike] = None) -> Tuple[str, tuple]:
+    """Equivalente indexável de ``DATE(coluna) BETWEEN data_inicio AND data_fim``."""
+    return f"{coluna} >= ? AND {coluna} < ?", limites_periodo(data_inicio, data_fim)
+
+
+def filtro_mes(coluna: str, ano: int, mes: int) -> Tuple[str, tuple]:
+    """Equivalente indexável de ``strftime('%Y-%m', coluna) = 'AAAA-MM'``."""
+    inicio = date(int(ano), int(mes), 1)
+    proximo = date(inicio.year + (inicio.month == 12), inicio.month % 12 + 1, 1)
+    return f"{coluna} >= ? AND {coluna} < ?", (inicio.isoformat(), proximo.isoformat())
+
+
+def filtro_dia_atual(coluna: str) -> str:
+    """Equivalente indexável de ``DATE(coluna) = DATE('now')``."""
+    return f"{coluna} >= DATE('now') AND {coluna} < DATE('now', '+1 day')"
+
+
+def filtro_mes_atual(coluna: str) -> str:
+    """Equivalente indexável de ``strftime('%Y-%m', coluna) = strftime('%Y-%m', 'now')``."""
+    return (f"{coluna} >= DATE('now', 'start of month') "
+            f"AND {coluna} < DATE('now', 'start of month', '+1 month')")
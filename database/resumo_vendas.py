@@ -0,0 +1,189 @@
+"""
+Resumo diário de vendas (tabela vendas_resumo_diario).
+
+Mantém, por dia / usuário / forma de pagamento, a quantidade de vendas, o
+total bruto, o custo e o lucro dos itens e os valores anulados. A tabela é
+atualizada por triggers em vendas e itens_venda, de modo que os cards do
+dashboard somam poucas linhas em vez de reagregar todo o histórico.
+
+Regras (as mesmas dos relatórios):
+- vendas com status 'Anulada' entram apenas em num_anuladas/total_anulado;
+- itens com status 'Removido' (substituídos na edição de uma venda) não
+  contam no custo nem no lucro;
+- o custo do item usa peso_kg quando informado, senão a quantidade;
+- o dia é o prefixo 'AAAA-MM-DD' de data_venda (mesma regra de
+  database.periodos), sem conversão de fuso.
+"""
+import sqlite3
+
+TABELA = 'vendas_resumo_diario'
+
+_DDL_TABELA = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA} (
+        dia TEXT NOT NULL,
+        usuario_id INTEGER NOT NULL DEFAULT 0,
+        forma_pagamento TEXT NOT NULL DEFAULT '',
+        num_vendas INTEGER NOT NULL DEFAULT 0,
+        total_bruto REAL NOT NULL DEFAULT 0,
+        custo REAL NOT NULL DEFAULT 0,
+        lucro REAL NOT NULL DEFAULT 0,
+        num_anuladas INTEGER NOT NULL DEFAULT 0,
+        total_anulado REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, usuario_id, forma_pagamento)
+    )
+"""
+
+TRIGGERS = (
+    'trg_resumo_venda_insert',
+    'trg_resumo_venda_update',
+    'trg_resumo_venda_delete',
+    'trg_resumo_item_insert',
+    'trg_resumo_item_update',
+    'trg_resumo_item_delete',
+)
+
+
+def _chave(v: str) -> str:
+    return (f"COALESCE(substr({v}.data_venda, 1, 10), ''), "
+            f"COALESCE({v}.usuario_id, 0), COALESCE({v}.forma_pagamento, '')")
+
+
+def _anulada(v: str) -> str:
+    return f"(COALESCE({v}.status, '') = 'Anulada')"
+
+
+def _valor(v: str) -> str:
+    return f"COALESCE({v}.total, {v}.valor_total, 0)"
+
+
+def _custo_item(i: str) -> str:
+    return (f"(COALESCE({i}.preco_custo_unitario, 0) * CASE "
+            f"WHEN COALESCE({i}.peso_kg, 0) > 0 THEN {i}.peso_kg "
+            f"ELSE COALESCE({i}.quantidade, 0) END)")
+
+
+def _item_conta(i: str) -> str:
+    return f"(COALESCE({i}.status, '') != 'Removido')"
+
+
+def _aplicar_venda(v: str, sinal: str) -> str:
+    """UPSERT que soma (sinal '+') ou subtrai (sinal '-') a venda e seus itens ativos."""
+    itens = f"FROM itens_venda iv WHERE iv.venda_id = {v}.id AND {_item_conta('iv')}"
+    custo = f"(SELECT COALESCE(SUM({_custo_item('iv')}), 0) {itens})"
+    lucro = f"(SELECT COALESCE(SUM(COALESCE(iv.subtotal, 0) - {_custo_item('iv')}), 0) {itens})"
+    ativa = f"(NOT {_anulada(v)})"
+    return f"""
+        INSERT INTO {TABELA} (dia, usuario_id, forma_pagamento, num_vendas, total_bruto,
+                              custo, lucro, num_anuladas, total_anulado)
+        VALUES ({_chave(v)},
+                {sinal}{ativa},
+                {sinal}(CASE WHEN {ativa} THEN {_valor(v)} ELSE 0 END),
+                {sinal}(CASE WHEN {ativa} THEN {custo} ELSE 0 END),
+                {sinal}(CASE WHEN {ativa} THEN {lucro} ELSE 0 END),
+                {sinal}{_anulada(v)},
+                {sinal}(CASE WHEN {_anulada(v)} THEN {_valor(v)} ELSE 0 END))
+        ON CONFLICT(dia, usuario_id, forma_pagamento) DO UPDATE SET
+            num_vendas = num_vendas + excluded.num_vendas,
+            total_bruto = total_bruto + excluded.total_bruto,
+            custo = custo + excluded.custo,
+            lucro = lucro + excluded.lucro,
+            num_anuladas = num_anuladas + excluded.num_anuladas,
+            total_anulado = total_anulado + excluded.total_anulado;
+    """
+
+
+def _aplicar_item(i: str, sinal: str) -> str:
+    """UPSERT que soma ou subtrai o custo/lucro de um item de venda não anulada."""
+    return f"""
+        INSERT INTO {TABELA} (dia, usuario_id, forma_pagamento, custo, lucro)
+        SELECT {_chave('v')},
+               {sinal}{_custo_item(i)},
+               {sinal}(COALESCE({i}.subtotal, 0) - {_custo_item(i)})
+        FROM vendas v
+        WHERE v.id = {i}.venda_id AND NOT {_anulada('v')} AND {_item_conta(i)}
+        ON CONFLICT(dia, usuario_id, forma_pagamento) DO UPDATE SET
+            custo = custo + excluded.custo,
+            lucro = lucro + excluded.lucro;
+    """
+
+
+def _ddl_triggers() -> tuple:
+    campos_venda = "data_venda, usuario_id, forma_pagamento, total, valor_total, status"
+    campos_item = "venda_id, quantidade, peso_kg, preco_custo_unitario, subtotal, status"
+    return (
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumo_venda_insert
+            AFTER INSERT ON vendas
+            BEGIN {_aplicar_venda('NEW', '+')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumo_venda_update
+            AFTER UPDATE OF {campos_venda} ON vendas
+            BEGIN {_aplicar_venda('OLD', '-')} {_aplicar_venda('NEW', '+')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumo_venda_delete
+            AFTER DELETE ON vendas
+            BEGIN {_aplicar_venda('OLD', '-')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumo_item_insert
+            AFTER INSERT ON itens_venda
+            BEGIN {_aplicar_item('NEW', '+')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumo_item_update
+            AFTER UPDATE OF {campos_item} ON itens_venda
+            BEGIN {_aplicar_item('OLD', '-')} {_aplicar_item('NEW', '+')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumo_item_delete
+            AFTER DELETE ON itens_venda
+            BEGIN {_aplicar_item('OLD', '-')} END""",
+    )
+
+
+def reconstruir_resumo(cursor) -> int:
+    """Recalcula o resumo a partir do histórico completo. Retorna o número de linhas geradas."""
+    cursor.execute(f"DELETE FROM {TABELA}")
+    cursor.execute(f"""
+        INSERT INTO {TABELA} (dia, usuario_id, forma_pagamento, num_vendas, total_bruto,
+                              custo, lucro, num_anuladas, total_anulado)
+        SELECT {_chave('v')},
+               SUM(NOT {_anulada('v')}),
+               SUM(CASE WHEN NOT {_anulada('v')} THEN {_valor('v')} ELSE 0 END),
+               SUM(CASE WHEN NOT {_anulada('v')} THEN COALESCE(it.custo, 0) ELSE 0 END),
+               SUM(CASE WHEN NOT {_anulada('v')} THEN COALESCE(it.lucro, 0) ELSE 0 END),
+               SUM({_anulada('v')}),
+               SUM(CASE WHEN {_anulada('v')} THEN {_valor('v')} ELSE 0 END)
+        FROM vendas v
+        LEFT JOIN (
+            SELECT iv.venda_id,
+                   SUM({_custo_item('iv')}) AS custo,
+                   SUM(COALESCE(iv.subtotal, 0) - {_custo_item('iv')}) AS lucro
+            FROM itens_venda iv
+            WHERE {_item_conta('iv')}
+            GROUP BY iv.venda_id
+        ) it ON it.venda_id = v.id
+        GROUP BY 1, 2, 3
+    """)
+    cursor.execute(f"SELECT COUNT(*) FROM {TABELA}")
+    return cursor.fetchone()[0]
+
+
+def criar_resumo_diario(cursor) -> bool:
+    """Cria tabela e triggers do resumo; popula a partir do histórico na primeira vez.
+
+    Deve ser chamado depois das migrações que recriam vendas/itens_venda, pois
+    DROP TABLE remove os triggers associados. Retorna True se o resumo foi
+    reconstruído.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABELA,))
+    existia = cursor.fetchone() is not None
+    cursor.execute("""
+        SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({})
+    """.format(', '.join('?' * len(TRIGGERS))), TRIGGERS)
+    triggers_completos = cursor.fetchone()[0] == len(TRIGGERS)
+
+    cursor.execute(_DDL_TABELA)
+    for ddl in _ddl_triggers():
+        cursor.execute(ddl)
+
+    # Sem tabela ou com triggers ausentes o resumo pode estar defasado
+    if not existia or not triggers_completos:
+        try:
+            linhas = reconstruir_resumo(cursor)
+            print(f"[RESUMO] vendas_resumo_diario reconstruído ({linhas} linhas)")
+            return True
+        except sqlite3.Error as e:
+            print(f"[RESUMO] Erro ao reconstruir resumo diário: {e}")
+    return False
@@ -0,0 +1,122 @@
+"""
+Cache das colunas de cada tabela (capacidades do esquema).
+
+Vários caminhos quentes (listagem de produtos, relatórios de vendas, pull de
+sincronização, finalização de venda) precisavam saber se colunas como uuid,
+synced ou status existem e executavam ``PRAGMA table_info`` a cada chamada.
+O cache é preenchido uma vez após as migrações de inicialização e deve ser
+invalidado sempre que o esquema mudar: recarregar_conexao, restauração de
+backup e migrações que executam ALTER TABLE.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from database.connection_factory import connect as db_connect
+
+# Comandos que alteram o catálogo e tornam o cache obsoleto
+_PREFIXOS_DDL = ('ALTER', 'CREATE', 'DROP')
+
+
+def altera_esquema(sql: str) -> bool:
+    """Indica se o comando SQL altera a estrutura do banco."""
+    return sql.lstrip().upper().startswith(_PREFIXOS_DDL)
+
+
+class SchemaCache:
+    """Colunas por tabela, por arquivo de banco, carregadas sob demanda."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # caminho -> tabela -> (nomes das colunas, linhas de PRAGMA table_info)
+        self._bancos: Dict[str, Dict[str, Tuple[tuple, tuple]]] = {}
+        self._stats = {'consultas': 0, 'sondagens': 0, 'invalidacoes': 0}
+
+    @staticmethod
+    def _chave(db_path) -> str:
+        return os.path.abspath(str(db_path))
+
+    @staticmethod
+    def _sondar(conn, tabela: str) -> Tuple[tuple, tuple]:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({tabela})")
+        info = tuple(tuple(col) for col in cursor.fetchall())
+        return tuple(col[1] for col in info), info
+
+    def carregar(self, db_path, conn=None):
+        """Lê as colunas de todas as tabelas de uma vez (chamado após as migrações)."""
+        chave = self._chave(db_path)
+        proprio = conn is None
+        if proprio:
+            conn = db_connect(chave)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            )
+            tabelas = {linha[0]: self._sondar(conn, linha[0]) for linha in cursor.fetchall()}
+        finally:
+            if proprio:
+                conn.close()
+        with self._lock:
+            self._bancos[chave] = tabelas
+            self._stats['sondagens'] += len(tabelas)
+
+    def colunas(self, db_path, tabela: str, conn=None) -> Tuple[str, ...]:
+        """Colunas da tabela na ordem de definição (tupla vazia se a tabela não existir)."""
+        return self._entrada(db_path, tabela, conn)[0]
+
+    def info_colunas(self, db_path, tabela: str, conn=None) -> Dict[str, tuple]:
+        """Linhas de PRAGMA table_info (cid, name, type, notnull, dflt_value, pk) por nome."""
+        return {col[1]: col for col in self._entrada(db_path, tabela, conn)[1]}
+
+    def _entrada(self, db_path, tabela: str, conn=None) -> Tuple[tuple, tuple]:
+        chave = self._chave(db_path)
+        with self._lock:
+            self._stats['consultas'] += 1
+            entrada = self._bancos.get(chave, {}).get(tabela)
+        if entrada is not None:
+            return entrada
+
+        proprio = conn is None
+        if proprio:
+            conn = db_connect(chave)
+        try:
+            entrada = self._sondar(conn, tabela)
+        except sqlite3.Error:
+            entrada = ((), ())
+        finally:
+            if proprio:
+                conn.close()
+
+        with self._lock:
+            self._stats['sondagens'] += 1
+            # Tabela inexistente não é memorizada: pode ser criada logo em seguida
+            if entrada[0]:
+                self._bancos.setdefault(chave, {})[tabela] = entrada
+        return entrada
+
+    def tem_coluna(self, db_path, tabela: str, coluna: str, conn=None) -> bool:
+        return coluna in self.colunas(db_path, tabela, conn)
+
+    def invalidar(self, db_path: Optional[str] = None, tabela: Optional[str] = None):
+        """Descarta o cache de uma tabela, de um banco inteiro ou de todos os bancos."""
+        with self._lock:
+            if db_path is None:
+                self._bancos.clear()
+            elif tabela is None:
+                self._bancos.pop(self._chave(db_path), None)
+            else:
+                self._bancos.get(self._chave(db_path), {}).pop(tabela, None)
+            self._stats['invalidacoes'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tabelas_em_cache'] = sum(len(t) for t in self._bancos.values())
+        return stats
+
+
+# Instância global para ser usada em toda a aplicação
+schema_cache = SchemaCache()
@@ -0,0 +1,267 @@
+"""
+Migrações versionadas do esquema (tabela schema_version).
+
+Antes, cada inicialização reexecutava todo o _init_database (dezenas de
+CREATE/ALTER e PRAGMA table_info) e cada repositório repetia as mesmas
+verificações pelo MigrationHelper. Agora cada passo do esquema é uma
+migração numerada; a versão aplicada fica gravada em schema_version e, num
+banco já atualizado, a inicialização faz uma única consulta de versão.
+
+Um backup antigo (sem schema_version) é tratado como versão 0 e recebe todas
+as migrações, que continuam idempotentes.
+"""
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple
+
+from database.busca_produtos import criar_busca_produtos
+from database.hash_conteudo import SCRIPT_COLUNAS as SCRIPT_COLUNAS_HASH
+from database.resumo_vendas import criar_resumo_diario
+from database.sync_cursor import criar_tabela_cursores
+
+TABELA = 'schema_version'
+
+ARQUIVO_COLUNAS_SYNC = Path(__file__).parent / 'migrations' / 'add_sync_columns.sql'
+
+_DDL_TABELA = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA} (
+        versao INTEGER PRIMARY KEY,
+        nome TEXT NOT NULL,
+        aplicada_em TEXT NOT NULL,
+        duracao_ms REAL NOT NULL DEFAULT 0
+    )
+"""
+
+# Índice único parcial usado por INSERT ... ON CONFLICT(uuid) no pull de produtos
+INDICE_UUID_PRODUTOS = 'idx_produtos_uuid'
+FILTRO_INDICE_UUID_PRODUTOS = "uuid IS NOT NULL AND uuid <> ''"
+
+_RE_ADD_COLUMN = re.compile(
+    r"ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)\s*(.*)$", re.IGNORECASE | re.DOTALL
+)
+_RE_DEFAULT_DINAMICO = re.compile(
+    r"\s+DEFAULT\s+(CURRENT_TIMESTAMP|CURRENT_DATE|CURRENT_TIME)\b", re.IGNORECASE
+)
+
+
+class Migracao(NamedTuple):
+    versao: int
+    nome: str
+    aplicar: Callable  # aplicar(db, cursor)
+
+
+def versao_atual(cursor) -> int:
+    """Maior versão aplicada (0 se o banco ainda não tem schema_version)."""
+    try:
+        cursor.execute(f"SELECT COALESCE(MAX(versao), 0) FROM {TABELA}")
+        return cursor.fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def _colunas(cursor, tabela: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({tabela})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def _comandos(script: str) -> List[str]:
+    """Separa um script SQL simples (sem triggers) em comandos, sem os comentários."""
+    linhas = [l for l in script.splitlines() if not l.strip().startswith('--')]
+    return [c.strip() for c in '\n'.join(linhas).split(';') if c.strip()]
+
+
+def aplicar_script_colunas(cursor, script: str) -> int:
+    """Executa um script de ALTER TABLE ... ADD COLUMN de forma idempotente.
+
+    Colunas já existentes e tabelas ausentes são ignoradas. O SQLite não aceita
+    DEFAULT CURRENT_TIMESTAMP em ADD COLUMN, então a coluna é criada sem o
+    default e preenchida com o instante da migração. Retorna o número de
+    colunas adicionadas.
+    """
+    adicionadas = 0
+    for comando in _comandos(script):
+        encontrado = _RE_ADD_COLUMN.match(comando)
+        if not encontrado:
+            cursor.execute(comando)
+            continue
+
+        tabela, coluna, definicao = encontrado.groups()
+        colunas = _colunas(cursor, tabela)
+        if not colunas or coluna in colunas:
+            continue
+
+        dinamico = _RE_DEFAULT_DINAMICO.search(definicao)
+        if dinamico:
+            definicao = _RE_DEFAULT_DINAMICO.sub('', definicao)
+        cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+        if dinamico:
+            cursor.execute(f"UPDATE {tabela} SET {coluna} = {dinamico.group(1)}")
+        adicionadas += 1
+    return adicionadas
+
+
+# ---------------------------------------------------------------------------
+# Migrações
+# ---------------------------------------------------------------------------
+
+def _esquema_base(db, cursor):
+    """Tabelas, colunas e dados iniciais do esquema legado (antigo _init_database)."""
+    db._criar_esquema_base()
+    try:
+        db.verificar_e_corrigir_esquema_pos_restauracao()
+    except Exception as e:
+        print(f"[MIGRACAO] Erro ao verificar esquema restaurado: {e}")
+
+
+def _indices_periodo(db, cursor):
+    db._criar_indices_periodo(cursor)
+
+
+def _resumo_vendas(db, cursor):
+    criar_resumo_diario(cursor)
+
+
+def _colunas_sincronizacao(db, cursor):
+    adicionadas = aplicar_script_colunas(cursor, ARQUIVO_COLUNAS_SYNC.read_text(encoding='utf-8'))
+    print(f"[MIGRACAO] {ARQUIVO_COLUNAS_SYNC.name}: {adicionadas} colunas adicionadas")
+
+
+def _entidades_hibridas(db, cursor):
+    """uuid/synced nas entidades sincronizadas e change_log (antes feito por cada repositório)."""
+    from utils.migration_helper import MigrationHelper
+
+    # O helper usa conexões próprias: liberar a transação do escritor antes
+    db.conn.commit()
+    helper = MigrationHelper(db.db_path)
+    helper.migrate_usuarios_table()
+    helper.migrate_produtos_table()
+    helper.migrate_clientes_table()
+    helper.migrate_vendas_table()
+    helper.create_change_log_table()
+
+
+def _busca_produtos(db, cursor):
+    criar_busca_produtos(cursor)
+
+
+def _cursores_sincronizacao(db, cursor):
+    criar_tabela_cursores(cursor)
+
+
+def criar_indice_uuid_produtos(cursor) -> bool:
+    """Cria o índice único parcial em produtos.uuid; False se houver uuids duplicados."""
+    try:
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {INDICE_UUID_PRODUTOS} "
+            f"ON produtos(uuid) WHERE {FILTRO_INDICE_UUID_PRODUTOS}"
+        )
+        return True
+    except sqlite3.IntegrityError as e:
+        print(f"[MIGRACAO] Produtos com uuid duplicado - índice {INDICE_UUID_PRODUTOS} não criado: {e}")
+        return False
+
+
+def _indice_uuid_produtos(db, cursor):
+    """Índice único parcial em produtos.uuid (alvo do upsert do pull de produtos).
+
+    Com uuids duplicados no banco o índice não é criado, mas a migração não
+    falha (as seguintes não dependem dele): o pull de produtos tenta criá-lo
+    de novo a cada execução e, enquanto não consegue, grava produto a produto.
+    """
+    criar_indice_uuid_produtos(cursor)
+
+
+def _indice_uuid_vendas(db, cursor):
+    """Busca de vendas por uuid (ingestão do pull, reconciliação)."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_uuid ON vendas(uuid)")
+
+
+def _hash_conteudo(db, cursor):
+    """Coluna hash_conteudo nas tabelas sincronizadas (comparação do pull)."""
+    adicionadas = aplicar_script_colunas(cursor, SCRIPT_COLUNAS_HASH)
+    print(f"[MIGRACAO] hash_conteudo: {adicionadas} colunas adicionadas")
+
+
+MIGRACOES = (
+    Migracao(1, 'esquema_base', _esquema_base),
+    Migracao(2, 'indices_periodo', _indices_periodo),
+    Migracao(3, 'resumo_vendas_diario', _resumo_vendas),
+    Migracao(4, 'colunas_sincronizacao', _colunas_sincronizacao),
+    Migracao(5, 'entidades_hibridas', _entidades_hibridas),
+    Migracao(6, 'busca_produtos_fts', _busca_produtos),
+    Migracao(7, 'cursores_sincronizacao', _cursores_sincronizacao),
+    Migracao(8, 'indice_uuid_produtos', _indice_uuid_produtos),
+    Migracao(9, 'indice_uuid_vendas', _indice_uuid_vendas),
+    Migracao(10, 'hash_conteudo', _hash_conteudo),
+)
+
+# A partir desta versão as colunas verificadas pelo MigrationHelper existem
+VERSAO_ENTIDADES_HIBRIDAS = 5
+
+VERSAO_ATUAL = MIGRACOES[-1].versao
+
+
+def executar_migracoes(db, migracoes=MIGRACOES) -> dict:
+    """Aplica, em ordem, as migrações com versão maior que a gravada no banco.
+
+    Cada migração é confirmada junto com o seu registro em schema_version; se
+    uma falhar, as seguintes não são aplicadas e o erro é propagado. Retorna
+    o relatório com a versão inicial/final e a duração de cada passo.
+    """
+    conn = db.conn
+    cursor = conn.cursor()
+
+    inicio = time.perf_counter()
+    cursor.execute(_DDL_TABELA)
+    conn.commit()
+    versao = versao_atual(cursor)
+    relatorio = {
+        'versao_inicial': versao,
+        'versao_final': versao,
+        'verificacao_ms': (time.perf_counter() - inicio) * 1000,
+        'aplicadas': [],
+    }
+
+    for migracao in migracoes:
+        if migracao.versao <= versao:
+            continue
+        inicio = time.perf_counter()
+        try:
+            migracao.aplicar(db, conn.cursor())
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            conn.execute(
+                f"INSERT OR REPLACE INTO {TABELA} (versao, nome, aplicada_em, duracao_ms) "
+                "VALUES (?, ?, ?, ?)",
+                (migracao.versao, migracao.nome, datetime.now().isoformat(), duracao_ms)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[MIGRACAO] Falha na migração {migracao.versao} ({migracao.nome}): {e}")
+            raise
+        relatorio['aplicadas'].append(
+            {'versao': migracao.versao, 'nome': migracao.nome, 'duracao_ms': duracao_ms}
+        )
+        relatorio['versao_final'] = migracao.versao
+
+    return relatorio
+
+
+def formatar_relatorio(relatorio: dict) -> str:
+    """Resumo de uma linha da inicialização, com o detalhe de cada migração aplicada."""
+    partes = [f"esquema v{relatorio['versao_final']}"]
+    if relatorio['aplicadas']:
+        passos = ', '.join(
+            f"v{m['versao']} {m['nome']} {m['duracao_ms']:.1f} ms" for m in relatorio['aplicadas']
+        )
+        partes.append(f"migrações: {passos}")
+    else:
+        partes.append("sem migrações pendentes")
+    partes.append(f"verificação {relatorio['verificacao_ms']:.1f} ms")
+    for chave, rotulo in (('cache_ms', 'cache'), ('total_ms', 'total')):
+        if chave in relatorio:
+            partes.append(f"{rotulo} {relatorio[chave]:.1f} ms")
+    return ' | '.join(partes)
@@ -0,0 +1,269 @@
+"""
+Cursores de sincronização (tabela sync_cursor) para o pull incremental.
+
+Os pulls de produtos, vendas, clientes e usuários baixavam a coleção inteira
+a cada ciclo e comparavam linha a linha, custo que cresce com o histórico.
+Agora cada entidade guarda a marca d'água do servidor (maior updated_at já
+recebido) e os pulls seguintes pedem só o que mudou depois dela, em páginas:
+
+    GET /api/produtos/?updated_since=<marca>&offset=0&limit=500
+
+A marca só avança depois que todas as páginas foram aplicadas; uma falha no
+meio repete o mesmo intervalo no ciclo seguinte (a aplicação é idempotente
+por UUID). Sem marca, o pull é completo; solicitar_reconciliacao apaga a
+marca e força uma reconciliação completa no próximo ciclo. Só o pull
+completo reflete as exclusões feitas no servidor, por isso o SyncManager
+também o força quando a última reconciliação fica mais velha que o
+intervalo configurado (reconciliacoes_vencidas).
+
+Servidores que ignoram updated_since/offset/limit continuam funcionando:
+a resposta sem paginação é tratada como a página única.
+
+O corpo de cada página é decodificado à medida que chega (array JSON ou
+NDJSON) e os pulls grandes (produtos, vendas) aplicam os itens em lotes de
+TAMANHO_LOTE (baixar_em_lotes), sem materializar a resposta inteira.
+"""
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from database.connection_factory import connect as db_connect
+
+TABELA = 'sync_cursor'
+
+TAMANHO_PAGINA = 500
+
+# Itens entregues por vez aos pulls que processam em streaming
+TAMANHO_LOTE = 100
+
+# Limite de segurança contra servidores que repetem a mesma página
+MAX_PAGINAS = 1000
+
+_DDL_TABELA = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA} (
+        entidade TEXT PRIMARY KEY,
+        marca_servidor TEXT,
+        atualizado_em TEXT NOT NULL,
+        ultima_reconciliacao TEXT
+    )
+"""
+
+
+def criar_tabela_cursores(cursor):
+    cursor.execute(_DDL_TABELA)
+
+
+def ler_cursor(db_path, entidade: str) -> Optional[str]:
+    """Marca d'água gravada para a entidade (None = próximo pull é completo)."""
+    try:
+        with db_connect(db_path) as conn:
+            row = conn.execute(
+                f"SELECT marca_servidor FROM {TABELA} WHERE entidade = ?", (entidade,)
+            ).fetchone()
+            return row[0] if row else None
+    except sqlite3.OperationalError:
+        return None
+
+
+def gravar_cursor(db_path, entidade: str, marca: Optional[str], completo: bool = False):
+    """Grava a nova marca d'água; completo=True registra também a reconciliação."""
+    agora = datetime.now().isoformat()
+    with db_connect(db_path) as conn:
+        conn.execute(_DDL_TABELA)
+        conn.execute(f"""
+            INSERT INTO {TABELA} (entidade, marca_servidor, atualizado_em, ultima_reconciliacao)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(entidade) DO UPDATE SET
+                marca_servidor = excluded.marca_servidor,
+                atualizado_em = excluded.atualizado_em,
+                ultima_reconciliacao = COALESCE(excluded.ultima_reconciliacao, ultima_reconciliacao)
+        """, (entidade, marca, agora, agora if completo else None))
+        conn.commit()
+
+
+def solicitar_reconciliacao(db_path, entidade: Optional[str] = None):
+    """Apaga a marca d'água (de uma entidade ou de todas): o próximo pull é completo."""
+    with db_connect(db_path) as conn:
+        conn.execute(_DDL_TABELA)
+        if entidade:
+            conn.execute(f"UPDATE {TABELA} SET marca_servidor = NULL WHERE entidade = ?", (entidade,))
+        else:
+            conn.execute(f"UPDATE {TABELA} SET marca_servidor = NULL")
+        conn.commit()
+    print(f"[SYNC] Reconciliação completa solicitada: {entidade or 'todas as entidades'}")
+
+
+def reconciliacoes_vencidas(db_path, idade_max: timedelta, agora: Optional[datetime] = None) -> List[str]:
+    """Entidades com marca gravada cuja última reconciliação completa é mais velha que idade_max."""
+    limite = (agora or datetime.now()) - idade_max
+    try:
+        with db_connect(db_path) as conn:
+            linhas = conn.execute(f"""
+                SELECT entidade, ultima_reconciliacao FROM {TABELA}
+                WHERE marca_servidor IS NOT NULL
+            """).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    vencidas = []
+    for entidade, ultima in linhas:
+        instante = _instante(ultima) if ultima else None
+        if instante is None or instante < limite:
+            vencidas.append(entidade)
+    return vencidas
+
+
+def _instante(valor) -> Optional[datetime]:
+    try:
+        instante = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    # Comparar com e sem fuso na mesma base
+    return instante.replace(tzinfo=None) if instante.tzinfo is None else instante.astimezone().replace(tzinfo=None)
+
+
+def maior_updated_at(itens: Iterable[Dict], atual: Optional[str] = None) -> Optional[str]:
+    """Maior updated_at (como veio do servidor) entre a marca atual e os itens."""
+    maior, maior_dt = atual, _instante(atual) if atual else None
+    for item in itens:
+        valor = item.get('updated_at')
+        instante = _instante(valor) if valor else None
+        if instante is not None and (maior_dt is None or instante > maior_dt):
+            maior, maior_dt = valor, instante
+    return maior
+
+
+def _chave(item: Dict):
+    return item.get('uuid') or item.get('id')
+
+
+class ErroDownload(Exception):
+    """Erro HTTP no meio do download: a marca d'água não deve avançar."""
+
+
+async def iterar_json(response) -> AsyncIterator[Dict]:
+    """Itens de um array JSON (ou NDJSON) decodificados à medida que o corpo chega.
+
+    Só o item em decodificação fica no buffer; um corpo que não é array é
+    lido inteiro (servidores antigos), como antes.
+    """
+    if 'ndjson' in response.headers.get('content-type', ''):
+        async for linha in response.aiter_lines():
+            if linha.strip():
+                yield json.loads(linha)
+        return
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    no_array = None  # None: início ainda não lido
+    async for pedaco in response.aiter_text():
+        buffer += pedaco
+        if no_array is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            no_array = buffer[0] == '['
+            if no_array:
+                buffer = buffer[1:]
+        if not no_array:
+            continue
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if not buffer or buffer[0] == ']':
+                break
+            try:
+                item, fim = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break  # item incompleto: esperar o próximo pedaço
+            yield item
+            buffer = buffer[fim:]
+
+    if no_array is False:
+        dados = json.loads(buffer)
+        for item in dados if isinstance(dados, list) else []:
+            yield item
+    elif no_array and buffer.strip() not in ('', ']'):
+        raise ValueError("Resposta JSON truncada ou inválida")
+
+
+async def _itens_da_pagina(client, url: str, params: Dict, timeout) -> AsyncIterator[Dict]:
+    if not hasattr(client, 'stream'):
+        response = await client.get(url, params=params, timeout=timeout)
+        if response.status_code != 200:
+            print(f"[SYNC] Erro HTTP {response.status_code} em {url}")
+            raise ErroDownload(response.status_code)
+        for item in response.json() or []:
+            yield item
+        return
+
+    try:
+        async with client.stream('GET', url, params=params, timeout=timeout,
+                                 headers={'Accept': 'application/x-ndjson, application/json'}) as response:
+            if response.status_code != 200:
+                print(f"[SYNC] Erro HTTP {response.status_code} em {url}")
+                raise ErroDownload(response.status_code)
+            async for item in iterar_json(response):
+                yield item
+    except ErroDownload:
+        raise
+    except Exception as e:
+        # Conexão caída ou corpo truncado no meio da página
+        print(f"[SYNC] Download interrompido em {url}: {e}")
+        raise ErroDownload(str(e)) from e
+
+
+async def baixar_em_lotes(client, url: str, desde: Optional[str] = None,
+                          tamanho_pagina: int = TAMANHO_PAGINA, tamanho_lote: int = TAMANHO_LOTE,
+                          timeout: float = 10.0) -> AsyncIterator[List[Dict]]:
+    """Baixa, em páginas, os itens alterados desde a marca (todos se desde=None),
+    entregando-os em lotes de até tamanho_lote à medida que chegam.
+
+    Repetições entre páginas vizinhas (deslocamento do offset) são descartadas;
+    só as chaves da página anterior e da atual ficam em memória. Levanta
+    ErroDownload em caso de erro HTTP ou download interrompido.
+    """
+    anteriores = set()
+    lote: List[Dict] = []
+    offset = 0
+    for _ in range(MAX_PAGINAS):
+        params = {'offset': offset, 'limit': tamanho_pagina}
+        if desde:
+            params['updated_since'] = desde
+        atuais = set()
+        recebidos = novos = 0
+        async for item in _itens_da_pagina(client, url, params, timeout):
+            recebidos += 1
+            chave = _chave(item)
+            if chave is not None:
+                if chave in anteriores or chave in atuais:
+                    continue
+                atuais.add(chave)
+            novos += 1
+            lote.append(item)
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+
+        # Fim: última página, servidor sem paginação ou página repetida
+        if recebidos != tamanho_pagina or novos == 0:
+            break
+        anteriores = atuais
+        offset += recebidos
+    if lote:
+        yield lote
+
+
+async def baixar_alteracoes(client, url: str, desde: Optional[str] = None,
+                            tamanho_pagina: int = TAMANHO_PAGINA,
+                            timeout: float = 10.0) -> Optional[List[Dict]]:
+    """Todos os itens de baixar_em_lotes numa lista (coleções pequenas).
+
+    Retorna None em caso de erro HTTP, para o chamador não avançar a marca.
+    """
+    itens: List[Dict] = []
+    try:
+        async for lote in baixar_em_lotes(client, url, desde, tamanho_pagina, timeout=timeout):
+            itens.extend(lote)
+    except ErroDownload:
+        return None
+    return itens
@@ -0,0 +1,120 @@
+"""
+Agendador da sincronização com grafo de dependências entre entidades.
+
+A sincronização completa aguardava produtos, vendas, usuários e clientes um
+depois do outro, embora usuários e clientes não dependam de produtos nem
+de vendas. Aqui cada etapa declara de quem depende e etapas independentes
+rodam ao mesmo tempo, limitadas por um semáforo (o backend e o SQLite não
+ganham nada com dezenas de etapas simultâneas).
+
+O relatório traz, por etapa, início/fim relativos ao começo da rodada e a
+duração, além do caminho crítico: a cadeia de etapas que determinou o tempo
+total (a última a terminar e, recursivamente, a dependência que a liberou).
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+LIMITE_CONCORRENCIA = 2
+
+
+class Etapa(NamedTuple):
+    nome: str
+    executar: Callable[[], Awaitable]
+    depende_de: Tuple[str, ...] = ()
+
+
+def _validar(etapas: List[Etapa]):
+    nomes = {e.nome for e in etapas}
+    for etapa in etapas:
+        faltando = set(etapa.depende_de) - nomes
+        if faltando:
+            raise ValueError(f"Etapa {etapa.nome} depende de etapas inexistentes: {sorted(faltando)}")
+
+    # Ordem topológica só para detectar ciclos
+    pendentes = {e.nome: set(e.depende_de) for e in etapas}
+    while pendentes:
+        prontas = [nome for nome, deps in pendentes.items() if not deps]
+        if not prontas:
+            raise ValueError(f"Dependências circulares entre: {sorted(pendentes)}")
+        for nome in prontas:
+            del pendentes[nome]
+        for deps in pendentes.values():
+            deps.difference_update(prontas)
+
+
+def caminho_critico(etapas: Iterable[Etapa], tempos: Dict[str, dict]) -> List[str]:
+    """Da etapa que terminou por último, volta pela dependência que terminou mais tarde."""
+    deps = {e.nome: e.depende_de for e in etapas}
+    if not tempos:
+        return []
+    atual = max(tempos, key=lambda nome: tempos[nome]['fim_ms'])
+    caminho = [atual]
+    while deps.get(atual):
+        atual = max(deps[atual], key=lambda nome: tempos[nome]['fim_ms'])
+        caminho.append(atual)
+    return list(reversed(caminho))
+
+
+async def executar_etapas(etapas: Iterable[Etapa], limite: int = LIMITE_CONCORRENCIA) -> dict:
+    """Executa as etapas respeitando as dependências e o limite de concorrência.
+
+    Uma etapa que falha não impede as dependentes (cada etapa de sync já
+    trata e reporta seus próprios erros); a falha fica no relatório.
+    """
+    etapas = list(etapas)
+    _validar(etapas)
+    semaforo = asyncio.Semaphore(max(1, limite))
+    concluidas = {e.nome: asyncio.Event() for e in etapas}
+    tempos: Dict[str, dict] = {}
+    resultados: Dict[str, object] = {}
+    inicio = time.perf_counter()
+
+    def _ms():
+        return (time.perf_counter() - inicio) * 1000
+
+    async def _rodar(etapa: Etapa):
+        try:
+            for dep in etapa.depende_de:
+                await concluidas[dep].wait()
+            async with semaforo:
+                comeco = _ms()
+                status = 'ok'
+                try:
+                    resultados[etapa.nome] = await etapa.executar()
+                except Exception as e:
+                    status = 'erro'
+                    resultados[etapa.nome] = e
+                    print(f"[SYNC][AGENDADOR] Etapa {etapa.nome} falhou: {e}")
+                fim = _ms()
+                tempos[etapa.nome] = {
+                    'inicio_ms': comeco, 'fim_ms': fim, 'duracao_ms': fim - comeco, 'status': status,
+                }
+        finally:
+            concluidas[etapa.nome].set()
+
+    await asyncio.gather(*(_rodar(e) for e in etapas))
+
+    caminho = caminho_critico(etapas, tempos)
+    return {
+        'resultados': resultados,
+        'etapas': tempos,
+        'caminho_critico': caminho,
+        'caminho_critico_ms': sum(tempos[nome]['duracao_ms'] for nome in caminho),
+        'total_ms': _ms(),
+        'soma_etapas_ms': sum(t['duracao_ms'] for t in tempos.values()),
+    }
+
+
+def formatar_relatorio(relatorio: dict) -> str:
+    """Uma linha por etapa e o caminho crítico."""
+    linhas = [
+        f"  {nome}: {t['duracao_ms']:.0f} ms (início {t['inicio_ms']:.0f} ms){'' if t['status'] == 'ok' else ' [ERRO]'}"
+        for nome, t in sorted(relatorio['etapas'].items(), key=lambda item: item[1]['inicio_ms'])
+    ]
+    linhas.append(
+        f"  caminho crítico: {' -> '.join(relatorio['caminho_critico'])} "
+        f"({relatorio['caminho_critico_ms']:.0f} ms de {relatorio['total_ms']:.0f} ms; "
+        f"soma das etapas {relatorio['soma_etapas_ms']:.0f} ms)"
+    )
+    return '\n'.join(linhas)
@@ -1,5 +1,5 @@
+import asyncio
 import sqlite3
-import httpx
 import json
 import uuid
 from datetime import datetime
@@ -8,6 +8,15 @@ from typing import List, Dict, Any, Optional
 import os
 import json
 from utils.migration_helper import MigrationHelper
+from database.connection_factory import connect as db_connect
+from utils.http_client import http_client
+from utils.connection_status import connection_status
+from database.cache_leituras import cache_leituras, invalida_cache
+from repositories.leitura_local import LOCAL_PRIMEIRO, modo_leitura, revalidador
+from database.compactacao_change_log import compactar_change_log
+from database.hash_conteudo import atualizar_hash, gravar_hash, hash_servidor
+from repositories.push_lote import enviar_em_lote
+from database.sync_cursor import baixar_alteracoes, gravar_cursor, ler_cursor, maior_updated_at
 
 class ClienteRepository:
     def __init__(self, backend_url: str = None):
@@ -56,43 +65,11 @@ class ClienteRepository:
     
     def _is_online(self) -> bool:
         """Verifica se o backend está online (versão síncrona)."""
-        try:
-            response = httpx.get(f"{self.backend_url}/healthz", timeout=3.0)
-            return response.status_code == 200
-        except:
-            return False
+        return connection_status.verificar_sync(self.backend_url)
     
     async def is_backend_online(self) -> bool:
         """Versão assíncrona para verificar se o backend está online."""
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
-                    url1 = f"{self.backend_url}/healthz"
-                    try:
-                        resp1 = await client.get(url1)
-                        if resp1.status_code == 200:
-                            return True
-                    except Exception:
-                        pass
-
-                    if self.backend_url.endswith('/api'):
-                        base_url = self.backend_url[:-4]
-                        url2 = f"{base_url}/healthz"
-                        try:
-                            resp2 = await client.get(url2)
-                            if resp2.status_code == 200:
-                                return True
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-
-            if attempt < max_retries - 1:
-                import asyncio
-                await asyncio.sleep(1)
-
-        return False
+        return await connection_status.verificar(self.backend_url)
     
     def _ensure_migration(self):
         """Garante que as colunas de sincronização existam na tabela clientes."""
@@ -111,7 +88,7 @@ class ClienteRepository:
 
     def _ensure_clientes_table(self):
         """Garante a existência da tabela clientes no SQLite atual."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -133,11 +110,22 @@ class ClienteRepository:
             )
             conn.commit()
     
+    def _revalidar_em_segundo_plano(self):
+        """Pull incremental de clientes em segundo plano (leitura local-primeiro)."""
+        def atualizar():
+            if not self._is_online():
+                return 0
+            return asyncio.run(self._pull_clientes_do_servidor())
+        revalidador.revalidar('clientes', atualizar)
+
     def get_all(self) -> List[Dict[str, Any]]:
-        """Obtém todos os clientes (híbrido: servidor primeiro, fallback local)."""
+        """Obtém todos os clientes (local primeiro, ver repositories/leitura_local)."""
+        if modo_leitura() == LOCAL_PRIMEIRO:
+            self._revalidar_em_segundo_plano()
+            return self._get_all_local()
         if self._is_online():
             try:
-                response = httpx.get(f"{self.api_base}/clientes/", timeout=5.0)
+                response = http_client.get(f"{self.api_base}/clientes/", timeout=5.0)
                 if response.status_code == 200:
                     return response.json()
             except Exception as e:
@@ -148,7 +136,11 @@ class ClienteRepository:
     
     def _get_all_local(self) -> List[Dict[str, Any]]:
         """Obtém todos os clientes do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        clientes = cache_leituras.obter((str(self.db_path), 'clientes.get_all'), ('clientes',), self._ler_todos_local)
+        return [dict(item) for item in clientes]
+
+    def _ler_todos_local(self) -> List[Dict[str, Any]]:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -167,7 +159,7 @@ class ClienteRepository:
                 # Buscar UUID do cliente local
                 cliente_local = self._get_local_cliente_by_id(cliente_id)
                 if cliente_local and cliente_local.get('uuid'):
-                    response = httpx.get(
+                    response = http_client.get(
                         f"{self.api_base}/clientes/{cliente_local['uuid']}", 
                         timeout=5.0
                     )
@@ -181,7 +173,7 @@ class ClienteRepository:
     
     def _get_local_cliente_by_id(self, cliente_id: int) -> Optional[Dict[str, Any]]:
         """Obtém cliente por ID do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -194,6 +186,7 @@ class ClienteRepository:
             row = cursor.fetchone()
             return dict(row) if row else None
     
+    @invalida_cache('clientes')
     def create(self, cliente_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Cria novo cliente (híbrido)."""
         # Gerar UUID se não existir
@@ -212,7 +205,7 @@ class ClienteRepository:
                     "endereco": cliente_data.get('endereco', ''),
                     "ativo": True,
                 }
-                response = httpx.post(f"{self.api_base}/clientes/", json=server_payload, timeout=5.0)
+                response = http_client.post(f"{self.api_base}/clientes/", json=server_payload, timeout=5.0)
                 if response.status_code in [200, 201]:
                     cliente_data['synced'] = 1
                     server_cliente = response.json()
@@ -248,7 +241,7 @@ class ClienteRepository:
             self._ensure_clientes_table()
         except Exception:
             pass
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO clientes (nome, nuit, telefone, email, endereco, especial, 
@@ -269,11 +262,13 @@ class ClienteRepository:
             ))
             
             cliente_id = cursor.lastrowid
+            atualizar_hash(conn, 'clientes', cliente_id)
             conn.commit()
             
             # Retornar cliente criado
             return self._get_local_cliente_by_id(cliente_id)
     
+    @invalida_cache('clientes')
     def update(self, cliente_id: int, cliente_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Atualiza cliente (híbrido)."""
         # Obter UUID do cliente local
@@ -286,7 +281,7 @@ class ClienteRepository:
         # Tentar atualizar no servidor
         if self._is_online():
             try:
-                response = httpx.put(
+                response = http_client.put(
                     f"{self.api_base}/clientes/{cliente_uuid}",
                     json=cliente_data,
                     timeout=5.0
@@ -314,7 +309,7 @@ class ClienteRepository:
     
     def _update_local_cliente(self, cliente_id: int, cliente_data: Dict[str, Any]) -> Dict[str, Any]:
         """Atualiza cliente no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE clientes 
@@ -333,11 +328,13 @@ class ClienteRepository:
                 cliente_data.get('synced', 0),
                 cliente_id
             ))
+            atualizar_hash(conn, 'clientes', cliente_id)
             conn.commit()
             
             # Retornar cliente atualizado
             return self._get_local_cliente_by_id(cliente_id)
     
+    @invalida_cache('clientes')
     def delete(self, cliente_id: int | str) -> bool:
         """Deleta cliente (hard delete híbrido). Aceita ID local (int) ou UUID (str)."""
         cliente_local = None
@@ -350,7 +347,7 @@ class ClienteRepository:
                 cliente_local = self._get_local_cliente_by_id(cid)
                 if not cliente_local:
                     # Buscar sem restrição extra
-                    with sqlite3.connect(str(self.db_path)) as conn:
+                    with db_connect(self.db_path) as conn:
                         conn.row_factory = sqlite3.Row
                         cur = conn.cursor()
                         cur.execute("SELECT * FROM clientes WHERE id = ?", (cid,))
@@ -363,7 +360,7 @@ class ClienteRepository:
                 cliente_uuid = str(cliente_id).strip()
                 cliente_local = self._get_cliente_by_uuid(cliente_uuid)
                 if not cliente_local:
-                    with sqlite3.connect(str(self.db_path)) as conn:
+                    with db_connect(self.db_path) as conn:
                         conn.row_factory = sqlite3.Row
                         cur = conn.cursor()
                         cur.execute("SELECT * FROM clientes WHERE TRIM(COALESCE(uuid,'')) = ?", (cliente_uuid,))
@@ -377,7 +374,7 @@ class ClienteRepository:
         synced = 0
         if cliente_uuid and self._is_online():
             try:
-                response = httpx.delete(f"{self.api_base}/clientes/{cliente_uuid}", timeout=5.0)
+                response = http_client.delete(f"{self.api_base}/clientes/{cliente_uuid}", timeout=5.0)
                 if response.status_code in (200, 204, 404):
                     synced = 1
                     try:
@@ -385,7 +382,7 @@ class ClienteRepository:
                         self._log_change(cliente_uuid, 'DELETE', {},)
                         # Marcar última change como synced
                         # Busca a última entrada criada acima e marca como synced
-                        with sqlite3.connect(str(self.db_path)) as conn:
+                        with db_connect(self.db_path) as conn:
                             cur = conn.cursor()
                             cur.execute(
                                 """
@@ -431,7 +428,7 @@ class ClienteRepository:
     
     def _delete_local_cliente(self, cliente_id: int) -> bool:
         """Deleta cliente do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
             
@@ -441,7 +438,7 @@ class ClienteRepository:
 
     def _delete_local_cliente_by_uuid(self, cliente_uuid: str) -> bool:
         """Deleta cliente localmente usando UUID."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM clientes WHERE TRIM(COALESCE(uuid,'')) = ?", (cliente_uuid,))
             success = cursor.rowcount > 0
@@ -450,7 +447,7 @@ class ClienteRepository:
     
     def _log_change(self, entity_id: str, operation: str, data: Dict[Any, Any]):
         """Registra mudança no change_log para sincronização posterior."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO change_log (entity_type, entity_id, operation, data_json, created_at, status)
@@ -467,7 +464,7 @@ class ClienteRepository:
     
     def _ensure_change_log_table(self):
         """Garante que a tabela change_log existe."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS change_log (
@@ -483,6 +480,7 @@ class ClienteRepository:
             """)
             conn.commit()
     
+    @invalida_cache('clientes')
     async def sincronizar_mudancas(self) -> Dict[str, Any]:
         """Sincroniza mudanças bidirecionalmente com o servidor."""
         print("=== INICIANDO SINCRONIZACAO BIDIRECIONAL DE CLIENTES ===")
@@ -502,7 +500,7 @@ class ClienteRepository:
             clientes_recebidos = 0
             clientes_antigos_enviados = 0
             try:
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with db_connect(self.db_path) as conn:
                     cur = conn.cursor()
                     cur.execute("""
                         SELECT COUNT(*) FROM clientes 
@@ -520,6 +518,8 @@ class ClienteRepository:
                 clientes_antigos_enviados = await self._sincronizar_clientes_antigos()
 
             # FASE 3: Push - enviar mudanças pendentes
+            # Reduz as mudanças pendentes à menor operação por entidade antes do envio
+            compactar_change_log(self.db_path, 'clientes')
             mudancas = await self._obter_mudancas_pendentes()
             mudancas_enviadas = 0
 
@@ -529,8 +529,15 @@ class ClienteRepository:
             if len(mudancas) == 0:
                 print("Nenhuma sincronizacao necessaria para clientes")
             else:
-                async with httpx.AsyncClient() as client:
-                    for ch in mudancas:
+                # Envio em lote; o que o servidor não confirmar segue pelo envio individual
+                lote = await enviar_em_lote(self.api_base, 'clientes', mudancas, self.db_path,
+                                            preparar=self._preparar_mudanca_lote)
+                mudancas_enviadas += lote.enviadas
+                self._marcar_clientes_sincronizados(
+                    [item['data']['id'] for item in lote.confirmadas if item['operation'] == 'CREATE']
+                )
+                async with http_client.sessao_async() as client:
+                    for ch in lote.restantes:
                         try:
                             op = ch['operation']
                             data = json.loads(ch['data_json']) if ch.get('data_json') else {}
@@ -552,7 +559,7 @@ class ClienteRepository:
                                     mudancas_enviadas += 1
                                     # Marcar local como sincronizado
                                     try:
-                                        with sqlite3.connect(str(self.db_path)) as conn:
+                                        with db_connect(self.db_path) as conn:
                                             cur2 = conn.cursor()
                                             cur2.execute("UPDATE clientes SET synced = 1, updated_at = CURRENT_TIMESTAMP WHERE uuid = ?", (payload.get('id'),))
                                             conn.commit()
@@ -563,7 +570,7 @@ class ClienteRepository:
                                     self._mark_change_synced(ch['id'])
                                     mudancas_enviadas += 1
                                     try:
-                                        with sqlite3.connect(str(self.db_path)) as conn:
+                                        with db_connect(self.db_path) as conn:
                                             cur2 = conn.cursor()
                                             cur2.execute("UPDATE clientes SET synced = 1, updated_at = CURRENT_TIMESTAMP WHERE uuid = ?", (payload.get('id'),))
                                             conn.commit()
@@ -639,7 +646,7 @@ class ClienteRepository:
         
         # Primeiro verificar se o servidor tem clientes
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client.sessao_async() as client:
                 response = await client.get(f"{self.api_base}/clientes/", timeout=5.0)
                 clientes_servidor = response.json() if response.status_code == 200 else []
                 servidor_vazio = len(clientes_servidor) == 0
@@ -647,7 +654,7 @@ class ClienteRepository:
             servidor_vazio = False
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_connect(self.db_path)
             cursor = conn.cursor()
             
             # Verificar se a tabela clientes existe
@@ -683,7 +690,7 @@ class ClienteRepository:
             print(f"Encontrados {len(clientes_nao_sync)} clientes nao sincronizados")
             
             enviados = 0
-            async with httpx.AsyncClient() as client:
+            async with http_client.sessao_async() as client:
                 for cliente in clientes_nao_sync:
                     try:
                         cliente_data = {
@@ -740,7 +747,7 @@ class ClienteRepository:
     
     async def _obter_mudancas_pendentes(self) -> List[Dict[str, Any]]:
         """Obtém mudanças pendentes de clientes."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -751,9 +758,39 @@ class ClienteRepository:
             """)
             return [dict(row) for row in cursor.fetchall()]
     
+    def _preparar_mudanca_lote(self, item: Dict[str, Any]):
+        """Mesmo payload do envio individual (campos do backend, id = uuid)."""
+        data = item['data']
+        if item['operation'] == 'DELETE':
+            return
+        payload = {
+            "nome": data.get('nome'),
+            "documento": data.get('nuit') or data.get('documento'),
+            "telefone": data.get('telefone', ''),
+            "endereco": data.get('endereco', ''),
+            "ativo": True if item['operation'] == 'CREATE' else data.get('ativo', True),
+        }
+        if item['operation'] == 'CREATE':
+            payload['id'] = data.get('uuid') or data.get('id')
+        else:
+            item['entity_id'] = data.get('uuid') or item['entity_id']
+        item['data'] = payload
+
+    def _marcar_clientes_sincronizados(self, uuids: List[str]):
+        """Marca os clientes criados no servidor como sincronizados (uma transação)."""
+        uuids = [u for u in uuids if u]
+        if not uuids:
+            return
+        with db_connect(self.db_path) as conn:
+            conn.executemany(
+                "UPDATE clientes SET synced = 1, updated_at = CURRENT_TIMESTAMP WHERE uuid = ?",
+                [(u,) for u in uuids]
+            )
+            conn.commit()
+
     def _mark_change_synced(self, change_id: int):
         """Marca mudança como sincronizada."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE change_log 
@@ -764,7 +801,7 @@ class ClienteRepository:
     
     def listar_todos(self) -> List[Dict[str, Any]]:
         """Lista todos os clientes."""
-        with sqlite3.connect(self.db_path) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -776,7 +813,7 @@ class ClienteRepository:
     
     def buscar_por_nome_ou_nuit(self, termo: str) -> List[Dict[str, Any]]:
         """Busca clientes por nome ou NUIT."""
-        with sqlite3.connect(self.db_path) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -787,26 +824,27 @@ class ClienteRepository:
             """, (f"%{termo.lower()}%", f"%{termo.lower()}%"))
             return [dict(row) for row in cursor.fetchall()]
     
-    async def _pull_clientes_do_servidor(self) -> int:
-        """Busca clientes do servidor e atualiza localmente."""
+    @invalida_cache('clientes')
+    async def _pull_clientes_do_servidor(self, completo: bool = False) -> int:
+        """Busca clientes alterados no servidor desde o último pull e atualiza localmente.
+
+        Sem cursor gravado (ou com completo=True) baixa todos os clientes.
+        """
         print("FASE 1: Buscando clientes do servidor...")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.api_base}/clientes/",
-                    timeout=10.0
-                )
-                
-                if response.status_code != 200:
-                    print(f"Erro ao buscar clientes do servidor: {response.status_code}")
+            desde = None if completo else ler_cursor(self.db_path, 'clientes')
+            async with http_client.sessao_async() as client:
+                clientes_servidor = await baixar_alteracoes(client, f"{self.api_base}/clientes/", desde)
+                if clientes_servidor is None:
                     return 0
                 
-                clientes_servidor = response.json()
-                print(f"Encontrados {len(clientes_servidor)} clientes no servidor")
+                print(f"Encontrados {len(clientes_servidor)} clientes no servidor"
+                      + (f" alterados desde {desde}" if desde else ""))
                 
                 clientes_recebidos = 0
                 clientes_atualizados = 0
+                falhas = 0
                 
                 for cliente_servidor in clientes_servidor:
                     try:
@@ -837,10 +875,14 @@ class ClienteRepository:
                                     print(f"Cliente atualizado: {cliente_servidor.get('nome','(sem nome)')}")
                     
                     except Exception as e:
+                        falhas += 1
                         print(f"Erro ao processar cliente {cliente_servidor.get('nome', 'N/A')}: {e}")
                 
                 total_recebidos = clientes_recebidos + clientes_atualizados
                 print(f"Pull de clientes concluído: {clientes_recebidos} novos, {clientes_atualizados} atualizados")
+                if not falhas:
+                    gravar_cursor(self.db_path, 'clientes', maior_updated_at(clientes_servidor, desde),
+                                  completo=desde is None)
                 return total_recebidos
                 
         except Exception as e:
@@ -849,7 +891,7 @@ class ClienteRepository:
     
     def _get_cliente_by_uuid(self, uuid: str) -> Optional[Dict[str, Any]]:
         """Busca cliente pelo UUID."""
-        with sqlite3.connect(self.db_path) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM clientes WHERE uuid = ?", (uuid,))
@@ -859,7 +901,7 @@ class ClienteRepository:
     def _inserir_cliente_do_servidor(self, cliente_data: Dict[str, Any]) -> bool:
         """Insere cliente recebido do servidor."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO clientes (nome, telefone, endereco, uuid, synced, created_at, updated_at)
@@ -870,6 +912,7 @@ class ClienteRepository:
                     cliente_data.get('endereco', ''),
                     cliente_data['uuid']
                 ))
+                gravar_hash(conn, 'clientes', cursor.lastrowid, hash_servidor('clientes', cliente_data))
                 conn.commit()
                 return True
         except Exception as e:
@@ -878,13 +921,17 @@ class ClienteRepository:
     
     def _cliente_servidor_mais_recente(self, cliente_local: Dict, cliente_servidor: Dict) -> bool:
         """Verifica se o cliente do servidor é mais recente."""
-        # Por simplicidade, sempre considerar servidor mais recente
+        # Com hash gravado, conteúdo igual não é regravado (nem updated_at alterado)
+        hash_local = cliente_local.get('hash_conteudo')
+        if hash_local:
+            return hash_local != hash_servidor('clientes', cliente_servidor)
+        # Sem hash, sempre considerar servidor mais recente
         return True
     
     def _atualizar_cliente_do_servidor(self, cliente_id: int, cliente_data: Dict[str, Any]) -> bool:
         """Atualiza cliente local com dados do servidor."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     UPDATE clientes 
@@ -896,6 +943,7 @@ class ClienteRepository:
                     cliente_data.get('endereco', ''),
                     cliente_id
                 ))
+                gravar_hash(conn, 'clientes', cliente_id, hash_servidor('clientes', cliente_data))
                 conn.commit()
                 return True
         except Exception as e:
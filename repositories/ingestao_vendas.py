@@ -0,0 +1,312 @@
+"""
+Ingestão em lote das vendas recebidas no pull.
+
+O pull de vendas consultava, para cada venda, o id local pelo uuid, o
+usuário pelo uuid (abrindo outra conexão) e, para cada item, o produto e o
+preço de custo, confirmando venda a venda: um pull completo com dezenas de
+milhares de vendas históricas levava minutos.
+
+Aqui os mapas uuid -> id de vendas, usuários e produtos são lidos uma vez
+por pull e cada lote baixado é gravado numa transação, com executemany:
+inserts das vendas novas, updates das existentes e a troca dos itens.
+Vendas cujo hash de conteúdo é igual ao gravado no último pull (e sem
+alteração local pendente) são puladas. Se o lote falha, ele é regravado
+venda a venda, e só a venda com problema fica de fora.
+
+Uma venda que cita produto ainda ausente no caixa é gravada sem esse item e
+guardada, como veio do servidor, em vendas_incompletas. O cursor do pull
+avança mesmo assim (senão uma única venda antiga de produto excluído no
+servidor faria todo ciclo baixar o histórico inteiro); quando os produtos
+chegam, reaplicar_incompletas refaz a venda a partir da cópia guardada.
+"""
+import json
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from database.hash_conteudo import digest
+
+# Vendas por lote do download (e por transação)
+TAMANHO_LOTE_VENDAS = 500
+
+# Parâmetros por comando IN (...) (abaixo do limite de 999 do SQLite)
+_LOTE_IN = 500
+
+_CAMPOS_VENDA = (
+    'usuario_id', 'total', 'forma_pagamento', 'valor_recebido', 'troco',
+    'status', 'motivo_alteracao', 'alterado_por', 'data_alteracao',
+    'origem', 'valor_original_divida', 'desconto_aplicado_divida',
+)
+
+_SQL_INSERIR = f"""
+    INSERT INTO vendas ({', '.join(_CAMPOS_VENDA)}, data_venda, uuid, hash_conteudo, synced)
+    VALUES ({', '.join('?' * len(_CAMPOS_VENDA))}, ?, ?, ?, 1)
+"""
+
+_SQL_ATUALIZAR = f"""
+    UPDATE vendas SET {', '.join(f'{c} = ?' for c in _CAMPOS_VENDA)}, hash_conteudo = ?, synced = 1
+    WHERE id = ?
+"""
+
+_SQL_INSERIR_ITEM = """
+    INSERT INTO itens_venda (
+        venda_id, produto_id, quantidade, preco_unitario, preco_custo_unitario, subtotal, peso_kg
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+TABELA_INCOMPLETAS = 'vendas_incompletas'
+
+_DDL_INCOMPLETAS = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_INCOMPLETAS} (
+        uuid TEXT PRIMARY KEY,
+        dados_json TEXT NOT NULL,
+        produtos_ausentes TEXT NOT NULL,
+        atualizado_em TEXT NOT NULL
+    )
+"""
+
+
+def _item_normalizado(item: dict) -> Tuple[str, int, float, float, float]:
+    return (
+        str(item.get('produto_id') or '').strip(),
+        int(item.get('quantidade') or 0) or 1,
+        float(item.get('preco_unitario') or 0.0),
+        float(item.get('subtotal') or 0.0),
+        float(item.get('peso_kg') or 0.0),
+    )
+
+
+def hash_venda(venda: dict) -> str:
+    """Hash estável do conteúdo de uma venda do servidor (campos gravados e itens)."""
+    conteudo = {c: venda.get(c) for c in _CAMPOS_VENDA if c != 'desconto_aplicado_divida'}
+    conteudo['desconto'] = venda.get('desconto', venda.get('desconto_aplicado_divida'))
+    conteudo['data_venda'] = venda.get('data_venda')
+    conteudo['itens'] = [_item_normalizado(i) for i in venda.get('itens') or []]
+    return digest(conteudo)
+
+
+def _em_blocos(sequencia, tamanho: int = _LOTE_IN):
+    for i in range(0, len(sequencia), tamanho):
+        yield sequencia[i:i + tamanho]
+
+
+class IngestaoVendas:
+    """Aplica lotes de vendas do servidor sobre uma conexão (uma transação por lote)."""
+
+    def __init__(self, conn, usuario_padrao: Callable[[], int]):
+        self.conn = conn
+        self._usuario_padrao = usuario_padrao
+        self._padrao: Optional[int] = None
+        self.vendas: Dict[str, Tuple[int, Optional[str], int]] = {}   # uuid -> (id, hash, synced)
+        self.usuarios: Dict[str, int] = {}
+        self.produtos: Dict[str, Tuple[int, float]] = {}              # uuid -> (id, preço de custo)
+        self.produtos_ausentes = set()
+        # uuid -> (venda do servidor, produtos ausentes); completadas saem de vendas_incompletas
+        self.incompletas: Dict[str, Tuple[dict, Set[str]]] = {}
+        self.completadas: Set[str] = set()
+        self._guardadas: Set[str] = set()
+        self.stats = {'inseridas': 0, 'atualizadas': 0, 'inalteradas': 0, 'falhas': 0, 'itens': 0,
+                      'reaplicadas': 0}
+
+    def carregar(self):
+        """Lê de uma vez os mapas uuid -> id usados na ingestão."""
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT uuid, id, hash_conteudo, COALESCE(synced, 0) FROM vendas
+            WHERE uuid IS NOT NULL AND uuid <> ''
+        """)
+        self.vendas = {r[0]: (r[1], r[2], r[3]) for r in cur.fetchall()}
+        cur.execute("SELECT uuid, id FROM usuarios WHERE uuid IS NOT NULL AND uuid <> ''")
+        self.usuarios = {r[0]: r[1] for r in cur.fetchall()}
+        cur.execute("""
+            SELECT uuid, id, COALESCE(preco_custo, 0) FROM produtos
+            WHERE uuid IS NOT NULL AND uuid <> ''
+        """)
+        self.produtos = {r[0]: (r[1], float(r[2])) for r in cur.fetchall()}
+        try:
+            cur.execute(f"SELECT uuid FROM {TABELA_INCOMPLETAS}")
+            self._guardadas = {r[0] for r in cur.fetchall()}
+        except sqlite3.OperationalError:
+            self._guardadas = set()
+
+    def _padrao_usuario(self) -> int:
+        if self._padrao is None:
+            self._padrao = self._usuario_padrao()
+        return self._padrao
+
+    def _usuario_local(self, bruto) -> int:
+        # usuario_id pode vir como UUID string do servidor ou como id numérico
+        if isinstance(bruto, str) and len(bruto) > 10:
+            return self.usuarios.get(bruto) or self._padrao_usuario()
+        try:
+            return int(bruto or 0) or self._padrao_usuario()
+        except (ValueError, TypeError):
+            return self._padrao_usuario()
+
+    def _campos(self, v: dict) -> tuple:
+        return (
+            self._usuario_local(v.get('usuario_id')),
+            float(v.get('total') or 0.0),
+            v.get('forma_pagamento') or 'Dinheiro',
+            float(v.get('valor_recebido') or 0.0),
+            float(v.get('troco') or 0.0),
+            v.get('status') or 'concluida',
+            v.get('motivo_alteracao') or '',
+            v.get('alterado_por'),
+            v.get('data_alteracao'),
+            v.get('origem') or 'servidor',
+            float(v.get('valor_original_divida') or 0.0),
+            float(v.get('desconto', v.get('desconto_aplicado_divida') or 0.0)),
+        )
+
+    def _itens(self, v: dict) -> Tuple[List[tuple], Set[str]]:
+        """Itens (sem venda_id) com produto mapeado e os uuids de produto que ficaram de fora."""
+        itens, ausentes = [], set()
+        for item in v.get('itens') or []:
+            prod_uuid, quantidade, preco_unitario, subtotal, peso_kg = _item_normalizado(item)
+            if not prod_uuid:
+                continue
+            produto = self.produtos.get(prod_uuid)
+            if produto is None:
+                # Produto não existe localmente; pular item
+                print(f"[VENDAS][PULL] Produto {prod_uuid} não encontrado localmente - pulando item")
+                self.produtos_ausentes.add(prod_uuid)
+                ausentes.add(prod_uuid)
+                continue
+            itens.append((produto[0], quantidade, preco_unitario, produto[1], subtotal, peso_kg))
+        return itens, ausentes
+
+    def aplicar(self, lote: List[dict]) -> int:
+        """Grava um lote e retorna quantas vendas foram inseridas ou alteradas."""
+        pendentes: Dict[str, tuple] = {}
+        for v in lote:
+            try:
+                venda_uuid = str(v.get('uuid') or v.get('id') or '').strip()
+                if not venda_uuid:
+                    print("[VENDAS][PULL] Venda sem UUID/ID - ignorando")
+                    continue
+                hash_novo = hash_venda(v)
+                local = self.vendas.get(venda_uuid)
+                if local is not None and local[1] == hash_novo and local[2] == 1:
+                    self.stats['inalteradas'] += 1
+                    continue
+                itens, ausentes = self._itens(v)
+                # Sem todos os itens o hash não é gravado: a venda é refeita quando o produto chegar
+                if ausentes:
+                    self.incompletas[venda_uuid] = (v, ausentes)
+                else:
+                    self.incompletas.pop(venda_uuid, None)
+                    if venda_uuid in self._guardadas:
+                        self.completadas.add(venda_uuid)
+                pendentes[venda_uuid] = (local, self._campos(v), v.get('data_venda'), itens,
+                                         None if ausentes else hash_novo)
+            except Exception as e:
+                self.stats['falhas'] += 1
+                print(f"[VENDAS][PULL] Erro ao processar venda {v.get('uuid', 'N/A')}: {e}")
+        if not pendentes:
+            return 0
+
+        try:
+            self._confirmar(*self._gravar(pendentes))
+            return len(pendentes)
+        except Exception as e:
+            self._desfazer(pendentes)
+            print(f"[VENDAS][PULL] Erro ao gravar lote de {len(pendentes)} vendas: {e} - gravando venda a venda")
+
+        # Uma venda com problema não deve derrubar as outras do lote
+        gravadas = 0
+        for venda_uuid, pendente in pendentes.items():
+            try:
+                self._confirmar(*self._gravar({venda_uuid: pendente}))
+                gravadas += 1
+            except Exception as e:
+                self._desfazer({venda_uuid: pendente})
+                self.completadas.discard(venda_uuid)
+                self.stats['falhas'] += 1
+                print(f"[VENDAS][PULL] Erro ao gravar venda {venda_uuid}: {e}")
+        return gravadas
+
+    def _gravar(self, pendentes: Dict[str, tuple]):
+        """Grava as vendas e itens e confirma a transação; retorna (novas, existentes, itens)."""
+        novas = [(u, p) for u, p in pendentes.items() if p[0] is None]
+        existentes = [(u, p) for u, p in pendentes.items() if p[0] is not None]
+        cur = self.conn.cursor()
+        if novas:
+            agora = datetime.now().isoformat()
+            cur.executemany(_SQL_INSERIR, [
+                (*campos, data_venda or agora, venda_uuid, hash_novo)
+                for venda_uuid, (_, campos, data_venda, _, hash_novo) in novas
+            ])
+            for bloco in _em_blocos([u for u, _ in novas]):
+                cur.execute(
+                    f"SELECT uuid, id FROM vendas WHERE uuid IN ({', '.join('?' * len(bloco))})", bloco)
+                for venda_uuid, venda_id in cur.fetchall():
+                    self.vendas[venda_uuid] = (venda_id, pendentes[venda_uuid][4], 1)
+        if existentes:
+            cur.executemany(_SQL_ATUALIZAR, [
+                (*campos, hash_novo, local[0])
+                for _, (local, campos, _, _, hash_novo) in existentes
+            ])
+
+        # Vendas existentes: limpar itens antigos e re-inserir (idempotente por uuid)
+        cur.executemany("DELETE FROM itens_venda WHERE venda_id = ?",
+                        [(local[0],) for _, (local, *_) in existentes])
+        linhas_itens = [
+            (self.vendas[u][0], *item) for u, p in pendentes.items() for item in p[3]
+        ]
+        cur.executemany(_SQL_INSERIR_ITEM, linhas_itens)
+        self.conn.commit()
+        return novas, existentes, len(linhas_itens)
+
+    def _confirmar(self, novas: list, existentes: list, itens: int):
+        for venda_uuid, (local, _, _, _, hash_novo) in existentes:
+            self.vendas[venda_uuid] = (local[0], hash_novo, 1)
+        self.stats['inseridas'] += len(novas)
+        self.stats['atualizadas'] += len(existentes)
+        self.stats['itens'] += itens
+
+    def _desfazer(self, pendentes: Dict[str, tuple]):
+        """Rollback da transação e dos ids de vendas novas já anotados no mapa."""
+        self.conn.rollback()
+        for venda_uuid, pendente in pendentes.items():
+            if pendente[0] is None:
+                self.vendas.pop(venda_uuid, None)
+
+    def reaplicar_incompletas(self) -> int:
+        """Refaz as vendas guardadas cujos produtos ausentes já existem localmente."""
+        try:
+            linhas = self.conn.execute(
+                f"SELECT uuid, dados_json, produtos_ausentes FROM {TABELA_INCOMPLETAS}").fetchall()
+        except sqlite3.OperationalError:
+            return 0  # tabela ainda não criada
+        prontas = [json.loads(dados) for _, dados, ausentes in linhas
+                   if all(p in self.produtos for p in json.loads(ausentes))]
+        if not prontas:
+            return 0
+        aplicadas = self.aplicar(prontas)
+        self.stats['reaplicadas'] += aplicadas
+        return aplicadas
+
+    def gravar_incompletas(self):
+        """Atualiza vendas_incompletas com as vendas vistas neste pull."""
+        agora = datetime.now().isoformat()
+        cur = self.conn.cursor()
+        cur.execute(_DDL_INCOMPLETAS)
+        cur.executemany(f"""
+            INSERT INTO {TABELA_INCOMPLETAS} (uuid, dados_json, produtos_ausentes, atualizado_em)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(uuid) DO UPDATE SET
+                dados_json = excluded.dados_json,
+                produtos_ausentes = excluded.produtos_ausentes,
+                atualizado_em = excluded.atualizado_em
+        """, [(u, json.dumps(v, default=str), json.dumps(sorted(ausentes)), agora)
+              for u, (v, ausentes) in self.incompletas.items()])
+        cur.executemany(f"DELETE FROM {TABELA_INCOMPLETAS} WHERE uuid = ?",
+                        [(u,) for u in self.completadas])
+        self.conn.commit()
+        self._guardadas = (self._guardadas | set(self.incompletas)) - self.completadas
+        self.completadas.clear()
+
+    def total_incompletas(self) -> int:
+        return len(self._guardadas)
@@ -0,0 +1,114 @@
+"""
+Leituras local-primeiro (stale-while-revalidate) nos repositórios híbridos.
+
+get_all/get_by_id e get_vendas_com_detalhes consultavam o servidor (timeout
+de 5 s) a cada chamada e só caíam para o SQLite em caso de falha: abrir a
+tela de produtos esperava uma ida e volta pela WAN.
+
+No modo ``local_primeiro`` (padrão; config.json ``read_mode``) a leitura
+responde do banco local na hora e agenda, em segundo plano, o pull
+incremental da entidade (o mesmo do sync, que só traz o que mudou desde o
+cursor). Se o pull trouxer mudanças, as views assinantes são avisadas e
+recarregam do banco local. ``servidor_primeiro`` mantém o comportamento
+anterior.
+
+Revalidações da mesma entidade não se sobrepõem e respeitam um intervalo
+mínimo, para telas reabertas em sequência não dispararem um pull cada.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+LOCAL_PRIMEIRO = 'local_primeiro'
+SERVIDOR_PRIMEIRO = 'servidor_primeiro'
+
+INTERVALO_MIN_REVALIDACAO_S = 30.0
+
+_modo: Optional[str] = None
+
+
+def modo_leitura() -> str:
+    """read_mode de config.json (lido uma vez por processo)."""
+    global _modo
+    if _modo is None:
+        _modo = LOCAL_PRIMEIRO
+        try:
+            caminho = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
+            with open(caminho, 'r', encoding='utf-8') as f:
+                if json.load(f).get('read_mode') == SERVIDOR_PRIMEIRO:
+                    _modo = SERVIDOR_PRIMEIRO
+        except Exception:
+            pass
+    return _modo
+
+
+class RevalidadorLeituras:
+    """Agenda as atualizações em segundo plano e avisa os assinantes."""
+
+    def __init__(self, intervalo_min: float = INTERVALO_MIN_REVALIDACAO_S, max_workers: int = 2):
+        self.intervalo_min = intervalo_min
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='revalidar')
+        self._lock = threading.Lock()
+        self._em_andamento = set()
+        self._ultima: Dict[str, float] = {}
+        self._ouvintes: Dict[str, List[Callable[[str], None]]] = {}
+        self._stats = {'agendadas': 0, 'suprimidas': 0, 'com_mudancas': 0, 'falhas': 0}
+
+    def assinar(self, entidade: str, callback: Callable[[str], None]):
+        with self._lock:
+            self._ouvintes.setdefault(entidade, []).append(callback)
+
+    def cancelar(self, entidade: str, callback: Callable[[str], None]):
+        with self._lock:
+            ouvintes = self._ouvintes.get(entidade, [])
+            if callback in ouvintes:
+                ouvintes.remove(callback)
+
+    def revalidar(self, entidade: str, atualizar: Callable[[], int]) -> Optional[Future]:
+        """Agenda atualizar() (retorna quantos itens mudaram) em segundo plano."""
+        agora = time.monotonic()
+        with self._lock:
+            if entidade in self._em_andamento or agora - self._ultima.get(entidade, -self.intervalo_min) < self.intervalo_min:
+                self._stats['suprimidas'] += 1
+                return None
+            self._em_andamento.add(entidade)
+            self._stats['agendadas'] += 1
+        return self._executor.submit(self._executar, entidade, atualizar)
+
+    def _executar(self, entidade: str, atualizar: Callable[[], int]) -> int:
+        try:
+            mudancas = int(atualizar() or 0)
+        except Exception as e:
+            print(f"[LEITURA] Falha ao revalidar {entidade}: {e}")
+            with self._lock:
+                self._stats['falhas'] += 1
+            mudancas = 0
+        finally:
+            with self._lock:
+                self._em_andamento.discard(entidade)
+                self._ultima[entidade] = time.monotonic()
+        if mudancas:
+            with self._lock:
+                self._stats['com_mudancas'] += 1
+            self.notificar(entidade)
+        return mudancas
+
+    def notificar(self, entidade: str):
+        with self._lock:
+            ouvintes = list(self._ouvintes.get(entidade, []))
+        for callback in ouvintes:
+            try:
+                callback(entidade)
+            except Exception as e:
+                print(f"[LEITURA] Erro ao notificar mudança em {entidade}: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# Instância global
+revalidador = RevalidadorLeituras()
@@ -2,18 +2,57 @@
 Repositório para entidade Produtos com fallback local/servidor.
 Implementa padrão Repository com sincronização híbrida.
 """
+import asyncio
 import sqlite3
+import time
 import uuid
 import json
-import httpx
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 import os
 import platform
 from utils.migration_helper import MigrationHelper
+from database.connection_factory import connect as db_connect
+from utils.http_client import http_client
+from utils.connection_status import connection_status
+from database.cache_leituras import cache_leituras, invalida_cache
+from repositories.leitura_local import LOCAL_PRIMEIRO, modo_leitura, revalidador
+from database.compactacao_change_log import compactar_change_log
+from database.hash_conteudo import atualizar_hash, gravar_hash, hash_servidor
+from repositories.push_lote import enviar_em_lote
+from database.schema_cache import schema_cache
+from database.schema_migrations import FILTRO_INDICE_UUID_PRODUTOS, INDICE_UUID_PRODUTOS, criar_indice_uuid_produtos
+from database.sync_cursor import ErroDownload, baixar_em_lotes, gravar_cursor, ler_cursor, maior_updated_at
+from repositories.reconciliacao import espelho_servidor
 import json
 
+# Grava um produto vindo do servidor. Na atualização o estoque local é
+# preservado; o do servidor fica em estoque_servidor.
+SQL_UPSERT_PRODUTO = f"""
+    INSERT INTO produtos (
+        codigo, nome, descricao, preco_custo, preco_venda,
+        categoria_id, fornecedor_id, estoque, estoque_servidor, estoque_minimo,
+        venda_por_peso, unidade_medida,
+        uuid, synced, created_at, updated_at, hash_conteudo
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+    ON CONFLICT(uuid) WHERE {FILTRO_INDICE_UUID_PRODUTOS} DO UPDATE SET
+        codigo = excluded.codigo,
+        nome = excluded.nome,
+        descricao = excluded.descricao,
+        preco_custo = excluded.preco_custo,
+        preco_venda = excluded.preco_venda,
+        categoria_id = excluded.categoria_id,
+        fornecedor_id = excluded.fornecedor_id,
+        estoque_minimo = excluded.estoque_minimo,
+        estoque_servidor = excluded.estoque_servidor,
+        venda_por_peso = excluded.venda_por_peso,
+        unidade_medida = excluded.unidade_medida,
+        updated_at = excluded.updated_at,
+        hash_conteudo = excluded.hash_conteudo
+"""
+
+
 class ProdutoRepository:
     def __init__(self, backend_url: str = None):
         self.backend_url = backend_url or self._get_backend_url()
@@ -39,29 +78,8 @@ class ProdutoRepository:
         return app_data_db_dir / 'sistema.db'
     
     def _is_online(self) -> bool:
-        """Verifica se o backend está online."""
-        try:
-            # Tenta primeiro exatamente a URL configurada
-            url1 = f"{self.backend_url}/healthz"
-            try:
-                resp1 = httpx.get(url1, timeout=2.0)
-                if resp1.status_code == 200:
-                    return True
-            except Exception:
-                pass
-
-            # Se falhar/404 e a URL terminar com /api, tenta sem /api
-            if self.backend_url.endswith('/api'):
-                base_url = self.backend_url[:-4]
-                url2 = f"{base_url}/healthz"
-                try:
-                    resp2 = httpx.get(url2, timeout=2.0)
-                    return resp2.status_code == 200
-                except Exception:
-                    pass
-            return False
-        except Exception:
-            return False
+        """Verifica se o backend está online (versão síncrona)."""
+        return connection_status.verificar_sync(self.backend_url)
     
     def _ensure_migration(self):
         """Garante que as colunas de sincronização existam na tabela produtos."""
@@ -80,7 +98,7 @@ class ProdutoRepository:
 
     def _backfill_missing_uuids(self):
         """Atribui UUID para qualquer produto local que ainda não tenha."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cur = conn.cursor()
             # Selecionar produtos sem UUID ou UUID vazio
@@ -102,53 +120,11 @@ class ProdutoRepository:
     
     async def is_backend_online(self) -> bool:
         """Versão assíncrona para verificar se o backend está online."""
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
-                    url1 = f"{self.backend_url}/healthz"
-                    print(f"Testando conexão com: {url1} (tentativa {attempt + 1})")
-                    try:
-                        response = await client.get(url1)
-                        print(f"Status da resposta: {response.status_code}")
-                        if response.status_code == 200:
-                            return True
-                        else:
-                            print("Backend retornou status", response.status_code)
-                    except Exception as e:
-                        print(f"Erro ao acessar {url1}: {e}")
-
-                    # Fallback sem /api quando aplicável
-                    if self.backend_url.endswith('/api'):
-                        base_url = self.backend_url[:-4]
-                        url2 = f"{base_url}/healthz"
-                        print(f"Tentando fallback em: {url2}")
-                        try:
-                            response2 = await client.get(url2)
-                            print(f"Status da resposta (fallback): {response2.status_code}")
-                            if response2.status_code == 200:
-                                return True
-                        except Exception as e2:
-                            print(f"Erro no fallback {url2}: {e2}")
-
-            except httpx.TimeoutException as e:
-                print(f"Timeout na tentativa {attempt + 1}: {e}")
-            except httpx.ConnectError as e:
-                print(f"Erro de conexao na tentativa {attempt + 1}: {e}")
-            except Exception as e:
-                print(f"Erro inesperado na tentativa {attempt + 1}: {type(e).__name__}: {e}")
-
-            if attempt < max_retries - 1:
-                print("Tentando novamente em 1 segundo...")
-                import asyncio
-                await asyncio.sleep(1)
-
-        print("Backend offline apos todas as tentativas")
-        return False
+        return await connection_status.verificar(self.backend_url)
     
     def _log_change(self, entity_id: str, operation: str, data: Dict[Any, Any], status: str = 'pending'):
         """Registra mudança no change_log com status customizável (pending/synced)."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -166,11 +142,22 @@ class ProdutoRepository:
             )
             conn.commit()
     
+    def _revalidar_em_segundo_plano(self):
+        """Pull incremental de produtos em segundo plano (leitura local-primeiro)."""
+        def atualizar():
+            if not self._is_online():
+                return 0
+            return asyncio.run(self._pull_produtos_do_servidor())
+        revalidador.revalidar('produtos', atualizar)
+
     def get_all(self) -> List[Dict[str, Any]]:
-        """Obtém todos os produtos. Tenta servidor primeiro, fallback para local."""
+        """Obtém todos os produtos (local primeiro, ver repositories/leitura_local)."""
+        if modo_leitura() == LOCAL_PRIMEIRO:
+            self._revalidar_em_segundo_plano()
+            return self._get_all_local()
         if self._is_online():
             try:
-                response = httpx.get(f"{self.api_base}/produtos/", timeout=5.0)
+                response = http_client.get(f"{self.api_base}/produtos/", timeout=5.0)
                 if response.status_code == 200:
                     server_list = response.json() or []
                     # Filtrar itens que foram soft-deletados localmente (ativo = 0)
@@ -178,7 +165,7 @@ class ProdutoRepository:
                     try:
                         soft_deleted: set[str] = set()
                         pending_delete: set[str] = set()
-                        with sqlite3.connect(str(self.db_path)) as conn:
+                        with db_connect(self.db_path) as conn:
                             cur = conn.cursor()
                             # Coletar UUIDs soft-deletados localmente
                             cur.execute("SELECT TRIM(COALESCE(uuid,'')) FROM produtos WHERE ativo = 0 AND TRIM(COALESCE(uuid,'')) <> ''")
@@ -211,13 +198,16 @@ class ProdutoRepository:
     
     def _get_all_local(self) -> List[Dict[str, Any]]:
         """Obtém todos os produtos do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        produtos = cache_leituras.obter((str(self.db_path), 'produtos.get_all'), ('produtos',), self._ler_todos_local)
+        return [dict(item) for item in produtos]
+
+    def _ler_todos_local(self) -> List[Dict[str, Any]]:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Verificar se as colunas uuid e synced existem
-            cursor.execute("PRAGMA table_info(produtos)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = schema_cache.colunas(self.db_path, 'produtos', conn)
             has_uuid = 'uuid' in columns
             has_synced = 'synced' in columns
             
@@ -253,10 +243,13 @@ class ProdutoRepository:
             return results
     
     def get_by_id(self, produto_id: int) -> Optional[Dict[str, Any]]:
-        """Obtém produto por ID. Tenta servidor primeiro, fallback para local."""
+        """Obtém produto por ID (local primeiro, ver repositories/leitura_local)."""
+        if modo_leitura() == LOCAL_PRIMEIRO:
+            self._revalidar_em_segundo_plano()
+            return self._get_local_produto_by_id(produto_id)
         if self._is_online():
             try:
-                response = httpx.get(f"{self.api_base}/produtos/{produto_id}", timeout=5.0)
+                response = http_client.get(f"{self.api_base}/produtos/{produto_id}", timeout=5.0)
                 if response.status_code == 200:
                     return response.json()
             except Exception as e:
@@ -266,10 +259,13 @@ class ProdutoRepository:
         return self._get_local_produto_by_id(produto_id)
     
     def get_by_uuid(self, produto_uuid: str) -> Optional[Dict[str, Any]]:
-        """Obtém produto por UUID. Tenta servidor primeiro, fallback para local."""
+        """Obtém produto por UUID (local primeiro, ver repositories/leitura_local)."""
+        if modo_leitura() == LOCAL_PRIMEIRO:
+            self._revalidar_em_segundo_plano()
+            return self._get_local_produto_by_uuid(produto_uuid)
         if self._is_online():
             try:
-                response = httpx.get(f"{self.api_base}/produtos/{produto_uuid}", timeout=5.0)
+                response = http_client.get(f"{self.api_base}/produtos/{produto_uuid}", timeout=5.0)
                 if response.status_code == 200:
                     return response.json()
             except Exception as e:
@@ -280,13 +276,12 @@ class ProdutoRepository:
     
     def _get_local_produto_by_uuid(self, produto_uuid: str) -> Optional[Dict[str, Any]]:
         """Obtém produto por UUID do banco local (SEM filtrar ativo) para lógica de sync."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Verificar se as colunas uuid e synced existem
-            cursor.execute("PRAGMA table_info(produtos)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = schema_cache.colunas(self.db_path, 'produtos', conn)
             has_uuid = 'uuid' in columns
             has_synced = 'synced' in columns
             
@@ -320,13 +315,12 @@ class ProdutoRepository:
     
     def _get_local_produto_by_id(self, produto_id: int) -> Optional[Dict[str, Any]]:
         """Obtém produto por ID do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Verificar se as colunas uuid e synced existem
-            cursor.execute("PRAGMA table_info(produtos)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = schema_cache.colunas(self.db_path, 'produtos', conn)
             has_uuid = 'uuid' in columns
             has_synced = 'synced' in columns
             
@@ -358,6 +352,7 @@ class ProdutoRepository:
                 return result
             return None
     
+    @invalida_cache('produtos')
     def create(self, produto_data: Dict[str, Any]) -> Dict[str, Any]:
         """Cria novo produto. Tenta servidor primeiro, sempre salva local."""
         # Gerar UUID se não existir
@@ -371,7 +366,7 @@ class ProdutoRepository:
         # Tentar criar no servidor primeiro
         if self._is_online():
             try:
-                response = httpx.post(
+                response = http_client.post(
                     f"{self.api_base}/produtos/", 
                     json=produto_data,
                     timeout=5.0
@@ -381,6 +376,7 @@ class ProdutoRepository:
                     server_produto = response.json()
                     # Usar dados do servidor se disponível
                     produto_data.update(server_produto)
+                    self._espelhar_envio('CREATE', produto_data['uuid'], produto_data)
                     # Opção B: registrar como 'synced' para aparecer no relatório
                     try:
                         self._ensure_change_log_table()
@@ -401,7 +397,7 @@ class ProdutoRepository:
     
     def _create_local_produto(self, produto_data: Dict[str, Any]) -> Dict[str, Any]:
         """Cria produto no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO produtos (codigo, nome, descricao, preco_custo, preco_venda,
@@ -427,12 +423,14 @@ class ProdutoRepository:
             ))
             
             produto_id = cursor.lastrowid
+            atualizar_hash(conn, 'produtos', produto_id)
             conn.commit()
             
             # Retornar produto criado
             produto_data['id'] = produto_id
             return produto_data
     
+    @invalida_cache('produtos')
     def update(self, produto_id: int, produto_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Atualiza produto. Tenta servidor primeiro, sempre atualiza local."""
         produto_data['updated_at'] = datetime.now().isoformat()
@@ -443,7 +441,7 @@ class ProdutoRepository:
         if not produto_local:
             # Tentar sem filtro de ativo
             try:
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with db_connect(self.db_path) as conn:
                     conn.row_factory = sqlite3.Row
                     cur = conn.cursor()
                     cur.execute("""
@@ -475,7 +473,7 @@ class ProdutoRepository:
         if self._is_online():
             try:
                 print(f"Tentando atualizar produto {produto_uuid} no servidor...")
-                response = httpx.put(
+                response = http_client.put(
                     f"{self.api_base}/produtos/{produto_uuid}",
                     json=produto_data,
                     timeout=8.0
@@ -486,6 +484,7 @@ class ProdutoRepository:
                     server_produto = response.json()
                     produto_data.update(server_produto)
                     print(f"Produto atualizado no servidor com sucesso")
+                    self._espelhar_envio('UPDATE', produto_uuid, produto_data)
                     # Opção B: registrar como 'synced' para aparecer no relatório
                     try:
                         self._ensure_change_log_table()
@@ -496,12 +495,12 @@ class ProdutoRepository:
                     # Produto não existe no servidor, verificar se existe produto com mesmo código
                     print(f"Produto nao encontrado por UUID. Tentando localizar por codigo: {produto_data.get('codigo')}")
                     try:
-                        list_resp = httpx.get(f"{self.api_base}/produtos/", timeout=8.0)
+                        list_resp = http_client.get(f"{self.api_base}/produtos/", timeout=8.0)
                         if list_resp.status_code == 200 and produto_data.get('codigo'):
                             servidor_lista = list_resp.json()
                             alvo = next((p for p in servidor_lista if p.get('codigo') == produto_data.get('codigo')), None)
                             if alvo:
-                                put2 = httpx.put(
+                                put2 = http_client.put(
                                     f"{self.api_base}/produtos/{alvo['id']}",
                                     json=produto_data,
                                     timeout=8.0
@@ -514,7 +513,7 @@ class ProdutoRepository:
                                     print(f"Falha no PUT por codigo: {put2.text}")
                             else:
                                 # Nao existe no servidor – criar
-                                post_resp = httpx.post(f"{self.api_base}/produtos/", json=produto_data, timeout=8.0)
+                                post_resp = http_client.post(f"{self.api_base}/produtos/", json=produto_data, timeout=8.0)
                                 print(f"POST create apos 404 status: {post_resp.status_code}")
                                 if post_resp.status_code in (200, 201):
                                     produto_data['synced'] = 1
@@ -559,7 +558,7 @@ class ProdutoRepository:
     
     def _update_local_produto(self, produto_id: int, produto_data: Dict[str, Any]) -> Dict[str, Any]:
         """Atualiza produto no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE produtos 
@@ -582,11 +581,13 @@ class ProdutoRepository:
                 produto_data['synced'],
                 produto_id
             ))
+            atualizar_hash(conn, 'produtos', produto_id)
             conn.commit()
             
             # Retornar produto atualizado
             return self._get_local_produto_by_id(produto_id)
     
+    @invalida_cache('produtos')
     def delete(self, produto_id: int | str) -> bool:
         """Deleta produto (soft delete). Aceita ID local (int) ou UUID (str).
         Tenta servidor primeiro, sempre aplica soft delete/registro local para refletir na UI e dashboard.
@@ -601,7 +602,7 @@ class ProdutoRepository:
                 produto_local = self._get_local_produto_by_id(pid)
                 if not produto_local:
                     # Tentar buscar sem filtro de ativo
-                    with sqlite3.connect(str(self.db_path)) as conn:
+                    with db_connect(self.db_path) as conn:
                         conn.row_factory = sqlite3.Row
                         cur = conn.cursor()
                         cur.execute("SELECT * FROM produtos WHERE id = ?", (pid,))
@@ -618,7 +619,7 @@ class ProdutoRepository:
                 produto_local = self._get_local_produto_by_uuid(produto_uuid)
                 if not produto_local:
                     # Buscar qualquer registro local por UUID (mesmo inativo)
-                    with sqlite3.connect(str(self.db_path)) as conn:
+                    with db_connect(self.db_path) as conn:
                         conn.row_factory = sqlite3.Row
                         cur = conn.cursor()
                         cur.execute("SELECT * FROM produtos WHERE TRIM(COALESCE(uuid,'')) = ?", (produto_uuid,))
@@ -636,12 +637,13 @@ class ProdutoRepository:
         # Tentar deletar no servidor (quando temos UUID)
         if produto_uuid and self._is_online():
             try:
-                response = httpx.delete(
+                response = http_client.delete(
                     f"{self.api_base}/produtos/{produto_uuid}",
                     timeout=5.0
                 )
                 if response.status_code in (200, 204, 404):
                     synced = 1
+                    self._espelhar_envio('DELETE', produto_uuid, {})
                     try:
                         self._ensure_change_log_table()
                         self._log_change(produto_uuid, 'DELETE', {'uuid': produto_uuid, 'id': produto_local.get('id') if produto_local else None}, status='synced')
@@ -700,7 +702,7 @@ class ProdutoRepository:
         # Garantir que a tabela change_log existe
         self._ensure_change_log_table()
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute(
@@ -731,7 +733,7 @@ class ProdutoRepository:
         
     def _ensure_change_log_table(self):
         """Garante que a tabela change_log existe."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS change_log (
@@ -748,6 +750,7 @@ class ProdutoRepository:
             conn.commit()
             print("Tabela change_log criada/verificada")
     
+    @invalida_cache('produtos')
     async def sincronizar_mudancas(self) -> Dict[str, Any]:
         """Sincroniza mudanças bidirecionalmente com o servidor."""
         print("=== INICIANDO SINCRONIZACAO BIDIRECIONAL ===")
@@ -763,6 +766,8 @@ class ProdutoRepository:
             
             # FASE 2: PUSH - Enviar mudanças pendentes ANTES do PULL
             print("FASE 2: Enviando mudancas pendentes...")
+            # Reduz as mudanças pendentes à menor operação por entidade antes do envio
+            compactar_change_log(self.db_path, 'produtos')
             mudancas = await self.obter_mudancas_pendentes()
             print(f"Encontradas {len(mudancas)} mudancas pendentes")
             
@@ -779,16 +784,20 @@ class ProdutoRepository:
                     "message": "Sincronização concluída. Nenhuma mudança necessária."
                 }
             
-            enviadas = 0
+            # Envio em lote; o que o servidor não confirmar segue pelo envio individual
+            lote = await enviar_em_lote(self.api_base, 'produtos', mudancas, self.db_path)
+            enviadas = lote.enviadas
+            for item in lote.confirmadas:
+                self._espelhar_envio(item['operation'], item['entity_id'], item['data'])
             
-            for mudanca in mudancas:
+            for mudanca in lote.restantes:
                 try:
                     print(f"Processando mudanca {mudanca['operation']} para {mudanca['entity_id']}")
                     
                     # Processar mudança baseada na operação
                     if mudanca['operation'] == 'CREATE':
                         data = json.loads(mudanca['data_json'])
-                        async with httpx.AsyncClient() as client:
+                        async with http_client.sessao_async() as client:
                             response = await client.post(
                                 f"{self.api_base}/produtos/",
                                 json=data,
@@ -797,6 +806,7 @@ class ProdutoRepository:
                             print(f"CREATE response: {response.status_code}")
                             if response.status_code in [200, 201]:
                                 self._mark_change_synced(mudanca['id'])
+                                self._espelhar_envio('CREATE', mudanca['entity_id'], data)
                                 enviadas += 1
                                 print(f"Mudanca CREATE sincronizada")
                             elif response.status_code == 409:
@@ -838,7 +848,7 @@ class ProdutoRepository:
                     
                     elif mudanca['operation'] == 'UPDATE':
                         data = json.loads(mudanca['data_json'])
-                        async with httpx.AsyncClient() as client:
+                        async with http_client.sessao_async() as client:
                             response = await client.put(
                                 f"{self.api_base}/produtos/{mudanca['entity_id']}",
                                 json=data,
@@ -847,6 +857,7 @@ class ProdutoRepository:
                             print(f"UPDATE response: {response.status_code}")
                             if response.status_code == 200:
                                 self._mark_change_synced(mudanca['id'])
+                                self._espelhar_envio('UPDATE', mudanca['entity_id'], data)
                                 enviadas += 1
                                 print(f"Mudanca UPDATE sincronizada")
                             elif response.status_code == 404:
@@ -878,6 +889,9 @@ class ProdutoRepository:
                                     print(f"UPDATE por codigo response: {update_response.status_code}")
                                     if update_response.status_code == 200:
                                         self._mark_change_synced(mudanca['id'])
+                                        self._espelhar_envio(
+                                            'UPDATE', produto_existente.get('uuid') or produto_existente['id'], data
+                                        )
                                         enviadas += 1
                                         print(f"Mudanca UPDATE por codigo sincronizada")
                                     else:
@@ -893,6 +907,7 @@ class ProdutoRepository:
                                     print(f"CREATE fallback response: {create_response.status_code}")
                                     if create_response.status_code in [200, 201]:
                                         self._mark_change_synced(mudanca['id'])
+                                        self._espelhar_envio('CREATE', mudanca['entity_id'], data)
                                         enviadas += 1
                                         print(f"Mudanca UPDATE->CREATE sincronizada")
                                     else:
@@ -901,7 +916,7 @@ class ProdutoRepository:
                                 print(f"Erro UPDATE: {response.text}")
                     
                     elif mudanca['operation'] == 'DELETE':
-                        async with httpx.AsyncClient() as client:
+                        async with http_client.sessao_async() as client:
                             response = await client.delete(
                                 f"{self.api_base}/produtos/{mudanca['entity_id']}",
                                 timeout=5.0
@@ -909,6 +924,7 @@ class ProdutoRepository:
                             print(f"DELETE response: {response.status_code}")
                             if response.status_code == 200:
                                 self._mark_change_synced(mudanca['id'])
+                                self._espelhar_envio('DELETE', mudanca['entity_id'], {})
                                 enviadas += 1
                                 print(f"Mudanca DELETE sincronizada")
                             else:
@@ -942,7 +958,7 @@ class ProdutoRepository:
         try:
             from datetime import datetime, timedelta
             limiar = (datetime.now() - timedelta(minutes=minutes)).isoformat()
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 # Comparação lexicográfica funciona para ISO 8601
                 cursor.execute(
@@ -958,97 +974,118 @@ class ProdutoRepository:
             print(f"Erro ao contar mudanças sincronizadas recentes: {e}")
             return 0
     
-    async def _pull_produtos_do_servidor(self) -> int:
-        """Busca produtos novos/atualizados do servidor e os integra localmente."""
+    @invalida_cache('produtos')
+    async def _pull_produtos_do_servidor(self, completo: bool = False) -> int:
+        """Busca produtos alterados no servidor desde o último pull e os integra localmente.
+
+        Sem cursor gravado (ou com completo=True) baixa o catálogo inteiro e
+        reflete também as deleções feitas no servidor.
+
+        Produtos locais e DELETEs pendentes são lidos uma única vez; cada lote
+        baixado é gravado com um executemany de INSERT ... ON CONFLICT(uuid)
+        DO UPDATE numa única transação.
+        """
         try:
-            async with httpx.AsyncClient() as client:
-                # Buscar todos os produtos do servidor
-                response = await client.get(
-                    f"{self.api_base}/produtos/",
-                    timeout=10.0
-                )
-                
-                if response.status_code != 200:
-                    print(f"Erro ao buscar produtos do servidor: {response.status_code}")
-                    return 0
-                
-                produtos_servidor = response.json()
-                print(f"Encontrados {len(produtos_servidor)} produtos no servidor")
-                
+            desde = None if completo else ler_cursor(self.db_path, 'produtos')
+            tempos = {'prefetch': 0.0, 'download': 0.0, 'gravacao': 0.0, 'delecoes': 0.0}
+
+            inicio = time.perf_counter()
+            with db_connect(self.db_path) as conn:
+                locais, tombstones = self._carregar_estado_local_produtos(conn)
+                upsert = self._garantir_indice_uuid_produtos(conn)
+            tempos['prefetch'] = (time.perf_counter() - inicio) * 1000
+            if not upsert:
+                print(f"[PULL] Índice único {INDICE_UUID_PRODUTOS} ausente - gravando produto a produto")
+
+            async with http_client.sessao_async() as client:
+                marca = desde
+                total_srv = 0
+                download_incompleto = False
                 produtos_recebidos = 0
                 produtos_atualizados = 0
+                ignorados = 0
+                falhas = 0
                 
                 # Construir conjunto de UUIDs vindos do servidor para rastrear deleções server-side
                 uuids_servidor = set()
 
-                for produto_servidor in produtos_servidor:
-                    try:
-                        # Extrair identificador do servidor: aceitar uuid ou id
-                        servidor_uuid = (produto_servidor.get('uuid') or produto_servidor.get('id') or '').strip()
-                        if not servidor_uuid:
-                            nome_dbg = produto_servidor.get('nome', 'N/A')
-                            print(f"Produto {nome_dbg} sem id/uuid - pulando")
-                            continue
-                        uuids_servidor.add(servidor_uuid)
-                        
-                        # Verificar se produto já existe localmente pelo UUID
-                        produto_local = self._get_local_produto_by_uuid(servidor_uuid)
-                        
-                        if produto_local is None:
-                            # Evitar 'ressurreicao': se houver DELETE pendente para este UUID, nao inserir
-                            try:
-                                import sqlite3 as _sql
-                                with _sql.connect(str(self.db_path)) as _conn:
-                                    _cur = _conn.cursor()
-                                    _cur.execute(
-                                        """
-                                        SELECT 1 FROM change_log
-                                        WHERE entity_type = 'produtos'
-                                          AND operation = 'DELETE'
-                                          AND status = 'pending'
-                                          AND entity_id = ?
-                                        LIMIT 1
-                                        """,
-                                        (servidor_uuid,)
-                                    )
-                                    if _cur.fetchone():
-                                        print(f"Pulando insercao do produto {produto_servidor.get('nome','')} por tombstone DELETE pendente ({servidor_uuid})")
-                                        continue
-                            except Exception as _t_err:
-                                print(f"[PULL] Falha ao checar tombstone de DELETE: {_t_err}")
-                            
-                            # Produto novo - inserir localmente
-                            # Garantir que vamos persistir o identificador como uuid
-                            produto_servidor = {**produto_servidor, 'uuid': servidor_uuid}
-                            if self._inserir_produto_do_servidor(produto_servidor):
-                                produtos_recebidos += 1
-                                print(f"Produto novo inserido: {produto_servidor.get('nome', 'Sem nome')}")
-                        else:
-                            # Produto existe - verificar se precisa atualizar
+                # Lotes aplicados à medida que chegam: o catálogo inteiro nunca fica em memória
+                try:
+                    inicio = time.perf_counter()
+                    async for lote in baixar_em_lotes(client, f"{self.api_base}/produtos/", desde):
+                        tempos['download'] += (time.perf_counter() - inicio) * 1000
+                        espelho_servidor.registrar(self.api_base, 'produtos', lote,
+                                                   completo=desde is None and not total_srv)
+                        total_srv += len(lote)
+                        marca = maior_updated_at(lote, marca)
+
+                        inserir, atualizar = [], []
+                        for produto_servidor in lote:
+                            # Extrair identificador do servidor: aceitar uuid ou id
+                            servidor_uuid = str(produto_servidor.get('uuid') or produto_servidor.get('id') or '').strip()
+                            if not servidor_uuid:
+                                print(f"Produto {produto_servidor.get('nome', 'N/A')} sem id/uuid - pulando")
+                                continue
+                            uuids_servidor.add(servidor_uuid)
+                            produto_local = locais.get(servidor_uuid)
+
+                            if produto_local is None:
+                                # Evitar 'ressurreicao': se houver DELETE pendente para este UUID, nao inserir
+                                if servidor_uuid in tombstones:
+                                    ignorados += 1
+                                    continue
+                                destino = inserir
                             # Respeitar soft delete local: nao reativar/atualizar se ativo = 0
-                            if int(produto_local.get('ativo', 1)) == 0:
-                                print(f"Produto {produto_local.get('nome','')} está soft-deletado localmente - mantendo inativo")
+                            elif int(produto_local.get('ativo', 1)) == 0:
+                                ignorados += 1
                                 continue
-                            
-                            if self._produto_servidor_mais_recente(produto_local, produto_servidor):
-                                # Garantir uuid no payload para manter consistência local
+                            elif self._produto_servidor_mais_recente(produto_local, produto_servidor):
+                                destino = atualizar
+                            else:
+                                continue
+
+                            try:
+                                # Garantir que vamos persistir o identificador como uuid
                                 produto_servidor = {**produto_servidor, 'uuid': servidor_uuid}
-                                if self._atualizar_produto_do_servidor(produto_local['id'], produto_servidor):
-                                    produtos_atualizados += 1
-                                    print(f"Produto atualizado: {produto_servidor.get('nome', 'Sem nome')}")
-                
-                    except Exception as e:
-                        print(f"Erro ao processar produto {produto_servidor.get('nome', 'N/A')}: {e}")
+                                destino.append((produto_servidor, self._linha_upsert_produto(produto_servidor)))
+                            except Exception as e:
+                                falhas += 1
+                                print(f"Erro ao processar produto {produto_servidor.get('nome', 'N/A')}: {e}")
+
+                        inicio = time.perf_counter()
+                        ok_insercoes, ok_atualizacoes, falhas_lote = self._gravar_produtos_do_servidor(
+                            inserir, atualizar, locais, upsert)
+                        tempos['gravacao'] += (time.perf_counter() - inicio) * 1000
+                        produtos_recebidos += ok_insercoes
+                        produtos_atualizados += ok_atualizacoes
+                        falhas += falhas_lote
+                        inicio = time.perf_counter()
                 
-                total_recebidos = produtos_recebidos + produtos_atualizados
+                except ErroDownload:
+                    falhas += 1
+                    download_incompleto = True
+                    if desde is None:
+                        # Espelho parcial não serve como estado completo do servidor
+                        espelho_servidor.invalidar('produtos')
+
+                if desde:
+                    print(f"Recebidos {total_srv} produtos alterados no servidor desde {desde}")
+                else:
+                    print(f"Recebidos {total_srv} produtos do servidor")
+                if ignorados:
+                    print(f"[PULL] {ignorados} produtos ignorados (DELETE pendente ou inativos localmente)")
+                if desde is None and not total_srv and not falhas:
+                    espelho_servidor.registrar(self.api_base, 'produtos', [], completo=True)
+
                 # Após processar todos os itens do servidor: detectar deleções feitas no backend
+                # (só no pull completo; o incremental traz apenas os alterados)
+                inicio = time.perf_counter()
                 try:
-                    import sqlite3 as _sql
-                    with _sql.connect(str(self.db_path)) as _conn:
+                    with db_connect(self.db_path) as _conn:
                         _cur = _conn.cursor()
                         # Marcar como inativos itens que eram sincronizados, estão ativos localmente, possuem UUID
                         # e que não estão no conjunto de UUIDs retornados pelo servidor (deletados no backend)
-                        if uuids_servidor:
+                        if uuids_servidor and desde is None and not download_incompleto:
                             placeholders = ",".join(["?"] * len(uuids_servidor))
                             sql = f"""
                                 UPDATE produtos
@@ -1069,14 +1106,124 @@ class ProdutoRepository:
                             pass
                 except Exception as del_err:
                     print(f"[PULL] Falha ao refletir deleções do servidor: {del_err}")
+                tempos['delecoes'] = (time.perf_counter() - inicio) * 1000
 
                 print(f"PULL concluído. Recebidos: {produtos_recebidos}, Atualizados: {produtos_atualizados}")
+                print("[PULL] Produtos - " + " | ".join(f"{fase}: {ms:.1f} ms" for fase, ms in tempos.items()))
+                # Com falhas a marca não avança: os mesmos itens voltam no próximo ciclo
+                if not falhas:
+                    gravar_cursor(self.db_path, 'produtos', marca, completo=desde is None)
                 total_recebidos = int(produtos_recebidos) + int(produtos_atualizados)
                 return total_recebidos
                 
         except Exception as e:
             print(f"Erro no pull de produtos: {e}")
             return 0
+
+    def _carregar_estado_local_produtos(self, conn):
+        """Produtos locais por uuid e uuids com DELETE pendente, numa leitura cada."""
+        cursor = conn.cursor()
+        coluna_hash = ('hash_conteudo' if schema_cache.tem_coluna(self.db_path, 'produtos', 'hash_conteudo', conn)
+                       else 'NULL')
+        cursor.execute(f"""
+            SELECT id, uuid, nome, COALESCE(ativo, 1), COALESCE(synced, 0), updated_at, {coluna_hash}
+            FROM produtos
+            WHERE COALESCE(TRIM(uuid), '') <> ''
+        """)
+        locais = {
+            linha[1]: {'id': linha[0], 'nome': linha[2], 'ativo': linha[3], 'synced': linha[4],
+                       'updated_at': linha[5], 'hash_conteudo': linha[6]}
+            for linha in cursor.fetchall()
+        }
+        tombstones = set()
+        try:
+            cursor.execute("""
+                SELECT entity_id FROM change_log
+                WHERE entity_type = 'produtos' AND operation = 'DELETE' AND status = 'pending'
+            """)
+            tombstones = {linha[0] for linha in cursor.fetchall()}
+        except sqlite3.OperationalError as e:
+            print(f"[PULL] Falha ao checar tombstones de DELETE: {e}")
+        return locais, tombstones
+
+    def _garantir_indice_uuid_produtos(self, conn) -> bool:
+        """Índice do upsert presente; a migração 8 não o cria se havia uuids duplicados."""
+        if any(linha[1] == INDICE_UUID_PRODUTOS for linha in conn.execute("PRAGMA index_list(produtos)").fetchall()):
+            return True
+        criado = criar_indice_uuid_produtos(conn.cursor())
+        conn.commit()
+        return criado
+
+    @staticmethod
+    def _linha_upsert_produto(produto_servidor: Dict[str, Any]) -> tuple:
+        """Parâmetros de SQL_UPSERT_PRODUTO para um produto do servidor."""
+        # Normalizar flags/valores vindos do servidor
+        vpp_val = 1 if (produto_servidor.get('venda_por_peso') in (1, True, '1', 'true', 'True')) else 0
+        estoque = produto_servidor.get('estoque', produto_servidor.get('estoque_atual', 0))
+        return (
+            produto_servidor['codigo'],
+            produto_servidor['nome'],
+            produto_servidor.get('descricao', ''),
+            produto_servidor['preco_custo'],
+            produto_servidor['preco_venda'],
+            produto_servidor.get('categoria_id'),
+            produto_servidor.get('fornecedor_id'),
+            estoque,
+            estoque,
+            produto_servidor.get('estoque_minimo', 0),
+            vpp_val,
+            produto_servidor.get('unidade_medida', 'un'),
+            produto_servidor['uuid'],
+            produto_servidor.get('created_at'),
+            produto_servidor.get('updated_at'),
+            hash_servidor('produtos', produto_servidor),
+        )
+
+    def _gravar_produtos_do_servidor(self, inserir: list, atualizar: list, locais: dict, upsert: bool):
+        """Grava um lote de (produto, linha) e retorna (inseridos, atualizados, falhas).
+
+        Novos produtos recebem o estoque do servidor; nos existentes o estoque
+        local é preservado e o do servidor vai para estoque_servidor.
+        """
+        if not inserir and not atualizar:
+            return 0, 0, 0
+        if not upsert:
+            ok_ins = sum(1 for p, _ in inserir if self._inserir_produto_do_servidor(p))
+            ok_upd = 0
+            for p, _ in atualizar:
+                local_id = locais[p['uuid']]['id'] or (self._get_local_produto_by_uuid(p['uuid']) or {}).get('id')
+                if local_id and self._atualizar_produto_do_servidor(local_id, p):
+                    ok_upd += 1
+            falhas = len(inserir) + len(atualizar) - ok_ins - ok_upd
+        else:
+            with db_connect(self.db_path) as conn:
+                try:
+                    conn.executemany(SQL_UPSERT_PRODUTO, [linha for _, linha in inserir + atualizar])
+                    ok_ins, ok_upd, falhas = len(inserir), len(atualizar), 0
+                except sqlite3.IntegrityError as e:
+                    # Ex.: código já usado por outro produto - isolar a linha problemática
+                    conn.rollback()
+                    print(f"[PULL] Lote de produtos rejeitado ({e}) - gravando um a um")
+                    ok_ins = ok_upd = falhas = 0
+                    for lista, eh_novo in ((inserir, True), (atualizar, False)):
+                        for produto, linha in lista:
+                            try:
+                                conn.execute(SQL_UPSERT_PRODUTO, linha)
+                            except sqlite3.IntegrityError as err:
+                                falhas += 1
+                                print(f"Erro ao gravar produto {produto.get('nome', 'N/A')}: {err}")
+                                continue
+                            if eh_novo:
+                                ok_ins += 1
+                            else:
+                                ok_upd += 1
+        # Produtos inseridos passam a existir para os lotes seguintes
+        for produto, linha in inserir:
+            locais.setdefault(produto['uuid'], {
+                'id': None, 'nome': produto.get('nome'), 'ativo': 1, 'synced': 1,
+                'updated_at': produto.get('updated_at'), 'hash_conteudo': linha[-1],
+            })
+        return ok_ins, ok_upd, falhas
     
     async def _sincronizar_produtos_antigos(self) -> int:
         """Sincroniza produtos antigos que não foram sincronizados (bulk sync)."""
@@ -1084,7 +1231,7 @@ class ProdutoRepository:
         
         # Primeiro verificar se o servidor tem produtos
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client.sessao_async() as client:
                 response = await client.get(f"{self.api_base}/produtos/", timeout=5.0)
                 produtos_servidor = response.json() if response.status_code == 200 else []
                 servidor_vazio = len(produtos_servidor) == 0
@@ -1092,7 +1239,7 @@ class ProdutoRepository:
             servidor_vazio = False
         
         # Buscar produtos locais para sincronizar
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -1133,7 +1280,7 @@ class ProdutoRepository:
         print(f"Encontrados {len(produtos_nao_sincronizados)} produtos nao sincronizados")
         enviados = 0
         
-        async with httpx.AsyncClient() as client:
+        async with http_client.sessao_async() as client:
             for produto in produtos_nao_sincronizados:
                 try:
                     # Gerar UUID se não existir
@@ -1217,7 +1364,7 @@ class ProdutoRepository:
     
     def _update_produto_uuid(self, produto_id: int, uuid_value: str):
         """Atualiza UUID de um produto."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE produtos SET uuid = ? WHERE id = ?
@@ -1227,7 +1374,7 @@ class ProdutoRepository:
     def _mark_produto_sincronizado(self, produto_id: int):
         """Marca produto como sincronizado."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 # Verificar se o produto existe primeiro
                 cursor.execute("SELECT id FROM produtos WHERE id = ?", (produto_id,))
@@ -1243,6 +1390,7 @@ class ProdutoRepository:
                 """, (datetime.now().isoformat(), produto_id))
                 
                 if cursor.rowcount > 0:
+                    atualizar_hash(conn, 'produtos', produto_id)
                     conn.commit()
                     print(f"Produto ID {produto_id} marcado como sincronizado")
                 else:
@@ -1250,9 +1398,13 @@ class ProdutoRepository:
         except Exception as e:
             print(f"Erro ao marcar produto {produto_id} como sincronizado: {e}")
 
+    def _espelhar_envio(self, operacao: str, entity_id, data: Dict[str, Any]):
+        """Leva ao espelho do servidor o que um push acabou de gravar lá."""
+        espelho_servidor.registrar_envio(self.api_base, 'produtos', operacao, entity_id, data)
+
     def _mark_change_synced(self, change_id: int):
         """Marca mudança como sincronizada."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE change_log 
@@ -1263,7 +1415,7 @@ class ProdutoRepository:
     
     def _delete_local_produto(self, produto_id: int, synced: int) -> bool:
         """Faz soft delete do produto no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE produtos 
@@ -1277,7 +1429,7 @@ class ProdutoRepository:
 
     def _delete_local_produto_by_uuid(self, produto_uuid: str, synced: int) -> bool:
         """Faz soft delete do produto local usando UUID."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -1293,7 +1445,7 @@ class ProdutoRepository:
     
     def _get_produto_by_uuid(self, uuid: str) -> Dict[str, Any]:
         """Busca produto local pelo UUID."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1310,7 +1462,7 @@ class ProdutoRepository:
     def _inserir_produto_do_servidor(self, produto_servidor: Dict[str, Any]) -> bool:
         """Insere produto recebido do servidor no banco local."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 # Normalizar flags/valores vindos do servidor
                 vpp_val = 1 if (produto_servidor.get('venda_por_peso') in (1, True, '1', 'true', 'True')) else 0
@@ -1338,6 +1490,7 @@ class ProdutoRepository:
                     produto_servidor.get('created_at'),
                     produto_servidor.get('updated_at')
                 ))
+                gravar_hash(conn, 'produtos', cursor.lastrowid, hash_servidor('produtos', produto_servidor))
                 conn.commit()
                 return True
         except Exception as e:
@@ -1351,8 +1504,13 @@ class ProdutoRepository:
             if not produto_local.get('synced', False):
                 print(f"Produto local {produto_local['nome']} tem mudanças não sincronizadas - mantendo versão local")
                 return False
+
+            # Com hash gravado, conteúdo igual não é regravado (nem updated_at alterado)
+            hash_local = produto_local.get('hash_conteudo')
+            if hash_local:
+                return hash_local != hash_servidor('produtos', produto_servidor)
             
-            # Comparar timestamps de updated_at
+            # Sem hash (linha anterior à coluna): comparar timestamps de updated_at
             local_updated = produto_local.get('updated_at')
             servidor_updated = produto_servidor.get('updated_at')
             
@@ -1377,7 +1535,7 @@ class ProdutoRepository:
         O estoque do servidor é armazenado em 'estoque_servidor' para comparação/relatórios.
         """
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 # Normalizar flags/valores vindos do servidor
                 vpp_val = 1 if (produto_servidor.get('venda_por_peso') in (1, True, '1', 'true', 'True')) else 0
@@ -1412,8 +1570,10 @@ class ProdutoRepository:
                     produto_servidor.get('updated_at'),
                     produto_id
                 ))
+                atualizado = cursor.rowcount > 0
+                gravar_hash(conn, 'produtos', produto_id, hash_servidor('produtos', produto_servidor))
                 conn.commit()
-                return cursor.rowcount > 0
+                return atualizado
         except Exception as e:
             print(f"Erro ao atualizar produto do servidor: {e}")
             return False
@@ -0,0 +1,136 @@
+"""
+Envio em lote das mudanças pendentes do change_log.
+
+O push de cada repositório fazia um POST/PUT/DELETE por mudança e abria uma
+conexão SQLite por linha para marcá-la como sincronizada; depois de um dia
+offline, milhares de mudanças levavam minutos. Aqui as mudanças pendentes são:
+
+1. consolidadas por entidade (ver database/compactacao_change_log; os
+   repositórios já compactam o change_log antes do push);
+2. enviadas em blocos de ``push_batch_size`` (config.json) para
+   ``POST {api}/{entidade}/batch``::
+
+       {"changes": [{"change_id": 12, "operation": "UPDATE",
+                     "entity_id": "<uuid>", "data": {...}}, ...]}
+
+   que responde ``{"results": [{"change_id": 12, "status": "ok"}, ...]}``;
+3. marcadas como sincronizadas numa única transação por bloco.
+
+O que o servidor não confirmar (ou tudo, se ele não tiver o endpoint de
+lote) volta para o envio individual de cada repositório, que continua
+tratando 404/409 caso a caso. A ausência do endpoint fica memorizada por
+alguns minutos para não ser sondada a cada ciclo.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from database.compactacao_change_log import consolidar
+from database.connection_factory import connect as db_connect
+from utils.http_client import http_client
+
+TAMANHO_LOTE_PADRAO = 200
+
+# Status que indicam servidor sem o endpoint de lote
+STATUS_SEM_LOTE = (404, 405, 501)
+
+# Tempo até voltar a tentar o endpoint de lote num servidor que não o tinha
+TTL_SEM_LOTE_S = 600.0
+
+_sem_lote: Dict[str, float] = {}
+
+
+class ResultadoLote(NamedTuple):
+    enviadas: int            # mudanças do change_log confirmadas (inclusive as consolidadas)
+    restantes: List[dict]    # mudanças originais que seguem pelo envio individual
+    confirmadas: List[dict]  # itens consolidados aceitos pelo servidor
+
+
+def tamanho_lote() -> int:
+    """push_batch_size de config.json (TAMANHO_LOTE_PADRAO se ausente)."""
+    try:
+        caminho = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
+        with open(caminho, 'r', encoding='utf-8') as f:
+            valor = int(json.load(f).get('push_batch_size') or 0)
+        return valor if valor > 0 else TAMANHO_LOTE_PADRAO
+    except Exception:
+        return TAMANHO_LOTE_PADRAO
+
+
+def marcar_sincronizadas(db_path, change_ids) -> int:
+    """Marca as mudanças como sincronizadas numa única transação."""
+    ids = list(change_ids)
+    if not ids:
+        return 0
+    agora = datetime.now().isoformat()
+    with db_connect(db_path) as conn:
+        conn.executemany(
+            "UPDATE change_log SET status = 'synced', updated_at = ? WHERE id = ?",
+            [(agora, change_id) for change_id in ids]
+        )
+        conn.commit()
+    return len(ids)
+
+
+async def enviar_em_lote(api_base: str, entidade: str, mudancas: List[dict], db_path,
+                         preparar: Optional[Callable] = None,
+                         tamanho: Optional[int] = None, http=http_client) -> ResultadoLote:
+    """Envia as mudanças pelo endpoint de lote; ver o docstring do módulo.
+
+    preparar(item) pode ajustar item['data'] ao formato que o servidor espera
+    (o mesmo mapeamento do envio individual).
+    """
+    url = f"{api_base}/{entidade}/batch"
+    if not mudancas or time.monotonic() < _sem_lote.get(url, 0):
+        return ResultadoLote(0, list(mudancas), [])
+
+    itens, descartadas = consolidar(mudancas)
+    enviadas = marcar_sincronizadas(db_path, descartadas)
+    tamanho = tamanho or tamanho_lote()
+    confirmadas: List[dict] = []
+    recusadas = set()
+
+    async with http.sessao_async() as client:
+        for inicio in range(0, len(itens), tamanho):
+            bloco = itens[inicio:inicio + tamanho]
+            try:
+                for item in bloco:
+                    if preparar:
+                        preparar(item)
+                resp = await client.post(url, json={'changes': [
+                    {'change_id': item['change_ids'][-1], 'operation': item['operation'],
+                     'entity_id': item['entity_id'], 'data': item['data']}
+                    for item in bloco
+                ]}, timeout=30.0)
+            except Exception as e:
+                print(f"[SYNC][LOTE] Falha ao enviar lote de {entidade}: {e}")
+                resp = None
+
+            if resp is None or resp.status_code != 200:
+                if resp is not None and resp.status_code in STATUS_SEM_LOTE:
+                    _sem_lote[url] = time.monotonic() + TTL_SEM_LOTE_S
+                    print(f"[SYNC][LOTE] Servidor sem {url} - envio individual")
+                elif resp is not None:
+                    print(f"[SYNC][LOTE] Lote de {entidade} recusado: HTTP {resp.status_code}")
+                for item in itens[inicio:]:
+                    recusadas.update(item['change_ids'])
+                break
+
+            status = {r.get('change_id'): r.get('status') for r in (resp.json() or {}).get('results', [])}
+            ok = []
+            for item in bloco:
+                if status.get(item['change_ids'][-1]) == 'ok':
+                    ok.append(item)
+                else:
+                    recusadas.update(item['change_ids'])
+            enviadas += marcar_sincronizadas(db_path, [i for item in ok for i in item['change_ids']])
+            confirmadas.extend(ok)
+
+    # Na ordem original, como o envio individual espera
+    restantes = [m for m in mudancas if m['id'] in recusadas]
+    if confirmadas or descartadas:
+        print(f"[SYNC][LOTE] {entidade}: {enviadas} mudanças sincronizadas em lote, "
+              f"{len(restantes)} para envio individual")
+    return ResultadoLote(enviadas, restantes, confirmadas)
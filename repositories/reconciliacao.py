@@ -0,0 +1,307 @@
+"""
+Reconciliação de estoque e vendas com o servidor, dentro do processo.
+
+Antes, cada ciclo de sync carregava scripts/reconcile_*_with_server.py via
+importlib; cada execução baixava de novo a lista inteira de produtos (duas
+vezes por ciclo, já que o estoque é reconciliado antes e depois das vendas)
+ou de vendas e reabria o SQLite.
+
+Aqui o estado do servidor vem de um espelho em memória alimentado pelos
+próprios pulls do ciclo (ver ``EspelhoServidor.registrar``): o pull completo
+preenche o espelho e os incrementais aplicam os deltas. Só quando o espelho
+ainda não está completo (processo recém-iniciado com cursor de pull gravado)
+é preciso consultar o servidor.
+
+Sem espelho, o estoque é comparado por faixas de hash (ver
+reconciliacao_buckets) e só as faixas divergentes são baixadas; o estado
+resultante passa a ser o espelho, e a segunda reconciliação do ciclo não
+volta ao servidor.
+
+A comparação usa índices por uuid (com fallback por código) e uma
+assinatura dos campos reconciliados; apenas as linhas divergentes são
+enviadas, e o espelho é atualizado com o que o servidor aceitou - aqui e
+nos pushes dos repositórios (``EspelhoServidor.registrar_envio``).
+"""
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from database.connection_factory import connect as db_connect
+from database.schema_cache import schema_cache
+from database.sync_cursor import baixar_alteracoes
+from repositories.reconciliacao_buckets import estado_servidor_por_buckets
+from utils.http_client import http_client
+
+# Campos guardados no espelho por entidade (o resto da resposta é descartado)
+CAMPOS_ESPELHO = {
+    'produtos': ('id', 'uuid', 'codigo', 'nome', 'estoque', 'preco_custo', 'preco_venda', 'ativo', 'updated_at'),
+    'vendas': ('id', 'uuid', 'updated_at'),
+}
+
+# Campos de produto que a reconciliação de estoque alinha no servidor
+CAMPOS_ESTOQUE = ('estoque', 'preco_custo', 'preco_venda')
+
+
+def _chave(item: dict) -> str:
+    return str(item.get('uuid') or item.get('id') or '').strip()
+
+
+class EspelhoServidor:
+    """Último estado conhecido do servidor, por (api_base, entidade)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._itens: Dict[Tuple[str, str], Dict[str, dict]] = {}
+
+    def registrar(self, api_base: str, entidade: str, itens: Iterable[dict], completo: bool = False):
+        """Integra itens recebidos num pull.
+
+        Um pull completo substitui o espelho; um incremental só é aplicado
+        sobre um espelho já completo (sem a base, os deltas não bastam).
+        """
+        campos = CAMPOS_ESPELHO.get(entidade)
+        projetados = {}
+        for item in itens or []:
+            chave = _chave(item)
+            if chave:
+                projetados[chave] = {c: item.get(c) for c in campos} if campos else dict(item)
+        with self._lock:
+            if completo:
+                self._itens[(api_base, entidade)] = projetados
+            elif (api_base, entidade) in self._itens:
+                self._itens[(api_base, entidade)].update(projetados)
+
+    def atualizar(self, api_base: str, entidade: str, chave: str, campos: dict):
+        with self._lock:
+            itens = self._itens.get((api_base, entidade))
+            if itens is not None:
+                itens[chave] = {**itens.get(chave, {}), **campos}
+
+    def registrar_envio(self, api_base: str, entidade: str, operacao: str, chave: str, dados: dict):
+        """Aplica ao espelho uma mudança que o servidor acabou de aceitar.
+
+        O pull do ciclo roda antes dos envios; sem isso, o que acabou de ser
+        enviado pareceria divergente e seria reenviado pela reconciliação.
+        """
+        chave = str(chave or '').strip()
+        if not chave:
+            return
+        if operacao == 'DELETE':
+            self.remover(api_base, entidade, chave)
+            return
+        campos = CAMPOS_ESPELHO.get(entidade)
+        valores = {c: v for c, v in (dados or {}).items() if not campos or c in campos}
+        self.atualizar(api_base, entidade, chave, {**valores, 'uuid': chave})
+
+    def remover(self, api_base: str, entidade: str, chave: str):
+        with self._lock:
+            itens = self._itens.get((api_base, entidade))
+            if itens is not None:
+                itens.pop(chave, None)
+
+    def itens(self, api_base: str, entidade: str) -> Optional[Dict[str, dict]]:
+        """Cópia do espelho, ou None se ainda não houve um pull completo."""
+        with self._lock:
+            itens = self._itens.get((api_base, entidade))
+            return dict(itens) if itens is not None else None
+
+    def invalidar(self, entidade: str = None):
+        with self._lock:
+            for chave in list(self._itens):
+                if entidade is None or chave[1] == entidade:
+                    del self._itens[chave]
+
+
+async def _carregar_espelho(api_base: str, entidade: str, espelho: EspelhoServidor, http) -> Optional[Dict[str, dict]]:
+    itens = espelho.itens(api_base, entidade)
+    if itens is not None:
+        return itens
+    print(f"[RECON] Espelho de {entidade} incompleto - baixando lista do servidor")
+    async with http.sessao_async() as client:
+        baixados = await baixar_alteracoes(client, f"{api_base}/{entidade}/")
+    if baixados is None:
+        return None
+    espelho.registrar(api_base, entidade, baixados, completo=True)
+    return espelho.itens(api_base, entidade)
+
+
+def _assinatura(item: dict) -> Optional[tuple]:
+    try:
+        return tuple(round(float(item.get(c) or 0.0), 3) for c in CAMPOS_ESTOQUE)
+    except (TypeError, ValueError):
+        return None
+
+
+def divergencias_estoque(locais: Iterable[dict], servidor: Dict[str, dict]):
+    """Pares (produto do servidor, valores locais) cujos campos divergem.
+
+    Casa por uuid e, para produtos locais ainda sem uuid, pelo código.
+    """
+    por_codigo = {}
+    for item in servidor.values():
+        codigo = str(item.get('codigo') or '').strip()
+        if codigo:
+            por_codigo[codigo] = item
+
+    divergentes = []
+    for local in locais:
+        remoto = servidor.get(str(local.get('uuid') or '').strip())
+        if remoto is None:
+            remoto = por_codigo.get(str(local.get('codigo') or '').strip())
+        if remoto is None:
+            continue
+        assinatura_local = _assinatura(local)
+        if assinatura_local is not None and assinatura_local != _assinatura(remoto):
+            divergentes.append((remoto, dict(zip(CAMPOS_ESTOQUE, assinatura_local))))
+    return divergentes
+
+
+async def reconciliar_estoque(api_base: str, db_path, espelho=None, http=http_client) -> dict:
+    """Envia ao servidor estoque e preços dos produtos que divergirem."""
+    espelho = espelho or espelho_servidor
+    with db_connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        synced = 'COALESCE(synced, 0)' if schema_cache.tem_coluna(db_path, 'produtos', 'synced', conn) else '1'
+        locais = [dict(r) for r in conn.execute(f"""
+            SELECT codigo, nome, preco_custo, preco_venda, estoque, COALESCE(ativo, 1) AS ativo,
+                   COALESCE(uuid, '') AS uuid, {synced} AS synced
+            FROM produtos
+        """).fetchall()]
+
+    servidor = espelho.itens(api_base, 'produtos')
+    if servidor is None:
+        # Sem espelho: pedir ao servidor só as faixas de hash que divergem
+        # (produtos ainda não enviados não existem lá e ficam de fora)
+        async with http.sessao_async() as client:
+            servidor = await estado_servidor_por_buckets(
+                client, api_base, [l for l in locais if l['synced']]
+            )
+        if servidor is not None:
+            espelho.registrar(api_base, 'produtos', servidor.values(), completo=True)
+            servidor = espelho.itens(api_base, 'produtos')
+    if servidor is None:
+        servidor = await _carregar_espelho(api_base, 'produtos', espelho, http)
+    if servidor is None:
+        print("[RECON-STOCK] Lista de produtos do servidor indisponível - pulando")
+        return {'divergentes': 0, 'sucesso': 0, 'falhas': 0}
+
+    divergentes = divergencias_estoque(locais, servidor)
+    ok = falhas = 0
+    if divergentes:
+        print(f"[RECON-STOCK] {len(divergentes)} divergências entre {len(locais)} produtos - reconciliando")
+        async with http.sessao_async() as client:
+            for remoto, valores in divergentes:
+                chave = _chave(remoto)
+                try:
+                    resp = await client.put(f"{api_base}/produtos/{chave}", json=valores, timeout=15.0)
+                except Exception as e:
+                    falhas += 1
+                    print(f"[RECON-STOCK] Falha em {remoto.get('codigo')}: {e}")
+                    continue
+                if resp.status_code == 200:
+                    ok += 1
+                    espelho.atualizar(api_base, 'produtos', chave, valores)
+                else:
+                    falhas += 1
+                    if resp.status_code == 404:
+                        espelho.remover(api_base, 'produtos', chave)
+                    print(f"[RECON-STOCK] {remoto.get('codigo')} {remoto.get('nome')} HTTP {resp.status_code}")
+        print(f"[RECON-STOCK] Concluído. Sucesso: {ok} | Falhas: {falhas}")
+    return {'divergentes': len(divergentes), 'sucesso': ok, 'falhas': falhas}
+
+
+def _payload_venda(conn, venda: sqlite3.Row) -> dict:
+    itens = []
+    for item in conn.execute("""
+        SELECT iv.produto_id, iv.quantidade, iv.preco_unitario, iv.subtotal,
+               COALESCE(iv.peso_kg, 0) AS peso_kg, p.uuid AS produto_uuid
+        FROM itens_venda iv
+        LEFT JOIN produtos p ON p.id = iv.produto_id
+        WHERE iv.venda_id = ?
+    """, (venda['id'],)).fetchall():
+        if not item['produto_uuid']:
+            raise RuntimeError(f"Produto local id={item['produto_id']} sem UUID para venda {venda['id']}")
+
+        qtd_raw = float(item['quantidade'] or 0.0)
+        peso = float(item['peso_kg'] or 0.0)
+        if abs(qtd_raw - int(qtd_raw)) > 1e-6 and peso <= 0.0:
+            peso = round(qtd_raw - int(qtd_raw), 3)
+        payload = {
+            'produto_id': str(item['produto_uuid']),
+            'quantidade': int(qtd_raw) if qtd_raw >= 1 else 1,  # backend exige inteiro > 0
+            'preco_unitario': float(item['preco_unitario'] or 0.0),
+            'subtotal': float(item['subtotal'] or 0.0),
+        }
+        if peso > 0:
+            payload['peso_kg'] = peso
+        itens.append(payload)
+
+    return {
+        'uuid': venda['uuid'],
+        'total': float(venda['total'] or 0.0),
+        'desconto': float(venda['desconto_aplicado_divida'] or 0.0),
+        'forma_pagamento': venda['forma_pagamento'] or 'Dinheiro',
+        'itens': itens,
+    }
+
+
+async def reconciliar_vendas(api_base: str, db_path, espelho=None, http=http_client) -> dict:
+    """Marca como sincronizadas as vendas locais que o servidor já tem e envia as demais."""
+    espelho = espelho or espelho_servidor
+    servidor = await _carregar_espelho(api_base, 'vendas', espelho, http)
+    if servidor is None:
+        print("[RECON] Lista de vendas do servidor indisponível - pulando")
+        return {'ja_no_servidor': 0, 'sucesso': 0, 'falhas': 0}
+
+    with db_connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        pendentes = conn.execute("""
+            SELECT id, total, desconto_aplicado_divida, forma_pagamento, uuid
+            FROM vendas
+            WHERE (synced = 0 OR synced IS NULL) AND uuid IS NOT NULL AND TRIM(uuid) <> ''
+              AND (status IS NULL OR status != 'Anulada')
+            ORDER BY id
+        """).fetchall()
+        ja_no_servidor = [v['id'] for v in pendentes if str(v['uuid']).strip() in servidor]
+        enviar = []
+        falhas = 0
+        for venda in pendentes:
+            if str(venda['uuid']).strip() in servidor:
+                continue
+            try:
+                enviar.append((venda['id'], _payload_venda(conn, venda)))
+            except Exception as e:
+                falhas += 1
+                print(f"[RECON] Venda {venda['id']} não pode ser enviada: {e}")
+
+    sincronizadas = list(ja_no_servidor)
+    if enviar:
+        print(f"[RECON] Enviando {len(enviar)} vendas ausentes no servidor")
+        async with http.sessao_async() as client:
+            for venda_id, payload in enviar:
+                try:
+                    resp = await client.post(f"{api_base}/vendas/", json=payload, timeout=20.0)
+                except Exception as e:
+                    falhas += 1
+                    print(f"[RECON] Falha ao enviar venda {venda_id}: {e}")
+                    continue
+                # 409: já existia no servidor
+                if resp.status_code in (200, 201, 409):
+                    sincronizadas.append(venda_id)
+                    espelho.atualizar(api_base, 'vendas', payload['uuid'], {'uuid': payload['uuid']})
+                else:
+                    falhas += 1
+                    print(f"[RECON] Venda {venda_id} HTTP {resp.status_code}: {resp.text}")
+
+    if sincronizadas:
+        with db_connect(db_path) as conn:
+            conn.executemany("UPDATE vendas SET synced = 1 WHERE id = ?", [(i,) for i in sincronizadas])
+            conn.commit()
+    enviadas = len(sincronizadas) - len(ja_no_servidor)
+    if pendentes:
+        print(f"[RECON] Vendas: {len(ja_no_servidor)} já no servidor, {enviadas} enviadas, {falhas} falhas")
+    return {'ja_no_servidor': len(ja_no_servidor), 'sucesso': enviadas, 'falhas': falhas}
+
+
+# Instância global
+espelho_servidor = EspelhoServidor()
@@ -0,0 +1,128 @@
+"""
+Diff de estoque por faixas de hash (árvore de Merkle de dois níveis).
+
+Para reconciliar o estoque sem baixar o catálogo inteiro, cliente e
+servidor distribuem os produtos em ``NUM_BUCKETS`` faixas pelo hash do uuid
+e calculam, para cada faixa, um hash das linhas canônicas
+``uuid|estoque|preco_venda|preco_custo`` (ordenadas por uuid). A raiz é o
+hash da concatenação dos hashes das faixas. Entram só os campos que a
+reconciliação envia: uma faixa que divergisse em outro campo seria baixada
+a cada ciclo sem nunca ser corrigida.
+
+Protocolo:
+
+1. ``GET {api}/produtos/hashes?buckets=N`` ->
+   ``{"buckets": N, "raiz": "...", "hashes": ["...", ...]}``;
+2. raiz igual à local: nada a fazer;
+3. para cada faixa divergente, ``GET {api}/produtos/?bucket=i&buckets=N``
+   devolve só os produtos daquela faixa.
+
+Do lado local entram só produtos já sincronizados; os que o servidor ainda
+não conhece deixariam a faixa divergente para sempre. As faixas que
+conferem são tomadas das linhas locais, de modo que o resultado é o estado
+completo do servidor e pode alimentar o espelho (ver reconciliacao).
+
+Servidores sem o endpoint de hashes ficam memorizados por alguns minutos e a
+reconciliação volta a baixar a lista completa.
+"""
+import hashlib
+import time
+from typing import Dict, Iterable, List, Optional
+
+NUM_BUCKETS = 64
+
+CAMPOS_HASH = ('estoque', 'preco_venda', 'preco_custo')
+
+# Status que indicam servidor sem o endpoint de hashes
+STATUS_SEM_HASH = (404, 405, 501)
+
+TTL_SEM_HASH_S = 600.0
+
+_sem_hash: Dict[str, float] = {}
+
+
+def _uuid(item: dict) -> str:
+    return str(item.get('uuid') or item.get('id') or '').strip()
+
+
+def linha_canonica(item: dict) -> str:
+    """Representação estável dos campos reconciliados (3 casas decimais)."""
+    valores = [_uuid(item)]
+    for campo in CAMPOS_HASH:
+        valores.append(f"{round(float(item.get(campo) or 0.0), 3):.3f}")
+    return '|'.join(valores)
+
+
+def bucket_de(uuid: str, buckets: int = NUM_BUCKETS) -> int:
+    return int(hashlib.sha1(uuid.encode('utf-8')).hexdigest()[:8], 16) % buckets
+
+
+def hashes_por_bucket(itens: Iterable[dict], buckets: int = NUM_BUCKETS) -> List[str]:
+    """Hash de cada faixa; itens sem uuid ficam de fora."""
+    linhas: List[List[str]] = [[] for _ in range(buckets)]
+    for item in itens:
+        uuid = _uuid(item)
+        if uuid:
+            linhas[bucket_de(uuid, buckets)].append(linha_canonica(item))
+    return [hashlib.sha1('\n'.join(sorted(faixa)).encode('utf-8')).hexdigest() for faixa in linhas]
+
+
+def raiz(hashes: List[str]) -> str:
+    return hashlib.sha1(''.join(hashes).encode('utf-8')).hexdigest()
+
+
+def _por_uuid(itens: Iterable[dict]) -> Dict[str, dict]:
+    return {uuid: item for uuid, item in ((_uuid(i), i) for i in itens) if uuid}
+
+
+async def estado_servidor_por_buckets(client, api_base: str, locais: List[dict],
+                                      buckets: int = NUM_BUCKETS) -> Optional[Dict[str, dict]]:
+    """Estado do servidor por uuid, baixando só as faixas que diferem das locais.
+
+    ``locais`` são os produtos locais já sincronizados; nas faixas que
+    conferem, eles próprios representam o servidor. Retorna None se o
+    servidor não suporta o protocolo (ou a consulta falhou) - nesse caso o
+    chamador baixa a lista completa.
+    """
+    url = f"{api_base}/produtos/hashes"
+    if time.monotonic() < _sem_hash.get(url, 0):
+        return None
+    try:
+        resp = await client.get(url, params={'buckets': buckets}, timeout=15.0)
+    except Exception as e:
+        print(f"[RECON-STOCK] Falha ao obter hashes do servidor: {e}")
+        return None
+    if resp.status_code != 200:
+        if resp.status_code in STATUS_SEM_HASH:
+            _sem_hash[url] = time.monotonic() + TTL_SEM_HASH_S
+            print("[RECON-STOCK] Servidor sem hashes por faixa - usando lista completa")
+        return None
+
+    dados = resp.json() or {}
+    remotos = dados.get('hashes') or []
+    if int(dados.get('buckets') or 0) != buckets or len(remotos) != buckets:
+        print("[RECON-STOCK] Resposta de hashes incompatível - usando lista completa")
+        return None
+
+    locais_hash = hashes_por_bucket(locais, buckets)
+    if dados.get('raiz') == raiz(locais_hash):
+        return _por_uuid(locais)
+
+    divergentes = {i for i in range(buckets) if remotos[i] != locais_hash[i]}
+    print(f"[RECON-STOCK] {len(divergentes)} de {buckets} faixas divergem - baixando só essas")
+    itens = {uuid: item for uuid, item in _por_uuid(locais).items() if bucket_de(uuid, buckets) not in divergentes}
+    for bucket in sorted(divergentes):
+        try:
+            resp = await client.get(f"{api_base}/produtos/", params={'bucket': bucket, 'buckets': buckets},
+                                    timeout=15.0)
+        except Exception as e:
+            print(f"[RECON-STOCK] Falha ao baixar faixa {bucket}: {e}")
+            return None
+        if resp.status_code != 200:
+            return None
+        for item in resp.json() or []:
+            uuid = _uuid(item)
+            # Servidor que ignora o filtro devolveria outras faixas
+            if uuid and bucket_de(uuid, buckets) == bucket:
+                itens[uuid] = item
+    return itens
@@ -1,15 +1,63 @@
 import asyncio
 import os
 import sys
-from datetime import datetime
-from typing import Dict, Any, List
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Set
 from repositories.produto_repository import ProdutoRepository
 from repositories.usuario_repository import UsuarioRepository
 from repositories.cliente_repository import ClienteRepository
 from repositories.venda_repository import VendaRepository
 from database.backup_recovery import BackupRecoveryManager
+from database.connection_factory import connect as db_connect
+from database.compactacao_change_log import metricas_compactacao
+from database.sync_cursor import reconciliacoes_vencidas, solicitar_reconciliacao
+from repositories.reconciliacao import espelho_servidor, reconciliar_estoque, reconciliar_vendas
+from repositories.agendador_sync import LIMITE_CONCORRENCIA, Etapa, executar_etapas, formatar_relatorio
+from utils.http_client import http_client
+from utils.connection_status import connection_status
 import json
 
+# Idade máxima da última reconciliação completa (pull sem cursor) por entidade
+INTERVALO_RECONCILIACAO_HORAS = 24
+
+
+class GuardaSync:
+    """Uma sincronização por vez no processo.
+
+    Canal de mudanças, dashboard, pós-venda e gerenciamento de vendas criam
+    cada um o seu SyncManager; duas execuções simultâneas enviariam as mesmas
+    mudanças pendentes do change_log duas vezes (e a compactação de uma
+    reescreveria linhas que a outra ainda está enviando). Quem encontra a
+    guarda ocupada só registra as entidades pedidas; quem a detém as
+    sincroniza ao terminar.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._lock = threading.Lock()
+        self._pedidas: Set[str] = set()
+
+    def tentar(self) -> bool:
+        return self._trava.acquire(blocking=False)
+
+    def liberar(self):
+        self._trava.release()
+
+    def pedir(self, entidades):
+        with self._lock:
+            self._pedidas |= set(entidades)
+
+    def retirar_pedidas(self) -> Set[str]:
+        with self._lock:
+            pedidas, self._pedidas = self._pedidas, set()
+        return pedidas
+
+
+# Instância global
+guarda_sync = GuardaSync()
+
+
 class SyncManager:
     """Gerenciador centralizado de sincronização para todas as entidades."""
     
@@ -23,6 +71,9 @@ class SyncManager:
         self.backend_url = self._get_backend_url()
         self.auto_reconcile_sales = self._get_config_flag('auto_reconcile_sales', default=True)
         self.auto_reconcile_stock = self._get_config_flag('auto_reconcile_stock', default=True)
+        self.max_concorrencia = self._get_config_int('sync_max_concurrency', default=LIMITE_CONCORRENCIA)
+        self.intervalo_reconciliacao = timedelta(
+            hours=self._get_config_int('full_resync_hours', default=INTERVALO_RECONCILIACAO_HORAS))
         self.produto_repo = ProdutoRepository(backend_url=self.backend_url)
         self.usuario_repo = UsuarioRepository(backend_url=self.backend_url)
         self.cliente_repo = ClienteRepository(backend_url=self.backend_url)
@@ -79,70 +130,35 @@ class SyncManager:
             pass
         return bool(default)
 
-    def _reconciliar_vendas(self):
-        """Executa reconciliação de vendas usando o script de utilidade, se existir.
+    def _get_config_int(self, key: str, default: int) -> int:
+        """Lê um inteiro positivo de config.json com fallback para default."""
+        try:
+            repo_root = os.path.dirname(os.path.dirname(__file__))
+            cfg_path = os.path.join(repo_root, 'config.json')
+            if os.path.exists(cfg_path):
+                with open(cfg_path, 'r', encoding='utf-8') as f:
+                    val = json.load(f).get(key)
+                    if isinstance(val, int) and not isinstance(val, bool) and val > 0:
+                        return val
+        except Exception:
+            pass
+        return int(default)
+
+    async def _reconciliar_vendas(self):
+        """Reconcilia vendas locais não sincronizadas com as do servidor.
         Melhor esforço: não falha a sincronização caso haja erro aqui.
         """
         try:
-            import importlib.util
-            import traceback
-            # Localizar script: pdv3/scripts/reconcile_sales_with_server.py
-            repo_root = os.path.dirname(os.path.dirname(__file__))
-            script_path = os.path.join(repo_root, 'scripts', 'reconcile_sales_with_server.py')
-            if not os.path.exists(script_path):
-                # Tentativa alternativa: subir um nível (quando rodando em contextos diferentes)
-                alt_path = os.path.join(os.path.dirname(repo_root), 'pdv3', 'scripts', 'reconcile_sales_with_server.py')
-                if os.path.exists(alt_path):
-                    script_path = alt_path
-            if not os.path.exists(script_path):
-                print("[RECON] Script reconcile_sales_with_server.py não encontrado - pulando")
-                return
-            spec = importlib.util.spec_from_file_location('reconcile_sales_with_server', script_path)
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)  # type: ignore
-            if hasattr(mod, 'main') and callable(mod.main):
-                print("[RECON] Executando reconciliação de vendas pós-sync...")
-                mod.main()
-                print("[RECON] Reconciliação de vendas concluída")
-            else:
-                print("[RECON] Função main() não encontrada no script - pulando")
+            await reconciliar_vendas(self.venda_repo.api_base, self.venda_repo.db_path)
         except Exception as e:
             print(f"[RECON] Erro ao executar reconciliação de vendas: {e}")
-            try:
-                traceback.print_exc()
-            except Exception:
-                pass
 
-    def _reconciliar_estoque(self):
-        """Executa reconciliação de estoque usando o script utilitário.
-        Sincroniza estoque e preços locais para o servidor quando divergirem.
-        """
+    async def _reconciliar_estoque(self):
+        """Sincroniza estoque e preços locais para o servidor quando divergirem."""
         try:
-            import importlib.util
-            import traceback
-            repo_root = os.path.dirname(os.path.dirname(__file__))
-            script_path = os.path.join(repo_root, 'scripts', 'reconcile_stock_with_server.py')
-            if not os.path.exists(script_path):
-                alt_path = os.path.join(os.path.dirname(repo_root), 'pdv3', 'scripts', 'reconcile_stock_with_server.py')
-                script_path = alt_path if os.path.exists(alt_path) else script_path
-            if not os.path.exists(script_path):
-                print("[RECON-STOCK] Script reconcile_stock_with_server.py não encontrado - pulando")
-                return
-            spec = importlib.util.spec_from_file_location('reconcile_stock_with_server', script_path)
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)  # type: ignore
-            if hasattr(mod, 'main') and callable(mod.main):
-                print("[RECON-STOCK] Executando reconciliação de estoque pós-sync...")
-                mod.main()
-                print("[RECON-STOCK] Reconciliação de estoque concluída")
-            else:
-                print("[RECON-STOCK] Função main() não encontrada no script - pulando")
+            await reconciliar_estoque(self.produto_repo.api_base, self.produto_repo.db_path)
         except Exception as e:
             print(f"[RECON-STOCK] Erro ao executar reconciliação de estoque: {e}")
-            try:
-                traceback.print_exc()
-            except Exception:
-                pass
 
     def _auto_check_backup_recovery(self):
         """Verificação automática de recuperação de backup na inicialização."""
@@ -164,12 +180,52 @@ class SyncManager:
             print(f"AVISO: Erro na verificacao de backup: {e}")
             # Continuar mesmo com erro na verificação
     
-    async def is_backend_online(self) -> bool:
-        """Verifica se o backend está online usando qualquer repositório."""
+    async def is_backend_online(self, forcar: bool = False) -> bool:
+        """Verifica se o backend está online usando qualquer repositório.
+
+        forcar=True ignora o backoff de reconexão (ação manual do usuário).
+        """
+        if forcar:
+            return await connection_status.verificar(self.backend_url, forcar=True)
         return await self.produto_repo.is_backend_online()
     
+    async def _exclusivo(self, entidades, executar, ocupado):
+        """Executa sob a guarda do processo; ocupada, só registra o pedido e retorna ocupado."""
+        if not guarda_sync.tentar():
+            guarda_sync.pedir(entidades)
+            print(f"[SYNC] Sincronização já em andamento - {sorted(entidades)} fica para o fim dela")
+            return ocupado
+        try:
+            resultado = await executar()
+        finally:
+            guarda_sync.liberar()
+        # Pedidos feitos durante a execução (se outra já pegou a guarda, voltam a ser registrados)
+        pedidas = guarda_sync.retirar_pedidas()
+        if pedidas:
+            print(f"[SYNC] Atendendo sincronização pedida durante a execução: {sorted(pedidas)}")
+            await self._exclusivo(pedidas, lambda: self._sincronizar_conjunto(pedidas), 0)
+        return resultado
+
+    @staticmethod
+    def _resultado_ocupado() -> Dict[str, Any]:
+        return {
+            "status": "em_andamento",
+            "message": "Sincronização já em andamento; as mudanças serão sincronizadas ao final dela.",
+            "enviadas": 0,
+            "recebidas": 0,
+            "total_enviadas": 0,
+            "total_recebidas": 0,
+            "duracao_segundos": 0.0,
+            "timestamp": datetime.now().isoformat(),
+        }
+
     async def sincronizar_todas_entidades(self) -> Dict[str, Any]:
-        """Sincroniza todas as entidades com o backend."""
+        """Sincroniza todas as entidades com o backend (uma sincronização por vez no processo)."""
+        return await self._exclusivo(
+            [nome for nome, _ in self.repositories], self._sincronizar_todas_entidades, self._resultado_ocupado()
+        )
+
+    async def _sincronizar_todas_entidades(self) -> Dict[str, Any]:
         print("=== INICIANDO SINCRONIZACAO COMPLETA ===")
         inicio = datetime.now()
         
@@ -181,6 +237,8 @@ class SyncManager:
                 "message": "Backend não está disponível",
                 "timestamp": inicio.isoformat()
             }
+
+        self._expirar_reconciliacoes()
         
         resultados = {}
         total_enviadas = 0
@@ -210,30 +268,31 @@ class SyncManager:
                     "mudancas_pendentes": 0
                 }
 
-        # Ordem crítica: produtos -> vendas, depois demais entidades
-        await _sync_entity('produtos', self.produto_repo)
-        # Reconciliação de estoque após produtos (antes de vendas) para alinhar valores no servidor
-        try:
+        async def _produtos():
+            await _sync_entity('produtos', self.produto_repo)
+            # Reconciliação de estoque após produtos (antes de vendas) para alinhar valores no servidor
             if self.auto_reconcile_stock:
-                self._reconciliar_estoque()
-        except Exception as e:
-            print(f"[SYNC] Falha ao reconciliar estoque pós-sync: {e}")
-        await _sync_entity('vendas', self.venda_repo)
-        # Reconciliação automática de vendas pós-sync (configurável)
-        try:
+                await self._reconciliar_estoque()
+
+        async def _vendas():
+            await _sync_entity('vendas', self.venda_repo)
+            # Reconciliação automática de vendas pós-sync (configurável)
             if self.auto_reconcile_sales:
-                self._reconciliar_vendas()
-        except Exception as e:
-            print(f"[SYNC] Falha ao reconcilicar vendas pós-sync: {e}")
-        # Rodar reconciliação de estoque novamente, pois vendas locais podem ter alterado estoque
-        try:
+                await self._reconciliar_vendas()
+            # Rodar reconciliação de estoque novamente, pois vendas locais podem ter alterado estoque
+            # (usa o espelho já atualizado pela primeira: só envia o que voltou a divergir)
             if self.auto_reconcile_stock:
-                self._reconciliar_estoque()
-        except Exception as e:
-            print(f"[SYNC] Falha ao reconciliar estoque pós-vendas: {e}")
-        # Sincronizar demais entidades
-        await _sync_entity('usuarios', self.usuario_repo)
-        await _sync_entity('clientes', self.cliente_repo)
+                await self._reconciliar_estoque()
+
+        # Vendas referenciam produtos e usuários (mapeamento de uuid); usuários e
+        # clientes não dependem de ninguém e rodam junto com produtos.
+        relatorio = await executar_etapas([
+            Etapa('produtos', _produtos),
+            Etapa('usuarios', lambda: _sync_entity('usuarios', self.usuario_repo)),
+            Etapa('clientes', lambda: _sync_entity('clientes', self.cliente_repo)),
+            Etapa('vendas', _vendas, depende_de=('produtos', 'usuarios')),
+        ], limite=self.max_concorrencia)
+        print(f"\n[SYNC][AGENDADOR] Tempos por etapa:\n{formatar_relatorio(relatorio)}")
         
         # O bulk sync já é executado automaticamente no sincronizar_mudancas do produto_repo
         print("\n--- Bulk sync de produtos executado automaticamente ---")
@@ -265,7 +324,10 @@ class SyncManager:
                 "rebuild_dashboard": True,
                 "missing_product_mappings": missing_items,
                 "action_hint": "Sincronize produtos novamente se existirem itens de venda ignorados."
-            }
+            },
+            "duracoes_ms": {nome: t['duracao_ms'] for nome, t in relatorio['etapas'].items()},
+            "caminho_critico": relatorio['caminho_critico'],
+            "caminho_critico_ms": relatorio['caminho_critico_ms'],
         }
         
         print(f"\n=== SINCRONIZACAO CONCLUIDA ===")
@@ -288,7 +350,12 @@ class SyncManager:
             return f"Falha na sincronização. {len(erros)} erros encontrados."
     
     async def sincronizar_entidade_especifica(self, entidade: str) -> Dict[str, Any]:
-        """Sincroniza uma entidade específica."""
+        """Sincroniza uma entidade específica (uma sincronização por vez no processo)."""
+        return await self._exclusivo(
+            [entidade], lambda: self._sincronizar_entidade_especifica(entidade), self._resultado_ocupado()
+        )
+
+    async def _sincronizar_entidade_especifica(self, entidade: str) -> Dict[str, Any]:
         repo_map = {
             'produtos': self.produto_repo,
             'usuarios': self.usuario_repo,
@@ -304,6 +371,7 @@ class SyncManager:
         
         print(f"Sincronizando {entidade}...")
         repo = repo_map[entidade]
+        self._expirar_reconciliacoes(entidade)
         
         try:
             resultado = await repo.sincronizar_mudancas()
@@ -322,12 +390,54 @@ class SyncManager:
                 "recebidas": 0
             }
     
+    async def sincronizar_entidades(self, entidades) -> int:
+        """Sincroniza só as entidades pedidas (todas: ciclo completo).
+
+        Usado pelo canal de mudanças; retorna quantos itens chegaram do servidor
+        (0 se outra sincronização estava em andamento: ela atende o pedido).
+        """
+        entidades = set(entidades)
+        return await self._exclusivo(entidades, lambda: self._sincronizar_conjunto(entidades), 0)
+
+    async def _sincronizar_conjunto(self, entidades: Set[str]) -> int:
+        if entidades >= {nome for nome, _ in self.repositories}:
+            resultado = await self._sincronizar_todas_entidades()
+            return int(resultado.get('total_recebidas', 0) or 0)
+        recebidas = 0
+        # Vendas por último: referenciam produtos e usuários
+        for entidade in ('produtos', 'usuarios', 'clientes', 'vendas'):
+            if entidade in entidades:
+                resultado = await self._sincronizar_entidade_especifica(entidade)
+                recebidas += int(resultado.get('recebidas', 0) or 0)
+        return recebidas
+
+    def solicitar_reconciliacao_completa(self, entidade: str = None):
+        """Descarta os cursores de pull: o próximo ciclo baixa a coleção inteira."""
+        solicitar_reconciliacao(self.produto_repo.db_path, entidade)
+        espelho_servidor.invalidar(entidade)
+
+    def _expirar_reconciliacoes(self, entidade: str = None):
+        """Força o pull completo das entidades sem reconciliação há mais de full_resync_hours.
+
+        Só o pull completo traz as exclusões feitas no servidor; o incremental
+        recebe apenas o que foi alterado.
+        """
+        try:
+            for vencida in reconciliacoes_vencidas(self.produto_repo.db_path, self.intervalo_reconciliacao):
+                if entidade is None or vencida == entidade:
+                    self.solicitar_reconciliacao_completa(vencida)
+        except Exception as e:
+            print(f"[SYNC] Falha ao verificar reconciliações vencidas: {e}")
+
     async def obter_status_sincronizacao(self) -> Dict[str, Any]:
         """Obtém status atual da sincronização (mudanças pendentes)."""
         status = {
             "backend_online": await self.is_backend_online(),
             "timestamp": datetime.now().isoformat(),
-            "entidades": {}
+            "entidades": {},
+            "http": http_client.get_stats(),
+            "conexao": connection_status.get_stats(),
+            "compactacao": metricas_compactacao.get_stats()
         }
         
         for nome, repo in self.repositories:
@@ -360,13 +470,10 @@ class SyncManager:
         """Remove entradas já sincronizadas do change_log (limpeza)."""
         print("Limpando change_log de entradas sincronizadas...")
         
-        import sqlite3
-        from pathlib import Path
-        
-        db_path = Path(__file__).parent.parent / 'database' / 'sistema.db'
+        db_path = self.produto_repo.db_path
         
         try:
-            with sqlite3.connect(str(db_path)) as conn:
+            with db_connect(db_path) as conn:
                 cursor = conn.cursor()
                 
                 # Contar entradas antes da limpeza
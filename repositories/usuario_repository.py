@@ -1,5 +1,5 @@
+import asyncio
 import sqlite3
-import httpx
 import json
 import uuid
 from datetime import datetime
@@ -9,6 +9,15 @@ import os
 import json
 import platform
 from utils.migration_helper import MigrationHelper
+from database.connection_factory import connect as db_connect
+from utils.http_client import http_client
+from utils.connection_status import connection_status
+from database.cache_leituras import cache_leituras, invalida_cache
+from repositories.leitura_local import LOCAL_PRIMEIRO, modo_leitura, revalidador
+from database.compactacao_change_log import compactar_change_log
+from database.hash_conteudo import atualizar_hash, gravar_hash, hash_servidor, hashes_locais
+from repositories.push_lote import enviar_em_lote
+from database.sync_cursor import baixar_alteracoes, gravar_cursor, ler_cursor, maior_updated_at
 from werkzeug.security import generate_password_hash
 
 class UsuarioRepository:
@@ -53,44 +62,11 @@ class UsuarioRepository:
     
     def _is_online(self) -> bool:
         """Verifica se o backend está online (versão síncrona)."""
-        try:
-            response = httpx.get(f"{self.backend_url}/healthz", timeout=3.0)
-            return response.status_code == 200
-        except:
-            return False
+        return connection_status.verificar_sync(self.backend_url)
     
     async def is_backend_online(self) -> bool:
         """Versão assíncrona para verificar se o backend está online."""
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
-                    url1 = f"{self.backend_url}/healthz"
-                    try:
-                        resp1 = await client.get(url1)
-                        if resp1.status_code == 200:
-                            return True
-                    except Exception:
-                        pass
-
-                    # Fallback sem /api quando aplicável
-                    if self.backend_url.endswith('/api'):
-                        base_url = self.backend_url[:-4]
-                        url2 = f"{base_url}/healthz"
-                        try:
-                            resp2 = await client.get(url2)
-                            if resp2.status_code == 200:
-                                return True
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-
-            if attempt < max_retries - 1:
-                import asyncio
-                await asyncio.sleep(1)
-
-        return False
+        return await connection_status.verificar(self.backend_url)
     
     def _ensure_migration(self):
         """Garante que as colunas de sincronização existam na tabela usuarios."""
@@ -102,11 +78,22 @@ class UsuarioRepository:
         except Exception as e:
             print(f"[USUARIO_REPO] Erro durante migração: {e}")
     
+    def _revalidar_em_segundo_plano(self):
+        """Pull incremental de usuarios em segundo plano (leitura local-primeiro)."""
+        def atualizar():
+            if not self._is_online():
+                return 0
+            return asyncio.run(self._pull_usuarios_do_servidor())
+        revalidador.revalidar('usuarios', atualizar)
+
     def get_all(self) -> List[Dict[str, Any]]:
-        """Obtém todos os usuários (híbrido: servidor primeiro, fallback local)."""
+        """Obtém todos os usuários (local primeiro, ver repositories/leitura_local)."""
+        if modo_leitura() == LOCAL_PRIMEIRO:
+            self._revalidar_em_segundo_plano()
+            return self._get_all_local()
         if self._is_online():
             try:
-                response = httpx.get(f"{self.api_base}/usuarios/", timeout=5.0)
+                response = http_client.get(f"{self.api_base}/usuarios/", timeout=5.0)
                 if response.status_code == 200:
                     return response.json()
             except Exception as e:
@@ -117,7 +104,11 @@ class UsuarioRepository:
     
     def _get_all_local(self) -> List[Dict[str, Any]]:
         """Obtém todos os usuários do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        usuarios = cache_leituras.obter((str(self.db_path), 'usuarios.get_all'), ('usuarios',), self._ler_todos_local)
+        return [dict(item) for item in usuarios]
+
+    def _ler_todos_local(self) -> List[Dict[str, Any]]:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -163,7 +154,7 @@ class UsuarioRepository:
                 # Buscar UUID do usuário local
                 usuario_local = self._get_local_usuario_by_id(usuario_id)
                 if usuario_local and usuario_local.get('uuid'):
-                    response = httpx.get(
+                    response = http_client.get(
                         f"{self.api_base}/usuarios/{usuario_local['uuid']}", 
                         timeout=5.0
                     )
@@ -176,7 +167,7 @@ class UsuarioRepository:
         return self._get_local_usuario_by_id(usuario_id)
     
     def _get_local_usuario_by_id(self, usuario_id: int) -> Optional[Dict[str, Any]]:
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -214,7 +205,7 @@ class UsuarioRepository:
     
     def get_by_uuid(self, usuario_uuid: str) -> Optional[Dict[str, Any]]:
         """Obtém usuário por UUID do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -250,6 +241,7 @@ class UsuarioRepository:
             
             return None
     
+    @invalida_cache('usuarios')
     def create(self, usuario_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Cria novo usuário (híbrido)."""
         # Gerar UUID se não existir
@@ -264,7 +256,7 @@ class UsuarioRepository:
                 s = str(payload.get('senha', '') or '')
                 if s.startswith('pbkdf2:') or s.startswith('scrypt:') or s.startswith('$2a$') or s.startswith('$2b$') or s.startswith('$2y$'):
                     payload.pop('senha', None)
-                response = httpx.post(
+                response = http_client.post(
                     f"{self.api_base}/usuarios/",
                     json=payload,
                     timeout=5.0
@@ -289,7 +281,7 @@ class UsuarioRepository:
     
     def _create_local_usuario(self, usuario_data: Dict[str, Any]) -> Dict[str, Any]:
         """Cria usuário no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             # Normalizar senha: se vier em texto puro, transformar em hash; se vazia, manter vazio
             raw = usuario_data.get('senha', '')
@@ -326,6 +318,7 @@ class UsuarioRepository:
             ))
             
             usuario_id = cursor.lastrowid
+            atualizar_hash(conn, 'usuarios', usuario_id)
             conn.commit()
             
             # Retornar usuário criado
@@ -334,7 +327,7 @@ class UsuarioRepository:
     async def _obter_mudancas_pendentes(self) -> List[Dict[str, Any]]:
         """Obtém mudanças pendentes de usuários."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 cursor.execute(
@@ -350,6 +343,7 @@ class UsuarioRepository:
             print(f"[USUARIOS] Erro ao obter mudancas pendentes: {e}")
             return []
     
+    @invalida_cache('usuarios')
     def update(self, usuario_id: int, usuario_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Atualiza usuário (híbrido)."""
         # Obter UUID do usuário local
@@ -366,7 +360,7 @@ class UsuarioRepository:
                 s = str(payload.get('senha', '') or '')
                 if s.startswith('pbkdf2:') or s.startswith('scrypt:') or s.startswith('$2a$') or s.startswith('$2b$') or s.startswith('$2y$'):
                     payload.pop('senha', None)
-                response = httpx.put(
+                response = http_client.put(
                     f"{self.api_base}/usuarios/{usuario_uuid}",
                     json=payload,
                     timeout=5.0
@@ -394,7 +388,7 @@ class UsuarioRepository:
     
     def _update_local_usuario(self, usuario_id: int, usuario_data: Dict[str, Any]) -> Dict[str, Any]:
         """Atualiza usuário no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             # Buscar registro atual para preencher campos ausentes e preservar hash
             try:
@@ -450,11 +444,13 @@ class UsuarioRepository:
                 usuario_data.get('synced', 0),
                 usuario_id
             ))
+            atualizar_hash(conn, 'usuarios', usuario_id)
             conn.commit()
             
             # Retornar usuário atualizado
             return self._get_local_usuario_by_id(usuario_id)
     
+    @invalida_cache('usuarios')
     def delete(self, usuario_id: int) -> bool:
         """Deleta usuário (soft delete híbrido)."""
         usuario_local = self._get_local_usuario_by_id(usuario_id)
@@ -466,7 +462,7 @@ class UsuarioRepository:
         # Tentar deletar no servidor
         if self._is_online():
             try:
-                response = httpx.delete(
+                response = http_client.delete(
                     f"{self.api_base}/usuarios/{usuario_uuid}",
                     timeout=5.0
                 )
@@ -488,7 +484,7 @@ class UsuarioRepository:
     
     def _soft_delete_local_usuario(self, usuario_id: int) -> bool:
         """Faz soft delete do usuário no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE usuarios 
@@ -502,7 +498,7 @@ class UsuarioRepository:
     
     def _log_change(self, entity_id: str, operation: str, data: Dict[Any, Any]):
         """Registra mudança no change_log para sincronização posterior."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO change_log (entity_type, entity_id, operation, data_json, created_at, status)
@@ -519,7 +515,7 @@ class UsuarioRepository:
     
     def _ensure_change_log_table(self):
         """Garante que a tabela change_log existe."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS change_log (
@@ -535,6 +531,7 @@ class UsuarioRepository:
             """)
             conn.commit()
     
+    @invalida_cache('usuarios')
     async def sincronizar_mudancas(self) -> Dict[str, Any]:
         """Sincroniza mudanças bidirecionalmente com o servidor."""
         print("=== INICIANDO SINCRONIZACAO BIDIRECIONAL DE USUARIOS ===")
@@ -554,7 +551,7 @@ class UsuarioRepository:
             usuarios_recebidos = 0
             usuarios_antigos_enviados = 0
             try:
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with db_connect(self.db_path) as conn:
                     cur = conn.cursor()
                     cur.execute("""
                         SELECT COUNT(*) FROM usuarios 
@@ -575,6 +572,8 @@ class UsuarioRepository:
                 usuarios_antigos_enviados = await self._sincronizar_usuarios_antigos()
             
             # FASE 3: Push - enviar mudanças pendentes
+            # Reduz as mudanças pendentes à menor operação por entidade antes do envio
+            compactar_change_log(self.db_path, 'usuarios')
             mudancas = await self._obter_mudancas_pendentes()
             mudancas_enviadas = 0
 
@@ -584,8 +583,12 @@ class UsuarioRepository:
             if len(mudancas) == 0:
                 print("Nenhuma sincronizacao necessaria para usuarios")
             else:
-                async with httpx.AsyncClient() as client:
-                    for ch in mudancas:
+                # Envio em lote; o que o servidor não confirmar segue pelo envio individual
+                lote = await enviar_em_lote(self.api_base, 'usuarios', mudancas, self.db_path,
+                                            preparar=self._preparar_mudanca_lote)
+                mudancas_enviadas += lote.enviadas
+                async with http_client.sessao_async() as client:
+                    for ch in lote.restantes:
                         try:
                             op = ch['operation']
                             data = json.loads(ch['data_json']) if ch.get('data_json') else {}
@@ -634,7 +637,7 @@ class UsuarioRepository:
                                     if srv_user and srv_user.get('uuid'):
                                         # Atualizar local por username
                                         try:
-                                            with sqlite3.connect(str(self.db_path)) as conn2:
+                                            with db_connect(self.db_path) as conn2:
                                                 cur2 = conn2.cursor()
                                                 pode_abastecer_val = 1 if srv_user.get('pode_abastecer', 0) else 0
                                                 pode_despesas_val = 1 if srv_user.get('pode_gerenciar_despesas', 0) else 0
@@ -724,25 +727,27 @@ class UsuarioRepository:
                 "mudancas_pendentes": 0
             }
     
-    async def _pull_usuarios_do_servidor(self) -> int:
-        """Busca usuários novos/atualizados do servidor e os integra localmente."""
+    @invalida_cache('usuarios')
+    async def _pull_usuarios_do_servidor(self, completo: bool = False) -> int:
+        """Busca usuários alterados no servidor desde o último pull e os integra localmente.
+
+        Sem cursor gravado (ou com completo=True) baixa todos os usuários.
+        """
         try:
-            async with httpx.AsyncClient() as client:
-                # Buscar todos os usuários do servidor
-                response = await client.get(
-                    f"{self.api_base}/usuarios/",
-                    timeout=10.0
-                )
-                
-                if response.status_code != 200:
-                    print(f"Erro ao buscar usuarios do servidor: {response.status_code}")
+            desde = None if completo else ler_cursor(self.db_path, 'usuarios')
+            async with http_client.sessao_async() as client:
+                usuarios_servidor = await baixar_alteracoes(client, f"{self.api_base}/usuarios/", desde)
+                if usuarios_servidor is None:
                     return 0
                 
-                usuarios_servidor = response.json()
-                print(f"Encontrados {len(usuarios_servidor)} usuarios no servidor")
+                print(f"Encontrados {len(usuarios_servidor)} usuarios no servidor"
+                      + (f" alterados desde {desde}" if desde else ""))
                 
                 usuarios_recebidos = 0
                 usuarios_atualizados = 0
+                falhas = 0
+                with db_connect(self.db_path) as conn:
+                    hashes = hashes_locais(conn, 'usuarios')
                 
                 for usuario_servidor in usuarios_servidor:
                     try:
@@ -761,16 +766,21 @@ class UsuarioRepository:
                                 print(f"Usuario novo inserido: {usuario_servidor['nome']}")
                         else:
                             # Usuário existe - verificar se precisa atualizar
+                            usuario_local['hash_conteudo'] = hashes.get(usuario_servidor['uuid'])
                             if self._usuario_servidor_mais_recente(usuario_local, usuario_servidor):
                                 if self._atualizar_usuario_do_servidor(usuario_local['id'], usuario_servidor):
                                     usuarios_atualizados += 1
                                     print(f"Usuario atualizado: {usuario_servidor['nome']}")
                     
                     except Exception as e:
+                        falhas += 1
                         print(f"Erro ao processar usuario {usuario_servidor.get('nome', 'N/A')}: {e}")
                 
                 total_recebidos = usuarios_recebidos + usuarios_atualizados
                 print(f"Pull de usuarios concluído: {usuarios_recebidos} novos, {usuarios_atualizados} atualizados")
+                if not falhas:
+                    gravar_cursor(self.db_path, 'usuarios', maior_updated_at(usuarios_servidor, desde),
+                                  completo=desde is None)
                 return total_recebidos
         except Exception as e:
             print(f"Erro geral na sincronizacao de usuarios: {e}")
@@ -779,7 +789,7 @@ class UsuarioRepository:
     def _inserir_usuario_do_servidor(self, usuario_servidor: Dict[str, Any]) -> bool:
         """Insere usuário do servidor no banco local."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
                 # Verificar se as colunas uuid e synced existem
@@ -825,6 +835,7 @@ class UsuarioRepository:
                         usuario_servidor.get('created_at', datetime.now().isoformat()),
                         usuario_servidor.get('updated_at', datetime.now().isoformat())
                     ))
+                    gravar_hash(conn, 'usuarios', cursor.lastrowid, hash_servidor('usuarios', usuario_servidor))
                 else:
                     cursor.execute("""
                         INSERT INTO usuarios (nome, usuario, senha, nivel, is_admin, ativo, salario,
@@ -851,6 +862,11 @@ class UsuarioRepository:
     def _usuario_servidor_mais_recente(self, usuario_local: Dict[str, Any], usuario_servidor: Dict[str, Any]) -> bool:
         """Verifica se o usuário do servidor é mais recente que o local."""
         try:
+            # Com hash gravado, conteúdo igual não é regravado (nem updated_at alterado)
+            hash_local = usuario_local.get('hash_conteudo')
+            if hash_local:
+                return hash_local != hash_servidor('usuarios', usuario_servidor)
+
             # Se não há updated_at local, considerar servidor mais recente
             if 'updated_at' not in usuario_local or not usuario_local['updated_at']:
                 return True
@@ -878,7 +894,7 @@ class UsuarioRepository:
     def _atualizar_usuario_do_servidor(self, usuario_id: int, usuario_servidor: Dict[str, Any]) -> bool:
         """Atualiza usuário local com dados do servidor."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
                 # Verificar se as colunas uuid e synced existem
@@ -928,6 +944,7 @@ class UsuarioRepository:
                         usuario_servidor.get('updated_at', datetime.now().isoformat()),
                         usuario_id
                     ))
+                    gravar_hash(conn, 'usuarios', usuario_id, hash_servidor('usuarios', usuario_servidor))
                 else:
                     cursor.execute("""
                         UPDATE usuarios SET nome = ?, usuario = ?, senha = ?, nivel = ?, is_admin = ?, ativo = ?, salario = ?,
@@ -964,7 +981,7 @@ class UsuarioRepository:
         # 1) Detectar se o servidor está vazio
         servidor_vazio = False
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client.sessao_async() as client:
                 resp = await client.get(f"{self.api_base}/usuarios/", timeout=8.0)
                 if resp.status_code == 200:
                     usuarios_srv = resp.json()
@@ -974,7 +991,7 @@ class UsuarioRepository:
 
         # 2) Selecionar usuários locais
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_connect(self.db_path)
             cursor = conn.cursor()
             if servidor_vazio:
                 print("Servidor vazio - sincronizando TODOS os usuarios locais...")
@@ -1004,7 +1021,7 @@ class UsuarioRepository:
 
         # 3) Enviar para o servidor
         enviados = 0
-        async with httpx.AsyncClient() as client:
+        async with http_client.sessao_async() as client:
             for u in usuarios_local:
                 try:
                     uid, nome, usuario_login, senha_hash, nivel, is_admin, ativo, salario, created_at, updated_at, uuid_local, synced_val = u
@@ -1117,7 +1134,7 @@ class UsuarioRepository:
     
     async def _obter_mudancas_pendentes(self) -> List[Dict[str, Any]]:
         """Obtém mudanças pendentes de usuários."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1132,7 +1149,7 @@ class UsuarioRepository:
         """Lista todos os usuários."""
         from database.database import Database
         db = Database()
-        with sqlite3.connect(db.db_path) as conn:
+        with db_connect(db.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1147,7 +1164,7 @@ class UsuarioRepository:
         """Busca usuários por nome ou nome de usuário."""
         from database.database import Database
         db = Database()
-        with sqlite3.connect(db.db_path) as conn:
+        with db_connect(db.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1159,9 +1176,16 @@ class UsuarioRepository:
             """, (f"%{termo.lower()}%", f"%{termo.lower()}%"))
             return [dict(row) for row in cursor.fetchall()]
     
+    def _preparar_mudanca_lote(self, item: Dict[str, Any]):
+        """Mesmo payload do envio individual: senha já hasheada não é reenviada."""
+        if item['operation'] == 'CREATE':
+            s = str(item['data'].get('senha', '') or '')
+            if s.startswith('pbkdf2:') or s.startswith('scrypt:') or s.startswith('$2'):
+                item['data']['senha'] = '1234'  # Backend vai hashear novamente
+
     def _mark_change_synced(self, change_id: int):
         """Marca mudança como sincronizada."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE change_log 
@@ -1,6 +1,7 @@
+import asyncio
 import sqlite3
-import httpx
 import json
+import time
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -8,6 +9,17 @@ from typing import List, Dict, Any, Optional
 import os
 import json
 from utils.migration_helper import MigrationHelper
+from database.connection_factory import connect as db_connect
+from utils.http_client import http_client
+from utils.connection_status import connection_status
+from repositories.leitura_local import LOCAL_PRIMEIRO, modo_leitura, revalidador
+from database.compactacao_change_log import compactar_change_log
+from repositories.push_lote import enviar_em_lote
+from database.periodos import filtro_periodo
+from database.schema_cache import schema_cache
+from database.sync_cursor import ErroDownload, baixar_em_lotes, gravar_cursor, ler_cursor, maior_updated_at
+from repositories.reconciliacao import espelho_servidor
+from repositories.ingestao_vendas import TAMANHO_LOTE_VENDAS, IngestaoVendas
 
 class VendaRepository:
     def __init__(self, backend_url: str = None):
@@ -23,7 +35,7 @@ class VendaRepository:
     def _get_usuario_uuid_by_id(self, local_usuario_id):
         """Busca o UUID de um usuário pelo ID local."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cur = conn.cursor()
                 # Espera-se que a tabela usuarios tenha coluna 'uuid'
@@ -41,7 +53,7 @@ class VendaRepository:
     def _buscar_usuario_por_uuid(self, uuid_str):
         """Busca o ID local de um usuário pelo UUID."""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cur = conn.cursor()
                 cur.execute("SELECT id FROM usuarios WHERE uuid = ?", (uuid_str,))
@@ -63,7 +75,7 @@ class VendaRepository:
         Preferir admin; caso contrário, o primeiro usuário disponível; fallback para 1.
         """
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cur = conn.cursor()
                 # Tentar admin
@@ -115,49 +127,11 @@ class VendaRepository:
     
     def _is_online(self) -> bool:
         """Verifica se o backend está online (versão síncrona)."""
-        try:
-            # Usar URL base sem /api para healthcheck
-            base_url = self.backend_url.replace('/api', '')
-            healthcheck_url = f"{base_url}/healthz"
-            response = httpx.get(healthcheck_url, timeout=3.0)
-            is_online = response.status_code == 200
-            print(f"🔗 Status conexão: {'ONLINE' if is_online else 'OFFLINE'} - {healthcheck_url}")
-            return is_online
-        except Exception as e:
-            print(f"❌ Erro ao verificar conexão: {e}")
-            return False
+        return connection_status.verificar_sync(self.backend_url)
     
     async def is_backend_online(self) -> bool:
         """Versão assíncrona para verificar se o backend está online."""
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
-                    # Tenta healthz na base informada
-                    try:
-                        r1 = await client.get(f"{self.backend_url}/healthz")
-                        if r1.status_code == 200:
-                            return True
-                    except Exception:
-                        pass
-
-                    # Fallback sem /api quando aplicável
-                    if self.backend_url.endswith('/api'):
-                        base_url = self.backend_url[:-4]
-                        try:
-                            r2 = await client.get(f"{base_url}/healthz")
-                            if r2.status_code == 200:
-                                return True
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-
-            if attempt < max_retries - 1:
-                import asyncio
-                await asyncio.sleep(1)
-
-        return False
+        return await connection_status.verificar(self.backend_url)
     
     def _ensure_migration(self):
         """Garante que as colunas de sincronização existam na tabela vendas."""
@@ -173,7 +147,7 @@ class VendaRepository:
         """Obtém todas as vendas (híbrido: servidor primeiro, fallback local)."""
         if self._is_online():
             try:
-                response = httpx.get(f"{self.api_base}/vendas/", timeout=5.0)
+                response = http_client.get(f"{self.api_base}/vendas/", timeout=5.0)
                 if response.status_code == 200:
                     return response.json()
             except Exception as e:
@@ -184,7 +158,7 @@ class VendaRepository:
     
     def _get_all_local(self) -> List[Dict[str, Any]]:
         """Obtém todas as vendas do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -204,7 +178,7 @@ class VendaRepository:
                 # Buscar UUID da venda local
                 venda_local = self._get_local_venda_by_id(venda_id)
                 if venda_local and venda_local.get('uuid'):
-                    response = httpx.get(
+                    response = http_client.get(
                         f"{self.api_base}/vendas/{venda_local['uuid']}", 
                         timeout=5.0
                     )
@@ -218,7 +192,7 @@ class VendaRepository:
     
     def _get_local_venda_by_id(self, venda_id: int) -> Optional[Dict[str, Any]]:
         """Obtém venda por ID do banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -252,7 +226,7 @@ class VendaRepository:
                         venda_data['usuario_id'] = None
                 except Exception:
                     venda_data['usuario_id'] = None
-                response = httpx.post(
+                response = http_client.post(
                     f"{self.api_base}/vendas/",
                     json=venda_data,
                     timeout=5.0
@@ -280,7 +254,7 @@ class VendaRepository:
     
     def _create_local_venda(self, venda_data: Dict[str, Any]) -> Dict[str, Any]:
         """Cria venda no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO vendas (usuario_id, total, forma_pagamento, valor_recebido, 
@@ -324,7 +298,7 @@ class VendaRepository:
         # Tentar atualizar no servidor
         if self._is_online():
             try:
-                response = httpx.put(
+                response = http_client.put(
                     f"{self.api_base}/vendas/{venda_uuid}",
                     json=venda_data,
                     timeout=5.0
@@ -352,7 +326,7 @@ class VendaRepository:
     
     def _update_local_venda(self, venda_id: int, venda_data: Dict[str, Any]) -> Dict[str, Any]:
         """Atualiza venda no banco local."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE vendas 
@@ -393,7 +367,7 @@ class VendaRepository:
         # Tentar deletar no servidor
         if self._is_online():
             try:
-                response = httpx.delete(
+                response = http_client.delete(
                     f"{self.api_base}/vendas/{venda_uuid}",
                     timeout=5.0
                 )
@@ -429,7 +403,7 @@ class VendaRepository:
         updated_remote = False
         if self._is_online() and venda_uuid:
             try:
-                resp = httpx.put(
+                resp = http_client.put(
                     f"{self.api_base}/vendas/{venda_uuid}",
                     json={"cancelada": True},
                     timeout=10.0
@@ -441,7 +415,7 @@ class VendaRepository:
                 print(f"[VENDAS][CANCELAR] Erro ao cancelar no servidor: {e}")
 
         # Atualizar localmente sempre
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -469,7 +443,7 @@ class VendaRepository:
     
     def _soft_delete_local_venda(self, venda_id: int) -> bool:
         """Soft delete da venda (marca como cancelada)."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE vendas 
@@ -485,7 +459,7 @@ class VendaRepository:
     
     def _log_change(self, entity_id: str, operation: str, data: Dict[Any, Any]):
         """Registra mudança no change_log para sincronização posterior."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO change_log (entity_type, entity_id, operation, data_json, created_at, status)
@@ -502,7 +476,7 @@ class VendaRepository:
     
     def _ensure_change_log_table(self):
         """Garante que a tabela change_log existe."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS change_log (
@@ -536,7 +510,7 @@ class VendaRepository:
             # Heurística PUSH-first: se há vendas locais pendentes, empurra primeiro
             pendentes = 0
             try:
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with db_connect(self.db_path) as conn:
                     cur = conn.cursor()
                     cur.execute("""
                         SELECT COUNT(*) FROM vendas 
@@ -555,6 +529,8 @@ class VendaRepository:
                 vendas_antigas_enviadas = await self._sincronizar_vendas_antigas()
             
             # FASE 3: Push - enviar mudanças pendentes
+            # Reduz as mudanças pendentes à menor operação por entidade antes do envio
+            compactar_change_log(self.db_path, 'vendas')
             mudancas = await self._obter_mudancas_pendentes()
             mudancas_enviadas = 0
             
@@ -564,8 +540,12 @@ class VendaRepository:
             if len(mudancas) == 0:
                 print("Nenhuma sincronizacao necessaria para vendas")
             else:
-                async with httpx.AsyncClient() as client:
-                    for ch in mudancas:
+                # Envio em lote; o que o servidor não confirmar segue pelo envio individual
+                lote = await enviar_em_lote(self.api_base, 'vendas', mudancas, self.db_path,
+                                            preparar=self._preparar_mudanca_lote)
+                mudancas_enviadas += lote.enviadas
+                async with http_client.sessao_async() as client:
+                    for ch in lote.restantes:
                         try:
                             op = ch['operation']
                             data = json.loads(ch['data_json']) if ch.get('data_json') else {}
@@ -634,161 +614,92 @@ class VendaRepository:
                 "mudancas_pendentes": 0
             }
     
-    async def _pull_vendas_do_servidor(self) -> int:
-        """Busca vendas do servidor e atualiza localmente."""
+    async def _pull_vendas_do_servidor(self, completo: bool = False) -> int:
+        """Busca vendas alteradas no servidor desde o último pull e atualiza localmente.
+
+        Sem cursor gravado (ou com completo=True) baixa todas as vendas. A
+        gravação é feita em lote (ver repositories/ingestao_vendas).
+        """
         print("FASE 1: Buscando vendas do servidor...")
-        recebidas = 0
+        falhas = 0
         self._last_missing_products = set()
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(f"{self.api_base}/vendas/", timeout=10.0)
-                if resp.status_code != 200:
-                    print(f"[VENDAS][PULL] Erro HTTP {resp.status_code}: {resp.text}")
-                    return 0
-
-                vendas_srv = resp.json() or []
-                print(f"[VENDAS][PULL] Encontradas {len(vendas_srv)} vendas no servidor")
-
-                with sqlite3.connect(str(self.db_path)) as conn:
-                    conn.row_factory = sqlite3.Row
+            desde = None if completo else ler_cursor(self.db_path, 'vendas')
+            marca = desde
+            total_srv = 0
+            tempos = {'prefetch': 0.0, 'download': 0.0, 'gravacao': 0.0}
+            async with http_client.sessao_async() as client:
+                with db_connect(self.db_path) as conn:
                     cur = conn.cursor()
 
-                    # Garantir colunas uuid/synced em vendas
+                    # Garantir colunas uuid/synced/hash_conteudo em vendas
                     try:
-                        cur.execute("PRAGMA table_info(vendas)")
-                        cols = [c[1] for c in cur.fetchall()]
-                        if 'uuid' not in cols:
-                            cur.execute("ALTER TABLE vendas ADD COLUMN uuid TEXT")
-                        if 'synced' not in cols:
-                            cur.execute("ALTER TABLE vendas ADD COLUMN synced INTEGER DEFAULT 0")
-                        conn.commit()
+                        cols = schema_cache.colunas(self.db_path, 'vendas', conn)
+                        faltantes = [c for c in ('uuid', 'synced', 'hash_conteudo') if c not in cols]
+                        if faltantes:
+                            if 'uuid' in faltantes:
+                                cur.execute("ALTER TABLE vendas ADD COLUMN uuid TEXT")
+                            if 'synced' in faltantes:
+                                cur.execute("ALTER TABLE vendas ADD COLUMN synced INTEGER DEFAULT 0")
+                            if 'hash_conteudo' in faltantes:
+                                cur.execute("ALTER TABLE vendas ADD COLUMN hash_conteudo TEXT")
+                            conn.commit()
+                            schema_cache.invalidar(self.db_path, 'vendas')
                     except Exception as mig_e:
                         print(f"[VENDAS][PULL] Aviso ao garantir colunas: {mig_e}")
 
-                    for v in vendas_srv:
-                        try:
-                            venda_uuid = (v.get('uuid') or v.get('id') or '').strip()
-                            if not venda_uuid:
-                                print("[VENDAS][PULL] Venda sem UUID/ID - ignorando")
-                                continue
-
-                            # Checar se existe localmente por UUID (sem depender de updated_at)
-                            cur.execute("SELECT id FROM vendas WHERE uuid = ?", (venda_uuid,))
-                            row = cur.fetchone()
+                    inicio = time.perf_counter()
+                    ingestao = IngestaoVendas(conn, self._get_default_usuario_id)
+                    ingestao.carregar()
+                    tempos['prefetch'] = (time.perf_counter() - inicio) * 1000
 
-                            # Preparar campos principais (com defaults e normalizações)
-                            data_venda = v.get('data_venda') or datetime.now().isoformat()
-                            total = float(v.get('total') or 0.0)
-                            forma_pagamento = v.get('forma_pagamento') or 'Dinheiro'
-                            valor_recebido = float(v.get('valor_recebido') or 0.0)
-                            troco = float(v.get('troco') or 0.0)
-                            status = v.get('status') or 'concluida'
-                            motivo_alteracao = v.get('motivo_alteracao') or ''
-                            alterado_por = v.get('alterado_por')
-                            data_alteracao = v.get('data_alteracao')
-                            origem = v.get('origem') or 'servidor'
-                            valor_original_divida = float(v.get('valor_original_divida') or 0.0)
-                            desconto_aplicado_divida = float(v.get('desconto', v.get('desconto_aplicado_divida') or 0.0))
-                            # Tratar usuario_id que pode vir como UUID string do servidor
-                            usuario_id_raw = v.get('usuario_id') or 0
-                            if isinstance(usuario_id_raw, str) and len(usuario_id_raw) > 10:
-                                # É um UUID string, buscar o ID local correspondente
-                                usuario_id_local = self._buscar_usuario_por_uuid(usuario_id_raw) or self._get_default_usuario_id()
-                            else:
-                                # É um ID numérico ou vazio
-                                try:
-                                    usuario_id_local = int(usuario_id_raw) or self._get_default_usuario_id()
-                                except (ValueError, TypeError):
-                                    usuario_id_local = self._get_default_usuario_id()
+                    # Vendas guardadas por falta de produto que agora podem ser completadas
+                    if ingestao.reaplicar_incompletas():
+                        print(f"[VENDAS][PULL] {ingestao.stats['reaplicadas']} vendas incompletas refeitas")
 
-                            if row is None:
-                                # Inserir venda nova
-                                cur.execute(
-                                    """
-                                    INSERT INTO vendas (
-                                        usuario_id, total, forma_pagamento, valor_recebido, troco,
-                                        data_venda, status, motivo_alteracao, alterado_por, data_alteracao,
-                                        origem, valor_original_divida, desconto_aplicado_divida, uuid, synced
-                                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
-                                    """,
-                                    (
-                                        usuario_id_local, total, forma_pagamento, valor_recebido, troco,
-                                        data_venda, status, motivo_alteracao, alterado_por, data_alteracao,
-                                        origem, valor_original_divida, desconto_aplicado_divida, venda_uuid
-                                    )
-                                )
-                                venda_id_local = cur.lastrowid
-                                conn.commit()
-                                recebidas += 1
-                            else:
-                                # Atualizar venda existente
-                                venda_id_local = row['id']
-                                cur.execute(
-                                    """
-                                    UPDATE vendas SET
-                                        usuario_id = ?, total = ?, forma_pagamento = ?, valor_recebido = ?, troco = ?,
-                                        status = ?, motivo_alteracao = ?, alterado_por = ?, data_alteracao = ?,
-                                        origem = ?, valor_original_divida = ?, desconto_aplicado_divida = ?, synced = 1
-                                    WHERE id = ?
-                                    """,
-                                    (
-                                        usuario_id_local, total, forma_pagamento, valor_recebido, troco,
-                                        status, motivo_alteracao, alterado_por, data_alteracao,
-                                        origem, valor_original_divida, desconto_aplicado_divida, venda_id_local
-                                    )
-                                )
-                                conn.commit()
-
-                            # Itens da venda
-                            itens = v.get('itens') or []
-
-                            # Limpar itens antigos e re-inserir (idempotente por uuid)
-                            try:
-                                cur.execute("DELETE FROM itens_venda WHERE venda_id = ?", (venda_id_local,))
-                            except Exception as di_e:
-                                print(f"[VENDAS][PULL] Aviso ao limpar itens: {di_e}")
-
-                            for it in itens:
-                                try:
-                                    prod_uuid = str(it.get('produto_id') or '').strip()
-                                    if not prod_uuid:
-                                        continue
-                                    # Mapear produto UUID -> ID local
-                                    cur.execute("SELECT id FROM produtos WHERE uuid = ?", (prod_uuid,))
-                                    prod_row = cur.fetchone()
-                                    if not prod_row:
-                                        # Produto não existe localmente; pular item (ou poderia criar placeholder)
-                                        print(f"[VENDAS][PULL] Produto {prod_uuid} não encontrado localmente - pulando item")
-                                        try:
-                                            self._last_missing_products.add(prod_uuid)
-                                        except Exception:
-                                            pass
-                                        continue
-                                    produto_id_local = prod_row['id']
+                    # Lotes aplicados à medida que chegam: a resposta inteira nunca fica em memória
+                    try:
+                        inicio = time.perf_counter()
+                        async for lote in baixar_em_lotes(client, f"{self.api_base}/vendas/", desde,
+                                                          tamanho_lote=TAMANHO_LOTE_VENDAS):
+                            tempos['download'] += (time.perf_counter() - inicio) * 1000
+                            espelho_servidor.registrar(self.api_base, 'vendas', lote,
+                                                       completo=desde is None and not total_srv)
+                            total_srv += len(lote)
+                            marca = maior_updated_at(lote, marca)
 
-                                    quantidade = int(it.get('quantidade') or 0) or 1
-                                    preco_unitario = float(it.get('preco_unitario') or 0.0)
-                                    subtotal = float(it.get('subtotal') or 0.0)
-                                    peso_kg = float(it.get('peso_kg') or 0.0)
+                            inicio = time.perf_counter()
+                            ingestao.aplicar(lote)
+                            tempos['gravacao'] += (time.perf_counter() - inicio) * 1000
+                            inicio = time.perf_counter()
+                    except ErroDownload:
+                        falhas += 1
+                        if desde is None:
+                            # Espelho parcial não serve como estado completo do servidor
+                            espelho_servidor.invalidar('vendas')
 
-                                    cur.execute(
-                                        """
-                                        INSERT INTO itens_venda (
-                                            venda_id, produto_id, quantidade, preco_unitario, preco_custo_unitario, subtotal, peso_kg
-                                        ) VALUES (?, ?, ?, ?, COALESCE((SELECT preco_custo FROM produtos WHERE id = ?), 0), ?, ?)
-                                        """,
-                                        (
-                                            venda_id_local, produto_id_local, quantidade, preco_unitario, produto_id_local, subtotal, peso_kg
-                                        )
-                                    )
-                                except Exception as it_e:
-                                    print(f"[VENDAS][PULL] Erro ao inserir item da venda {venda_uuid}: {it_e}")
-
-                            conn.commit()
-                        except Exception as v_e:
-                            print(f"[VENDAS][PULL] Erro ao processar venda {v.get('uuid', 'N/A')}: {v_e}")
+                    try:
+                        ingestao.gravar_incompletas()
+                    except Exception as e:
+                        falhas += 1
+                        print(f"[VENDAS][PULL] Falha ao guardar vendas incompletas: {e}")
 
-                print(f"[VENDAS][PULL] Concluído. Vendas novas/atualizadas: {recebidas}")
+                stats = ingestao.stats
+                falhas += stats['falhas']
+                self._last_missing_products = ingestao.produtos_ausentes
+                recebidas = stats['inseridas'] + stats['atualizadas']
+                if ingestao.total_incompletas():
+                    print(f"[VENDAS][PULL] {ingestao.total_incompletas()} vendas aguardando produtos ausentes")
+                if desde is None and not total_srv and not falhas:
+                    espelho_servidor.registrar(self.api_base, 'vendas', [], completo=True)
+                print(f"[VENDAS][PULL] Recebidas {total_srv} vendas do servidor"
+                      + (f" alteradas desde {desde}" if desde else ""))
+                print(f"[VENDAS][PULL] Concluído. Novas: {stats['inseridas']}, atualizadas: {stats['atualizadas']}, "
+                      f"inalteradas: {stats['inalteradas']}, itens: {stats['itens']}, falhas: {stats['falhas']}")
+                print("[VENDAS][PULL] " + " | ".join(f"{fase}: {ms:.1f} ms" for fase, ms in tempos.items()))
+                # Vendas com produto ausente não seguram a marca: ficam em vendas_incompletas
+                if not falhas:
+                    gravar_cursor(self.db_path, 'vendas', marca, completo=desde is None)
                 return recebidas
 
         except Exception as e:
@@ -802,7 +713,7 @@ class VendaRepository:
         
         # Verificar se há vendas locais não sincronizadas (incluindo bulk sync)
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = db_connect(self.db_path)
             cursor = conn.cursor()
             
             # Primeiro verificar se há vendas nunca sincronizadas (bulk sync)
@@ -835,7 +746,7 @@ class VendaRepository:
             print(f"Encontradas {len(vendas_nao_sync)} vendas nao sincronizadas")
             
             enviados = 0
-            async with httpx.AsyncClient() as client:
+            async with http_client.sessao_async() as client:
                 for venda in vendas_nao_sync:
                     try:
                         # Buscar itens da venda
@@ -1032,7 +943,7 @@ class VendaRepository:
             print(f"Erro na sincronizacao de vendas antigas: {e}")
             return 0
             
-            async with httpx.AsyncClient() as client:
+            async with http_client.sessao_async() as client:
                 for mudanca in mudancas:
                     try:
                         print(f"Processando mudanca {mudanca['operation']} para venda {mudanca['entity_id']}")
@@ -1094,7 +1005,7 @@ class VendaRepository:
     
     async def _obter_mudancas_pendentes(self) -> List[Dict[str, Any]]:
         """Obtém mudanças pendentes de vendas."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1105,9 +1016,14 @@ class VendaRepository:
             """)
             return [dict(row) for row in cursor.fetchall()]
     
+    def _preparar_mudanca_lote(self, item: Dict[str, Any]):
+        """Mesmo mapeamento do envio individual: usuario_id local -> uuid."""
+        if item['operation'] != 'DELETE':
+            item['data']['usuario_id'] = self._get_user_uuid(item['data'].get('usuario_id')) or None
+
     def _mark_change_synced(self, change_id: int):
         """Marca mudança como sincronizada."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE change_log 
@@ -1118,32 +1034,44 @@ class VendaRepository:
     
     def get_vendas_periodo(self, data_inicio: str, data_fim: str) -> List[Dict[str, Any]]:
         """Obtém vendas por período."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute("""
+            filtro, params = filtro_periodo('data_venda', data_inicio, data_fim)
+            cursor.execute(f"""
                 SELECT * FROM vendas 
-                WHERE DATE(data_venda) BETWEEN ? AND ?
+                WHERE {filtro}
                 AND status != 'cancelada'
                 ORDER BY data_venda DESC
-            """, (data_inicio, data_fim))
+            """, params)
             return [dict(row) for row in cursor.fetchall()]
     
     def get_total_vendas_hoje(self) -> float:
         """Obtém total de vendas do dia atual."""
-        hoje = datetime.now().strftime('%Y-%m-%d')
-        with sqlite3.connect(str(self.db_path)) as conn:
+        filtro, params = filtro_periodo('data_venda', datetime.now())
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT COALESCE(SUM(total), 0) as total
                 FROM vendas 
-                WHERE DATE(data_venda) = ? AND status != 'cancelada'
-            """, (hoje,))
+                WHERE {filtro} AND status != 'cancelada'
+            """, params)
             result = cursor.fetchone()
             return result[0] if result else 0.0
     
+    def _revalidar_em_segundo_plano(self):
+        """Pull incremental de vendas em segundo plano (leitura local-primeiro)."""
+        def atualizar():
+            if not self._is_online():
+                return 0
+            return asyncio.run(self._pull_vendas_do_servidor())
+        revalidador.revalidar('vendas', atualizar)
+
     def get_vendas_com_detalhes(self, data_inicio: str, data_fim: str, usuario_id: int = None, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
-        """Obtém vendas com detalhes, priorizando dados do servidor se online."""
+        """Obtém vendas com detalhes (local primeiro, ver repositories/leitura_local)."""
+        if modo_leitura() == LOCAL_PRIMEIRO:
+            self._revalidar_em_segundo_plano()
+            return self._get_vendas_locais_com_detalhes(data_inicio, data_fim, usuario_id, limit, offset)
         print(f"🔍 Buscando vendas de {data_inicio} a {data_fim}, usuário: {usuario_id}")
         
         # Tentar buscar do servidor primeiro se online
@@ -1188,7 +1116,7 @@ class VendaRepository:
                 
             url = f"{self.api_base}/vendas/periodo"
             print(f"📡 Buscando vendas por período: {url} - {params}")
-            response = httpx.get(url, params=params, timeout=10.0)
+            response = http_client.get(url, params=params, timeout=10.0)
             if response.status_code == 200:
                 vendas = response.json()
                 print(f"✅ {len(vendas)} vendas do período recebidas do servidor")
@@ -1213,7 +1141,7 @@ class VendaRepository:
                 
             url = f"{self.backend_url}/api/vendas/usuario/{usuario_id}"
             print(f"📡 Buscando vendas do usuário {usuario_id}: {url} - {params}")
-            response = httpx.get(url, params=params, timeout=10.0)
+            response = http_client.get(url, params=params, timeout=10.0)
             if response.status_code == 200:
                 vendas = response.json()
                 print(f"✅ {len(vendas)} vendas do usuário {usuario_id} recebidas do servidor")
@@ -1227,14 +1155,12 @@ class VendaRepository:
     
     def _get_vendas_locais_com_detalhes(self, data_inicio: str, data_fim: str, usuario_id: int = None, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
         """Obtém vendas locais com detalhes incluindo informações do usuário."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Verificar se a coluna status existe
-            cursor.execute("PRAGMA table_info(vendas)")
-            colunas = cursor.fetchall()
-            tem_status = any(col[1] == 'status' for col in colunas)
+            tem_status = schema_cache.tem_coluna(self.db_path, 'vendas', 'status', conn)
             
             # Construir query base
             if tem_status:
@@ -1243,6 +1169,7 @@ class VendaRepository:
                 status_sql = "'Ativa' as status"
             
             # Query base - incluir campos data e hora separados para compatibilidade
+            filtro, params_periodo = filtro_periodo('v.data_venda', data_inicio, data_fim)
             query = f"""
                 SELECT 
                     v.id,
@@ -1257,10 +1184,10 @@ class VendaRepository:
                     'Sem itens' as itens
                 FROM vendas v
                 LEFT JOIN usuarios u ON v.usuario_id = u.id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE {filtro}
             """
             
-            params = [data_inicio, data_fim]
+            params = list(params_periodo)
             
             # Filtrar por usuário se especificado
             if usuario_id is not None:
@@ -1331,7 +1258,7 @@ class VendaRepository:
         if not vendedor and usuario_id:
             # Buscar nome local pelo uuid como fallback
             try:
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with db_connect(self.db_path) as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
                     cursor.execute("SELECT nome FROM usuarios WHERE uuid = ?", (str(usuario_id),))
@@ -1359,15 +1286,16 @@ class VendaRepository:
     
     def count_vendas_periodo(self, data_inicio: str, data_fim: str, usuario_id: int = None) -> int:
         """Conta total de vendas no período."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            query = """
+            filtro, params_periodo = filtro_periodo('v.data_venda', data_inicio, data_fim)
+            query = f"""
                 SELECT COUNT(*) as total
                 FROM vendas v
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE {filtro}
             """
-            params = [data_inicio, data_fim]
+            params = list(params_periodo)
             
             if usuario_id is not None:
                 query += " AND v.usuario_id = ?"
@@ -1418,12 +1346,13 @@ class VendaRepository:
     
     def _get_vendas_usuario_locais_com_itens(self, usuario_id: int, data_inicio: str, data_fim: str, status_filter: str = None) -> List[Dict[str, Any]]:
         """Obtém vendas locais de um usuário com itens."""
-        with sqlite3.connect(str(self.db_path)) as conn:
+        with db_connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Query para buscar vendas com itens
-            query = """
+            filtro, params_periodo = filtro_periodo('v.data_venda', data_inicio, data_fim)
+            query = f"""
                 SELECT 
                     v.id,
                     DATE(v.data_venda) as data,
@@ -1439,11 +1368,11 @@ class VendaRepository:
                 JOIN itens_venda iv ON iv.venda_id = v.id
                 JOIN produtos p ON p.id = iv.produto_id
                 WHERE v.usuario_id = ?
-                AND DATE(v.data_venda) BETWEEN ? AND ?
+                AND {filtro}
                 AND (v.status IS NULL OR v.status != 'Anulada')
             """
             
-            params = [usuario_id, data_inicio, data_fim]
+            params = [usuario_id, *params_periodo]
             
             # Aplicar filtro de status
             if status_filter == "Não Fechadas":
@@ -2,6 +2,7 @@
 Script para forçar reconciliação de estoque usando PATCH em vez de PUT
 """
 import os
+import sys
 import json
 import httpx
 import sqlite3
@@ -10,6 +11,10 @@ import platform
 
 # Resolve backend URL
 ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from database.connection_factory import connect as db_connect
+
 config_path = ROOT / "config.json"
 backend_url = os.getenv("BACKEND_URL", "http://localhost:8000")
 if config_path.exists():
@@ -41,7 +46,7 @@ def fetch_server_products():
 def fetch_local_products():
     """Busca produtos locais"""
     rows = []
-    with sqlite3.connect(str(db_path)) as conn:
+    with db_connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         cur = conn.cursor()
         cur.execute("""
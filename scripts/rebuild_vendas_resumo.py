@@ -0,0 +1,27 @@
+"""
+Reconstrói a tabela vendas_resumo_diario a partir do histórico de vendas.
+
+Uso:
+  python scripts/rebuild_vendas_resumo.py
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from database.database import Database
+
+
+def main():
+    db = Database()
+    print(f"Banco local: {db.db_path}")
+    linhas = db.reconstruir_resumo_vendas()
+    resumo = db.get_resumo_vendas()
+    print(f"Concluído. Linhas no resumo: {linhas} | Vendas: {resumo['num_vendas']} | "
+          f"Total: MT {resumo['total_bruto']:.2f} | Lucro: MT {resumo['lucro']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -176,8 +176,9 @@ def reconciliar(backend_url: str, limit: Optional[int], dry_run: bool, timeout:
     print(f"[RECONCILIAR] Banco local: {db_path}")
     print(f"[RECONCILIAR] Backend: {backend_url}")
     api_base = _make_api_base(backend_url)
+    from database.connection_factory import connect as db_connect
 
-    with sqlite3.connect(db_path) as conn:
+    with db_connect(db_path) as conn:
         if listar:
             _listar_resumo(conn, limit)
             return
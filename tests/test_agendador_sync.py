@@ -0,0 +1,80 @@
+"""
+Testes do agendador da sincronização por grafo de dependências.
+"""
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.agendador_sync import Etapa, executar_etapas, formatar_relatorio
+
+
+class TestAgendadorSync(unittest.TestCase):
+    """Testes para agendador_sync"""
+
+    def _etapa(self, nome, espera, log, depende_de=(), falhar=False):
+        async def executar():
+            log.append(('inicio', nome))
+            await asyncio.sleep(espera)
+            log.append(('fim', nome))
+            if falhar:
+                raise RuntimeError('falhou')
+            return nome
+        return Etapa(nome, executar, depende_de)
+
+    def test_dependencias_e_concorrencia(self):
+        """Independentes rodam juntas; vendas espera produtos e usuários"""
+        log = []
+        relatorio = asyncio.run(executar_etapas([
+            self._etapa('produtos', 0.05, log),
+            self._etapa('usuarios', 0.01, log),
+            self._etapa('clientes', 0.01, log),
+            self._etapa('vendas', 0.01, log, depende_de=('produtos', 'usuarios')),
+        ], limite=3))
+
+        inicio_vendas = log.index(('inicio', 'vendas'))
+        self.assertLess(log.index(('fim', 'produtos')), inicio_vendas)
+        self.assertLess(log.index(('fim', 'usuarios')), inicio_vendas)
+        # As três independentes começaram antes de qualquer uma terminar
+        self.assertEqual({e for _, e in log[:3]}, {'produtos', 'usuarios', 'clientes'})
+
+        self.assertEqual(relatorio['caminho_critico'], ['produtos', 'vendas'])
+        self.assertLess(relatorio['total_ms'], relatorio['soma_etapas_ms'])
+        self.assertEqual(relatorio['resultados']['vendas'], 'vendas')
+        self.assertIn('produtos -> vendas', formatar_relatorio(relatorio))
+
+    def test_limite_de_concorrencia(self):
+        """Com limite 1 nunca há duas etapas em execução"""
+        log = []
+        asyncio.run(executar_etapas(
+            [self._etapa(n, 0.005, log) for n in ('a', 'b', 'c')], limite=1
+        ))
+        for i in range(0, len(log), 2):
+            self.assertEqual(log[i][0], 'inicio')
+            self.assertEqual(log[i + 1], ('fim', log[i][1]))
+
+    def test_falha_nao_bloqueia_dependentes(self):
+        """Erro numa etapa fica no relatório e as dependentes ainda rodam"""
+        log = []
+        relatorio = asyncio.run(executar_etapas([
+            self._etapa('produtos', 0, log, falhar=True),
+            self._etapa('vendas', 0, log, depende_de=('produtos',)),
+        ]))
+        self.assertEqual(relatorio['etapas']['produtos']['status'], 'erro')
+        self.assertEqual(relatorio['etapas']['vendas']['status'], 'ok')
+        self.assertIsInstance(relatorio['resultados']['produtos'], RuntimeError)
+
+    def test_grafo_invalido(self):
+        """Dependência inexistente ou circular é rejeitada antes de executar"""
+        async def nada():
+            return None
+        with self.assertRaises(ValueError):
+            asyncio.run(executar_etapas([Etapa('vendas', nada, ('produtos',))]))
+        with self.assertRaises(ValueError):
+            asyncio.run(executar_etapas([Etapa('a', nada, ('b',)), Etapa('b', nada, ('a',))]))
+
+
+if __name__ == '__main__':
+    unittest.main()
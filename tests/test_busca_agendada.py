@@ -0,0 +1,58 @@
+"""
+Testes da busca com debounce do PDV.
+"""
+import unittest
+import threading
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.busca_agendada import BuscaAgendada
+
+
+class TestBuscaAgendada(unittest.TestCase):
+    """Testes para BuscaAgendada"""
+
+    def setUp(self):
+        self.executadas = []
+        self.concluiu = threading.Event()
+
+        def executar(termo, geracao):
+            self.executadas.append(termo)
+            self.concluiu.set()
+
+        self.busca = BuscaAgendada(executar, janela=0.05)
+
+    def test_teclas_rapidas_executam_uma_vez(self):
+        """Só o último termo digitado dentro da janela é buscado"""
+        for i in range(1, 14):
+            self.busca.agendar('7891000000000'[:i])
+        self.assertTrue(self.concluiu.wait(2))
+        self.assertEqual(self.executadas, ['7891000000000'])
+        stats = self.busca.get_stats()
+        self.assertEqual(stats['agendadas'], 13)
+        self.assertEqual(stats['executadas'], 1)
+
+    def test_agora_cancela_pedido_em_espera(self):
+        """A busca imediata substitui a agendada"""
+        self.busca.agendar('arr')
+        self.busca.agora('arroz')
+        self.assertEqual(self.executadas, ['arroz'])
+        self.concluiu.clear()
+        self.assertFalse(self.concluiu.wait(0.15))
+        self.assertEqual(self.executadas, ['arroz'])
+
+    def test_geracao_obsoleta(self):
+        """Uma busca em andamento fica obsoleta quando outra é pedida"""
+        geracoes = []
+        busca = BuscaAgendada(lambda termo, geracao: geracoes.append(geracao))
+        busca.agora('a')
+        self.assertFalse(busca.obsoleta(geracoes[0]))
+        busca.agendar('ab')
+        self.assertTrue(busca.obsoleta(geracoes[0]))
+        busca.cancelar()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Testes da busca de produtos com FTS5.
+"""
+import unittest
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.busca_produtos import criar_busca_produtos, expressao_fts, filtrar_por_termo, juncao_fts
+from database.database import Database
+
+
+class _BancoBusca:
+    """Só o necessário do Database para buscar_produto_por_codigo_ou_nome."""
+
+    buscar_produto_por_codigo_ou_nome = Database.buscar_produto_por_codigo_ou_nome
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def tem_busca_fts(self):
+        return True
+
+    def fetchone(self, sql, params=(), dictionary=False):
+        cursor = self.conn.execute(sql, params)
+        linha = cursor.fetchone()
+        return dict(zip([c[0] for c in cursor.description], linha)) if linha else None
+
+
+class TestBuscaProdutos(unittest.TestCase):
+    """Testes para produtos_fts"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.executescript("""
+            CREATE TABLE produtos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, codigo TEXT, nome TEXT, descricao TEXT,
+                ativo INTEGER DEFAULT 1, categoria_id INTEGER
+            );
+            CREATE TABLE categorias (id INTEGER PRIMARY KEY, nome TEXT);
+            INSERT INTO produtos (codigo, nome, descricao) VALUES
+                ('7891000', 'Açúcar Branco', 'Mercearia'),
+                ('AB-12', 'Arroz Agulha', 'Grão longo');
+        """)
+        if not criar_busca_produtos(self.conn.cursor()):
+            self.skipTest("SQLite sem FTS5")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _buscar(self, termo):
+        juncao, condicao, ordem, params = juncao_fts(termo)
+        return [linha[0] for linha in self.conn.execute(f"""
+            SELECT p.nome FROM produtos p {juncao}
+            WHERE {condicao} AND p.ativo = 1 ORDER BY {ordem}
+        """, params)]
+
+    def test_expressao(self):
+        """Cada palavra vira um prefixo; pontuação é descartada"""
+        self.assertEqual(expressao_fts('arr "ag'), '"arr"* "ag"*')
+        self.assertEqual(expressao_fts('  '), '')
+
+    def test_historico_indexado_e_sem_acentos(self):
+        """Produtos existentes entram no índice; acentos e caixa são ignorados"""
+        self.assertEqual(self._buscar('acucar'), ['Açúcar Branco'])
+        self.assertEqual(self._buscar('ARR agu'), ['Arroz Agulha'])
+        self.assertEqual(self._buscar('ab-12'), ['Arroz Agulha'])
+        self.assertEqual(self._buscar('7891'), ['Açúcar Branco'])
+
+    def test_triggers_mantem_indice(self):
+        """Inserção, edição e exclusão refletem no índice"""
+        self.conn.execute("INSERT INTO produtos (codigo, nome, descricao) VALUES ('99', 'Feijão', 'Grão')")
+        self.assertEqual(self._buscar('feij'), ['Feijão'])
+
+        self.conn.execute("UPDATE produtos SET nome = 'Feijão Manteiga' WHERE codigo = '99'")
+        self.assertEqual(self._buscar('mant'), ['Feijão Manteiga'])
+
+        self.conn.execute("DELETE FROM produtos WHERE codigo = '99'")
+        self.assertEqual(self._buscar('feij'), [])
+        self.assertTrue(criar_busca_produtos(self.conn.cursor()))
+
+    def test_relevancia(self):
+        """Casamento no nome pesa mais que na descrição"""
+        self.conn.execute("INSERT INTO produtos (codigo, nome, descricao) VALUES ('1', 'Grão de Bico', 'Leguminosa')")
+        self.assertEqual(self._buscar('grao')[0], 'Grão de Bico')
+
+    def test_busca_por_codigo_cai_no_like_sem_resultado_fts(self):
+        """Final do código de barras não casa no FTS, mas ainda encontra o produto"""
+        banco = _BancoBusca(self.conn)
+        self.assertEqual(banco.buscar_produto_por_codigo_ou_nome('AB-12')['nome'], 'Arroz Agulha')
+        self.assertEqual(banco.buscar_produto_por_codigo_ou_nome('1000')['nome'], 'Açúcar Branco')
+        self.assertIsNone(banco.buscar_produto_por_codigo_ou_nome('xyz'))
+
+    def test_filtro_por_trecho_ordenado_pelo_indice(self):
+        """Final do código de barras e trecho do nome filtram; o FTS só ordena"""
+        self.conn.execute("INSERT INTO produtos (codigo, nome, descricao) VALUES ('55', 'Farinha de Arroz', '')")
+        produtos = [{'id': r[0], 'codigo': r[1], 'nome': r[2]}
+                    for r in self.conn.execute("SELECT id, codigo, nome FROM produtos ORDER BY id")]
+
+        def nomes(termo):
+            juncao, condicao, ordem, params = juncao_fts(termo)
+            ids = [r[0] for r in self.conn.execute(
+                f"SELECT p.id FROM produtos p {juncao} WHERE {condicao} ORDER BY {ordem}", params)]
+            return [p['nome'] for p in filtrar_por_termo(produtos, termo, ids)]
+
+        self.assertEqual(nomes('1000'), ['Açúcar Branco'])
+        self.assertEqual(nomes('gulh'), ['Arroz Agulha'])
+        self.assertEqual(nomes('acucar'), ['Açúcar Branco'])
+        self.assertEqual(nomes('rroz'), ['Arroz Agulha', 'Farinha de Arroz'])
+        # O que o índice encontrou ("ar"*) vem antes do que só o trecho encontrou (Açúcar, primeiro da lista)
+        self.assertEqual(nomes('ar')[-1], 'Açúcar Branco')
+        self.assertEqual(len(nomes('ar')), 3)
+        # Sem índice, o filtro antigo
+        self.assertEqual([p['nome'] for p in filtrar_por_termo(produtos, '1000', None)], ['Açúcar Branco'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Testes do cache de leituras de cadastros.
+"""
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.cache_leituras import (
+    CacheLeituras, cache_leituras, invalida_cache, tabela_escrita, tabelas_lidas,
+)
+
+
+class RelogioFalso:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+class TestCacheLeituras(unittest.TestCase):
+    """Testes para CacheLeituras"""
+
+    def setUp(self):
+        self.relogio = RelogioFalso()
+        self.cache = CacheLeituras(ttl=60, relogio=self.relogio)
+        self.leituras = 0
+
+    def carregar(self):
+        self.leituras += 1
+        return [{'id': 1, 'nome': 'Arroz'}]
+
+    def test_acerto_ate_a_tabela_mudar(self):
+        for _ in range(3):
+            self.cache.obter('q', ('produtos',), self.carregar)
+        self.assertEqual(self.leituras, 1)
+
+        # Escrita em outra tabela não afeta
+        self.cache.invalidar('usuarios')
+        self.cache.obter('q', ('produtos',), self.carregar)
+        self.assertEqual(self.leituras, 1)
+
+        self.cache.invalidar('produtos')
+        self.cache.obter('q', ('produtos',), self.carregar)
+        self.assertEqual(self.leituras, 2)
+
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['acertos'], 3)
+        self.assertEqual(stats['faltas'], 2)
+        self.assertEqual(stats['obsoletas'], 1)
+
+    def test_ttl_expira_entrada(self):
+        self.cache.obter('q', ('produtos',), self.carregar)
+        self.relogio.agora = 61
+        self.cache.obter('q', ('produtos',), self.carregar)
+        self.assertEqual(self.leituras, 2)
+        self.assertEqual(self.cache.get_stats()['expiradas'], 1)
+
+    def test_escrita_durante_leitura_nao_e_guardada(self):
+        def carregar_com_escrita():
+            self.leituras += 1
+            self.cache.invalidar('produtos')
+            return []
+
+        self.cache.obter('q', ('produtos',), carregar_com_escrita)
+        self.cache.obter('q', ('produtos',), carregar_com_escrita)
+        self.assertEqual(self.leituras, 2)
+
+    def test_limite_de_memoria_despeja_menos_usadas(self):
+        valor = ['x' * 1000]
+        cache = CacheLeituras(limite_bytes=3000, relogio=self.relogio)
+        cache.obter('a', ('produtos',), lambda: list(valor))
+        cache.obter('b', ('produtos',), lambda: list(valor))
+        cache.obter('a', ('produtos',), lambda: list(valor))  # 'a' passa a ser a mais recente
+        cache.obter('c', ('produtos',), lambda: list(valor))
+
+        stats = cache.get_stats()
+        self.assertGreaterEqual(stats['despejos'], 1)
+        self.assertLessEqual(stats['bytes'], 3000)
+        self.assertIn('a', cache._entradas)
+        self.assertNotIn('b', cache._entradas)
+
+    def test_deteccao_de_tabelas_no_sql(self):
+        self.assertEqual(tabelas_lidas("SELECT id, nome FROM usuarios WHERE ativo = 1"), {'usuarios'})
+        self.assertEqual(
+            tabelas_lidas("SELECT p.nome, c.nome FROM produtos p LEFT JOIN categorias c ON c.id = p.categoria_id"),
+            {'produtos', 'categorias'},
+        )
+        # Vendas não são cacheadas
+        self.assertIsNone(tabelas_lidas("SELECT * FROM vendas v JOIN usuarios u ON u.id = v.usuario_id"))
+        self.assertIsNone(tabelas_lidas("UPDATE produtos SET estoque = 0"))
+
+        self.assertEqual(tabela_escrita("  UPDATE produtos SET estoque = ? WHERE id = ?"), 'produtos')
+        self.assertEqual(tabela_escrita("INSERT OR REPLACE INTO usuarios (id) VALUES (1)"), 'usuarios')
+        self.assertEqual(tabela_escrita("DELETE FROM clientes WHERE id = ?"), 'clientes')
+        self.assertEqual(tabela_escrita("ALTER TABLE produtos ADD COLUMN x"), '*')
+        self.assertIsNone(tabela_escrita("SELECT 1"))
+
+    def test_decorador_invalida_apos_metodo_async(self):
+        class Repo:
+            @invalida_cache('clientes')
+            async def sincronizar(self):
+                return 5
+
+        antes = cache_leituras.get_stats()['invalidacoes']
+        self.assertEqual(asyncio.run(Repo().sincronizar()), 5)
+        self.assertEqual(cache_leituras.get_stats()['invalidacoes'], antes + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Testes do canal de mudanças e do polling adaptativo.
+"""
+import unittest
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import canal_mudancas
+from utils.canal_mudancas import CanalMudancas, IntervaloAdaptativo, entidades_do_evento
+from utils.http_client import HttpClientManager
+
+
+class TestCanalMudancas(unittest.TestCase):
+    """Testes para canal_mudancas"""
+
+    def setUp(self):
+        self.sincronizadas = []
+        self._janela = canal_mudancas.JANELA_EVENTOS_S
+        canal_mudancas.JANELA_EVENTOS_S = 0.01
+
+    def tearDown(self):
+        canal_mudancas.JANELA_EVENTOS_S = self._janela
+
+    async def _sincronizar(self, entidades):
+        self.sincronizadas.append(set(entidades))
+        return 0
+
+    def _canal(self, responder, **kwargs):
+        http = HttpClientManager(backoff_s=0, async_transport=httpx.MockTransport(responder))
+        return CanalMudancas('http://srv/api', self._sincronizar, http=http, **kwargs)
+
+    def test_intervalo_adaptativo(self):
+        """Dobra quando ocioso até o máximo e volta ao mínimo com mudanças"""
+        intervalo = IntervaloAdaptativo(base=30, minimo=10, maximo=100)
+        self.assertEqual([intervalo.registrar(False) for _ in range(3)], [60, 100, 100])
+        self.assertEqual(intervalo.registrar(True), 10)
+        self.assertEqual(intervalo.registrar(False), 20)
+
+    def test_entidades_do_evento(self):
+        """Aceita os formatos de evento e ignora entidades desconhecidas"""
+        self.assertEqual(entidades_do_evento(b'{"entidade": "produtos"}'), {'produtos'})
+        self.assertEqual(entidades_do_evento('{"entidades": ["vendas", "caixa"]}'), {'vendas'})
+        self.assertEqual(entidades_do_evento({'entity_type': 'clientes'}), {'clientes'})
+        self.assertEqual(entidades_do_evento('usuarios'), {'usuarios'})
+        self.assertEqual(entidades_do_evento('lixo'), set())
+
+    def test_sse_agrupa_eventos(self):
+        """Eventos SSE próximos viram uma única sincronização das entidades citadas"""
+        corpo = (
+            b': keep-alive\n\n'
+            b'data: {"entidade": "produtos"}\n\n'
+            b'data: {"entidade": "clientes"}\n\n'
+        )
+
+        def responder(request):
+            self.assertEqual(request.url.path, '/api/eventos/stream')
+            return httpx.Response(200, content=corpo, headers={'content-type': 'text/event-stream'})
+
+        canal = self._canal(responder)
+        self.assertTrue(asyncio.run(canal._ouvir('sse')))
+        self.assertEqual(self.sincronizadas, [{'produtos', 'clientes'}])
+        self.assertEqual(canal.get_stats()['eventos'], 2)
+
+    def test_sem_canal_faz_polling(self):
+        """Servidor sem o endpoint: cai para polling e recua o intervalo"""
+        canal = self._canal(lambda request: httpx.Response(404),
+                            intervalo=IntervaloAdaptativo(base=0.01, minimo=0.01, maximo=0.02))
+        self.assertFalse(asyncio.run(canal._ouvir('sse')))
+
+        async def sincronizar(entidades):
+            self.sincronizadas.append(set(entidades))
+            if len(self.sincronizadas) == 3:
+                canal.parar()
+            return 0
+        canal.sincronizar = sincronizar
+        asyncio.run(canal.executar())
+        self.assertEqual(len(self.sincronizadas), 3)
+        self.assertEqual(self.sincronizadas[0], set(canal_mudancas.ENTIDADES))
+        self.assertEqual(canal.get_stats()['intervalo_polling_s'], 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Testes do índice em memória do catálogo de produtos.
+"""
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.catalogo_index import CatalogoIndex, normalizar
+
+
+class TestCatalogoIndex(unittest.TestCase):
+    """Testes para CatalogoIndex"""
+
+    def setUp(self):
+        self.catalogo = CatalogoIndex()
+        self.catalogo.carregar([
+            {'id': 1, 'codigo': '7891000', 'nome': 'Pão Francês', 'descricao': 'Padaria', 'estoque': 10},
+            {'id': 2, 'codigo': '7891001', 'nome': 'Açúcar 1kg', 'descricao': 'Mercearia', 'estoque': 5},
+            {'id': 3, 'codigo': 'AB12', 'nome': 'Arroz', 'descricao': 'Grão longo', 'estoque': 0},
+            {'id': 4, 'codigo': '12', 'nome': 'Sabão', 'descricao': None, 'estoque': 2},
+        ])
+
+    def _ids(self, produtos):
+        return [p['id'] for p in produtos]
+
+    def test_normalizar(self):
+        """Remove acentos, caixa e espaços repetidos"""
+        self.assertEqual(normalizar('  Pão   FRANCÊS '), 'pao frances')
+
+    def test_busca_por_trecho_sem_acentos(self):
+        """Trechos casam em qualquer campo, ignorando acentos, em ordem alfabética"""
+        self.assertEqual(self._ids(self.catalogo.buscar('acucar')), [2])
+        self.assertEqual(self._ids(self.catalogo.buscar('ÃO')), [1, 4])
+        self.assertEqual(self._ids(self.catalogo.buscar('merc')), [2])
+        self.assertEqual(self._ids(self.catalogo.buscar('7891')), [2, 1])
+        self.assertEqual(self.catalogo.buscar('xyz'), [])
+
+    def test_codigo_exato_primeiro_e_estoque(self):
+        """Código exato vem antes dos demais; sem estoque fica oculto"""
+        self.assertEqual(self._ids(self.catalogo.buscar('12')), [4])
+        self.assertEqual(self._ids(self.catalogo.buscar('12', somente_com_estoque=False)), [4, 3])
+        self.assertEqual(self.catalogo.por_codigo('ab12')['id'], 3)
+
+    def test_atualizacao_incremental(self):
+        """Atualizar e remover refletem na busca sem recarregar"""
+        self.catalogo.atualizar({'id': 3, 'codigo': 'AB12', 'nome': 'Arroz Agulha', 'descricao': '', 'estoque': 4})
+        self.assertEqual(self._ids(self.catalogo.buscar('agulha')), [3])
+        self.assertEqual(self.catalogo.buscar('grao'), [])
+
+        self.catalogo.remover(1)
+        self.assertEqual(self._ids(self.catalogo.buscar('pao')), [])
+        self.assertIsNone(self.catalogo.por_codigo('7891000'))
+        self.assertEqual(self._ids(self.catalogo.todos()), [2, 3, 4])
+
+    def test_limite(self):
+        """O limite corta o resultado mantendo a ordem"""
+        self.assertEqual(self._ids(self.catalogo.buscar('a', limite=2)), [2, 1])
+        self.assertEqual(self._ids(self.catalogo.buscar('789', limite=1)), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
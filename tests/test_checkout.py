@@ -0,0 +1,183 @@
+"""
+Testes do checkout em transação única.
+"""
+import unittest
+import asyncio
+import threading
+import sqlite3
+import tempfile
+import os
+import sys
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import connection_factory
+from database.database import Database
+from database.checkout import CheckoutService, MetricasCheckout
+from repositories.venda_repository import VendaRepository
+from utils.metricas import percentil
+
+
+class _BancoFalso:
+    """Só o necessário do Database: conexão, lock do escritor e colunas."""
+
+    _inserir_venda = Database._inserir_venda
+
+    def __init__(self, caminho=':memory:'):
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(caminho)
+        self.conn.executescript("""
+            CREATE TABLE produtos (
+                id INTEGER PRIMARY KEY, uuid TEXT, codigo TEXT, preco_custo REAL, venda_por_peso INTEGER DEFAULT 0,
+                estoque REAL, updated_at TEXT, synced INTEGER DEFAULT 1
+            );
+            CREATE TABLE vendas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, usuario_id INTEGER, total REAL,
+                forma_pagamento TEXT, valor_recebido REAL, troco REAL, data_venda TEXT,
+                uuid TEXT, synced INTEGER, desconto_aplicado_divida REAL, status TEXT DEFAULT 'Concluída'
+            );
+            CREATE TABLE usuarios (id INTEGER PRIMARY KEY, uuid TEXT);
+            CREATE TABLE itens_venda (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER, produto_id INTEGER,
+                quantidade REAL, preco_unitario REAL, preco_custo_unitario REAL, subtotal REAL,
+                peso_kg REAL DEFAULT 0
+            );
+            CREATE TABLE change_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, entity_type TEXT, entity_id TEXT,
+                operation TEXT, data_json TEXT, created_at TEXT, updated_at TEXT, status TEXT
+            );
+            INSERT INTO usuarios VALUES (7, 'usr-7');
+            INSERT INTO produtos (id, uuid, preco_custo, venda_por_peso, estoque) VALUES
+                (1, 'p-1', 6, 0, 10), (2, 'p-2', 50, 1, 5), (3, NULL, 1, 0, 3);
+        """)
+
+    def colunas(self, tabela):
+        return tuple(c[1] for c in self.conn.execute(f"PRAGMA table_info({tabela})"))
+
+
+class TestCheckout(unittest.TestCase):
+    """Testes para CheckoutService"""
+
+    def setUp(self):
+        self.db = _BancoFalso()
+        self.checkout = CheckoutService(self.db, MetricasCheckout())
+
+    def tearDown(self):
+        self.db.conn.close()
+
+    def test_grava_venda_itens_e_estoque(self):
+        """Itens repetidos somam a baixa; peso é derivado do subtotal"""
+        itens = [
+            {'id': 1, 'quantidade': 2, 'preco': 10, 'subtotal': 20},
+            {'id': 1, 'quantidade': 1, 'preco': 10, 'subtotal': 10},
+            {'id': 2, 'quantidade': 1, 'preco': 100, 'subtotal': 50},
+            {'id': 3, 'quantidade': 1, 'preco': 2, 'subtotal': 2},
+        ]
+        resultado = self.checkout.finalizar(7, itens, 'Dinheiro', 82, 100)
+
+        estoque = dict(self.db.conn.execute("SELECT id, estoque FROM produtos"))
+        self.assertEqual(estoque, {1: 7, 2: 4.5, 3: 2})
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM itens_venda").fetchone()[0], 4)
+        custo, peso = self.db.conn.execute(
+            "SELECT preco_custo_unitario, peso_kg FROM itens_venda WHERE produto_id = 2"
+        ).fetchone()
+        self.assertEqual((custo, peso), (50, 0.5))
+
+        # Produto sem uuid não vai para o payload da API
+        self.assertEqual([i['produto_id'] for i in resultado['itens_payload']], ['p-1', 'p-1', 'p-2'])
+        # A venda segue pelo synced = 0, sem entrada no change_log
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0], 0)
+        venda = "SELECT synced FROM vendas WHERE id = ?"
+        self.assertEqual(self.db.conn.execute(venda, (resultado['venda_id'],)).fetchone()[0], 0)
+
+        self.checkout.marcar_sincronizada(resultado['venda_id'])
+        self.assertEqual(self.db.conn.execute(venda, (resultado['venda_id'],)).fetchone()[0], 1)
+        self.assertEqual(self.checkout.get_stats()['vendas'], 1)
+
+    def test_erro_desfaz_tudo(self):
+        """Falha no meio do checkout não deixa venda nem baixa de estoque"""
+        self.db.conn.execute("DROP TABLE itens_venda")
+        with self.assertRaises(sqlite3.Error):
+            self.checkout.finalizar(7, [{'id': 1, 'quantidade': 1, 'preco': 10, 'subtotal': 10}],
+                                    'Dinheiro', 10, 10)
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0], 0)
+        self.assertEqual(self.db.conn.execute("SELECT estoque FROM produtos WHERE id = 1").fetchone()[0], 10)
+
+    def test_percentil(self):
+        """Percentil nearest-rank"""
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50)
+        self.assertEqual(percentil(valores, 95), 95)
+        self.assertEqual(percentil([], 99), 0.0)
+
+
+class _Resposta:
+    text = ''
+
+    def __init__(self, status_code, dados=None):
+        self.status_code = status_code
+        self._dados = dados
+
+    def json(self):
+        return self._dados
+
+
+class _ServidorVendas:
+    """Servidor que aceita tudo e registra os POSTs de vendas."""
+
+    def __init__(self):
+        self.posts = []
+
+    async def get(self, url, params=None, timeout=None):
+        return _Resposta(200, {})
+
+    async def post(self, url, json=None, timeout=None):
+        self.posts.append(json.get('uuid'))
+        return _Resposta(201, {})
+
+    async def put(self, url, json=None, timeout=None):
+        return _Resposta(200, {})
+
+    @asynccontextmanager
+    async def sessao_async(self):
+        yield self
+
+
+class TestCheckoutSincronizacao(unittest.TestCase):
+    """Venda feita offline no checkout e enviada pelo sync de vendas"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'checkout.db')
+        self.db = _BancoFalso(self.db_path)
+        self.checkout = CheckoutService(self.db, MetricasCheckout())
+
+        self.repo = VendaRepository.__new__(VendaRepository)
+        self.repo.backend_url = 'http://teste'
+        self.repo.api_base = 'http://teste/api'
+        self.repo.db_path = self.db_path
+        self.repo._last_missing_products = set()
+
+    def tearDown(self):
+        self.db.conn.close()
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def test_venda_offline_enviada_uma_vez(self):
+        resultado = self.checkout.finalizar(7, [{'id': 1, 'quantidade': 2, 'preco': 10, 'subtotal': 20}],
+                                            'Dinheiro', 20, 20)
+        servidor = _ServidorVendas()
+        with patch('repositories.venda_repository.http_client', servidor), \
+                patch.object(VendaRepository, 'is_backend_online', AsyncMock(return_value=True)), \
+                patch.object(VendaRepository, '_pull_vendas_do_servidor', AsyncMock(return_value=0)):
+            asyncio.run(self.repo.sincronizar_mudancas())
+
+        self.assertEqual(servidor.posts, [resultado['uuid']])
+        synced = self.db.conn.execute("SELECT synced FROM vendas WHERE id = ?", (resultado['venda_id'],))
+        self.assertEqual(synced.fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Testes da compactação do change_log.
+"""
+import unittest
+import json
+import tempfile
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import connect as db_connect, connection_factory
+from database.compactacao_change_log import MetricasCompactacao, compactar_change_log, consolidar
+
+
+def _mudanca(id, entity_id, operation, **data):
+    return {'id': id, 'entity_id': entity_id, 'operation': operation, 'data_json': json.dumps(data)}
+
+
+class TestCompactacaoChangeLog(unittest.TestCase):
+    """Testes para compactar_change_log"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'compactacao.db')
+        with db_connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE change_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, entity_type TEXT, entity_id TEXT,
+                    operation TEXT, data_json TEXT, created_at TEXT, updated_at TEXT,
+                    status TEXT DEFAULT 'pending'
+                )
+            """)
+            conn.commit()
+
+    def tearDown(self):
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def _registrar(self, *mudancas, entity_type='produtos', status='pending'):
+        with db_connect(self.db_path) as conn:
+            for i, (entity_id, operation, data) in enumerate(mudancas):
+                conn.execute("""
+                    INSERT INTO change_log (entity_type, entity_id, operation, data_json, created_at, status)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (entity_type, entity_id, operation, json.dumps(data), f'2025-01-01T10:00:{i:02d}', status))
+            conn.commit()
+
+    def _pendentes(self):
+        with db_connect(self.db_path) as conn:
+            return [
+                (r[0], r[1], json.loads(r[2])) for r in conn.execute("""
+                    SELECT entity_id, operation, data_json FROM change_log
+                    WHERE status = 'pending' ORDER BY id
+                """)
+            ]
+
+    def test_consolidar(self):
+        """Edições se juntam, DELETE prevalece e CREATE+DELETE é descartado"""
+        itens, descartadas = consolidar([
+            _mudanca(1, 'a', 'CREATE', nome='Arroz', preco=10),
+            _mudanca(2, 'b', 'UPDATE', nome='Feijão'),
+            _mudanca(3, 'a', 'UPDATE', preco=12),
+            _mudanca(4, 'c', 'CREATE', nome='Temporário'),
+            _mudanca(5, 'c', 'DELETE'),
+            _mudanca(6, 'b', 'DELETE'),
+        ])
+        self.assertEqual(descartadas, [4, 5])
+        a, b = itens
+        self.assertEqual((a['operation'], a['data'], a['change_ids']), ('CREATE', {'nome': 'Arroz', 'preco': 12}, [1, 3]))
+        self.assertEqual((b['operation'], b['change_ids']), ('DELETE', [2, 6]))
+
+    def test_excluido_e_recriado_vira_update(self):
+        """DELETE seguido de CREATE da mesma entidade vira UPDATE com o estado final"""
+        itens, descartadas = consolidar([
+            _mudanca(1, 'a', 'UPDATE', preco=10),
+            _mudanca(2, 'a', 'DELETE'),
+            _mudanca(3, 'a', 'CREATE', nome='Arroz', preco=11),
+            _mudanca(4, 'a', 'UPDATE', preco=12),
+        ])
+        self.assertEqual(descartadas, [])
+        (a,) = itens
+        self.assertEqual((a['operation'], a['data'], a['change_ids']), ('UPDATE', {'nome': 'Arroz', 'preco': 12}, [1, 2, 3, 4]))
+
+    def test_dez_edicoes_e_exclusao(self):
+        """Dez edições de preço seguidas de exclusão viram um único DELETE"""
+        self._registrar(*[('p1', 'UPDATE', {'preco': i}) for i in range(10)], ('p1', 'DELETE', {'uuid': 'p1'}))
+        metricas = MetricasCompactacao()
+        relatorio = compactar_change_log(self.db_path, 'produtos', metricas)
+
+        self.assertEqual(relatorio, {'antes': 11, 'depois': 1, 'eliminadas': 10, 'canceladas': 0})
+        self.assertEqual(self._pendentes(), [('p1', 'DELETE', {'uuid': 'p1'})])
+        self.assertEqual(metricas.get_stats()['operacoes_eliminadas'], 10)
+
+    def test_create_com_estado_final_e_cancelados(self):
+        """CREATE+UPDATE* vira CREATE final; CREATE+DELETE some; outros tipos e enviadas ficam"""
+        self._registrar(('p2', 'UPDATE', {'nome': 'já enviada'}), status='synced')
+        self._registrar(('c1', 'UPDATE', {'nome': 'Cliente'}), entity_type='clientes')
+        self._registrar(
+            ('p1', 'CREATE', {'nome': 'Arroz', 'preco': 10}),
+            ('p3', 'CREATE', {'nome': 'Temporário'}),
+            ('p1', 'UPDATE', {'preco': 12}),
+            ('p3', 'DELETE', {}),
+        )
+        relatorio = compactar_change_log(self.db_path, 'produtos', MetricasCompactacao())
+
+        self.assertEqual(relatorio['canceladas'], 1)
+        self.assertEqual(self._pendentes(), [
+            ('c1', 'UPDATE', {'nome': 'Cliente'}),
+            ('p1', 'CREATE', {'nome': 'Arroz', 'preco': 12}),
+        ])
+        with db_connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM change_log WHERE status = 'synced'").fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
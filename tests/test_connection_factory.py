@@ -0,0 +1,101 @@
+"""
+Testes da fábrica central de conexões SQLite.
+"""
+import unittest
+import tempfile
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import ConnectionFactory
+
+
+class TestConnectionFactory(unittest.TestCase):
+    """Testes para o ConnectionFactory"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'fabrica.db')
+        self.fabrica = ConnectionFactory()
+        with self.fabrica.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)")
+
+    def tearDown(self):
+        self.fabrica.invalidate()
+        self.temp_dir.cleanup()
+
+    def test_reutiliza_conexao_entre_blocos(self):
+        """Blocos sequenciais reaproveitam a mesma conexão física"""
+        with self.fabrica.connect(self.db_path) as conn:
+            conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+        with self.fabrica.connect(self.db_path) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+
+        self.assertEqual(total, 1)
+        stats = self.fabrica.get_stats()
+        self.assertEqual(stats['aberturas'], 1)
+        self.assertEqual(stats['reutilizacoes'], 2)
+
+    def test_pragmas_aplicadas(self):
+        """Conexões saem configuradas com WAL, synchronous e temp_store"""
+        with self.fabrica.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0].lower(), 'wal')
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)  # MEMORY
+
+    def test_blocos_aninhados_usam_conexoes_distintas(self):
+        """Um bloco interno não confirma nem desfaz a transação do externo"""
+        with self.fabrica.connect(self.db_path) as externo:
+            externo.execute("INSERT INTO itens (nome) VALUES ('externo')")
+            try:
+                with self.fabrica.connect(self.db_path) as interno:
+                    self.assertIsNot(interno._conn, externo._conn)
+                    raise ValueError("falha no bloco interno")
+            except ValueError:
+                pass
+            self.assertTrue(externo.in_transaction)
+
+        with self.fabrica.connect(self.db_path) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+        self.assertEqual(total, 1)
+
+    def test_row_factory_por_emprestimo(self):
+        """row_factory definido por um chamador não vaza para o próximo"""
+        with self.fabrica.connect(self.db_path) as conn:
+            conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+        with self.fabrica.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            linha = conn.cursor().execute("SELECT nome FROM itens").fetchone()
+            self.assertEqual(linha['nome'], 'a')
+        with self.fabrica.connect(self.db_path) as conn:
+            linha = conn.execute("SELECT nome FROM itens").fetchone()
+            self.assertIsInstance(linha, tuple)
+
+    def test_close_descarta_trabalho_pendente(self):
+        """close() devolve a conexão desfazendo alterações não confirmadas"""
+        conn = self.fabrica.connect(self.db_path)
+        conn.execute("INSERT INTO itens (nome) VALUES ('pendente')")
+        conn.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+        with self.fabrica.connect(self.db_path) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+        self.assertEqual(total, 0)
+
+    def test_invalidate_reabre_conexoes(self):
+        """Após invalidate() nenhuma conexão antiga é reaproveitada"""
+        emprestada = self.fabrica.connect(self.db_path)
+        self.fabrica.invalidate()
+        emprestada.close()
+
+        self.assertEqual(self.fabrica.get_stats()['ociosas'], 0)
+        with self.fabrica.connect(self.db_path):
+            pass
+        self.assertEqual(self.fabrica.get_stats()['aberturas'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Testes do pool de conexões SQLite usado pelo Database.
+"""
+import unittest
+import tempfile
+import threading
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_pool import ConnectionPool, is_consulta_leitura
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Testes para o ConnectionPool"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'pool.db')
+        self.pool = ConnectionPool(self.db_path)
+        with self.pool.writer() as conn:
+            conn.execute("CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)")
+            conn.commit()
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.temp_dir.cleanup()
+
+    def test_wal_ativado_na_abertura(self):
+        """Conexões do pool abrem em modo WAL"""
+        with self.pool.reader() as conn:
+            modo = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(modo.lower(), 'wal')
+
+    def test_um_leitor_por_thread(self):
+        """Cada thread recebe sua própria conexão de leitura"""
+        conexoes = []
+        barreira = threading.Barrier(3)
+
+        def ler():
+            with self.pool.reader() as conn:
+                conexoes.append(conn)
+                conn.execute("SELECT COUNT(*) FROM itens").fetchone()
+            # Manter as threads vivas até todas abrirem seus leitores
+            barreira.wait()
+
+        threads = [threading.Thread(target=ler) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len({id(c) for c in conexoes}), 3)
+        with self.pool.reader() as c1, self.pool.reader() as c2:
+            self.assertIs(c1, c2)
+
+    def test_leitura_ve_transacao_aberta_do_escritor(self):
+        """Leituras durante uma transação aberta usam o escritor"""
+        writer = self.pool.writer_connection
+        writer.execute("INSERT INTO itens (nome) VALUES ('pendente')")
+        self.assertTrue(writer.in_transaction)
+        with self.pool.reader() as conn:
+            self.assertIs(conn, writer)
+            total = conn.execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+        self.assertEqual(total, 1)
+        writer.commit()
+
+    def test_estatisticas(self):
+        """Estatísticas contabilizam escritas, leituras e tamanho do pool"""
+        with self.pool.writer() as conn:
+            conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+            conn.commit()
+        with self.pool.reader() as conn:
+            conn.execute("SELECT * FROM itens").fetchall()
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['escritas'], 2)
+        self.assertEqual(stats['leituras'], 1)
+        self.assertEqual(stats['pool_size'], 2)
+        self.assertGreaterEqual(stats['espera_escrita_max'], 0.0)
+
+    def test_leitores_de_threads_encerradas_sao_descartados(self):
+        """Conexões de threads finalizadas são fechadas na próxima abertura"""
+        t = threading.Thread(target=lambda: self.pool.reader().__enter__())
+        t.start()
+        t.join()
+        with self.pool.reader():
+            pass
+        self.assertEqual(self.pool.get_stats()['leitores_descartados'], 1)
+
+    def test_classificacao_de_comandos(self):
+        """Apenas consultas são direcionadas ao leitor"""
+        self.assertTrue(is_consulta_leitura("  select * from itens"))
+        self.assertTrue(is_consulta_leitura("WITH x AS (SELECT 1) SELECT * FROM x"))
+        self.assertTrue(is_consulta_leitura("PRAGMA table_info(itens)"))
+        self.assertFalse(is_consulta_leitura("UPDATE itens SET nome = 'b'"))
+        self.assertFalse(is_consulta_leitura("PRAGMA journal_mode=DELETE"))
+
+
+if __name__ == '__main__':
+    unittest.main()
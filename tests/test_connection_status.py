@@ -0,0 +1,109 @@
+"""
+Testes da máquina de estados de conectividade.
+"""
+import unittest
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.connection_status import (
+    BACKOFF_BASE_S, BACKOFF_MAX_S, DEGRADADO, DESCONHECIDO, INTERVALO_ONLINE_S, OFFLINE, ONLINE,
+    ConnectionStatus, MaquinaConectividade
+)
+from utils.http_client import HttpClientManager
+
+URL = 'http://srv/api'
+
+
+class _Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+class TestConnectionStatus(unittest.TestCase):
+    """Testes para connection_status"""
+
+    def setUp(self):
+        self.relogio = _Relogio()
+        self.online = False
+        self.sondas = 0
+
+    def _status(self):
+        def responder(request):
+            self.sondas += 1
+            return httpx.Response(200 if self.online else 503)
+        http = HttpClientManager(tentativas=1, backoff_s=0, transport=httpx.MockTransport(responder),
+                                 async_transport=httpx.MockTransport(responder))
+        status = ConnectionStatus(http=http, relogio=self.relogio)
+        status.server_url = URL
+        return status
+
+    def test_transicoes_e_backoff(self):
+        """Degradado, depois offline; backoff dobra até o teto e zera no sucesso"""
+        maquina = MaquinaConectividade(relogio=self.relogio, aleatorio=lambda: 0.5)
+        self.assertEqual(maquina.registrar(False), DESCONHECIDO)
+        self.assertEqual(maquina.estado, DEGRADADO)
+        self.assertEqual(maquina.espera(), BACKOFF_BASE_S)
+        maquina.registrar(False)
+        self.assertEqual(maquina.espera(), BACKOFF_BASE_S * 2)
+        self.assertEqual(maquina.registrar(False), DEGRADADO)
+        self.assertEqual(maquina.estado, OFFLINE)
+        for _ in range(20):
+            maquina.registrar(False)
+        self.assertEqual(maquina.espera(), BACKOFF_MAX_S)
+
+        self.assertEqual(maquina.registrar(True), OFFLINE)
+        self.assertEqual(maquina.estado, ONLINE)
+        self.assertTrue(maquina.precisa_sondar())
+        self.assertEqual(maquina.espera(), INTERVALO_ONLINE_S)
+
+    def test_jitter(self):
+        """O backoff varia no máximo ±20%"""
+        baixo = MaquinaConectividade(aleatorio=lambda: 0.0)
+        alto = MaquinaConectividade(aleatorio=lambda: 0.999)
+        for maquina in (baixo, alto):
+            maquina.registrar(False)
+        self.assertAlmostEqual(baixo.espera(), BACKOFF_BASE_S * 0.8)
+        self.assertLess(alto.espera(), BACKOFF_BASE_S * 1.2)
+
+    def test_backoff_evita_sondas_e_recupera(self):
+        """Durante o backoff não há sonda; após ele (ou forçando) o sucesso volta a online"""
+        status = self._status()
+        self.assertFalse(asyncio.run(status.verificar()))
+        sondas = self.sondas
+        self.assertFalse(asyncio.run(status.verificar()))
+        self.assertEqual(self.sondas, sondas)
+        self.assertEqual(status.estado(), DEGRADADO)
+
+        self.online = True
+        self.assertTrue(asyncio.run(status.verificar(forcar=True)))
+        self.assertEqual(status.estado(), ONLINE)
+        self.assertTrue(status.is_online)
+
+        self.online = False
+        status.http.invalidar_saude()
+        self.assertFalse(status.verificar_sync())
+        self.relogio.agora += BACKOFF_MAX_S
+        self.online = True
+        self.assertTrue(status.verificar_sync())
+
+    def test_sonda_compartilhada(self):
+        """Verificações simultâneas usam uma única sonda"""
+        status = self._status()
+        self.online = True
+
+        async def varias():
+            return await asyncio.gather(*(status.verificar() for _ in range(5)))
+        self.assertEqual(asyncio.run(varias()), [True] * 5)
+        self.assertEqual(self.sondas, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Testes da guarda de sincronização do processo.
+"""
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.sync_manager import SyncManager, guarda_sync
+
+
+class TestGuardaSync(unittest.TestCase):
+    """Testes para guarda_sync/SyncManager._exclusivo"""
+
+    def setUp(self):
+        self.chamadas = []
+        self.outro = self._manager()
+
+    def tearDown(self):
+        guarda_sync.retirar_pedidas()
+
+    def _manager(self):
+        manager = SyncManager.__new__(SyncManager)
+        manager.repositories = [(nome, None) for nome in ('produtos', 'usuarios', 'clientes', 'vendas')]
+
+        async def todas():
+            self.chamadas.append('todas')
+            # Outro ponto de entrada (outro SyncManager) pede sincronização no meio desta
+            self.concorrente = await self.outro.sincronizar_entidades({'vendas'})
+            return {'status': 'success', 'total_recebidas': 3}
+
+        async def especifica(entidade):
+            self.chamadas.append(entidade)
+            return {'status': 'success', 'recebidas': 1}
+
+        manager._sincronizar_todas_entidades = todas
+        manager._sincronizar_entidade_especifica = especifica
+        return manager
+
+    def test_concorrente_nao_roda_junto_e_e_atendido_no_fim(self):
+        resultado = asyncio.run(self._manager().sincronizar_todas_entidades())
+
+        self.assertEqual(resultado['total_recebidas'], 3)
+        self.assertEqual(self.concorrente, 0)
+        # vendas só depois do ciclo em andamento, e uma única vez
+        self.assertEqual(self.chamadas, ['todas', 'vendas'])
+        self.assertTrue(guarda_sync.tentar())
+        guarda_sync.liberar()
+
+    def test_ocupada_retorna_em_andamento(self):
+        self.assertTrue(guarda_sync.tentar())
+        try:
+            resultado = asyncio.run(self.outro.sincronizar_todas_entidades())
+        finally:
+            guarda_sync.liberar()
+        self.assertEqual(resultado['status'], 'em_andamento')
+        self.assertEqual(self.chamadas, [])
+        self.assertEqual(guarda_sync.retirar_pedidas(), {'produtos', 'usuarios', 'clientes', 'vendas'})
+
+
+if __name__ == '__main__':
+    unittest.main()
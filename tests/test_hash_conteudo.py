@@ -0,0 +1,48 @@
+"""
+Testes do hash de conteúdo usado na comparação do pull.
+"""
+import unittest
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.hash_conteudo import atualizar_hash, hash_conteudo, hash_servidor, hashes_locais
+
+
+class TestHashConteudo(unittest.TestCase):
+    """Testes para hash_conteudo/hash_servidor"""
+
+    def test_hash_estavel_e_normalizado(self):
+        base = {'nome': 'Ana', 'usuario': 'ana', 'nivel': 1, 'is_admin': False, 'ativo': 1, 'salario': 0}
+        self.assertEqual(hash_conteudo('usuarios', base), hash_conteudo('usuarios', dict(reversed(base.items()))))
+        # 1/1.0/True e None/'' representam o mesmo valor
+        self.assertEqual(
+            hash_conteudo('usuarios', base),
+            hash_conteudo('usuarios', {**base, 'nivel': 1.0, 'is_admin': 0, 'salario': '0.00', 'pode_abastecer': None}),
+        )
+        self.assertNotEqual(hash_conteudo('usuarios', base), hash_conteudo('usuarios', {**base, 'nome': 'Ana Maria'}))
+
+    def test_hash_da_linha_local_igual_ao_do_servidor(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("""
+            CREATE TABLE clientes (id INTEGER PRIMARY KEY, nome TEXT, telefone TEXT, endereco TEXT,
+                                   uuid TEXT, hash_conteudo TEXT)
+        """)
+        conn.execute("INSERT INTO clientes VALUES (1, 'Loja', '84000', '', 'c1', NULL)")
+        servidor = {'uuid': 'c1', 'nome': 'Loja', 'telefone': '84000', 'updated_at': '2025-01-01'}
+
+        self.assertEqual(atualizar_hash(conn, 'clientes', 1), hash_servidor('clientes', servidor))
+        self.assertEqual(hashes_locais(conn, 'clientes'), {'c1': hash_servidor('clientes', servidor)})
+
+    def test_banco_sem_coluna(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE clientes (id INTEGER PRIMARY KEY, nome TEXT, telefone TEXT, endereco TEXT, uuid TEXT)")
+        conn.execute("INSERT INTO clientes VALUES (1, 'Loja', '', '', 'c1')")
+        self.assertIsNone(atualizar_hash(conn, 'clientes', 1))
+        self.assertEqual(hashes_locais(conn, 'clientes'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
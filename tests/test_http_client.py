@@ -0,0 +1,102 @@
+"""
+Testes do cliente HTTP compartilhado.
+"""
+import unittest
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.http_client import HttpClientManager
+
+
+class TestHttpClientManager(unittest.TestCase):
+    """Testes para HttpClientManager"""
+
+    def setUp(self):
+        self.pedidos = []
+        self.respostas = []
+
+        def responder(request):
+            self.pedidos.append((request.method, str(request.url)))
+            resposta = self.respostas.pop(0) if self.respostas else 200
+            if isinstance(resposta, Exception):
+                raise resposta
+            return httpx.Response(resposta, json={})
+
+        self.http = HttpClientManager(
+            backoff_s=0,
+            transport=httpx.MockTransport(responder),
+            async_transport=httpx.MockTransport(responder),
+        )
+
+    def tearDown(self):
+        self.http.fechar()
+
+    def test_sessao_reaproveita_cliente(self):
+        """Sair do bloco 'with' não fecha o cliente compartilhado"""
+        with self.http.sessao(timeout=5.0) as client:
+            client.get('http://srv/api/produtos/')
+        cliente = self.http.cliente()
+        with self.http.sessao() as client:
+            client.get('http://srv/api/produtos/')
+        self.assertIs(self.http.cliente(), cliente)
+        self.assertFalse(cliente.is_closed)
+        self.assertEqual(self.http.get_stats()['por_host']['srv']['requisicoes'], 2)
+
+    def test_nova_tentativa(self):
+        """GET repete em 503; POST só repete quando a conexão falhou"""
+        self.respostas = [503, 200]
+        self.assertEqual(self.http.get('http://srv/api/vendas/').status_code, 200)
+
+        self.respostas = [503]
+        self.assertEqual(self.http.post('http://srv/api/vendas/').status_code, 503)
+
+        self.respostas = [httpx.ConnectError('recusada'), 201]
+        self.assertEqual(self.http.post('http://srv/api/vendas/').status_code, 201)
+
+        self.respostas = [httpx.ReadTimeout('lento')]
+        with self.assertRaises(httpx.ReadTimeout):
+            self.http.post('http://srv/api/vendas/')
+
+        stats = self.http.get_stats()
+        self.assertEqual(stats['requisicoes'], 6)
+        self.assertEqual(stats['retentativas'], 2)
+
+    def test_saude_em_cache_e_fallback(self):
+        """/healthz sem o /api é tentado e o resultado vale para as próximas consultas"""
+        self.respostas = [404, 200]
+        self.assertTrue(self.http.backend_online('http://srv/api'))
+        self.assertTrue(self.http.backend_online('http://srv/api'))
+        self.assertEqual([url for _, url in self.pedidos], ['http://srv/api/healthz', 'http://srv/healthz'])
+
+    def test_cliente_async_por_event_loop(self):
+        """Cada asyncio.run recebe seu cliente; dentro do loop ele é reaproveitado"""
+        async def duas_requisicoes():
+            async with self.http.sessao_async() as client:
+                await client.get('http://srv/api/clientes/')
+                await client.get('http://srv/api/usuarios/')
+            return self.http.cliente_async()
+
+        primeiro = asyncio.run(duas_requisicoes())
+        segundo = asyncio.run(duas_requisicoes())
+        self.assertIsNot(primeiro, segundo)
+        self.assertEqual(len(self.pedidos), 4)
+
+    def test_cliente_async_fechado_ao_fim_do_loop(self):
+        """O pool de conexões do loop é fechado quando o asyncio.run termina"""
+        async def requisicao():
+            async with self.http.sessao_async() as client:
+                await client.get('http://srv/api/clientes/')
+            cliente = self.http.cliente_async()
+            self.assertFalse(cliente.is_closed)
+            return cliente
+
+        self.assertTrue(asyncio.run(requisicao()).is_closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
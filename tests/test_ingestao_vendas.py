@@ -0,0 +1,137 @@
+"""
+Testes da ingestão em lote das vendas do pull.
+"""
+import unittest
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.ingestao_vendas import IngestaoVendas, hash_venda
+
+USUARIO_UUID = '11111111-2222-3333-4444-555555555555'
+
+
+def _venda(i, **extra):
+    return {
+        'uuid': f'v{i}', 'usuario_id': USUARIO_UUID, 'total': 10.0 * i, 'forma_pagamento': 'M-Pesa',
+        'data_venda': '2025-03-01T09:00:00', 'updated_at': '2025-03-01T09:00:00',
+        'itens': [{'produto_id': 'p1', 'quantidade': 2, 'preco_unitario': 5.0, 'subtotal': 10.0}],
+        **extra,
+    }
+
+
+class TestIngestaoVendas(unittest.TestCase):
+    """Testes para IngestaoVendas"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.executescript(f"""
+            CREATE TABLE usuarios (id INTEGER PRIMARY KEY, nome TEXT, uuid TEXT, is_admin INTEGER, ativo INTEGER);
+            CREATE TABLE produtos (id INTEGER PRIMARY KEY, nome TEXT, preco_custo REAL, uuid TEXT);
+            CREATE TABLE vendas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, usuario_id INTEGER, total REAL, forma_pagamento TEXT,
+                valor_recebido REAL, troco REAL, data_venda TEXT, status TEXT, motivo_alteracao TEXT,
+                alterado_por INTEGER, data_alteracao TEXT, origem TEXT, valor_original_divida REAL,
+                desconto_aplicado_divida REAL, uuid TEXT, synced INTEGER DEFAULT 0, hash_conteudo TEXT
+            );
+            CREATE TABLE itens_venda (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, venda_id INTEGER, produto_id INTEGER, quantidade REAL,
+                preco_unitario REAL, preco_custo_unitario REAL, subtotal REAL, peso_kg REAL
+            );
+            INSERT INTO usuarios VALUES (1, 'Admin', NULL, 1, 1), (7, 'Caixa', '{USUARIO_UUID}', 0, 1);
+            INSERT INTO produtos VALUES (3, 'Arroz', 4.0, 'p1');
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _ingestao(self):
+        ingestao = IngestaoVendas(self.conn, lambda: 1)
+        ingestao.carregar()
+        return ingestao
+
+    def test_insere_vendas_e_itens_com_mapas(self):
+        ingestao = self._ingestao()
+        self.assertEqual(ingestao.aplicar([_venda(1), _venda(2)]), 2)
+
+        vendas = self.conn.execute("SELECT uuid, usuario_id, total, synced FROM vendas ORDER BY uuid").fetchall()
+        self.assertEqual(vendas, [('v1', 7, 10.0, 1), ('v2', 7, 20.0, 1)])
+        itens = self.conn.execute("""
+            SELECT v.uuid, i.produto_id, i.quantidade, i.preco_custo_unitario
+            FROM itens_venda i JOIN vendas v ON v.id = i.venda_id ORDER BY v.uuid
+        """).fetchall()
+        self.assertEqual(itens, [('v1', 3, 2, 4.0), ('v2', 3, 2, 4.0)])
+
+    def test_pula_vendas_sem_mudanca(self):
+        self._ingestao().aplicar([_venda(1), _venda(2)])
+
+        ingestao = self._ingestao()
+        self.assertEqual(ingestao.aplicar([_venda(1), _venda(2, total=99.0)]), 1)
+        self.assertEqual(ingestao.stats['inalteradas'], 1)
+        self.assertEqual(ingestao.stats['atualizadas'], 1)
+        self.assertEqual(self.conn.execute("SELECT total FROM vendas WHERE uuid = 'v2'").fetchone()[0], 99.0)
+        # Itens trocados, não duplicados
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM itens_venda").fetchone()[0], 2)
+
+    def test_alteracao_local_pendente_nao_e_pulada(self):
+        self._ingestao().aplicar([_venda(1)])
+        self.conn.execute("UPDATE vendas SET synced = 0, total = 1 WHERE uuid = 'v1'")
+
+        self.assertEqual(self._ingestao().aplicar([_venda(1)]), 1)
+        self.assertEqual(self.conn.execute("SELECT total, synced FROM vendas").fetchone(), (10.0, 1))
+
+    def test_produto_ausente_nao_grava_hash(self):
+        venda = _venda(1, itens=[{'produto_id': 'p9', 'quantidade': 1}])
+        ingestao = self._ingestao()
+        ingestao.aplicar([venda])
+        self.assertEqual(ingestao.produtos_ausentes, {'p9'})
+        self.assertIsNone(self.conn.execute("SELECT hash_conteudo FROM vendas").fetchone()[0])
+
+        # Quando o produto chega, a venda é refeita com o item
+        self.conn.execute("INSERT INTO produtos VALUES (9, 'Feijão', 2.0, 'p9')")
+        self.assertEqual(self._ingestao().aplicar([venda]), 1)
+        self.assertEqual(self.conn.execute("SELECT hash_conteudo FROM vendas").fetchone()[0], hash_venda(venda))
+        self.assertEqual(self.conn.execute("SELECT produto_id FROM itens_venda").fetchall(), [(9,)])
+
+    def test_venda_incompleta_guardada_e_refeita_quando_produto_chega(self):
+        venda = _venda(1, itens=[{'produto_id': 'p9', 'quantidade': 1}])
+        ingestao = self._ingestao()
+        ingestao.aplicar([venda])
+        ingestao.gravar_incompletas()
+        self.assertEqual(ingestao.total_incompletas(), 1)
+
+        # Sem o produto nada é reaplicado
+        self.assertEqual(self._ingestao().reaplicar_incompletas(), 0)
+
+        self.conn.execute("INSERT INTO produtos VALUES (9, 'Feijão', 2.0, 'p9')")
+        ingestao = self._ingestao()
+        self.assertEqual(ingestao.reaplicar_incompletas(), 1)
+        ingestao.gravar_incompletas()
+        self.assertEqual(self.conn.execute("SELECT produto_id FROM itens_venda").fetchall(), [(9,)])
+        self.assertEqual(self.conn.execute("SELECT hash_conteudo FROM vendas").fetchone()[0], hash_venda(venda))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM vendas_incompletas").fetchone()[0], 0)
+        self.assertEqual(ingestao.total_incompletas(), 0)
+
+    def test_venda_com_erro_nao_derruba_o_lote(self):
+        """Falha no executemany: o lote é regravado venda a venda e só a ruim fica de fora"""
+        self.conn.execute("""
+            CREATE TRIGGER recusa_venda BEFORE INSERT ON vendas WHEN NEW.uuid = 'v3'
+            BEGIN SELECT RAISE(ABORT, 'venda recusada'); END
+        """)
+        ingestao = self._ingestao()
+        self.assertEqual(ingestao.aplicar([_venda(1), _venda(3), _venda(2)]), 2)
+
+        self.assertEqual([r[0] for r in self.conn.execute("SELECT uuid FROM vendas ORDER BY uuid")], ['v1', 'v2'])
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM itens_venda").fetchone()[0], 2)
+        self.assertEqual((ingestao.stats['inseridas'], ingestao.stats['falhas']), (2, 1))
+        self.assertNotIn('v3', ingestao.vendas)
+
+    def test_usuario_desconhecido_usa_padrao(self):
+        self._ingestao().aplicar([_venda(1, usuario_id='ffffffff-0000-0000-0000-000000000000')])
+        self.assertEqual(self.conn.execute("SELECT usuario_id FROM vendas").fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
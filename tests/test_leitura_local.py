@@ -0,0 +1,93 @@
+"""
+Testes das leituras local-primeiro com revalidação em segundo plano.
+"""
+import unittest
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repositories.leitura_local import LOCAL_PRIMEIRO, RevalidadorLeituras
+from repositories.produto_repository import ProdutoRepository
+
+
+class TestRevalidadorLeituras(unittest.TestCase):
+    """Testes para RevalidadorLeituras"""
+
+    def test_revalidacoes_simultaneas_nao_se_sobrepoem(self):
+        revalidador = RevalidadorLeituras(intervalo_min=0)
+        liberar = threading.Event()
+        chamadas = []
+
+        def atualizar():
+            chamadas.append(1)
+            liberar.wait(5)
+            return 0
+
+        futuro = revalidador.revalidar('produtos', atualizar)
+        self.assertIsNotNone(futuro)
+        self.assertIsNone(revalidador.revalidar('produtos', atualizar))
+        liberar.set()
+        futuro.result(5)
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(revalidador.get_stats()['suprimidas'], 1)
+
+    def test_intervalo_minimo_entre_revalidacoes(self):
+        revalidador = RevalidadorLeituras(intervalo_min=60)
+        revalidador.revalidar('clientes', lambda: 0).result(5)
+        self.assertIsNone(revalidador.revalidar('clientes', lambda: 0))
+        # Outras entidades não são afetadas
+        self.assertIsNotNone(revalidador.revalidar('usuarios', lambda: 0))
+
+    def test_notifica_apenas_quando_ha_mudancas(self):
+        revalidador = RevalidadorLeituras(intervalo_min=0)
+        avisos = []
+        revalidador.assinar('produtos', avisos.append)
+
+        revalidador.revalidar('produtos', lambda: 0).result(5)
+        self.assertEqual(avisos, [])
+
+        revalidador.revalidar('produtos', lambda: 3).result(5)
+        self.assertEqual(avisos, ['produtos'])
+
+        revalidador.cancelar('produtos', avisos.append)
+        revalidador.revalidar('produtos', lambda: 2).result(5)
+        self.assertEqual(avisos, ['produtos'])
+        self.assertEqual(revalidador.get_stats()['com_mudancas'], 2)
+
+    def test_falha_na_atualizacao_e_contabilizada(self):
+        revalidador = RevalidadorLeituras(intervalo_min=0)
+
+        def atualizar():
+            raise ConnectionError("offline")
+
+        self.assertEqual(revalidador.revalidar('vendas', atualizar).result(5), 0)
+        self.assertEqual(revalidador.get_stats()['falhas'], 1)
+        # A falha libera a entidade para a próxima revalidação
+        self.assertIsNotNone(revalidador.revalidar('vendas', lambda: 0))
+
+
+class TestProdutosLocalPrimeiro(unittest.TestCase):
+    """Leitura de produtos em local_primeiro"""
+
+    def test_get_all_responde_local_e_dispara_pull(self):
+        repo = ProdutoRepository.__new__(ProdutoRepository)
+        puxou = threading.Event()
+
+        async def pull_falso():
+            puxou.set()
+            return 0
+
+        with patch('repositories.produto_repository.modo_leitura', return_value=LOCAL_PRIMEIRO), \
+                patch('repositories.produto_repository.revalidador', RevalidadorLeituras(intervalo_min=0)), \
+                patch.object(repo, '_is_online', return_value=True), \
+                patch.object(repo, '_get_all_local', return_value=[{'id': 1}]), \
+                patch.object(repo, '_pull_produtos_do_servidor', pull_falso):
+            self.assertEqual(repo.get_all(), [{'id': 1}])
+            self.assertTrue(puxou.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
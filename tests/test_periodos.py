@@ -0,0 +1,87 @@
+"""
+Testes dos filtros de período indexáveis sobre data_venda.
+"""
+import unittest
+import sqlite3
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.periodos import (
+    limites_periodo, filtro_periodo, filtro_mes, filtro_dia_atual, filtro_mes_atual
+)
+
+
+class TestPeriodos(unittest.TestCase):
+    """Testes para os helpers de database.periodos"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("""
+            CREATE TABLE vendas (
+                id INTEGER PRIMARY KEY, data_venda TEXT, status TEXT, total REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX idx_vendas_data_status ON vendas(data_venda, status)")
+        self.conn.executemany(
+            "INSERT INTO vendas (data_venda, status, total) VALUES (?, 'Ativa', ?)",
+            [
+                ('2024-01-31 23:59:59', 1),
+                ('2024-02-01 00:00:00', 2),
+                ('2024-02-15T10:30:00', 4),     # formato ISO vindo do servidor
+                ('2024-02-29 18:00:00', 8),
+                ('2024-03-01 00:00:00', 16),
+            ]
+        )
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _soma(self, filtro, params=()):
+        return self.conn.execute(
+            f"SELECT COALESCE(SUM(total), 0) FROM vendas WHERE {filtro}", params
+        ).fetchone()[0]
+
+    def test_limites_semiabertos(self):
+        """Fim do período é exclusivo e avança um dia"""
+        self.assertEqual(limites_periodo('2024-02-01', '2024-02-29'), ('2024-02-01', '2024-03-01'))
+        self.assertEqual(limites_periodo(date(2024, 12, 31)), ('2024-12-31', '2025-01-01'))
+        self.assertEqual(limites_periodo(datetime(2024, 5, 1, 15, 0), '2024-05-02 00:00:00'),
+                         ('2024-05-01', '2024-05-03'))
+
+    def test_equivale_a_date_between(self):
+        """Mesmo resultado que DATE(data_venda) BETWEEN, inclusive para datas ISO"""
+        filtro, params = filtro_periodo('data_venda', '2024-02-01', '2024-02-29')
+        esperado = self._soma("DATE(data_venda) BETWEEN ? AND ?", ('2024-02-01', '2024-02-29'))
+        self.assertEqual(self._soma(filtro, params), esperado)
+        self.assertEqual(esperado, 14)
+
+    def test_filtro_mes(self):
+        """Equivale a strftime('%Y-%m', data_venda) e trata a virada de ano"""
+        filtro, params = filtro_mes('data_venda', 2024, 2)
+        self.assertEqual(self._soma(filtro, params), 14)
+        self.assertEqual(filtro_mes('data_venda', 2024, 12)[1], ('2024-12-01', '2025-01-01'))
+
+    def test_filtros_relativos_a_hoje(self):
+        """Filtros de hoje/mês atual batem com as expressões originais"""
+        self.conn.execute("INSERT INTO vendas (data_venda, total) VALUES (datetime('now'), 32)")
+        self.assertEqual(self._soma(filtro_dia_atual('data_venda')),
+                         self._soma("DATE(data_venda) = DATE('now')"))
+        self.assertEqual(self._soma(filtro_mes_atual('data_venda')),
+                         self._soma("strftime('%Y-%m', data_venda) = strftime('%Y-%m', 'now')"))
+
+    def test_usa_indice(self):
+        """O plano de execução busca pelo índice em vez de varrer a tabela"""
+        filtro, params = filtro_periodo('data_venda', '2024-02-01', '2024-02-29')
+        plano = self.conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT SUM(total) FROM vendas WHERE {filtro}", params
+        ).fetchall()
+        detalhe = ' '.join(str(linha[-1]) for linha in plano)
+        self.assertIn('idx_vendas_data_status', detalhe)
+        self.assertNotIn('SCAN vendas', detalhe.replace('USING', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
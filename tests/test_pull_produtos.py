@@ -0,0 +1,163 @@
+"""
+Testes da gravação em lote do pull de produtos.
+"""
+import unittest
+import asyncio
+import sqlite3
+import tempfile
+import os
+import sys
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import connection_factory
+from database.hash_conteudo import hash_servidor
+from database.schema_migrations import _indice_uuid_produtos
+from repositories.produto_repository import ProdutoRepository
+from repositories.reconciliacao import espelho_servidor
+
+
+class _Resposta:
+    status_code = 200
+
+    def __init__(self, dados):
+        self._dados = dados
+
+    def json(self):
+        return self._dados
+
+
+class _HttpFalso:
+    """Servidor sem paginação: devolve sempre a lista inteira."""
+
+    def __init__(self, itens):
+        self.itens = itens
+
+    async def get(self, url, params=None, timeout=None):
+        return _Resposta(self.itens)
+
+    @asynccontextmanager
+    async def sessao_async(self):
+        yield self
+
+
+def _produto(i, **extra):
+    return {'uuid': f'u{i}', 'codigo': f'C{i}', 'nome': f'Produto {i}', 'preco_custo': 1.0,
+            'preco_venda': 2.0, 'estoque': 10, 'updated_at': '2025-02-01T10:00:00', **extra}
+
+
+class TestPullProdutos(unittest.TestCase):
+    """Testes para ProdutoRepository._pull_produtos_do_servidor"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'pull.db')
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE produtos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    codigo TEXT NOT NULL UNIQUE, nome TEXT NOT NULL, descricao TEXT,
+                    preco_custo REAL, preco_venda REAL, categoria_id INTEGER, fornecedor_id INTEGER,
+                    estoque REAL DEFAULT 0, estoque_servidor REAL, estoque_minimo REAL DEFAULT 0,
+                    venda_por_peso INTEGER DEFAULT 0, unidade_medida TEXT DEFAULT 'un',
+                    ativo INTEGER DEFAULT 1, uuid TEXT, synced INTEGER DEFAULT 0,
+                    created_at TEXT, updated_at TEXT, hash_conteudo TEXT
+                );
+                CREATE TABLE change_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, entity_type TEXT, entity_id TEXT,
+                    operation TEXT, data_json TEXT, created_at TEXT, status TEXT
+                );
+                INSERT INTO produtos (codigo, nome, estoque, uuid, synced, updated_at)
+                VALUES ('C1', 'Antigo 1', 3, 'u1', 1, '2025-01-01T00:00:00'),
+                       ('C2', 'Local pendente', 4, 'u2', 0, '2025-01-01T00:00:00'),
+                       ('C3', 'Inativo', 5, 'u3', 1, '2025-01-01T00:00:00');
+                UPDATE produtos SET ativo = 0 WHERE uuid = 'u3';
+                INSERT INTO change_log (entity_type, entity_id, operation, status)
+                VALUES ('produtos', 'u5', 'DELETE', 'pending');
+            """)
+            _indice_uuid_produtos(None, conn.cursor())
+
+        self.repo = ProdutoRepository.__new__(ProdutoRepository)
+        self.repo.backend_url = 'http://teste'
+        self.repo.api_base = 'http://teste/api'
+        self.repo.db_path = self.db_path
+
+    def tearDown(self):
+        espelho_servidor.invalidar()
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def _pull(self, itens):
+        with patch('repositories.produto_repository.http_client', _HttpFalso(itens)):
+            return asyncio.run(self.repo._pull_produtos_do_servidor(completo=True))
+
+    def _linhas(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return {r[0]: r[1:] for r in conn.execute(
+                "SELECT uuid, nome, estoque, estoque_servidor, ativo FROM produtos")}
+
+    def test_insere_atualiza_e_respeita_estado_local(self):
+        itens = [_produto(i) for i in range(1, 6)]
+        self.assertEqual(self._pull(itens), 2)  # u1 atualizado, u4 inserido
+
+        linhas = self._linhas()
+        # Atualizado: nome do servidor, estoque local preservado
+        self.assertEqual(linhas['u1'], ('Produto 1', 3, 10, 1))
+        # Mudança local pendente e soft delete local não são sobrescritos
+        self.assertEqual(linhas['u2'][0], 'Local pendente')
+        self.assertEqual(linhas['u3'][0], 'Inativo')
+        # Novo: estoque do servidor
+        self.assertEqual(linhas['u4'], ('Produto 4', 10, 10, 1))
+        # DELETE pendente impede a ressurreição
+        self.assertNotIn('u5', linhas)
+
+    def test_conflito_de_codigo_isola_a_linha(self):
+        itens = [_produto(4), _produto(6, codigo='C1')]
+        self.assertEqual(self._pull(itens), 1)
+        linhas = self._linhas()
+        self.assertIn('u4', linhas)
+        self.assertNotIn('u6', linhas)
+
+    def _tem_indice(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return any(l[1] == 'idx_produtos_uuid' for l in conn.execute("PRAGMA index_list(produtos)"))
+
+    def test_sem_indice_unico_grava_produto_a_produto(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DROP INDEX idx_produtos_uuid")
+            conn.execute("INSERT INTO produtos (codigo, nome, uuid, synced) VALUES ('C9', 'Duplicado', 'u3', 1)")
+        self.assertEqual(self._pull([_produto(1), _produto(4)]), 2)
+        self.assertEqual(self._linhas()['u1'], ('Produto 1', 3, 10, 1))
+        self.assertFalse(self._tem_indice())
+
+    def test_indice_ausente_recriado_no_pull(self):
+        """Resolvidos os duplicados, o pull cria o índice que a migração não criou"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DROP INDEX idx_produtos_uuid")
+        self.assertEqual(self._pull([_produto(1), _produto(4)]), 2)
+        self.assertTrue(self._tem_indice())
+
+    def _estado(self, produto_uuid):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(
+                "SELECT nome, updated_at, hash_conteudo FROM produtos WHERE uuid = ?", (produto_uuid,)).fetchone()
+
+    def test_produto_inalterado_nao_e_regravado(self):
+        self._pull([_produto(1), _produto(4)])
+        antes = self._estado('u1')
+        self.assertEqual(antes[2], hash_servidor('produtos', _produto(1)))
+
+        # Mesmo conteúdo com updated_at mais novo (ex.: touch no servidor): nada é gravado
+        self.assertEqual(self._pull([_produto(1, updated_at='2025-06-01T00:00:00'), _produto(4)]), 0)
+        self.assertEqual(self._estado('u1'), antes)
+
+    def test_conteudo_alterado_atualiza_mesmo_com_timestamp_antigo(self):
+        self._pull([_produto(1)])
+        self.assertEqual(self._pull([_produto(1, nome='Renomeado', updated_at='2024-01-01T00:00:00')]), 1)
+        self.assertEqual(self._estado('u1')[0], 'Renomeado')
+
+
+if __name__ == '__main__':
+    unittest.main()
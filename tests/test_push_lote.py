@@ -0,0 +1,92 @@
+"""
+Testes do envio em lote do change_log.
+"""
+import unittest
+import asyncio
+import json
+import tempfile
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import connect as db_connect, connection_factory
+from repositories import push_lote
+from repositories.push_lote import enviar_em_lote
+from utils.http_client import HttpClientManager
+
+
+def _mudanca(id, entity_id, operation, **data):
+    return {'id': id, 'entity_id': entity_id, 'operation': operation, 'data_json': json.dumps(data)}
+
+
+class TestPushLote(unittest.TestCase):
+    """Testes para push_lote"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'lote.db')
+        self.mudancas = [
+            _mudanca(1, 'a', 'CREATE', nome='Arroz', preco=10),
+            _mudanca(2, 'b', 'UPDATE', nome='Feijão'),
+            _mudanca(3, 'a', 'UPDATE', preco=12),
+            _mudanca(4, 'c', 'CREATE', nome='Temporário'),
+            _mudanca(5, 'c', 'DELETE'),
+            _mudanca(6, 'b', 'DELETE'),
+        ]
+        with db_connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE change_log (id INTEGER PRIMARY KEY, status TEXT DEFAULT 'pending', updated_at TEXT)
+            """)
+            conn.executemany("INSERT INTO change_log (id) VALUES (?)", [(m['id'],) for m in self.mudancas])
+            conn.commit()
+        self.lotes = []
+        push_lote._sem_lote.clear()
+
+    def tearDown(self):
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def _http(self, responder):
+        return HttpClientManager(backoff_s=0, async_transport=httpx.MockTransport(responder))
+
+    def _sincronizadas(self):
+        with db_connect(self.db_path) as conn:
+            return [r[0] for r in conn.execute("SELECT id FROM change_log WHERE status = 'synced' ORDER BY id")]
+
+    def test_lote_confirmado_parcialmente(self):
+        """Confirmados são marcados; recusados voltam para o envio individual"""
+        def responder(request):
+            changes = json.loads(request.content)['changes']
+            self.lotes.append(changes)
+            return httpx.Response(200, json={'results': [
+                {'change_id': c['change_id'], 'status': 'ok' if c['entity_id'] == 'a' else 'error'}
+                for c in changes
+            ]})
+
+        resultado = asyncio.run(enviar_em_lote(
+            'http://srv/api', 'produtos', self.mudancas, self.db_path, tamanho=1, http=self._http(responder)
+        ))
+        self.assertEqual(len(self.lotes), 2)
+        self.assertEqual(resultado.enviadas, 4)
+        self.assertEqual([m['id'] for m in resultado.restantes], [2, 6])
+        self.assertEqual(self._sincronizadas(), [1, 3, 4, 5])
+
+    def test_servidor_sem_endpoint(self):
+        """404 no lote devolve tudo para o envio individual e não sonda de novo"""
+        def responder(request):
+            self.lotes.append(request.url)
+            return httpx.Response(404)
+
+        http = self._http(responder)
+        for _ in range(2):
+            resultado = asyncio.run(enviar_em_lote('http://srv/api', 'vendas', self.mudancas[:3], self.db_path, http=http))
+            self.assertEqual([m['id'] for m in resultado.restantes], [1, 2, 3])
+        self.assertEqual(len(self.lotes), 1)
+        self.assertEqual(self._sincronizadas(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Testes da reconciliação de estoque e vendas com o servidor.
+"""
+import unittest
+import asyncio
+import json
+import tempfile
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import connect as db_connect, connection_factory
+from repositories.reconciliacao import EspelhoServidor, reconciliar_estoque, reconciliar_vendas
+from utils.http_client import HttpClientManager
+
+API = 'http://srv/api'
+
+
+class TestReconciliacao(unittest.TestCase):
+    """Testes para reconciliacao"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'recon.db')
+        with db_connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE produtos (id INTEGER PRIMARY KEY, codigo TEXT, nome TEXT, preco_custo REAL, ativo INTEGER,
+                                       preco_venda REAL, estoque REAL, uuid TEXT);
+                CREATE TABLE vendas (id INTEGER PRIMARY KEY, total REAL, desconto_aplicado_divida REAL,
+                                     forma_pagamento TEXT, status TEXT, uuid TEXT, synced INTEGER DEFAULT 0);
+                CREATE TABLE itens_venda (id INTEGER PRIMARY KEY, venda_id INTEGER, produto_id INTEGER,
+                                          quantidade REAL, preco_unitario REAL, subtotal REAL, peso_kg REAL);
+                INSERT INTO produtos VALUES (1, 'P1', 'Arroz', 5, 1, 10, 8, 'u1');
+                INSERT INTO produtos VALUES (2, 'P2', 'Feijão', 4, 1, 9, 3, 'u2');
+                INSERT INTO produtos VALUES (3, 'P3', 'Sal', 1, 1, 2, 5, NULL);
+                INSERT INTO vendas VALUES (1, 10, 0, 'Dinheiro', NULL, 'v1', 0);
+                INSERT INTO vendas VALUES (2, 18, 0, 'M-Pesa', NULL, 'v2', 0);
+                INSERT INTO itens_venda VALUES (1, 2, 2, 2, 9, 18, 0);
+            """)
+            conn.commit()
+        self.espelho = EspelhoServidor()
+        self.pedidos = []
+
+    def tearDown(self):
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def _http(self, servidor):
+        def responder(request):
+            self.pedidos.append((request.method, request.url.path))
+            if request.method == 'GET':
+                offset = int(request.url.params.get('offset', 0))
+                return httpx.Response(200, json=servidor[offset:] if offset == 0 else [])
+            return httpx.Response(200, json={})
+        return HttpClientManager(backoff_s=0, async_transport=httpx.MockTransport(responder))
+
+    def test_estoque_envia_so_divergentes_e_reusa_espelho(self):
+        """Só o produto divergente vai ao servidor; a segunda rodada não baixa nada"""
+        self.espelho.registrar(API, 'produtos', [
+            {'id': 'u1', 'codigo': 'P1', 'estoque': 8, 'preco_custo': 5, 'preco_venda': 10},
+            {'id': 'u2', 'codigo': 'P2', 'estoque': 7, 'preco_custo': 4, 'preco_venda': 9},
+            {'id': 'u3', 'codigo': 'P3', 'estoque': 5.0004, 'preco_custo': 1, 'preco_venda': 2},
+        ], completo=True)
+        http = self._http([])
+
+        resultado = asyncio.run(reconciliar_estoque(API, self.db_path, self.espelho, http))
+        self.assertEqual(resultado, {'divergentes': 1, 'sucesso': 1, 'falhas': 0})
+        self.assertEqual(self.pedidos, [('PUT', '/api/produtos/u2')])
+
+        # O espelho guardou o valor aceito: nada mais diverge
+        resultado = asyncio.run(reconciliar_estoque(API, self.db_path, self.espelho, http))
+        self.assertEqual(resultado['divergentes'], 0)
+        self.assertEqual(len(self.pedidos), 1)
+
+    def test_espelho_incremental_so_sobre_base_completa(self):
+        """Delta sem pull completo não conta como estado do servidor"""
+        self.espelho.registrar(API, 'produtos', [{'id': 'u1', 'estoque': 1}])
+        self.assertIsNone(self.espelho.itens(API, 'produtos'))
+        self.espelho.registrar(API, 'produtos', [{'id': 'u1', 'estoque': 1}], completo=True)
+        self.espelho.registrar(API, 'produtos', [{'uuid': 'u1', 'estoque': 2, 'extra': 'x'}])
+        self.assertEqual(self.espelho.itens(API, 'produtos')['u1']['estoque'], 2)
+        self.assertNotIn('extra', self.espelho.itens(API, 'produtos')['u1'])
+        self.espelho.invalidar('produtos')
+        self.assertIsNone(self.espelho.itens(API, 'produtos'))
+
+    def test_envio_aceito_atualiza_espelho(self):
+        """O que o push enviou depois do pull não volta como divergência"""
+        self.espelho.registrar(API, 'produtos', [
+            {'id': 'u1', 'codigo': 'P1', 'estoque': 8, 'preco_custo': 5, 'preco_venda': 10},
+            {'id': 'u2', 'codigo': 'P2', 'estoque': 7, 'preco_custo': 4, 'preco_venda': 9},
+        ], completo=True)
+        self.espelho.registrar_envio(API, 'produtos', 'UPDATE', 'u2',
+                                     {'estoque': 3, 'preco_custo': 4, 'preco_venda': 9, 'descricao': 'x'})
+        self.espelho.registrar_envio(API, 'produtos', 'DELETE', 'u1', {})
+
+        resultado = asyncio.run(reconciliar_estoque(API, self.db_path, self.espelho, self._http([])))
+        self.assertEqual(resultado['divergentes'], 0)
+        self.assertEqual(self.pedidos, [])
+        self.assertEqual(set(self.espelho.itens(API, 'produtos')), {'u2'})
+        self.assertNotIn('descricao', self.espelho.itens(API, 'produtos')['u2'])
+
+    def test_vendas_sem_espelho_baixa_uma_vez(self):
+        """Vendas já no servidor são marcadas; as ausentes são enviadas"""
+        http = self._http([{'id': 'v1'}])
+        resultado = asyncio.run(reconciliar_vendas(API, self.db_path, self.espelho, http))
+        self.assertEqual(resultado, {'ja_no_servidor': 1, 'sucesso': 1, 'falhas': 0})
+        self.assertEqual([p for p in self.pedidos if p[0] == 'POST'], [('POST', '/api/vendas/')])
+        with db_connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM vendas WHERE synced = 1").fetchone()[0], 2)
+        self.assertIn('v2', self.espelho.itens(API, 'vendas'))
+
+
+if __name__ == '__main__':
+    unittest.main()
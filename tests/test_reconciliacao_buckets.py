@@ -0,0 +1,144 @@
+"""
+Testes do diff de estoque por faixas de hash.
+"""
+import unittest
+import asyncio
+import tempfile
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection_factory import connect as db_connect, connection_factory
+from repositories import reconciliacao_buckets
+from repositories.reconciliacao import EspelhoServidor, reconciliar_estoque
+from repositories.reconciliacao_buckets import bucket_de, hashes_por_bucket, linha_canonica, raiz
+from utils.http_client import HttpClientManager
+
+API = 'http://srv/api'
+
+
+class _ServidorHashes:
+    """Servidor em memória que implementa o protocolo de faixas."""
+
+    def __init__(self, produtos, suporta=True):
+        self.produtos = produtos
+        self.suporta = suporta
+        self.pedidos = []
+
+    def __call__(self, request):
+        params = request.url.params
+        self.pedidos.append((request.method, request.url.path, dict(params)))
+        if request.method == 'PUT':
+            return httpx.Response(200, json={})
+        if request.url.path.endswith('/hashes'):
+            if not self.suporta:
+                return httpx.Response(404)
+            buckets = int(params['buckets'])
+            hashes = hashes_por_bucket(self.produtos, buckets)
+            return httpx.Response(200, json={'buckets': buckets, 'raiz': raiz(hashes), 'hashes': hashes})
+        if 'bucket' in params:
+            bucket, buckets = int(params['bucket']), int(params['buckets'])
+            return httpx.Response(200, json=[p for p in self.produtos if bucket_de(p['id'], buckets) == bucket])
+        offset = int(params.get('offset', 0))
+        return httpx.Response(200, json=self.produtos if offset == 0 else [])
+
+
+class TestReconciliacaoBuckets(unittest.TestCase):
+    """Testes para reconciliacao_buckets"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'buckets.db')
+        self.servidor = [
+            {'id': f'u{i}', 'codigo': f'P{i}', 'estoque': 10, 'preco_custo': 5, 'preco_venda': 8, 'ativo': True}
+            for i in range(200)
+        ]
+        with db_connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE produtos (id INTEGER PRIMARY KEY, codigo TEXT, nome TEXT, preco_custo REAL,
+                                       preco_venda REAL, estoque REAL, ativo INTEGER, uuid TEXT)
+            """)
+            conn.executemany(
+                "INSERT INTO produtos (codigo, nome, preco_custo, preco_venda, estoque, ativo, uuid) "
+                "VALUES (?, ?, 5, 8, 10, 1, ?)",
+                [(p['codigo'], p['codigo'], p['id']) for p in self.servidor]
+            )
+            conn.execute("UPDATE produtos SET estoque = 7 WHERE uuid = 'u42'")
+            conn.commit()
+        reconciliacao_buckets._sem_hash.clear()
+
+    def tearDown(self):
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def _reconciliar(self, servidor, espelho=None):
+        http = HttpClientManager(backoff_s=0, async_transport=httpx.MockTransport(servidor))
+        return asyncio.run(reconciliar_estoque(API, self.db_path, espelho or EspelhoServidor(), http))
+
+    def test_linha_canonica_estavel(self):
+        """Formatos diferentes do mesmo valor geram o mesmo hash"""
+        self.assertEqual(
+            linha_canonica({'uuid': 'a', 'estoque': 1, 'preco_venda': '2.5', 'preco_custo': None, 'ativo': True}),
+            linha_canonica({'id': 'a', 'estoque': 1.0004, 'preco_venda': 2.5, 'preco_custo': 0, 'ativo': 1}),
+        )
+        self.assertEqual(hashes_por_bucket(self.servidor, 8), hashes_por_bucket(list(reversed(self.servidor)), 8))
+
+    def test_baixa_so_faixas_divergentes(self):
+        """Um produto divergente: uma faixa baixada e um PUT"""
+        servidor = _ServidorHashes(self.servidor)
+        resultado = self._reconciliar(servidor)
+        self.assertEqual(resultado['sucesso'], 1)
+
+        faixas = [p for p in servidor.pedidos if 'bucket' in p[2]]
+        self.assertEqual(len(faixas), 1)
+        self.assertEqual(int(faixas[0][2]['bucket']), bucket_de('u42'))
+        self.assertEqual([p[:2] for p in servidor.pedidos if p[0] == 'PUT'], [('PUT', '/api/produtos/u42')])
+
+    def test_raiz_igual_nao_baixa_nada(self):
+        """Catálogos iguais: só a consulta de hashes"""
+        self.servidor[42]['estoque'] = 7
+        servidor = _ServidorHashes(self.servidor)
+        self.assertEqual(self._reconciliar(servidor)['divergentes'], 0)
+        self.assertEqual(len(servidor.pedidos), 1)
+
+    def test_ativo_e_produtos_nao_enviados_nao_divergem(self):
+        """ativo não entra no hash e produtos que o servidor não conhece ficam de fora"""
+        self.servidor[42]['estoque'] = 7
+        self.servidor[7]['ativo'] = False
+        with db_connect(self.db_path) as conn:
+            conn.execute("ALTER TABLE produtos ADD COLUMN synced INTEGER DEFAULT 1")
+            conn.execute("INSERT INTO produtos (codigo, nome, preco_custo, preco_venda, estoque, ativo, uuid, synced) "
+                         "VALUES ('N1', 'Novo', 1, 2, 3, 1, 'local-1', 0)")
+            conn.commit()
+        servidor = _ServidorHashes(self.servidor)
+        self.assertEqual(self._reconciliar(servidor)['divergentes'], 0)
+        self.assertEqual(len(servidor.pedidos), 1)
+
+    def test_faixas_baixadas_alimentam_espelho(self):
+        """A segunda reconciliação do ciclo usa o espelho montado pela primeira"""
+        servidor = _ServidorHashes(self.servidor)
+        espelho = EspelhoServidor()
+        self._reconciliar(servidor, espelho)
+        self.assertEqual(len(espelho.itens(API, 'produtos')), 200)
+        self.assertEqual(espelho.itens(API, 'produtos')['u42']['estoque'], 7)
+
+        servidor.pedidos.clear()
+        self.assertEqual(self._reconciliar(servidor, espelho)['divergentes'], 0)
+        self.assertEqual(servidor.pedidos, [])
+
+    def test_servidor_sem_protocolo_usa_lista_completa(self):
+        """404 nos hashes volta para a lista completa e não sonda de novo"""
+        servidor = _ServidorHashes(self.servidor, suporta=False)
+        self.assertEqual(self._reconciliar(servidor)['sucesso'], 1)
+        self.assertTrue(any(p[1] == '/api/produtos/' and 'offset' in p[2] for p in servidor.pedidos))
+
+        servidor.pedidos.clear()
+        self._reconciliar(servidor)
+        self.assertFalse(any(p[1].endswith('/hashes') for p in servidor.pedidos))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Testes do resumo diário de vendas mantido por triggers.
+"""
+import unittest
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.resumo_vendas import criar_resumo_diario, reconstruir_resumo
+
+
+class TestResumoVendas(unittest.TestCase):
+    """Testes para vendas_resumo_diario"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE vendas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usuario_id INTEGER NOT NULL,
+                total REAL,
+                valor_total REAL,
+                forma_pagamento TEXT,
+                data_venda DATETIME,
+                status TEXT DEFAULT 'Concluida'
+            );
+            CREATE TABLE itens_venda (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                venda_id INTEGER NOT NULL,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                preco_unitario REAL NOT NULL,
+                preco_custo_unitario REAL NOT NULL,
+                subtotal REAL NOT NULL,
+                peso_kg REAL DEFAULT 0,
+                status TEXT
+            );
+        """)
+        criar_resumo_diario(self.conn.cursor())
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _venda(self, total, data='2024-03-10 10:00:00', usuario=1, forma='Dinheiro', itens=()):
+        cur = self.conn.execute(
+            "INSERT INTO vendas (usuario_id, total, valor_total, forma_pagamento, data_venda) "
+            "VALUES (?, ?, ?, ?, ?)", (usuario, total, total, forma, data)
+        )
+        venda_id = cur.lastrowid
+        for qtd, preco, custo, peso in itens:
+            self.conn.execute(
+                "INSERT INTO itens_venda (venda_id, produto_id, quantidade, preco_unitario, "
+                "preco_custo_unitario, subtotal, peso_kg) VALUES (?, 1, ?, ?, ?, ?, ?)",
+                (venda_id, qtd, preco, custo, (peso or qtd) * preco, peso)
+            )
+        return venda_id
+
+    def _resumo(self):
+        return {
+            (r['dia'], r['usuario_id'], r['forma_pagamento']): dict(r)
+            for r in self.conn.execute("SELECT * FROM vendas_resumo_diario")
+        }
+
+    def _conferir_com_reconstrucao(self):
+        incremental = self._resumo()
+        reconstruir_resumo(self.conn.cursor())
+        reconstruido = self._resumo()
+        for chave, linha in reconstruido.items():
+            for campo, valor in linha.items():
+                if isinstance(valor, float):
+                    self.assertAlmostEqual(incremental[chave][campo], valor, places=6)
+                else:
+                    self.assertEqual(incremental[chave][campo], valor)
+        # Linhas só no incremental devem estar zeradas (grupos esvaziados)
+        for chave in set(incremental) - set(reconstruido):
+            self.assertEqual(incremental[chave]['num_vendas'], 0)
+            self.assertEqual(incremental[chave]['num_anuladas'], 0)
+
+    def test_insercao_de_venda_e_itens(self):
+        """Inserir venda e itens acumula contagem, bruto, custo e lucro"""
+        self._venda(50, itens=[(2, 10, 6, 0), (1, 30, 20, 0)])
+        self._venda(5, itens=[(1, 10, 4, 0.5)], data='2024-03-10T18:00:00')
+
+        linha = self._resumo()[('2024-03-10', 1, 'Dinheiro')]
+        self.assertEqual(linha['num_vendas'], 2)
+        self.assertAlmostEqual(linha['total_bruto'], 55)
+        self.assertAlmostEqual(linha['custo'], 12 + 20 + 2)
+        self.assertAlmostEqual(linha['lucro'], 8 + 10 + 3)
+        self._conferir_com_reconstrucao()
+
+    def test_anulacao_move_para_anuladas(self):
+        """Anular a venda remove bruto/lucro e registra em anuladas"""
+        venda_id = self._venda(20, itens=[(2, 10, 5, 0)])
+        self.conn.execute("UPDATE vendas SET status = 'Anulada' WHERE id = ?", (venda_id,))
+
+        linha = self._resumo()[('2024-03-10', 1, 'Dinheiro')]
+        self.assertEqual((linha['num_vendas'], linha['num_anuladas']), (0, 1))
+        self.assertAlmostEqual(linha['total_bruto'], 0)
+        self.assertAlmostEqual(linha['lucro'], 0)
+        self.assertAlmostEqual(linha['total_anulado'], 20)
+        self._conferir_com_reconstrucao()
+
+    def test_edicao_de_itens_e_mudanca_de_chave(self):
+        """Itens removidos deixam de contar e mudanças de dia/forma migram os valores"""
+        venda_id = self._venda(20, itens=[(2, 10, 5, 0)])
+        self.conn.execute("UPDATE itens_venda SET status = 'Removido' WHERE venda_id = ?", (venda_id,))
+        self.conn.execute(
+            "INSERT INTO itens_venda (venda_id, produto_id, quantidade, preco_unitario, "
+            "preco_custo_unitario, subtotal) VALUES (?, 1, 1, 10, 5, 10)", (venda_id,)
+        )
+        self.conn.execute(
+            "UPDATE vendas SET total = 10, forma_pagamento = 'M-Pesa', data_venda = '2024-03-11 09:00:00' "
+            "WHERE id = ?", (venda_id,)
+        )
+
+        resumo = self._resumo()
+        self.assertEqual(resumo[('2024-03-10', 1, 'Dinheiro')]['num_vendas'], 0)
+        nova = resumo[('2024-03-11', 1, 'M-Pesa')]
+        self.assertEqual(nova['num_vendas'], 1)
+        self.assertAlmostEqual(nova['total_bruto'], 10)
+        self.assertAlmostEqual(nova['lucro'], 5)
+        self._conferir_com_reconstrucao()
+
+    def test_exclusao(self):
+        """Excluir itens e venda zera o resumo"""
+        venda_id = self._venda(20, itens=[(2, 10, 5, 0)])
+        self.conn.execute("DELETE FROM itens_venda WHERE venda_id = ?", (venda_id,))
+        self.conn.execute("DELETE FROM vendas WHERE id = ?", (venda_id,))
+
+        linha = self._resumo()[('2024-03-10', 1, 'Dinheiro')]
+        self.assertEqual(linha['num_vendas'], 0)
+        self.assertAlmostEqual(linha['total_bruto'], 0)
+        self.assertAlmostEqual(linha['lucro'], 0)
+
+    def test_criacao_popula_historico(self):
+        """Ao criar o resumo num banco com vendas antigas, ele é reconstruído"""
+        self._venda(20, itens=[(2, 10, 5, 0)])
+        self.conn.execute("DROP TABLE vendas_resumo_diario")
+
+        self.assertTrue(criar_resumo_diario(self.conn.cursor()))
+        linha = self._resumo()[('2024-03-10', 1, 'Dinheiro')]
+        self.assertEqual(linha['num_vendas'], 1)
+        self.assertAlmostEqual(linha['lucro'], 10)
+        self.assertFalse(criar_resumo_diario(self.conn.cursor()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Testes do cache de colunas do esquema.
+"""
+import unittest
+import tempfile
+import sqlite3
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.schema_cache import SchemaCache, altera_esquema
+from utils.migration_helper import MigrationHelper
+
+
+class TestSchemaCache(unittest.TestCase):
+    """Testes para o SchemaCache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'esquema.db')
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE produtos (id INTEGER PRIMARY KEY, nome TEXT NOT NULL DEFAULT 'x')")
+            conn.execute("CREATE TABLE vendas (id INTEGER PRIMARY KEY, total REAL)")
+        self.cache = SchemaCache()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _adicionar_coluna(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("ALTER TABLE produtos ADD COLUMN uuid TEXT")
+
+    def test_carregar_le_todas_as_tabelas(self):
+        """Após carregar, consultas não sondam mais o catálogo"""
+        self.cache.carregar(self.db_path)
+        sondagens = self.cache.get_stats()['sondagens']
+
+        self.assertEqual(self.cache.colunas(self.db_path, 'produtos'), ('id', 'nome'))
+        self.assertTrue(self.cache.tem_coluna(self.db_path, 'vendas', 'total'))
+        self.assertEqual(self.cache.get_stats()['sondagens'], sondagens)
+
+    def test_cache_ate_invalidar(self):
+        """Colunas adicionadas só aparecem após invalidar"""
+        self.assertFalse(self.cache.tem_coluna(self.db_path, 'produtos', 'uuid'))
+        self._adicionar_coluna()
+        self.assertFalse(self.cache.tem_coluna(self.db_path, 'produtos', 'uuid'))
+
+        self.cache.invalidar(self.db_path, 'produtos')
+        self.assertTrue(self.cache.tem_coluna(self.db_path, 'produtos', 'uuid'))
+
+    def test_tabela_inexistente_nao_e_memorizada(self):
+        """Uma tabela criada depois da primeira consulta é enxergada"""
+        self.assertEqual(self.cache.colunas(self.db_path, 'change_log'), ())
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE change_log (id INTEGER PRIMARY KEY, status TEXT)")
+        self.assertEqual(self.cache.colunas(self.db_path, 'change_log'), ('id', 'status'))
+
+    def test_info_colunas(self):
+        """Informações de NOT NULL e DEFAULT ficam disponíveis"""
+        info = self.cache.info_colunas(self.db_path, 'produtos')
+        self.assertEqual(info['nome'][3], 1)
+        self.assertEqual(info['nome'][4], "'x'")
+
+    def test_deteccao_de_ddl(self):
+        """Comandos DDL invalidam o cache no Database.execute"""
+        self.assertTrue(altera_esquema("  alter table produtos add column x"))
+        self.assertTrue(altera_esquema("CREATE INDEX idx ON produtos(nome)"))
+        self.assertFalse(altera_esquema("UPDATE produtos SET nome = 'a'"))
+
+    def test_migracao_invalida_apos_commit(self):
+        """Recarregar o cache na invalidação já enxerga as colunas novas"""
+        vistas = []
+
+        def invalidar(db_path, tabela=None):
+            self.cache.invalidar(db_path, tabela)
+            # Outra conexão recarrega o cache no mesmo instante
+            vistas.append(self.cache.colunas(db_path, tabela))
+
+        with patch('utils.migration_helper.schema_cache.invalidar', side_effect=invalidar):
+            MigrationHelper(self.db_path).migrate_produtos_table()
+
+        self.assertEqual(vistas, [('id', 'nome', 'uuid', 'synced')])
+
+
+if __name__ == '__main__':
+    unittest.main()
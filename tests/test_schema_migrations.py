@@ -0,0 +1,96 @@
+"""
+Testes do executor de migrações versionadas.
+"""
+import unittest
+import tempfile
+import sqlite3
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.schema_migrations import (
+    Migracao, executar_migracoes, versao_atual, aplicar_script_colunas, formatar_relatorio
+)
+
+
+class _BancoFalso:
+    """Contexto mínimo recebido pelas migrações (só a conexão)."""
+
+    def __init__(self, caminho):
+        self.db_path = caminho
+        self.conn = sqlite3.connect(caminho)
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    """Testes para executar_migracoes e aplicar_script_colunas"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = _BancoFalso(os.path.join(self.temp_dir.name, 'migracoes.db'))
+        self.chamadas = []
+
+    def tearDown(self):
+        self.db.conn.close()
+        self.temp_dir.cleanup()
+
+    def _migracao(self, versao, sql):
+        def aplicar(db, cursor):
+            self.chamadas.append(versao)
+            cursor.execute(sql)
+        return Migracao(versao, f'm{versao}', aplicar)
+
+    def test_aplica_somente_pendentes(self):
+        """Na segunda execução só a migração nova roda"""
+        migracoes = [
+            self._migracao(1, "CREATE TABLE produtos (id INTEGER PRIMARY KEY)"),
+            self._migracao(2, "ALTER TABLE produtos ADD COLUMN nome TEXT"),
+        ]
+        relatorio = executar_migracoes(self.db, migracoes)
+        self.assertEqual((relatorio['versao_inicial'], relatorio['versao_final']), (0, 2))
+
+        migracoes.append(self._migracao(3, "CREATE INDEX idx_nome ON produtos(nome)"))
+        relatorio = executar_migracoes(self.db, migracoes)
+        self.assertEqual(self.chamadas, [1, 2, 3])
+        self.assertEqual([m['versao'] for m in relatorio['aplicadas']], [3])
+
+        executar_migracoes(self.db, migracoes)
+        self.assertEqual(self.chamadas, [1, 2, 3])
+        self.assertEqual(versao_atual(self.db.conn.cursor()), 3)
+        self.assertIn('sem migrações pendentes', formatar_relatorio(executar_migracoes(self.db, migracoes)))
+
+    def test_falha_interrompe_e_nao_registra(self):
+        """Uma migração com erro não é registrada e as seguintes não rodam"""
+        migracoes = [
+            self._migracao(1, "CREATE TABLE produtos (id INTEGER PRIMARY KEY)"),
+            self._migracao(2, "ALTER TABLE inexistente ADD COLUMN x TEXT"),
+            self._migracao(3, "CREATE INDEX idx_id ON produtos(id)"),
+        ]
+        with self.assertRaises(sqlite3.Error):
+            executar_migracoes(self.db, migracoes)
+        self.assertEqual(self.chamadas, [1, 2])
+        self.assertEqual(versao_atual(self.db.conn.cursor()), 1)
+
+    def test_script_de_colunas_idempotente(self):
+        """DEFAULT CURRENT_TIMESTAMP é preenchido e tabelas ausentes são ignoradas"""
+        self.db.conn.execute("CREATE TABLE produtos (id INTEGER PRIMARY KEY, synced INTEGER)")
+        self.db.conn.execute("INSERT INTO produtos (id) VALUES (1)")
+        script = """
+            -- comentário
+            ALTER TABLE produtos ADD COLUMN last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+            ALTER TABLE produtos ADD COLUMN synced BOOLEAN DEFAULT FALSE;
+            ALTER TABLE fornecedores ADD COLUMN synced BOOLEAN DEFAULT FALSE;
+            CREATE TABLE IF NOT EXISTS sync_logs (id INTEGER PRIMARY KEY);
+        """
+        cursor = self.db.conn.cursor()
+        self.assertEqual(aplicar_script_colunas(cursor, script), 1)
+        self.assertEqual(aplicar_script_colunas(cursor, script), 0)
+
+        valor = cursor.execute("SELECT last_updated FROM produtos WHERE id = 1").fetchone()[0]
+        self.assertIsNotNone(valor)
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'sync_logs'")
+        self.assertIsNotNone(cursor.fetchone())
+
+
+if __name__ == '__main__':
+    unittest.main()
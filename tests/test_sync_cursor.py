@@ -0,0 +1,162 @@
+"""
+Testes dos cursores do pull incremental.
+"""
+import unittest
+import asyncio
+import json
+import tempfile
+from datetime import datetime, timedelta
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from database.connection_factory import connection_factory
+from database.sync_cursor import (
+    ErroDownload, baixar_alteracoes, baixar_em_lotes, gravar_cursor, ler_cursor, maior_updated_at,
+    reconciliacoes_vencidas, solicitar_reconciliacao
+)
+from utils.http_client import HttpClientManager
+
+
+class _Resposta:
+    def __init__(self, dados, status_code=200):
+        self.status_code = status_code
+        self._dados = dados
+
+    def json(self):
+        return self._dados
+
+
+class _ClienteFalso:
+    """Servidor em memória; paginado=False ignora offset/limit/updated_since."""
+
+    def __init__(self, itens, paginado=True):
+        self.itens = itens
+        self.paginado = paginado
+        self.pedidos = []
+
+    async def get(self, url, params=None, timeout=None):
+        self.pedidos.append(dict(params))
+        if not self.paginado:
+            return _Resposta(self.itens)
+        desde = params.get('updated_since')
+        itens = [i for i in self.itens if not desde or i['updated_at'] >= desde]
+        return _Resposta(itens[params['offset']:params['offset'] + params['limit']])
+
+
+class TestSyncCursor(unittest.TestCase):
+    """Testes para sync_cursor"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'cursor.db')
+        self.itens = [
+            {'uuid': f'u{i}', 'updated_at': f'2025-01-{i + 1:02d}T10:00:00'} for i in range(7)
+        ]
+
+    def tearDown(self):
+        connection_factory.invalidate()
+        self.temp_dir.cleanup()
+
+    def test_cursor_gravado_e_reconciliacao(self):
+        """Sem cursor o pull é completo; reconciliação apaga a marca"""
+        self.assertIsNone(ler_cursor(self.db_path, 'produtos'))
+        gravar_cursor(self.db_path, 'produtos', '2025-01-07T10:00:00', completo=True)
+        gravar_cursor(self.db_path, 'vendas', '2025-01-03T10:00:00')
+        self.assertEqual(ler_cursor(self.db_path, 'produtos'), '2025-01-07T10:00:00')
+
+        solicitar_reconciliacao(self.db_path, 'produtos')
+        self.assertIsNone(ler_cursor(self.db_path, 'produtos'))
+        self.assertEqual(ler_cursor(self.db_path, 'vendas'), '2025-01-03T10:00:00')
+
+    def test_reconciliacoes_vencidas(self):
+        """Marcas com reconciliação completa antiga (ou nunca feita) são apontadas"""
+        gravar_cursor(self.db_path, 'produtos', '2025-01-07T10:00:00', completo=True)
+        gravar_cursor(self.db_path, 'vendas', '2025-01-03T10:00:00')
+        self.assertEqual(reconciliacoes_vencidas(self.db_path, timedelta(hours=24)), ['vendas'])
+
+        daqui_a_dois_dias = datetime.now() + timedelta(days=2)
+        self.assertEqual(
+            sorted(reconciliacoes_vencidas(self.db_path, timedelta(hours=24), agora=daqui_a_dois_dias)),
+            ['produtos', 'vendas'])
+        # Sem marca o próximo pull já é completo
+        solicitar_reconciliacao(self.db_path)
+        self.assertEqual(reconciliacoes_vencidas(self.db_path, timedelta(hours=24), agora=daqui_a_dois_dias), [])
+
+    def test_maior_updated_at(self):
+        """A marca só avança; aceita fuso 'Z' e ignora datas inválidas"""
+        self.assertEqual(maior_updated_at(self.itens), '2025-01-07T10:00:00')
+        self.assertEqual(maior_updated_at([], '2025-01-02T00:00:00'), '2025-01-02T00:00:00')
+        self.assertEqual(
+            maior_updated_at([{'updated_at': 'x'}, {'updated_at': '2025-02-01T00:00:00Z'}], '2025-01-02T00:00:00'),
+            '2025-02-01T00:00:00Z'
+        )
+
+    def test_paginacao_e_delta(self):
+        """Baixa em páginas e pede só o que mudou desde a marca"""
+        cliente = _ClienteFalso(self.itens)
+        itens = asyncio.run(baixar_alteracoes(cliente, '/produtos/', tamanho_pagina=3))
+        self.assertEqual(len(itens), 7)
+        self.assertEqual([p['offset'] for p in cliente.pedidos], [0, 3, 6])
+
+        cliente.pedidos.clear()
+        itens = asyncio.run(baixar_alteracoes(cliente, '/produtos/', '2025-01-06T10:00:00', tamanho_pagina=3))
+        self.assertEqual([i['uuid'] for i in itens], ['u5', 'u6'])
+        self.assertEqual(cliente.pedidos[0]['updated_since'], '2025-01-06T10:00:00')
+
+    def test_servidor_sem_paginacao(self):
+        """Resposta sem paginação é tratada como página única, sem repetir pedidos"""
+        cliente = _ClienteFalso(self.itens[:3], paginado=False)
+        itens = asyncio.run(baixar_alteracoes(cliente, '/produtos/', tamanho_pagina=3))
+        self.assertEqual(len(itens), 3)
+        self.assertEqual(len(cliente.pedidos), 2)
+
+        self.assertIsNone(asyncio.run(baixar_alteracoes(_ErroHttp(), '/produtos/')))
+
+    def _http(self, corpo: bytes, tipo='application/json', pedaco=7, status=200):
+        async def pedacos():
+            for i in range(0, len(corpo), pedaco):
+                yield corpo[i:i + pedaco]
+
+        def responder(request):
+            return httpx.Response(status, content=pedacos(), headers={'content-type': tipo})
+        return HttpClientManager(backoff_s=0, async_transport=httpx.MockTransport(responder))
+
+    def _lotes(self, http, **kwargs):
+        async def baixar():
+            async with http.sessao_async() as client:
+                return [lote async for lote in baixar_em_lotes(client, 'http://srv/api/vendas/', **kwargs)]
+        return asyncio.run(baixar())
+
+    def test_streaming_em_lotes(self):
+        """Array JSON cortado em pedaços arbitrários chega em lotes do tamanho pedido"""
+        itens = [{'uuid': f'v{i}', 'itens': [{'nome': 'a, ]"{'}], 'total': i * 1.5} for i in range(7)]
+        corpo = json.dumps(itens, ensure_ascii=False).encode('utf-8')
+        lotes = self._lotes(self._http(corpo), tamanho_lote=3)
+        self.assertEqual([len(l) for l in lotes], [3, 3, 1])
+        self.assertEqual([i for l in lotes for i in l], itens)
+
+    def test_streaming_ndjson(self):
+        """NDJSON é decodificado linha a linha"""
+        corpo = b'{"uuid": "a"}\n\n{"uuid": "b"}\n'
+        lotes = self._lotes(self._http(corpo, tipo='application/x-ndjson', pedaco=4))
+        self.assertEqual(lotes, [[{'uuid': 'a'}, {'uuid': 'b'}]])
+
+    def test_streaming_erros(self):
+        """Erro HTTP e corpo truncado não passam como download completo"""
+        with self.assertRaises(ErroDownload):
+            self._lotes(self._http(b'[]', status=500))
+        with self.assertRaises(ErroDownload):
+            self._lotes(self._http(b'[{"uuid": "a"}, {"uuid": '))
+
+
+class _ErroHttp:
+    async def get(self, url, params=None, timeout=None):
+        return _Resposta(None, status_code=500)
+
+
+if __name__ == '__main__':
+    unittest.main()
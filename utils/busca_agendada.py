@@ -0,0 +1,78 @@
+"""
+Busca com espera entre teclas (debounce) e descarte de resultados obsoletos.
+
+O campo de busca do PDV disparava uma consulta e a reconstrução da tabela a
+cada tecla; um leitor de código de barras "digita" 13 caracteres em poucos
+milissegundos e enfileirava 13 buscas completas. BuscaAgendada só executa
+depois de uma janela sem novas teclas e numera cada pedido (geração): uma
+busca que termina depois de outra mais nova ter sido pedida é descartada
+antes de chegar à tela (ver obsoleta).
+"""
+import threading
+from typing import Callable
+
+JANELA_PADRAO_S = 0.2
+
+
+class BuscaAgendada:
+    """Agenda executar(termo, geracao) para depois da janela de espera."""
+
+    def __init__(self, executar: Callable, janela: float = JANELA_PADRAO_S,
+                 criar_timer: Callable = threading.Timer):
+        self._executar = executar
+        self.janela = janela
+        self._criar_timer = criar_timer
+        self._lock = threading.Lock()
+        self._timer = None
+        self._geracao = 0
+        self._stats = {'agendadas': 0, 'executadas': 0, 'descartadas': 0}
+
+    def agendar(self, termo):
+        """Pedido a cada tecla: substitui o pedido anterior ainda em espera."""
+        with self._lock:
+            geracao = self._nova_geracao()
+            self._stats['agendadas'] += 1
+            self._timer = self._criar_timer(self.janela, self._disparar, args=(termo, geracao))
+            self._timer.daemon = True
+            self._timer.start()
+        return geracao
+
+    def agora(self, termo):
+        """Executa imediatamente (Enter, fim de venda), cancelando o pedido em espera."""
+        with self._lock:
+            geracao = self._nova_geracao()
+        self._disparar(termo, geracao)
+        return geracao
+
+    def cancelar(self):
+        """Cancela o pedido em espera e invalida buscas em andamento."""
+        with self._lock:
+            self._nova_geracao()
+
+    def obsoleta(self, geracao) -> bool:
+        """True se um pedido mais novo já foi feito depois desta geração."""
+        return geracao != self._geracao
+
+    def descartar(self):
+        """Contabiliza um resultado descartado pelo executor por ser obsoleto."""
+        with self._lock:
+            self._stats['descartadas'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _nova_geracao(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._geracao += 1
+        return self._geracao
+
+    def _disparar(self, termo, geracao):
+        if self.obsoleta(geracao):
+            self.descartar()
+            return
+        with self._lock:
+            self._stats['executadas'] += 1
+        self._executar(termo, geracao)
@@ -0,0 +1,242 @@
+"""
+Notificações de mudanças do servidor com fallback para polling adaptativo.
+
+Em vez de sincronizar a cada ``sync_interval_seconds`` mesmo sem nada novo,
+o PDV assina um canal de eventos e sincroniza só as entidades alteradas:
+
+- MQTT (``asyncio-mqtt``, opcional) quando ``mqtt_broker`` está configurado;
+- SSE em ``GET {api}/eventos/stream`` nos demais casos.
+
+Cada evento traz a entidade alterada, em JSON: ``{"entidade": "produtos"}``
+(também aceitos ``entity``/``entity_type`` ou a lista ``entidades``).
+Eventos próximos são agrupados numa única sincronização.
+
+Sem canal disponível (broker fora, servidor sem o endpoint, rede caída) o
+PDV volta a sincronizar periodicamente, com intervalo adaptativo: dobra a
+cada ciclo sem mudanças até o máximo e volta ao mínimo quando algo chega.
+O canal é tentado de novo periodicamente; ao reconectar, uma sincronização
+completa recupera o que possa ter sido perdido.
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Awaitable, Callable, Optional, Set
+
+import httpx
+
+from utils.http_client import http_client
+
+try:
+    import asyncio_mqtt
+except ImportError:  # dependência opcional
+    asyncio_mqtt = None
+
+ENTIDADES = ('produtos', 'vendas', 'usuarios', 'clientes')
+
+INTERVALO_MIN_S = 10.0
+INTERVALO_MAX_S = 300.0
+
+# Janela para agrupar eventos próximos numa única sincronização
+JANELA_EVENTOS_S = 1.0
+
+# Tempo até tentar de novo um canal que falhou
+RETENTAR_CANAL_S = 300.0
+
+# Sem nenhum dado (nem keep-alive) por esse tempo, a conexão SSE é dada como morta
+TIMEOUT_LEITURA_SSE_S = 90.0
+
+
+class IntervaloAdaptativo:
+    """Intervalo de polling: recua quando ocioso, acelera quando há mudanças."""
+
+    def __init__(self, base: float = 30.0, minimo: float = INTERVALO_MIN_S,
+                 maximo: float = INTERVALO_MAX_S, fator: float = 2.0):
+        self.minimo = minimo
+        self.maximo = max(minimo, maximo)
+        self.fator = fator
+        self.atual = min(max(base, self.minimo), self.maximo)
+
+    def registrar(self, houve_mudancas: bool) -> float:
+        """Ajusta e retorna o intervalo até o próximo ciclo."""
+        if houve_mudancas:
+            self.atual = self.minimo
+        else:
+            self.atual = min(self.atual * self.fator, self.maximo)
+        return self.atual
+
+
+def entidades_do_evento(dados) -> Set[str]:
+    """Entidades citadas num evento (bytes, texto JSON ou dict)."""
+    if isinstance(dados, (bytes, bytearray)):
+        dados = dados.decode('utf-8', errors='replace')
+    if isinstance(dados, str):
+        dados = dados.strip()
+        if dados in ENTIDADES:
+            return {dados}
+        try:
+            dados = json.loads(dados)
+        except ValueError:
+            return set()
+    if not isinstance(dados, dict):
+        return set()
+    nomes = dados.get('entidades') or [dados.get('entidade') or dados.get('entity') or dados.get('entity_type')]
+    return {str(n) for n in nomes if n} & set(ENTIDADES)
+
+
+class CanalMudancas:
+    """Escuta o canal de mudanças numa thread própria e dispara as sincronizações.
+
+    sincronizar(entidades) deve retornar quantos itens foram recebidos do
+    servidor (o polling usa isso para ajustar o intervalo).
+    """
+
+    def __init__(self, api_base: str, sincronizar: Callable[[Set[str]], Awaitable[int]],
+                 modo: str = 'auto', mqtt_broker: str = None, mqtt_topico: str = 'pdv/mudancas',
+                 intervalo: IntervaloAdaptativo = None, http=http_client):
+        self.api_base = api_base.rstrip('/')
+        self.sincronizar = sincronizar
+        self.modo = modo
+        self.mqtt_broker = mqtt_broker
+        self.mqtt_topico = mqtt_topico
+        self.intervalo = intervalo or IntervaloAdaptativo()
+        self.http = http
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pendentes: Set[str] = set()
+        self._disparo: Optional[asyncio.Task] = None
+        self._proxima_tentativa = 0.0
+        self._stats = {'eventos': 0, 'sincronizacoes_por_evento': 0, 'ciclos_polling': 0, 'conexoes': 0}
+
+    # ------------------------------------------------------------------ ciclo
+    def iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=lambda: asyncio.run(self.executar()), daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _canal(self) -> Optional[str]:
+        if self.modo == 'off':
+            return None
+        if self.modo in ('auto', 'mqtt') and self.mqtt_broker and asyncio_mqtt is not None:
+            return 'mqtt'
+        if self.modo in ('auto', 'sse'):
+            return 'sse'
+        return None
+
+    async def executar(self):
+        while not self._parar.is_set():
+            canal = self._canal()
+            if canal and time.monotonic() >= self._proxima_tentativa:
+                conectou = await self._ouvir(canal)
+                if conectou:
+                    # Eventos podem ter se perdido enquanto a conexão caía
+                    await self._sincronizar(set(ENTIDADES))
+                    await self._aguardar(self.intervalo.minimo)
+                    continue
+                self._proxima_tentativa = time.monotonic() + RETENTAR_CANAL_S
+                print(f"[SYNC][CANAL] Canal {canal} indisponível - polling a cada {self.intervalo.atual:.0f}s")
+
+            self._stats['ciclos_polling'] += 1
+            recebidas = await self._sincronizar(set(ENTIDADES))
+            await self._aguardar(self.intervalo.registrar(recebidas > 0))
+
+    async def _aguardar(self, segundos: float):
+        fim = time.monotonic() + segundos
+        while not self._parar.is_set() and time.monotonic() < fim:
+            await asyncio.sleep(min(1.0, fim - time.monotonic()))
+
+    async def _sincronizar(self, entidades: Set[str]) -> int:
+        try:
+            return int(await self.sincronizar(entidades) or 0)
+        except Exception as e:
+            print(f"[SYNC][CANAL] Falha ao sincronizar {sorted(entidades)}: {e}")
+            return 0
+
+    # ---------------------------------------------------------------- eventos
+    def _receber(self, dados):
+        entidades = entidades_do_evento(dados)
+        if not entidades:
+            return
+        self._stats['eventos'] += 1
+        self._pendentes |= entidades
+        if self._disparo is None or self._disparo.done():
+            self._disparo = asyncio.ensure_future(self._disparar())
+
+    async def _disparar(self):
+        await asyncio.sleep(JANELA_EVENTOS_S)
+        while self._pendentes:
+            entidades, self._pendentes = self._pendentes, set()
+            self._stats['sincronizacoes_por_evento'] += 1
+            print(f"[SYNC][CANAL] Mudanças em {sorted(entidades)} - sincronizando")
+            await self._sincronizar(entidades)
+
+    async def _ouvir(self, canal: str) -> bool:
+        """Fica conectado enquanto o canal durar; False se nem chegou a conectar."""
+        conexoes = self._stats['conexoes']
+        try:
+            if canal == 'mqtt':
+                return await self._ouvir_mqtt()
+            return await self._ouvir_sse()
+        except Exception as e:
+            print(f"[SYNC][CANAL] Conexão {canal} encerrada: {e}")
+            # Queda depois de conectado não conta como canal indisponível
+            return self._stats['conexoes'] > conexoes
+        finally:
+            if self._disparo is not None and not self._disparo.done():
+                await self._disparo
+
+    async def _ouvir_sse(self) -> bool:
+        url = f"{self.api_base}/eventos/stream"
+        timeout = httpx.Timeout(10.0, read=TIMEOUT_LEITURA_SSE_S)
+        client = self.http.cliente_async()
+        async with client.stream('GET', url, headers={'Accept': 'text/event-stream'}, timeout=timeout) as resp:
+            if resp.status_code != 200:
+                return False
+            self._stats['conexoes'] += 1
+            print("[SYNC][CANAL] Conectado ao canal SSE de mudanças")
+            dados = []
+            async for linha in resp.aiter_lines():
+                if self._parar.is_set():
+                    break
+                if linha.startswith('data:'):
+                    dados.append(linha[5:].strip())
+                elif not linha and dados:
+                    # Linha vazia fecha o evento
+                    self._receber('\n'.join(dados))
+                    dados = []
+        return True
+
+    async def _ouvir_mqtt(self) -> bool:
+        host, _, porta = self.mqtt_broker.partition(':')
+        async with asyncio_mqtt.Client(host, port=int(porta or 1883)) as client:
+            self._stats['conexoes'] += 1
+            print(f"[SYNC][CANAL] Conectado ao broker MQTT {self.mqtt_broker}")
+            async with client.messages() as mensagens:
+                await client.subscribe(self.mqtt_topico)
+                async for mensagem in mensagens:
+                    if self._parar.is_set():
+                        break
+                    self._receber(mensagem.payload)
+        return True
+
+    def get_stats(self) -> dict:
+        return {**self._stats, 'canal': self._canal(), 'intervalo_polling_s': self.intervalo.atual}
+
+
+def criar_canal(api_base: str, sincronizar, config: dict) -> CanalMudancas:
+    """Canal configurado a partir de config.json."""
+    return CanalMudancas(
+        api_base, sincronizar,
+        modo=config.get('sync_push_channel', 'auto'),
+        mqtt_broker=config.get('mqtt_broker'),
+        mqtt_topico=config.get('mqtt_topic', 'pdv/mudancas'),
+        intervalo=IntervaloAdaptativo(
+            base=float(config.get('sync_interval_seconds') or 30),
+            minimo=float(config.get('sync_interval_min_seconds') or INTERVALO_MIN_S),
+            maximo=float(config.get('sync_interval_max_seconds') or INTERVALO_MAX_S),
+        ),
+    )
@@ -0,0 +1,234 @@
+"""
+Índice em memória do catálogo de produtos para a busca do PDV.
+
+A cada tecla o PDV executava LOWER(codigo/nome/descricao) LIKE '%x%' no
+SQLite (desktop) ou varria a lista inteira de produtos (web). O índice é
+carregado uma vez com os produtos exibidos pelo PDV e mantém:
+
+- um mapa exato código de barras -> produto;
+- um índice de trigramas sobre código, nome e descrição normalizados
+  (minúsculas e sem acentos), usado para localizar candidatos a uma busca
+  por trecho; o resultado é confirmado por substring, com a mesma
+  semântica do LIKE '%x%';
+- a ordem alfabética por nome, para devolver os resultados já ordenados.
+
+Alterações (venda, edição de produto) são aplicadas com atualizar/remover,
+sem reconstruir o índice.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+TAMANHO_NGRAMA = 3
+
+_CAMPOS_BUSCA = ('codigo', 'nome', 'descricao')
+
+
+def normalizar(texto) -> str:
+    """Minúsculas, sem acentos e com espaços simples ('Pão  Francês' -> 'pao frances')."""
+    if texto is None:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto).lower())
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.split())
+
+
+def ngramas(texto: str, tamanho: int = TAMANHO_NGRAMA) -> set:
+    return {texto[i:i + tamanho] for i in range(len(texto) - tamanho + 1)}
+
+
+class CatalogoIndex:
+    """Busca por código exato e por trecho de código/nome/descrição."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._produtos: Dict[Any, dict] = {}
+        self._campos: Dict[Any, tuple] = {}         # id -> campos normalizados
+        self._chave_ordem: Dict[Any, tuple] = {}    # id -> (nome normalizado, id)
+        self._por_codigo: Dict[str, Any] = {}
+        self._ngramas: Dict[str, set] = {}
+        self._ordenados: Optional[List[Any]] = None
+        self._stats = {'buscas': 0, 'tempo_total_ms': 0.0, 'ultima_ms': 0.0, 'atualizacoes': 0}
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+    def carregar(self, produtos: Iterable):
+        """Reconstrói o índice com a lista completa de produtos."""
+        with self._lock:
+            self._produtos.clear()
+            self._campos.clear()
+            self._chave_ordem.clear()
+            self._por_codigo.clear()
+            self._ngramas.clear()
+            for produto in produtos:
+                self._indexar(dict(produto))
+            # Ordem calculada já na carga para a primeira tecla não pagar a ordenação
+            self._ordenados = None
+            self._em_ordem()
+
+    def atualizar(self, produto):
+        """Insere ou substitui um produto (ex.: após venda ou edição)."""
+        produto = dict(produto)
+        with self._lock:
+            self._desindexar(produto['id'])
+            self._indexar(produto)
+            self._ordenados = None
+            self._stats['atualizacoes'] += 1
+
+    def remover(self, produto_id):
+        with self._lock:
+            if self._desindexar(produto_id):
+                self._ordenados = None
+                self._stats['atualizacoes'] += 1
+
+    def _indexar(self, produto: dict):
+        pid = produto['id']
+        campos = tuple(normalizar(produto.get(c)) for c in _CAMPOS_BUSCA)
+        self._produtos[pid] = produto
+        self._campos[pid] = campos
+        self._chave_ordem[pid] = (campos[1], str(pid))
+        if campos[0]:
+            self._por_codigo[campos[0]] = pid
+        indice = self._ngramas
+        for campo in campos:
+            for i in range(len(campo) - TAMANHO_NGRAMA + 1):
+                grama = campo[i:i + TAMANHO_NGRAMA]
+                ids = indice.get(grama)
+                if ids is None:
+                    indice[grama] = {pid}
+                else:
+                    ids.add(pid)
+
+    def _desindexar(self, pid) -> bool:
+        campos = self._campos.pop(pid, None)
+        if campos is None:
+            return False
+        self._produtos.pop(pid, None)
+        self._chave_ordem.pop(pid, None)
+        if campos[0] and self._por_codigo.get(campos[0]) == pid:
+            del self._por_codigo[campos[0]]
+        for grama in set().union(*(ngramas(c) for c in campos)):
+            ids = self._ngramas.get(grama)
+            if ids is not None:
+                ids.discard(pid)
+                if not ids:
+                    del self._ngramas[grama]
+        return True
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _disponivel(produto: dict) -> bool:
+        try:
+            return float(produto.get('estoque') or 0) > 0
+        except (TypeError, ValueError):
+            return False
+
+    def _em_ordem(self) -> List[Any]:
+        if self._ordenados is None:
+            self._ordenados = sorted(self._produtos, key=self._chave_ordem.__getitem__)
+        return self._ordenados
+
+    def por_codigo(self, codigo) -> Optional[dict]:
+        """Produto com o código exato (leitor de código de barras)."""
+        with self._lock:
+            pid = self._por_codigo.get(normalizar(codigo))
+            return self._produtos.get(pid) if pid is not None else None
+
+    def todos(self, limite: Optional[int] = None, somente_com_estoque: bool = True) -> List[dict]:
+        """Produtos em ordem alfabética."""
+        with self._lock:
+            resultado = []
+            for pid in self._em_ordem():
+                produto = self._produtos[pid]
+                if somente_com_estoque and not self._disponivel(produto):
+                    continue
+                resultado.append(produto)
+                if limite is not None and len(resultado) >= limite:
+                    break
+            return resultado
+
+    def buscar(self, termo, limite: Optional[int] = None, somente_com_estoque: bool = True) -> List[dict]:
+        """Produtos cujo código, nome ou descrição contém o termo, em ordem alfabética.
+
+        O produto com código exatamente igual ao termo vem primeiro.
+        """
+        inicio = time.perf_counter()
+        alvo = normalizar(termo)
+        with self._lock:
+            if not alvo:
+                resultado = self.todos(limite, somente_com_estoque)
+            else:
+                resultado = self._buscar(alvo, limite, somente_com_estoque)
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            self._stats['buscas'] += 1
+            self._stats['tempo_total_ms'] += duracao_ms
+            self._stats['ultima_ms'] = duracao_ms
+        return resultado
+
+    def _buscar(self, alvo: str, limite, somente_com_estoque) -> List[dict]:
+        def aceita(pid) -> bool:
+            if somente_com_estoque and not self._disponivel(self._produtos[pid]):
+                return False
+            return any(alvo in campo for campo in self._campos[pid])
+
+        exato = self._por_codigo.get(alvo)
+        if exato is not None and not aceita(exato):
+            exato = None
+
+        if len(alvo) < TAMANHO_NGRAMA:
+            # Termos curtos casam com boa parte do catálogo: percorre em ordem e para no limite
+            encontrados = []
+            for pid in self._em_ordem():
+                if pid != exato and aceita(pid):
+                    encontrados.append(pid)
+                    if limite is not None and len(encontrados) >= limite:
+                        break
+        else:
+            listas = []
+            for grama in ngramas(alvo):
+                ids = self._ngramas.get(grama)
+                if not ids:
+                    listas = []
+                    break
+                listas.append(ids)
+            candidatos = set()
+            if listas:
+                listas.sort(key=len)
+                candidatos = set(listas[0]).intersection(*listas[1:])
+            candidatos.discard(exato)
+            if limite is not None and len(candidatos) ** 2 > limite * len(self._produtos):
+                # Muitos candidatos: percorrer a ordem alfabética até o limite sai mais barato
+                encontrados = []
+                for pid in self._em_ordem():
+                    if pid in candidatos and aceita(pid):
+                        encontrados.append(pid)
+                        if len(encontrados) >= limite:
+                            break
+            else:
+                encontrados = [pid for pid in candidatos if aceita(pid)]
+                if limite is not None and len(encontrados) > limite:
+                    encontrados = heapq.nsmallest(limite, encontrados, key=self._chave_ordem.__getitem__)
+                else:
+                    encontrados.sort(key=self._chave_ordem.__getitem__)
+
+        if exato is not None:
+            encontrados.insert(0, exato)
+            if limite is not None:
+                encontrados = encontrados[:limite]
+        return [self._produtos[pid] for pid in encontrados]
+
+    def __len__(self):
+        return len(self._produtos)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['produtos'] = len(self._produtos)
+            stats['ngramas'] = len(self._ngramas)
+            stats['media_ms'] = stats['tempo_total_ms'] / stats['buscas'] if stats['buscas'] else 0.0
+        return stats
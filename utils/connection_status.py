@@ -1,15 +1,95 @@
+"""
+Estado de conectividade com o backend, compartilhado por toda a aplicação.
+
+Cada URL de backend tem uma máquina de estados online/degradado/offline:
+
+- sucesso numa verificação: online na hora, sem espera;
+- primeiras falhas: degradado; a partir de LIMIAR_OFFLINE falhas seguidas: offline;
+- depois de uma falha, a próxima verificação real só acontece após um
+  backoff exponencial com jitter (BACKOFF_BASE_S dobrando até BACKOFF_MAX_S);
+  antes disso, quem perguntar recebe o último resultado sem nova sonda.
+
+Repositórios, sync manager e indicador de status consultam esta instância, de
+modo que chamadas simultâneas compartilham a mesma sonda (e o cache de saúde
+do http_client) em vez de cada um bater no /healthz por conta própria.
+"""
 import asyncio
-import httpx
+import random
+import threading
+import time
+from utils.http_client import http_client
 import json
 import os
 import sys
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any
+
+DESCONHECIDO = 'desconhecido'  # antes da primeira verificação
+ONLINE = 'online'
+DEGRADADO = 'degradado'
+OFFLINE = 'offline'
+
+# Falhas seguidas até considerar o backend offline
+LIMIAR_OFFLINE = 3
+
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 300.0
+
+# Variação aleatória do backoff (±20%) para vários PDVs não sondarem juntos
+JITTER = 0.2
+
+# Intervalo entre verificações quando online
+INTERVALO_ONLINE_S = 30.0
+
+
+class MaquinaConectividade:
+    """Estado e backoff de um backend."""
+
+    def __init__(self, relogio: Callable[[], float] = time.monotonic,
+                 aleatorio: Callable[[], float] = random.random):
+        self.relogio = relogio
+        self.aleatorio = aleatorio
+        self.estado = DESCONHECIDO
+        self.falhas = 0
+        self.proxima_sonda = 0.0
+        self.transicoes = 0
+
+    def precisa_sondar(self) -> bool:
+        return self.relogio() >= self.proxima_sonda
+
+    def espera(self) -> float:
+        """Segundos até a próxima verificação (com jitter quando em falha)."""
+        if not self.falhas:
+            return INTERVALO_ONLINE_S
+        backoff = min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** (self.falhas - 1)))
+        return backoff * (1 + JITTER * (2 * self.aleatorio() - 1))
+
+    def registrar(self, online: bool) -> Optional[str]:
+        """Aplica o resultado de uma sonda; retorna o estado anterior se mudou."""
+        anterior = self.estado
+        if online:
+            self.falhas = 0
+            self.estado = ONLINE
+            self.proxima_sonda = 0.0
+        else:
+            self.falhas += 1
+            self.estado = OFFLINE if self.falhas >= LIMIAR_OFFLINE else DEGRADADO
+            self.proxima_sonda = self.relogio() + self.espera()
+        if self.estado != anterior:
+            self.transicoes += 1
+            return anterior
+        return None
+
 
 class ConnectionStatus:
-    def __init__(self):
+    def __init__(self, http=http_client, relogio: Callable[[], float] = time.monotonic):
         self.is_online = False
         self.last_check = None
         self.server_url = self._get_server_url()
+        self.http = http
+        self.relogio = relogio
+        self._maquinas: Dict[str, MaquinaConectividade] = {}
+        self._lock = threading.Lock()
+        self._sondas: Dict[tuple, asyncio.Future] = {}
         
     def _get_server_url(self) -> str:
         """Obtém a URL do servidor do arquivo de configuração."""
@@ -40,37 +120,100 @@ class ConnectionStatus:
             pass
         return 'http://127.0.0.1:8000'
     
-    async def check_connection(self) -> bool:
-        """Verifica se o backend está online fazendo uma requisição ao endpoint /healthz."""
+    def _maquina(self, backend_url: str = None) -> MaquinaConectividade:
+        url = (backend_url or self.server_url).rstrip('/')
+        with self._lock:
+            if url not in self._maquinas:
+                self._maquinas[url] = MaquinaConectividade(relogio=self.relogio)
+            return self._maquinas[url]
+
+    def _aplicar(self, backend_url: str, online: bool) -> bool:
+        maquina = self._maquina(backend_url)
+        with self._lock:
+            anterior = maquina.registrar(online)
+        if anterior is not None:
+            extra = '' if online else f" ({maquina.falhas} falhas; nova tentativa em {maquina.espera():.0f}s)"
+            print(f"[CONEXAO] {anterior} -> {maquina.estado}{extra}")
+        if not backend_url or backend_url.rstrip('/') == self.server_url.rstrip('/'):
+            self.is_online = online
+            self.last_check = time.time()
+        return online
+
+    async def verificar(self, backend_url: str = None, forcar: bool = False) -> bool:
+        """Backend está online? Respeita o backoff e compartilha a sonda em andamento."""
+        backend_url = backend_url or self.server_url
+        maquina = self._maquina(backend_url)
+        if not forcar and not maquina.precisa_sondar():
+            return maquina.estado == ONLINE
+
+        chave = (id(asyncio.get_running_loop()), backend_url.rstrip('/'))
+        sonda = self._sondas.get(chave)
+        if sonda is None:
+            sonda = asyncio.ensure_future(self._sondar(backend_url))
+            self._sondas[chave] = sonda
+            sonda.add_done_callback(lambda _: self._sondas.pop(chave, None))
+        return await asyncio.shield(sonda)
+
+    async def _sondar(self, backend_url: str) -> bool:
+        if self._maquina(backend_url).falhas:
+            # Backoff vencido: o resultado em cache é justamente a falha anterior
+            self.http.invalidar_saude(backend_url)
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                # Tentar primeiro o endpoint /healthz direto
-                try:
-                    response = await client.get(f"{self.server_url}/healthz")
-                    if response.status_code == 200:
-                        self.is_online = True
-                        return True
-                except:
-                    pass
-                
-                # Se falhar, tentar sem /api no final (caso server_url já inclua /api)
-                base_url = self.server_url.replace('/api', '') if self.server_url.endswith('/api') else self.server_url
-                response = await client.get(f"{base_url}/healthz")
-                self.is_online = response.status_code == 200
-                return self.is_online
+            online = await self.http.abackend_online(backend_url, timeout=5.0)
+        except Exception as e:
+            print(f"Erro na verificação de conexão: {e}")
+            online = False
+        return self._aplicar(backend_url, online)
+
+    def verificar_sync(self, backend_url: str = None, forcar: bool = False) -> bool:
+        """Versão síncrona de verificar (mesmo estado e backoff)."""
+        backend_url = backend_url or self.server_url
+        maquina = self._maquina(backend_url)
+        if not forcar and not maquina.precisa_sondar():
+            return maquina.estado == ONLINE
+        if maquina.falhas:
+            self.http.invalidar_saude(backend_url)
+        try:
+            online = self.http.backend_online(backend_url)
         except Exception as e:
             print(f"Erro na verificação de conexão: {e}")
-            self.is_online = False
-            return False
+            online = False
+        return self._aplicar(backend_url, online)
+
+    def estado(self, backend_url: str = None) -> str:
+        return self._maquina(backend_url).estado
+
+    def intervalo_verificacao(self, backend_url: str = None) -> float:
+        """Quanto esperar até a próxima verificação periódica."""
+        maquina = self._maquina(backend_url)
+        if maquina.falhas:
+            return max(1.0, maquina.proxima_sonda - maquina.relogio())
+        return INTERVALO_ONLINE_S
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                url: {'estado': m.estado, 'falhas': m.falhas, 'transicoes': m.transicoes}
+                for url, m in self._maquinas.items()
+            }
+
+    async def check_connection(self) -> bool:
+        """Verifica se o backend está online fazendo uma requisição ao endpoint /healthz."""
+        # /healthz na URL configurada e, se terminar em /api, também sem o /api
+        return await self.verificar()
     
     def get_status_text(self) -> str:
         """Retorna o texto do status de conexão."""
-        return "🌐 Online" if self.is_online else "⚡ Offline"
+        if self.is_online:
+            return "🌐 Online"
+        return "⚠ Instável" if self.estado() == DEGRADADO else "⚡ Offline"
     
     def get_status_color(self):
         """Retorna a cor do status de conexão."""
         import flet as ft
-        return ft.colors.GREEN if self.is_online else ft.colors.ORANGE
+        if self.is_online:
+            return ft.colors.GREEN
+        return ft.colors.AMBER if self.estado() == DEGRADADO else ft.colors.ORANGE
 
 # Instância global para ser usada em toda a aplicação
 connection_status = ConnectionStatus()
@@ -0,0 +1,407 @@
+"""
+Cliente HTTP compartilhado por todo o tráfego de sincronização.
+
+Cada push/pull abria um httpx.AsyncClient novo e as leituras usavam
+httpx.get avulso: toda requisição pagava DNS + TCP + TLS até o backend.
+O gerenciador mantém clientes com keep-alive reaproveitados pelo processo:
+
+- um httpx.Client (síncrono) compartilhado entre threads;
+- um httpx.AsyncClient por event loop (cada asyncio.run tem o seu loop, e
+  um AsyncClient não pode ser usado fora do loop em que abriu conexões),
+  fechado quando o loop encerra;
+- HTTP/2 quando o pacote h2 estiver instalado;
+- limites de conexões, timeout padrão por host e nova tentativa com
+  backoff para falhas de conexão e 502/503/504 (POST só é repetido quando
+  a requisição nem chegou a ser enviada);
+- verificação de /healthz com cache curto, compartilhada pelos
+  repositórios em vez de cada um sondar o backend;
+- métricas de requisições, falhas, novas tentativas e latência por host.
+
+Uso: ``async with http_client.sessao_async() as client`` e
+``with http_client.sessao() as client`` substituem httpx.AsyncClient() e
+httpx.Client() sem fechar as conexões ao sair do bloco; http_client.get/
+post/put/delete substituem httpx.get/post/...
+"""
+import asyncio
+import contextlib
+import importlib.util
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.metricas import percentil
+
+HTTP2_DISPONIVEL = importlib.util.find_spec('h2') is not None
+
+LIMITES = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+
+TIMEOUT_PADRAO = httpx.Timeout(10.0, connect=5.0)
+
+TENTATIVAS = 3
+BACKOFF_S = 0.25
+
+# Status transitórios (proxy/backend reiniciando) que valem nova tentativa
+STATUS_REPETIR = (502, 503, 504)
+
+METODOS_IDEMPOTENTES = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# Validade do resultado de /healthz
+TTL_SAUDE_S = 5.0
+
+_AMOSTRAS_LATENCIA = 500
+
+
+async def _fechar_ao_encerrar(cliente):
+    """Guardião do AsyncClient de um loop.
+
+    asyncio.run fecha os geradores assíncronos ainda abertos
+    (shutdown_asyncgens) antes de encerrar o loop; o finally fecha o
+    cliente e seu pool de conexões ainda dentro do loop dele.
+    """
+    try:
+        yield
+    finally:
+        await cliente.aclose()
+
+
+async def _iniciar(guardiao):
+    await guardiao.asend(None)
+
+
+async def _fechar_sem_erro(cliente):
+    try:
+        await cliente.aclose()
+    except Exception:
+        pass
+
+
+def _host(url) -> str:
+    return urlsplit(str(url)).netloc or '?'
+
+
+class _MetricasHost:
+    def __init__(self):
+        self.requisicoes = 0
+        self.falhas = 0
+        self.retentativas = 0
+        self.latencias = deque(maxlen=_AMOSTRAS_LATENCIA)
+
+    def resumo(self) -> dict:
+        amostras = list(self.latencias)
+        return {
+            'requisicoes': self.requisicoes,
+            'falhas': self.falhas,
+            'retentativas': self.retentativas,
+            'p50_ms': percentil(amostras, 50),
+            'p95_ms': percentil(amostras, 95),
+            'max_ms': max(amostras) if amostras else 0.0,
+        }
+
+
+class _Sessao:
+    """Fachada de um cliente compartilhado: 'with' não fecha as conexões."""
+
+    def __init__(self, gerenciador, timeout=None):
+        self._gerenciador = gerenciador
+        self._timeout = timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        return self._gerenciador.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+
+class _SessaoAsync(_Sessao):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def aclose(self):
+        pass
+
+    async def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        return await self._gerenciador.arequest(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request('PUT', url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self.request('PATCH', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    def stream(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        return self._gerenciador.astream(method, url, **kwargs)
+
+
+class HttpClientManager:
+    """Clientes HTTP do processo, com nova tentativa, timeouts por host e métricas."""
+
+    def __init__(self, tentativas: int = TENTATIVAS, backoff_s: float = BACKOFF_S,
+                 transport=None, async_transport=None):
+        self.tentativas = tentativas
+        self.backoff_s = backoff_s
+        self._transport = transport
+        self._async_transport = async_transport
+        self._lock = threading.Lock()
+        self._cliente = None
+        self._clientes_async: Dict[int, tuple] = {}
+        self._timeouts_host: Dict[str, httpx.Timeout] = {}
+        self._metricas: Dict[str, _MetricasHost] = {}
+        self._saude: Dict[str, tuple] = {}
+
+    # -- clientes ----------------------------------------------------------
+
+    def _opcoes(self, transport) -> dict:
+        opcoes = {'limits': LIMITES, 'timeout': TIMEOUT_PADRAO, 'http2': HTTP2_DISPONIVEL}
+        if transport is not None:
+            opcoes['transport'] = transport
+        return opcoes
+
+    def cliente(self) -> httpx.Client:
+        with self._lock:
+            if self._cliente is None or self._cliente.is_closed:
+                self._cliente = httpx.Client(**self._opcoes(self._transport))
+            return self._cliente
+
+    def cliente_async(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Clientes de loops encerrados sem shutdown_asyncgens (loop criado à mão)
+            for chave, (loop_antigo, antigo, _) in list(self._clientes_async.items()):
+                if loop_antigo.is_closed():
+                    del self._clientes_async[chave]
+                    if not antigo.is_closed:
+                        loop.create_task(_fechar_sem_erro(antigo))
+            registro = self._clientes_async.get(id(loop))
+            if registro is None or registro[0] is not loop or registro[1].is_closed:
+                cliente = httpx.AsyncClient(**self._opcoes(self._async_transport))
+                guardiao = _fechar_ao_encerrar(cliente)
+                loop.create_task(_iniciar(guardiao))
+                registro = (loop, cliente, guardiao)
+                self._clientes_async[id(loop)] = registro
+            return registro[1]
+
+    def sessao(self, timeout=None) -> _Sessao:
+        return _Sessao(self, timeout)
+
+    def sessao_async(self, timeout=None) -> _SessaoAsync:
+        return _SessaoAsync(self, timeout)
+
+    def definir_timeout(self, url_ou_host: str, timeout):
+        """Timeout padrão das requisições a um host (quando o chamador não informa)."""
+        host = _host(url_ou_host) if '://' in url_ou_host else url_ou_host
+        self._timeouts_host[host] = timeout if isinstance(timeout, httpx.Timeout) else httpx.Timeout(timeout)
+
+    def fechar(self):
+        with self._lock:
+            if self._cliente is not None:
+                self._cliente.close()
+                self._cliente = None
+            self._clientes_async.clear()
+
+    # -- requisições -------------------------------------------------------
+
+    def _preparar(self, method, url, kwargs):
+        host = _host(url)
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self._timeouts_host.get(host, TIMEOUT_PADRAO)
+        with self._lock:
+            metricas = self._metricas.setdefault(host, _MetricasHost())
+        return method.upper(), metricas
+
+    def _repetir(self, method, tentativa, erro=None, response=None) -> bool:
+        if tentativa >= self.tentativas - 1:
+            return False
+        if erro is not None:
+            # Sem conexão a requisição não saiu: qualquer método pode ser repetido
+            return isinstance(erro, (httpx.ConnectError, httpx.ConnectTimeout)) or (
+                method in METODOS_IDEMPOTENTES and isinstance(erro, httpx.TransportError)
+            )
+        return method in METODOS_IDEMPOTENTES and response.status_code in STATUS_REPETIR
+
+    def _registrar(self, metricas, inicio, falhou):
+        with self._lock:
+            metricas.requisicoes += 1
+            metricas.latencias.append((time.perf_counter() - inicio) * 1000)
+            if falhou:
+                metricas.falhas += 1
+
+    def request(self, method, url, **kwargs) -> httpx.Response:
+        method, metricas = self._preparar(method, url, kwargs)
+        cliente = self.cliente()
+        for tentativa in range(self.tentativas):
+            inicio = time.perf_counter()
+            try:
+                response = cliente.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self._registrar(metricas, inicio, True)
+                if not self._repetir(method, tentativa, erro=e):
+                    raise
+            else:
+                self._registrar(metricas, inicio, response.status_code >= 500)
+                if not self._repetir(method, tentativa, response=response):
+                    return response
+            with self._lock:
+                metricas.retentativas += 1
+            time.sleep(self.backoff_s * (2 ** tentativa))
+
+    async def arequest(self, method, url, **kwargs) -> httpx.Response:
+        method, metricas = self._preparar(method, url, kwargs)
+        cliente = self.cliente_async()
+        for tentativa in range(self.tentativas):
+            inicio = time.perf_counter()
+            try:
+                response = await cliente.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self._registrar(metricas, inicio, True)
+                if not self._repetir(method, tentativa, erro=e):
+                    raise
+            else:
+                self._registrar(metricas, inicio, response.status_code >= 500)
+                if not self._repetir(method, tentativa, response=response):
+                    return response
+            with self._lock:
+                metricas.retentativas += 1
+            await asyncio.sleep(self.backoff_s * (2 ** tentativa))
+
+    @contextlib.asynccontextmanager
+    async def astream(self, method, url, **kwargs):
+        """Resposta com o corpo ainda não lido (sem nova tentativa: o corpo é consumido uma vez)."""
+        method, metricas = self._preparar(method, url, kwargs)
+        inicio = time.perf_counter()
+        registrado = False
+        try:
+            async with self.cliente_async().stream(method, url, **kwargs) as response:
+                self._registrar(metricas, inicio, response.status_code >= 500)
+                registrado = True
+                yield response
+        except httpx.TransportError:
+            if not registrado:
+                self._registrar(metricas, inicio, True)
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    # -- saúde do backend --------------------------------------------------
+
+    @staticmethod
+    def urls_saude(backend_url: str):
+        """/healthz na URL configurada e, se ela terminar em /api, também sem o /api."""
+        base = (backend_url or '').rstrip('/')
+        urls = [f"{base}/healthz"]
+        if base.endswith('/api'):
+            urls.append(f"{base[:-4]}/healthz")
+        return urls
+
+    def _saude_em_cache(self, backend_url) -> Optional[bool]:
+        registro = self._saude.get(backend_url)
+        if registro and time.monotonic() - registro[1] < TTL_SAUDE_S:
+            return registro[0]
+        return None
+
+    def _gravar_saude(self, backend_url, online: bool) -> bool:
+        self._saude[backend_url] = (online, time.monotonic())
+        return online
+
+    def backend_online(self, backend_url: str, timeout=3.0) -> bool:
+        em_cache = self._saude_em_cache(backend_url)
+        if em_cache is not None:
+            return em_cache
+        for url in self.urls_saude(backend_url):
+            try:
+                if self.request('GET', url, timeout=timeout).status_code == 200:
+                    return self._gravar_saude(backend_url, True)
+            except Exception:
+                pass
+        return self._gravar_saude(backend_url, False)
+
+    async def abackend_online(self, backend_url: str, timeout=httpx.Timeout(5.0, connect=2.0)) -> bool:
+        em_cache = self._saude_em_cache(backend_url)
+        if em_cache is not None:
+            return em_cache
+        for url in self.urls_saude(backend_url):
+            try:
+                if (await self.arequest('GET', url, timeout=timeout)).status_code == 200:
+                    return self._gravar_saude(backend_url, True)
+            except Exception:
+                pass
+        return self._gravar_saude(backend_url, False)
+
+    def invalidar_saude(self, backend_url: str = None):
+        if backend_url:
+            self._saude.pop(backend_url, None)
+        else:
+            self._saude.clear()
+
+    # -- métricas ----------------------------------------------------------
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            por_host = {host: m.resumo() for host, m in self._metricas.items()}
+            todas = [l for m in self._metricas.values() for l in m.latencias]
+        return {
+            'http2': HTTP2_DISPONIVEL,
+            'requisicoes': sum(m['requisicoes'] for m in por_host.values()),
+            'falhas': sum(m['falhas'] for m in por_host.values()),
+            'retentativas': sum(m['retentativas'] for m in por_host.values()),
+            'p50_ms': percentil(todas, 50),
+            'p95_ms': percentil(todas, 95),
+            'por_host': por_host,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._metricas.clear()
+
+
+# Instância global
+http_client = HttpClientManager()
@@ -0,0 +1,13 @@
+"""
+Funções comuns às métricas de latência (checkout, cliente HTTP).
+"""
+import math
+
+
+def percentil(valores, p: float) -> float:
+    """Percentil pelo método nearest-rank (0 se não houver amostras)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = max(1, math.ceil(p / 100 * len(ordenados)))
+    return ordenados[posicao - 1]
@@ -9,9 +9,12 @@ from pathlib import Path
 import os
 import platform
 
+from database.schema_cache import schema_cache
+from database.schema_migrations import versao_atual, VERSAO_ENTIDADES_HIBRIDAS
+
 class MigrationHelper:
-    def __init__(self):
-        self.db_path = self._get_database_path()
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else self._get_database_path()
     
     def _get_database_path(self) -> Path:
         """Obtém o caminho do banco de dados baseado no sistema operacional."""
@@ -67,6 +70,9 @@ class MigrationHelper:
                 cursor.execute("ALTER TABLE usuarios ADD COLUMN synced INTEGER DEFAULT 0")
             
             conn.commit()
+            # Só depois do commit: antes dele outra conexão ainda veria o esquema antigo
+            if 'uuid' not in columns or 'synced' not in columns:
+                schema_cache.invalidar(self.db_path, 'usuarios')
     
     def migrate_produtos_table(self):
         """Adiciona colunas de sincronização na tabela produtos se não existirem."""
@@ -97,6 +103,9 @@ class MigrationHelper:
                 cursor.execute("ALTER TABLE produtos ADD COLUMN synced INTEGER DEFAULT 0")
             
             conn.commit()
+            # Só depois do commit: antes dele outra conexão ainda veria o esquema antigo
+            if 'uuid' not in columns or 'synced' not in columns:
+                schema_cache.invalidar(self.db_path, 'produtos')
     
     def migrate_clientes_table(self):
         """Adiciona colunas de sincronização na tabela clientes se não existirem."""
@@ -150,6 +159,9 @@ class MigrationHelper:
                 cursor.execute("ALTER TABLE clientes ADD COLUMN synced INTEGER DEFAULT 0")
             
             conn.commit()
+            # Só depois do commit: antes dele outra conexão ainda veria o esquema antigo
+            if 'uuid' not in columns or 'synced' not in columns:
+                schema_cache.invalidar(self.db_path, 'clientes')
     
     def migrate_vendas_table(self):
         """Adiciona colunas de sincronização na tabela vendas se não existirem."""
@@ -186,6 +198,9 @@ class MigrationHelper:
                 cursor.execute("ALTER TABLE vendas ADD COLUMN synced INTEGER DEFAULT 0")
             
             conn.commit()
+            # Só depois do commit: antes dele outra conexão ainda veria o esquema antigo
+            if 'uuid' not in columns or 'synced' not in columns:
+                schema_cache.invalidar(self.db_path, 'vendas')
     
     def create_change_log_table(self):
         """Cria a tabela change_log se não existir."""
@@ -221,6 +236,10 @@ class MigrationHelper:
             with sqlite3.connect(str(self.db_path)) as conn:
                 cursor = conn.cursor()
                 
+                # Banco já migrado pelo Database: uma consulta em vez das sondagens abaixo
+                if versao_atual(cursor) >= VERSAO_ENTIDADES_HIBRIDAS:
+                    return False
+                
                 # Verificar tabelas principais
                 tables_to_check = ['usuarios', 'produtos', 'clientes', 'vendas']
                 
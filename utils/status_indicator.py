@@ -67,24 +67,18 @@ class StatusIndicator(ft.UserControl):
                         loop.close()
                     
                     # Atualizar interface
-                    if is_online:
-                        self.status_text.value = "🌐 Online"
-                        self.status_text.color = ft.colors.GREEN
-                        self.sync_icon.name = ft.icons.CLOUD_DONE
-                        self.sync_icon.color = ft.colors.GREEN
-                    else:
-                        self.status_text.value = "⚡ Offline"
-                        self.status_text.color = ft.colors.ORANGE
-                        self.sync_icon.name = ft.icons.CLOUD_OFF
-                        self.sync_icon.color = ft.colors.ORANGE
+                    self.status_text.value = connection_status.get_status_text()
+                    self.status_text.color = connection_status.get_status_color()
+                    self.sync_icon.name = ft.icons.CLOUD_DONE if is_online else ft.icons.CLOUD_OFF
+                    self.sync_icon.color = self.status_text.color
                     
                     if self.page:
                         self.update()
                     
                     self.is_checking = False
                 
-                # Aguardar 30 segundos antes da próxima verificação
-                time.sleep(30)
+                # Próxima verificação: 30 s online, backoff com jitter quando em falha
+                time.sleep(connection_status.intervalo_verificacao())
                 
             except Exception as e:
                 print(f"Erro no monitoramento de conexão: {e}")
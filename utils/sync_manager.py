@@ -1,4 +1,6 @@
 import json
+from database.connection_factory import connect as db_connect
+from database.schema_cache import schema_cache
 import logging
 import os
 import sqlite3
@@ -430,13 +432,12 @@ class SyncManager:
             Lista de dicionários com os dados não sincronizados
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
                 # Verificar se a tabela tem a coluna 'synced'
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [col[1] for col in cursor.fetchall()]
+                columns = schema_cache.colunas(self.db_path, table_name, conn)
                 has_synced = 'synced' in columns
                 has_created_at = 'created_at' in columns
                 
@@ -499,13 +500,12 @@ class SyncManager:
         updated_records = []
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with db_connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
                 # Obter informações da tabela
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns_info = {col[1]: col for col in cursor.fetchall()}
+                columns_info = schema_cache.info_colunas(self.db_path, table_name, conn)
                 
                 # Verificar se a tabela tem as colunas necessárias
                 has_synced = 'synced' in columns_info
@@ -734,12 +734,11 @@ class SyncManager:
             ids_to_show = record_ids[:10]
             logger.info(f"IDs sendo marcados como sincronizados: {', '.join(ids_to_show)}{' ...' if len(record_ids) > 10 else ''}")
             
-            with sqlite3.connect(self.db_path) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
                 # Verificar se a tabela tem a coluna 'synced'
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                has_synced = any(col[1] == 'synced' for col in cursor.fetchall())
+                has_synced = schema_cache.tem_coluna(self.db_path, table_name, 'synced', conn)
                 
                 if has_synced:
                     placeholders = ','.join(['?'] * len(record_ids))
@@ -776,7 +775,7 @@ class SyncManager:
         try:
             logger.info(f"SALVANDO CONFLITOS [{table_name}]: {len(conflicts)} conflitos encontrados")
             
-            with sqlite3.connect(self.db_path) as conn:
+            with db_connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
                 # Garantir que a tabela de conflitos existe
@@ -1,6 +1,7 @@
 import flet as ft
 from views.generic_header import create_header
 from database.database import Database
+from database.busca_produtos import filtrar_por_termo
 
 
 class AbastecimentoView(ft.UserControl):
@@ -616,7 +617,8 @@ class AbastecimentoView(ft.UserControl):
         if codigo:
             base = [p for p in base if codigo in (p.get("codigo") or "").lower()]
         if termo:
-            base = [p for p in base if (termo in (p.get("nome") or "").lower() or termo in (p.get("codigo") or "").lower())]
+            # Trecho do nome/código filtra; o índice FTS5 (se houver) ordena por relevância
+            base = filtrar_por_termo(base, termo, self.db.buscar_ids_produtos(termo))
 
         self._popular_produtos(base)
         if len(base) == 1:
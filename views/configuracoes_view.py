@@ -153,7 +153,8 @@ class ConfiguracoesView(ft.UserControl, TranslationMixin):
                     backup_file = os.path.join(self.backup_dir, f"{nome_base}_{contador}.db")
                     nome_arquivo = f"{nome_base}_{contador}.db"
                 
-                # Copiar banco de dados
+                # Copiar banco de dados (consolidar o WAL antes da cópia)
+                self.db.checkpoint()
                 shutil.copy2(self.db.db_path, backup_file)
                 
                 # Fechar diálogo
@@ -437,6 +438,8 @@ class ConfiguracoesView(ft.UserControl, TranslationMixin):
             # Fazer backup de segurança do banco atual (apenas se necessário)
             pre_restore_backup = None
             if os.path.exists(str(self.db.db_path)):
+                # Consolidar o WAL para que tamanho/hash reflitam o estado real do banco
+                self.db.checkpoint()
                 # Verificar se o banco atual é diferente do backup que será restaurado
                 banco_atual_size = os.path.getsize(str(self.db.db_path))
                 
@@ -496,7 +499,7 @@ class ConfiguracoesView(ft.UserControl, TranslationMixin):
                 try:
                     if hasattr(self.db, 'conn') and self.db.conn:
                         try:
-                            self.db.conn.close()
+                            self.db.close_all_connections()
                         except Exception:
                             pass
                         print("[RESTAURAÇÃO] Conexão fechada")
@@ -569,6 +572,7 @@ class ConfiguracoesView(ft.UserControl, TranslationMixin):
             if 'pre_restore_backup' in locals() and pre_restore_backup and os.path.exists(pre_restore_backup):
                 try:
                     print("[RECUPERAÇÃO] Restaurando backup de segurança...")
+                    self.db.close_all_connections()
                     if os.path.exists(str(self.db.db_path)):
                         os.remove(str(self.db.db_path))
                     shutil.copy2(pre_restore_backup, str(self.db.db_path))
@@ -733,7 +737,7 @@ class ConfiguracoesView(ft.UserControl, TranslationMixin):
                 # Fecha a conexão atual
                 if hasattr(self.db, 'conn'):
                     try:
-                        self.db.conn.close()
+                        self.db.close_all_connections()
                     except:
                         pass
                 
@@ -858,6 +862,7 @@ class ConfiguracoesView(ft.UserControl, TranslationMixin):
                 # Fazer backup antes do reset (por segurança)
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 backup_file = os.path.join(self.backup_dir, f"pre_dashboard_reset_{timestamp}.db")
+                self.db.checkpoint()
                 shutil.copy2(self.db.db_path, backup_file)
                 
                 # Para admin: reseta para todos os usuários
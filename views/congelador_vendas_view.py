@@ -1,5 +1,6 @@
 import flet as ft
 from database.database import Database
+from database.cache_leituras import cache_leituras
 from utils.translation_mixin import TranslationMixin
 from views.generic_table_style import apply_table_style
 from views.generic_header import create_header
@@ -440,6 +441,7 @@ class CongeladorVendasView(ft.UserControl, TranslationMixin):
             
             # Commit the transaction
             self.db.conn.commit()
+            cache_leituras.invalidar('produtos')
             
             # Fechar diálogo
             self.page.dialog.open = False
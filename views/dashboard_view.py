@@ -7,12 +7,24 @@ from utils.translations import get_text
 from utils.translation_mixin import TranslationMixin
 from repositories.sync_manager import SyncManager
 from utils.status_indicator import StatusIndicator
+from utils.canal_mudancas import criar_canal
 import asyncio
 from typing import List, Dict, Any, Optional
 import os
 import threading
 import httpx
 
+# Canal de mudanças do servidor (um por processo, iniciado no primeiro did_mount)
+_canal_mudancas = None
+
+
+def _parar_canal_mudancas():
+    """Encerra o canal de mudanças (saída do dashboard ou fim da sessão)."""
+    global _canal_mudancas
+    if _canal_mudancas is not None:
+        _canal_mudancas.parar()
+        _canal_mudancas = None
+
 class DashboardView(ft.UserControl, TranslationMixin):
     def __init__(self, page: ft.Page, usuario):
         super().__init__()
@@ -398,6 +410,26 @@ class DashboardView(ft.UserControl, TranslationMixin):
         except Exception:
             return False
 
+    def _iniciar_canal_mudancas(self):
+        """Inicia (uma vez por processo) o canal de mudanças do servidor, se sync_enabled."""
+        global _canal_mudancas
+        if _canal_mudancas is not None:
+            return
+        try:
+            import json
+            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config.json")
+            conf = {}
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    conf = json.load(f)
+            if not conf.get('sync_enabled', False):
+                return
+            sync_manager = SyncManager()
+            _canal_mudancas = criar_canal(self._get_api_base(), sync_manager.sincronizar_entidades, conf)
+            _canal_mudancas.iniciar()
+        except Exception as e:
+            print(f"[SYNC][CANAL] Não foi possível iniciar o canal de mudanças: {e}")
+
     def _get_backend_url(self) -> str:
         """Obtém a URL do backend do arquivo de configuração ou variáveis de ambiente."""
         try:
@@ -603,6 +635,20 @@ class DashboardView(ft.UserControl, TranslationMixin):
                             ),
                             animate_rotation=ft.animation.Animation(300, ft.AnimationCurve.BOUNCE_OUT),
                         ),
+                        ft.Container(width=8),
+                        ft.IconButton(
+                            icon=ft.icons.CLOUD_SYNC,
+                            tooltip="Sincronização completa (reconciliar com o servidor)",
+                            on_click=lambda e: self._on_sync_clicked(e, completo=True),
+                            icon_color=ft.colors.WHITE,
+                            icon_size=20,
+                            style=ft.ButtonStyle(
+                                side=ft.border.BorderSide(1, ft.colors.WHITE),
+                                shape=ft.RoundedRectangleBorder(radius=5),
+                                padding=8,
+                                bgcolor=ft.colors.with_opacity(ft.colors.BLUE_600, 0.3)
+                            ),
+                        ),
                         ft.Container(width=8),  # Espaço entre os botões
                         ft.IconButton(
                             icon=ft.icons.LOGOUT,
@@ -884,25 +930,13 @@ class DashboardView(ft.UserControl, TranslationMixin):
             if self.usuario.get('is_admin'):
                 vendas_dia = self.db.get_total_vendas_hoje()
             else:
-                vendas_dia = self.db.fetchone("""
-                    SELECT COALESCE(SUM(total), 0) as total
-                    FROM vendas 
-                    WHERE usuario_id = ? 
-                        AND DATE(data_venda) = DATE('now')
-                        AND (status IS NULL OR status != 'Anulada')
-                """, (self.usuario['id'],))['total']
+                vendas_dia = self.db.get_resumo_vendas('dia', self.usuario['id'])['total_bruto']
 
             # Buscar vendas do mês
             if self.usuario.get('is_admin'):
                 vendas_mes = self.db.get_total_vendas_mes()
             else:
-                vendas_mes = self.db.fetchone("""
-                    SELECT COALESCE(SUM(total), 0) as total
-                    FROM vendas 
-                    WHERE usuario_id = ? 
-                        AND strftime('%Y-%m', data_venda) = strftime('%Y-%m', 'now')
-                        AND (status IS NULL OR status != 'Anulada')
-                """, (self.usuario['id'],))['total']
+                vendas_mes = self.db.get_resumo_vendas('mes', self.usuario['id'])['total_bruto']
 
             # Produtos com estoque baixo
             estoque_baixo = self.db.fetchone("""
@@ -1165,25 +1199,7 @@ class DashboardView(ft.UserControl, TranslationMixin):
 
     def get_lucro_mes(self):
         try:
-            query = """
-                SELECT
-                    SUM(
-                        CASE
-                            WHEN v.status = 'Anulada' THEN 0
-                            ELSE (
-                                CASE 
-                                    WHEN iv.status = 'Removido' THEN 0
-                                    ELSE (iv.subtotal - (iv.preco_custo_unitario * iv.quantidade))
-                                END
-                            )
-                        END
-                    ) as lucro
-                FROM vendas v
-                JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE strftime('%Y-%m', v.data_venda) = strftime('%Y-%m', 'now')
-            """
-            result = self.db.fetchone(query)
-            return result['lucro'] or 0
+            return self.db.get_resumo_vendas('mes')['lucro']
 
         except Exception as e:
             return 0
@@ -1494,6 +1510,8 @@ class DashboardView(ft.UserControl, TranslationMixin):
         )
     def terminar_sessao(self):
         """Termina a sessão atual e volta para a tela de login"""
+        # Sem sessão, nada de sincronizar em segundo plano
+        _parar_canal_mudancas()
         # Limpa os dados da sessão
         self.page.data.clear()
         # Volta para a tela de login
@@ -2073,10 +2091,15 @@ class DashboardView(ft.UserControl, TranslationMixin):
             print(f"Erro na sincronização: {ex}")
             return False
     
-    def _on_sync_clicked(self, e):
-        """Manipulador de clique do botão de sincronização para Flet 0.9.0"""
+    def _on_sync_clicked(self, e, completo=False):
+        """Manipulador de clique do botão de sincronização para Flet 0.9.0
+
+        completo=True descarta os cursores de pull antes: o ciclo baixa tudo do
+        servidor e aplica também as exclusões feitas lá.
+        """
         # Armazenar referência do controle
         control = e.control
+        icone_original = control.icon
         
         # Função para atualizar a UI (síncrona)
         def update_ui(icon=None, disabled=False, content=None):
@@ -2132,10 +2155,12 @@ class DashboardView(ft.UserControl, TranslationMixin):
                 async def sync_hibrido():
                     sync_manager = SyncManager()
                     
-                    # Verificar status da conexão
-                    is_online = await sync_manager.is_backend_online()
+                    # Verificar status da conexão (clique manual: sem esperar o backoff)
+                    is_online = await sync_manager.is_backend_online(forcar=True)
                     
                     if is_online:
+                        if completo:
+                            sync_manager.solicitar_reconciliacao_completa()
                         # Sincronizar todas as entidades
                         resultado = await sync_manager.sincronizar_todas_entidades()
                         return resultado
@@ -2171,6 +2196,15 @@ class DashboardView(ft.UserControl, TranslationMixin):
                             pass
                     except Exception as _:
                         pass
+                elif resultado.get("status") == "em_andamento":
+                    show_snack_safe(
+                        ft.Row([
+                            ft.Icon(ft.icons.SYNC, color=ft.colors.WHITE),
+                            ft.Text("Sincronização já em andamento - será repetida ao final dela", color=ft.colors.WHITE),
+                        ], spacing=10),
+                        bgcolor=ft.colors.BLUE_700,
+                        duration=3000,
+                    )
                 elif resultado.get("status") == "offline":
                     show_snack_safe(
                         ft.Row([
@@ -2233,7 +2267,7 @@ class DashboardView(ft.UserControl, TranslationMixin):
             finally:
                 # Restaurar estado do botão
                 if control.page:  # Verificar se a página ainda existe
-                    update_ui(icon=ft.icons.SYNC, disabled=False, content=None)
+                    update_ui(icon=icone_original, disabled=False, content=None)
         
         # Executar a tarefa em uma thread separada
         import threading
@@ -2345,6 +2379,10 @@ class DashboardView(ft.UserControl, TranslationMixin):
         except Exception as e:
             print(f"Erro ao reconstruir cards: {e}")
 
+    def will_unmount(self):
+        # O canal volta a ser iniciado no próximo did_mount
+        _parar_canal_mudancas()
+
     def did_mount(self):
         print("\n=== Debug did_mount() ===")
         try:
@@ -2389,6 +2427,8 @@ class DashboardView(ft.UserControl, TranslationMixin):
             
             # Iniciar monitoramento de conexão
             self.status_indicator.start_monitoring()
+            # Sincronização em segundo plano disparada por mudanças no servidor
+            self._iniciar_canal_mudancas()
 
             # Se estiver em modo web, buscar números do backend para os cards (em thread)
             try:
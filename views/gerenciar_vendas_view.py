@@ -482,8 +482,7 @@ class GerenciarVendasView(ft.UserControl, TranslationMixin):
             print(f"[DESEMPENHO] Iniciando carregamento de vendas em {inicio_operacao.strftime('%H:%M:%S.%f')}")
             
             # Verificar se a coluna status existe
-            colunas = self.db.fetchall("PRAGMA table_info(vendas)")
-            tem_status = any(col['name'] == 'status' for col in colunas)
+            tem_status = 'status' in self.db.colunas('vendas')
             
             # Ajustar a query baseado na existência da coluna status
             if tem_status:
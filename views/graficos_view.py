@@ -3,6 +3,7 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 from database.database import Database
+from database.periodos import limites_periodo
 from views.generic_header import create_header
 from datetime import datetime, timedelta
 
@@ -146,6 +147,9 @@ class GraficosView(ft.UserControl):
         try:
             print("=== Iniciando atualização de gráficos ===")
             
+            # Intervalo semiaberto sobre v.data_venda (usa o índice de data)
+            periodo = limites_periodo(self.data_inicial.value, self.data_final.value)
+
             # Carregar dados de vendas
             print("Carregando dados de vendas...")
             vendas = self.db.fetchall("""
@@ -153,10 +157,10 @@ class GraficosView(ft.UserControl):
                     DATE(v.data_venda) as data,
                     SUM(v.total) as total
                 FROM vendas v
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE v.data_venda >= ? AND v.data_venda < ?
                 GROUP BY DATE(v.data_venda)
                 ORDER BY data
-            """, (self.data_inicial.value, self.data_final.value), dictionary=True)
+            """, periodo, dictionary=True)
             
             print(f"Dados de vendas carregados: {vendas}")
             
@@ -215,11 +219,11 @@ class GraficosView(ft.UserControl):
                 FROM itens_venda iv
                 JOIN produtos p ON p.id = iv.produto_id
                 JOIN vendas v ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE v.data_venda >= ? AND v.data_venda < ?
                 GROUP BY p.nome
                 ORDER BY quantidade DESC
                 LIMIT 10
-            """, (self.data_inicial.value, self.data_final.value), dictionary=True)
+            """, periodo, dictionary=True)
             
             print(f"Dados de produtos carregados: {produtos}")
             
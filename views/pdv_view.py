@@ -1,6 +1,9 @@
 import flet as ft
 import traceback
 from database.database import Database
+from database.checkout import CheckoutService
+from utils.busca_agendada import BuscaAgendada
+from utils.catalogo_index import CatalogoIndex
 from views.generic_header import create_header
 import os
 import httpx
@@ -13,6 +16,10 @@ else:
     from utils.rongta_printer import RongtaPrinter
 from datetime import datetime
 
+# Busca de produtos: espera entre teclas e linhas exibidas por página
+JANELA_BUSCA_S = 0.2
+PRODUTOS_POR_PAGINA = 50
+
 class PDVView(ft.UserControl):
     def __init__(self, page: ft.Page, usuario):
         super().__init__()
@@ -20,6 +27,7 @@ class PDVView(ft.UserControl):
         self.page.bgcolor = ft.colors.BLUE_50  # Adicionar fundo claro
         self.usuario = usuario
         self.db = Database()
+        self.checkout = CheckoutService(self.db)
         self.printer = RongtaPrinter()
         self.ultima_venda_id = None
         
@@ -52,6 +60,13 @@ class PDVView(ft.UserControl):
         self.total_venda = 0.0
         # Cache de produtos (especialmente para modo web)
         self._produtos_cache = []
+        # Índice em memória usado pela busca (carregado em carregar_produtos)
+        self.catalogo = CatalogoIndex()
+        self.busca = BuscaAgendada(self._executar_busca, janela=JANELA_BUSCA_S)
+        # Resultado da busca atual e linhas da tabela, reaproveitadas entre buscas
+        self._resultado_busca = []
+        self._limite_exibidos = PRODUTOS_POR_PAGINA
+        self._linhas_produtos = []
         # Flag para evitar double-click/duplo disparo ao adicionar
         self._add_in_progress = False
 
@@ -60,7 +75,8 @@ class PDVView(ft.UserControl):
             label="Buscar produto",
             width=200,
             prefix_icon=ft.icons.SEARCH,
-            on_change=self.filtrar_produtos,
+            on_change=self.agendar_busca,
+            on_submit=self.filtrar_produtos,
             bgcolor=ft.colors.WHITE,
             color=ft.colors.BLACK,
             label_style=ft.TextStyle(color=ft.colors.BLACK)
@@ -83,6 +99,11 @@ class PDVView(ft.UserControl):
             column_spacing=20,
             width=700
         )
+        self.btn_mais_produtos = ft.TextButton(
+            "Mostrar mais",
+            visible=False,
+            on_click=self.mostrar_mais_produtos
+        )
 
         # Tabela do carrinho
         self.carrinho_table = ft.DataTable(
@@ -269,7 +290,7 @@ class PDVView(ft.UserControl):
                             ),
                             ft.Container(
                                 content=ft.Column(
-                                    [self.produtos_table],
+                                    [self.produtos_table, self.btn_mais_produtos],
                                     scroll=ft.ScrollMode.AUTO
                                 ),
                                 padding=10,
@@ -363,6 +384,10 @@ class PDVView(ft.UserControl):
             expand=True
         )
 
+    def will_unmount(self):
+        # Busca agendada não deve atualizar uma tela que já saiu
+        self.busca.cancelar()
+
     def did_mount(self):
         self.page.bgcolor = ft.colors.BLUE_GREY_50
         self.page.update()
@@ -410,110 +435,156 @@ class PDVView(ft.UserControl):
             return base[:-1]
         return base + '/api'
 
+    def agendar_busca(self, e):
+        """on_change do campo de busca: só busca após a janela sem novas teclas."""
+        self.busca.agendar(self.busca_field.value or "")
+
     def filtrar_produtos(self, e):
+        """Busca imediata (Enter, fim de venda), descartando a que estava agendada."""
+        self.busca.agora(self.busca_field.value or "")
+
+    def _executar_busca(self, termo, geracao):
         try:
-            busca = self.busca_field.value.lower() if self.busca_field.value else ""
+            busca = termo.lower()
             
-            # Fonte de produtos: cache (web) ou banco local
-            if self._is_web():
-                produtos = [p for p in self._produtos_cache if (
-                    (p.get('estoque', 0) or 0) > 0 and (
-                        (p.get('codigo') or '').lower().find(busca) >= 0 or
-                        (p.get('nome') or '').lower().find(busca) >= 0 or
-                        (p.get('descricao') or '').lower().find(busca) >= 0
-                    )
-                )] if busca else self._produtos_cache
-                # Garantir ordenação alfabética por nome também no filtro web
-                try:
-                    produtos = sorted(produtos, key=lambda p: (p.get('nome') or '').lower())
-                except Exception:
-                    pass
+            # Fonte de produtos: índice em memória (código exato, trechos sem acento)
+            if self._is_web() or len(self.catalogo):
+                produtos = self.catalogo.buscar(busca)
             else:
-                # Se a busca estiver vazia, recarregar todos os produtos
+                # Índice ainda vazio: carregar todos os produtos
                 if not busca:
                     self.carregar_produtos()
                     return
-                produtos = self.db.fetchall(
-                    """
-                    SELECT 
-                        id, 
-                        codigo, 
-                        nome, 
-                        descricao,
-                        preco_venda,
-                        estoque,
-                        venda_por_peso,
-                        unidade_medida
-                    FROM produtos 
-                    WHERE ativo = 1 
-                    AND estoque > 0
-                    AND (
-                        LOWER(codigo) LIKE ? 
-                        OR LOWER(nome) LIKE ? 
-                        OR LOWER(descricao) LIKE ?
-                    )
-                    ORDER BY nome
-                    """,
-                    (f"%{busca}%", f"%{busca}%", f"%{busca}%")
-                )
-            
-            self.produtos_table.rows.clear()
-            
-            for produto in produtos:
-                # Ajustar exibição do preço e estoque baseado no tipo de venda
-                venda_por_peso_val = produto['venda_por_peso'] if isinstance(produto, dict) else produto['venda_por_peso']
-                preco_base = produto['preco_venda'] if isinstance(produto, dict) else produto['preco_venda']
-                estoque_base = produto['estoque'] if isinstance(produto, dict) else produto['estoque']
-                if int(venda_por_peso_val) == 1:
-                    preco_display = f"MT {float(preco_base):.2f}/KG"
-                    estoque_display = f"{float(estoque_base):.3f} KG"
+                ids = self.db.buscar_ids_produtos(busca, limite=500)
+                if ids is not None:
+                    # Índice FTS5: prefixos sem acento, ordenados por relevância
+                    por_id = {p['id']: p for p in self.db.fetchall(f"""
+                        SELECT id, codigo, nome, descricao, preco_venda, estoque,
+                               venda_por_peso, unidade_medida
+                        FROM produtos
+                        WHERE estoque > 0 AND id IN ({', '.join('?' * len(ids))})
+                    """, tuple(ids))} if ids else {}
+                    produtos = [por_id[i] for i in ids if i in por_id]
                 else:
-                    preco_display = f"MT {float(preco_base):.2f}"
-                    estoque_display = str(estoque_base)
-                
-                self.produtos_table.rows.append(
-                    ft.DataRow(
-                        cells=[
-                            ft.DataCell(ft.Text((produto['codigo'] if isinstance(produto, dict) else produto['codigo']), color=ft.colors.BLACK)),
-                            ft.DataCell(
-                                ft.TextButton(
-                                    text=(produto['nome'] if isinstance(produto, dict) else produto['nome']),
-                                    style=ft.ButtonStyle(color=ft.colors.BLACK),
-                                    data=(produto if isinstance(produto, dict) else dict(produto)),
-                                    on_click=self.mostrar_detalhes_produto
-                                )
-                            ),
-                            ft.DataCell(ft.Text((produto.get('descricao') if isinstance(produto, dict) else (produto['descricao'] or '')), color=ft.colors.BLACK)),
-                            ft.DataCell(ft.Text(preco_display, color=ft.colors.BLACK)),
-                            ft.DataCell(ft.Text(estoque_display, color=ft.colors.BLACK)),
-                            ft.DataCell(
-                                ft.Row([
-                                    ft.IconButton(
-                                        icon=ft.icons.ADD_SHOPPING_CART,
-                                        icon_color=ft.colors.BLUE,
-                                        tooltip="Adicionar ao Carrinho",
-                                        data=(produto if isinstance(produto, dict) else dict(produto)),
-                                        on_click=self.adicionar_ao_carrinho
-                                    ),
-                                    ft.IconButton(
-                                        icon=ft.icons.INFO_OUTLINE,
-                                        icon_color=ft.colors.BLUE_900,
-                                        tooltip="Ver detalhes",
-                                        data=(produto if isinstance(produto, dict) else dict(produto)),
-                                        on_click=self.mostrar_detalhes_produto
-                                    )
-                                ])
-                            )
-                        ]
+                    produtos = self.db.fetchall(
+                        """
+                        SELECT
+                            id,
+                            codigo,
+                            nome,
+                            descricao,
+                            preco_venda,
+                            estoque,
+                            venda_por_peso,
+                            unidade_medida
+                        FROM produtos
+                        WHERE ativo = 1
+                        AND estoque > 0
+                        AND (
+                            LOWER(codigo) LIKE ?
+                            OR LOWER(nome) LIKE ?
+                            OR LOWER(descricao) LIKE ?
+                        )
+                        ORDER BY nome
+                        """,
+                        (f"%{busca}%", f"%{busca}%", f"%{busca}%")
                     )
-                )
             
-            self.update()
+            # Outra tecla chegou enquanto consultava: este resultado não vai para a tela
+            if self.busca.obsoleta(geracao):
+                self.busca.descartar()
+                return
+            self.exibir_produtos(produtos)
             
         except Exception as error:
             print(f"Erro ao filtrar produtos: {error}")
             self.mostrar_erro("Erro ao filtrar produtos!")
 
+    def exibir_produtos(self, produtos):
+        """Troca o resultado exibido, mostrando só a primeira página."""
+        self._resultado_busca = produtos
+        self._limite_exibidos = PRODUTOS_POR_PAGINA
+        self._renderizar_produtos()
+
+    def mostrar_mais_produtos(self, e):
+        self._limite_exibidos += PRODUTOS_POR_PAGINA
+        self._renderizar_produtos()
+
+    def _renderizar_produtos(self):
+        """Preenche a tabela reaproveitando as linhas já criadas."""
+        visiveis = self._resultado_busca[:self._limite_exibidos]
+        while len(self._linhas_produtos) < len(visiveis):
+            self._linhas_produtos.append(self._criar_linha_produto())
+        
+        for linha, produto in zip(self._linhas_produtos, visiveis):
+            try:
+                self._preencher_linha_produto(linha, produto)
+            except Exception as item_error:
+                print(f"Erro ao processar produto {produto.get('nome', 'desconhecido')}: {item_error}")
+        self.produtos_table.rows = self._linhas_produtos[:len(visiveis)]
+        
+        restantes = len(self._resultado_busca) - len(visiveis)
+        self.btn_mais_produtos.visible = restantes > 0
+        self.btn_mais_produtos.text = f"Mostrar mais ({restantes})"
+        self.update()
+
+    def _criar_linha_produto(self):
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text("", color=ft.colors.BLACK)),
+                ft.DataCell(
+                    ft.TextButton(
+                        text="",
+                        style=ft.ButtonStyle(color=ft.colors.BLACK),
+                        on_click=self.mostrar_detalhes_produto
+                    )
+                ),
+                ft.DataCell(ft.Text("", color=ft.colors.BLACK)),
+                ft.DataCell(ft.Text("", color=ft.colors.BLACK)),
+                ft.DataCell(ft.Text("", color=ft.colors.BLACK)),
+                ft.DataCell(
+                    ft.Row([
+                        ft.IconButton(
+                            icon=ft.icons.ADD_SHOPPING_CART,
+                            icon_color=ft.colors.BLUE,
+                            tooltip="Adicionar ao Carrinho",
+                            on_click=self.adicionar_ao_carrinho
+                        ),
+                        ft.IconButton(
+                            icon=ft.icons.INFO_OUTLINE,
+                            icon_color=ft.colors.BLUE_900,
+                            tooltip="Ver detalhes",
+                            on_click=self.mostrar_detalhes_produto
+                        )
+                    ])
+                )
+            ]
+        )
+
+    def _preencher_linha_produto(self, linha, produto):
+        produto = produto if isinstance(produto, dict) else dict(produto)
+        # Ajustar exibição do preço e estoque baseado no tipo de venda
+        venda_por_peso = int(produto.get('venda_por_peso') or 0)
+        preco_venda = float(produto.get('preco_venda') or 0)
+        estoque = float(produto.get('estoque') or 0)
+        if venda_por_peso == 1:
+            preco_display = f"MT {preco_venda:.2f}/KG"
+            estoque_display = f"{estoque:.3f} KG"
+        else:
+            preco_display = f"MT {preco_venda:.2f}"
+            estoque_display = str(estoque)
+        
+        codigo, nome, descricao, preco, estoque_cell, acoes = (c.content for c in linha.cells)
+        codigo.value = produto.get('codigo')
+        nome.text = produto.get('nome')
+        nome.data = produto
+        descricao.value = produto.get('descricao') or ''
+        preco.value = preco_display
+        estoque_cell.value = estoque_display
+        estoque_cell.color = ft.colors.BLACK
+        for botao in acoes.controls:
+            botao.data = produto
+
     def carregar_produtos(self):
         """Carrega a lista de produtos"""
         try:
@@ -558,6 +629,7 @@ class PDVView(ft.UserControl):
                 except Exception:
                     pass
                 self._produtos_cache = [p for p in produtos if p.get('estoque', 0) > 0]
+                self.catalogo.carregar(produtos)
             else:
                 # Verificar se a tabela produtos existe
                 tabela_existe = self.db.fetchone("""SELECT name FROM sqlite_master WHERE type='table' AND name='produtos'""")
@@ -568,8 +640,7 @@ class PDVView(ft.UserControl):
                 
                 # Verificar estrutura da tabela
                 try:
-                    colunas = self.db.fetchall("PRAGMA table_info(produtos)")
-                    colunas_nomes = [coluna['name'] for coluna in colunas]
+                    colunas_nomes = self.db.colunas('produtos')
                     colunas_necessarias = ['id', 'codigo', 'nome', 'descricao', 'preco_venda', 'estoque', 'venda_por_peso', 'unidade_medida']
                     for coluna in colunas_necessarias:
                         if coluna not in colunas_nomes:
@@ -597,75 +668,16 @@ class PDVView(ft.UserControl):
                     LEFT JOIN categorias c ON p.categoria_id = c.id
                     LEFT JOIN fornecedores f ON p.fornecedor_id = f.id
                     WHERE p.ativo = 1 
-                    AND CAST(p.estoque AS REAL) > 0
                     ORDER BY p.nome
                     """
                 )
+                # Índice com todos os ativos; sem estoque ficam ocultos até serem repostos
+                self.catalogo.carregar(produtos)
             
-            self.produtos_table.rows.clear()
-            
+            produtos = self.catalogo.todos()
             if not produtos:
                 print("Nenhum produto encontrado ou erro na consulta")
-                return
-                
-            for produto in (self._produtos_cache if self._is_web() else produtos):
-                try:
-                    # Ajustar exibição do preço e estoque baseado no tipo de venda
-                    venda_por_peso = int((produto['venda_por_peso'] if isinstance(produto, dict) else produto['venda_por_peso']) or 0)
-                    preco_venda = float((produto['preco_venda'] if isinstance(produto, dict) else produto['preco_venda']) or 0)
-                    estoque = float((produto['estoque'] if isinstance(produto, dict) else produto['estoque']) or 0)
-                    
-                    if venda_por_peso == 1:
-                        preco_display = f"MT {preco_venda:.2f}/KG"
-                        estoque_display = f"{estoque:.3f} KG"
-                    else:
-                        preco_display = f"MT {preco_venda:.2f}"
-                        estoque_display = str(estoque)
-                    
-                    self.produtos_table.rows.append(
-                        ft.DataRow(
-                            cells=[
-                                ft.DataCell(ft.Text((produto['codigo'] if isinstance(produto, dict) else produto['codigo']), color=ft.colors.BLACK)),
-                                ft.DataCell(
-                                    ft.TextButton(
-                                        text=(produto['nome'] if isinstance(produto, dict) else produto['nome']),
-                                        style=ft.ButtonStyle(color=ft.colors.BLACK),
-                                        data=(produto if isinstance(produto, dict) else dict(produto)),
-                                        on_click=self.mostrar_detalhes_produto
-                                    )
-                                ),
-                                ft.DataCell(ft.Text((produto.get('descricao') if isinstance(produto, dict) else (produto['descricao'] or '')), color=ft.colors.BLACK)),
-                                ft.DataCell(ft.Text(preco_display, color=ft.colors.BLACK)),
-                                ft.DataCell(ft.Text(estoque_display, color=ft.colors.BLACK)),
-                                ft.DataCell(
-                                    ft.Row([
-                                        ft.IconButton(
-                                            icon=ft.icons.ADD_SHOPPING_CART,
-                                            icon_color=ft.colors.BLUE,
-                                            tooltip="Adicionar ao Carrinho",
-                                            data=(produto if isinstance(produto, dict) else dict(produto)),
-                                            on_click=self.adicionar_ao_carrinho
-                                        ),
-                                        ft.IconButton(
-                                            icon=ft.icons.INFO_OUTLINE,
-                                            icon_color=ft.colors.BLUE_900,
-                                            tooltip="Ver detalhes",
-                                            data=(produto if isinstance(produto, dict) else dict(produto)),
-                                            on_click=self.mostrar_detalhes_produto
-                                        )
-                                    ])
-                                )
-                            ]
-                        )
-                    )
-                except Exception as item_error:
-                    try:
-                        produto_nome = produto['nome'] if 'nome' in produto else 'desconhecido'
-                    except:
-                        produto_nome = 'desconhecido'
-                    print(f"Erro ao processar produto {produto_nome}: {item_error}")
-            
-            self.update()
+            self.exibir_produtos(produtos)
             
         except Exception as error:
             print(f"Erro ao carregar produtos: {error}")
@@ -673,6 +685,43 @@ class PDVView(ft.UserControl):
             import traceback
             traceback.print_exc()
 
+    def atualizar_produtos_catalogo(self, produto_ids):
+        """Relê do banco os produtos informados e aplica no índice de busca."""
+        ids = list(dict.fromkeys(produto_ids))
+        if not ids:
+            return
+        try:
+            linhas = self.db.fetchall(f"""
+                SELECT 
+                    p.id, 
+                    p.codigo, 
+                    p.nome, 
+                    p.descricao,
+                    CAST(p.preco_venda AS REAL) as preco_venda,
+                    CAST(p.estoque AS REAL) as estoque,
+                    CAST(p.venda_por_peso AS INTEGER) as venda_por_peso,
+                    p.unidade_medida,
+                    p.ativo,
+                    c.nome as categoria_nome,
+                    f.nome as fornecedor_nome
+                FROM produtos p
+                LEFT JOIN categorias c ON p.categoria_id = c.id
+                LEFT JOIN fornecedores f ON p.fornecedor_id = f.id
+                WHERE p.id IN ({', '.join('?' * len(ids))})
+            """, tuple(ids))
+            encontrados = set()
+            for linha in linhas:
+                produto = dict(linha)
+                encontrados.add(produto['id'])
+                if produto.pop('ativo', 1) == 1:
+                    self.catalogo.atualizar(produto)
+                else:
+                    self.catalogo.remover(produto['id'])
+            for pid in set(ids) - encontrados:
+                self.catalogo.remover(pid)
+        except Exception as e:
+            print(f"Erro ao atualizar índice de produtos: {e}")
+
     def verificar_estoque_baixo(self):
         """Verifica produtos com estoque abaixo do mínimo"""
         try:
@@ -1642,117 +1691,16 @@ class PDVView(ft.UserControl):
                     self.mostrar_erro("Valor recebido menor que o total!")
                     return
             
-            # Iniciar transação
-            self.db.conn.execute("BEGIN TRANSACTION")
-            
             try:
-                # Inserir venda usando helper que cria UUID e marca synced=0
-                venda_data = {
-                    'usuario_id': self.usuario['id'],
-                    'total': self.total_venda,
-                    'forma_pagamento': self.forma_pagamento.value,
-                    'valor_recebido': float(self.valor_recebido_field.value or 0),
-                    'troco': float(self.valor_recebido_field.value or 0) - self.total_venda
-                }
-                venda_id = self.db.insert_venda(venda_data)
-                
-                # Inserir itens e atualizar estoque
-                for item in self.itens:
-                    # Buscar preço de custo atual
-                    produto = self.db.fetchone("""
-                        SELECT preco_custo FROM produtos WHERE id = ?
-                    """, (item['id'],))
-                    
-                    # Verificar se produto foi encontrado e tem preço de custo
-                    # Suporta tanto dict quanto sqlite3.Row
-                    preco_custo = 0.0
-                    try:
-                        if produto is not None:
-                            # Tenta acesso por chave (Row também suporta por nome)
-                            if 'preco_custo' in (produto.keys() if hasattr(produto, 'keys') else []):
-                                preco_custo = produto['preco_custo'] or 0.0
-                            else:
-                                # Tentativa alternativa convertendo para dict
-                                try:
-                                    preco_custo = dict(produto).get('preco_custo', 0.0) or 0.0
-                                except Exception:
-                                    preco_custo = 0.0
-                        else:
-                            print(f"⚠️ Produto {item['id']} não encontrado ao buscar preco_custo - usando 0.0")
-                    except Exception as ex:
-                        print(f"⚠️ Erro ao obter preco_custo do produto {item['id']}: {ex} - usando 0.0")
-                    
-                    # Inserir item
-                    cursor = self.db.conn.cursor()
-                    # Garantir coluna peso_kg (já criada no init, mas não custa tentar)
-                    try:
-                        self.db.conn.execute("PRAGMA table_info(itens_venda)")
-                    except Exception:
-                        pass
-
-                    # Calcular peso_kg automaticamente para produtos vendidos por peso quando não informado
-                    peso_kg_item = float(item.get('peso_kg', 0) or 0)
-                    try:
-                        cur_check = self.db.conn.cursor()
-                        cur_check.execute("SELECT venda_por_peso FROM produtos WHERE id = ?", (item['id'],))
-                        row_vpp = cur_check.fetchone()
-                        is_peso = int(row_vpp[0]) == 1 if row_vpp and row_vpp[0] is not None else False
-                    except Exception:
-                        is_peso = False
-                    if is_peso and peso_kg_item <= 0:
-                        try:
-                            preco_unitario = float(item.get('preco') or 0)
-                            subtotal_item = float(item.get('subtotal') or 0)
-                            if preco_unitario > 0:
-                                peso_kg_item = round(subtotal_item / preco_unitario, 3)
-                        except Exception:
-                            pass
-                    cursor.execute("""
-                        INSERT INTO itens_venda (
-                            venda_id, produto_id, quantidade,
-                            preco_unitario, preco_custo_unitario,
-                            subtotal, peso_kg
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        venda_id,
-                        item['id'],
-                        item['quantidade'],
-                        item['preco'],
-                        preco_custo,
-                        item['subtotal'],
-                        peso_kg_item
-                    ))
-                    
-                    # Atualizar estoque e marcar para sincronização
-                    # Determinar decremento considerando venda por peso
-                    try:
-                        cur2 = self.db.conn.cursor()
-                        cur2.execute("SELECT venda_por_peso, unidade_medida FROM produtos WHERE id = ?", (item['id'],))
-                        row = cur2.fetchone()
-                        venda_por_peso = int(row[0]) if row and row[0] is not None else 0
-                        unidade_medida = (row[1] or 'un') if row else 'un'
-                    except Exception:
-                        venda_por_peso = 0
-                        unidade_medida = 'un'
-
-                    decremento = float(peso_kg_item or 0.0)
-                    if decremento <= 0.0:
-                        # Se não há peso informado, usa quantidade
-                        try:
-                            decremento = float(item.get('quantidade', 0) or 0)
-                        except Exception:
-                            decremento = 0.0
-
-                    cursor.execute("""
-                        UPDATE produtos 
-                        SET estoque = estoque - ?,
-                            updated_at = CURRENT_TIMESTAMP,
-                            synced = 0
-                        WHERE id = ?
-                    """, (decremento, item['id']))
-                
-                # Commit da transação
-                self.db.conn.commit()
+                # Venda, itens e baixa de estoque numa única transação (synced = 0 até o envio)
+                resultado = self.checkout.finalizar(
+                    usuario_id=self.usuario['id'],
+                    itens=self.itens,
+                    forma_pagamento=self.forma_pagamento.value,
+                    total=self.total_venda,
+                    valor_recebido=float(self.valor_recebido_field.value or 0)
+                )
+                venda_id = resultado['venda_id']
 
                 # Best-effort: se backend estiver acessível, enviar venda imediatamente
                 try:
@@ -1770,42 +1718,7 @@ class PDVView(ft.UserControl):
                         print("[ONLINE] server_url não configurado; não enviando venda agora")
                     else:
                         api_base = api_base.rstrip('/')
-                        itens_payload = []
-                        for item in list(self.itens):
-                            try:
-                                rowp = self.db.fetchone("SELECT uuid, venda_por_peso FROM produtos WHERE id = ?", (item['id'],))
-                                prod_uuid = None
-                                venda_por_peso = 0
-                                if rowp is not None:
-                                    try:
-                                        prod_uuid = rowp['uuid'] if ('uuid' in (rowp.keys() if hasattr(rowp,'keys') else [])) else dict(rowp).get('uuid')
-                                        venda_por_peso = rowp['venda_por_peso'] if ('venda_por_peso' in (rowp.keys() if hasattr(rowp,'keys') else [])) else dict(rowp).get('venda_por_peso', 0)
-                                    except Exception:
-                                        pass
-                                if not prod_uuid:
-                                    continue
-                                qtd_raw = float(item.get('quantidade') or 0)
-                                qtd_int = int(qtd_raw) if qtd_raw >= 1 else 1
-                                peso_val = float(item.get('peso_kg') or 0.0)
-                                if int(venda_por_peso) == 1 and peso_val <= 0.0:
-                                    try:
-                                        preco_unitario = float(item.get('preco') or 0)
-                                        subtotal_item = float(item.get('subtotal') or 0)
-                                        if preco_unitario > 0:
-                                            peso_val = round(subtotal_item / preco_unitario, 3)
-                                    except Exception:
-                                        pass
-                                it = {
-                                    'produto_id': str(prod_uuid),
-                                    'quantidade': qtd_int,
-                                    'preco_unitario': float(item.get('preco') or 0.0),
-                                    'subtotal': float(item.get('subtotal') or 0.0)
-                                }
-                                if peso_val and peso_val > 0:
-                                    it['peso_kg'] = peso_val
-                                itens_payload.append(it)
-                            except Exception as _e_item:
-                                print(f"[ONLINE] Falha ao montar item para envio: {item.get('id')}: {_e_item}")
+                        itens_payload = resultado['itens_payload']
                         if itens_payload:
                             payload = {
                                 'uuid': None,
@@ -1821,9 +1734,7 @@ class PDVView(ft.UserControl):
                                     resp = client.post(url_post, json=payload)
                                     if resp.status_code in (200, 201):
                                         try:
-                                            cur_sync = self.db.conn.cursor()
-                                            cur_sync.execute("UPDATE vendas SET synced = 1 WHERE id = ?", (venda_id,))
-                                            self.db.conn.commit()
+                                            self.checkout.marcar_sincronizada(venda_id)
                                         except Exception:
                                             pass
                                         print("[ONLINE] Venda enviada e marcada como sincronizada")
@@ -1848,13 +1759,18 @@ class PDVView(ft.UserControl):
                     self.imprimir_recibo(venda_id)
                 
                 # Limpar carrinho e campos
+                ids_vendidos = [item['id'] for item in self.itens]
                 self.itens.clear()
                 self.valor_recebido_field.value = ""
                 self.forma_pagamento.value = None
                 self.atualizar_carrinho()
                 
-                # Recarregar produtos
-                self.carregar_produtos()
+                # Atualizar só os produtos vendidos no índice (web recarrega do servidor)
+                if self._is_web():
+                    self.carregar_produtos()
+                else:
+                    self.atualizar_produtos_catalogo(ids_vendidos)
+                    self.filtrar_produtos(None)
                 
                 # Mostrar mensagem de sucesso
                 self.page.show_snack_bar(
@@ -1922,7 +1838,6 @@ class PDVView(ft.UserControl):
                     pass
                 
             except Exception as error:
-                self.db.conn.rollback()
                 print(f"Erro ao finalizar venda: {error}")
                 self.mostrar_erro("Erro ao finalizar venda!")
                 return False
@@ -6,6 +6,7 @@ from utils.helpers import formatar_moeda
 from utils.translation_mixin import TranslationMixin
 from views.generic_table_style import apply_table_style
 from repositories.produto_repository import ProdutoRepository
+from repositories.leitura_local import revalidador
 
 class ProdutosView(ft.UserControl, TranslationMixin):
     def __init__(self, page: ft.Page, usuario):
@@ -662,10 +663,19 @@ class ProdutosView(ft.UserControl, TranslationMixin):
             self.carregar_categorias()
             # Depois carregar os produtos
             self.carregar_produtos()
+            # Recarregar quando a revalidação em segundo plano trouxer mudanças
+            revalidador.assinar('produtos', self._produtos_atualizados)
             print("=== Fim did_mount() ===\n")
         except Exception as e:
             print(f"Erro no did_mount: {e}")
 
+    def will_unmount(self):
+        revalidador.cancelar('produtos', self._produtos_atualizados)
+
+    def _produtos_atualizados(self, entidade):
+        """Chamado pela thread de revalidação: relê os produtos do banco local."""
+        self.carregar_produtos(self.busca_field.value or "")
+
     def carregar_categorias(self):
         """Carrega as categorias no dropdown"""
         try:
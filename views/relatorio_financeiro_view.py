@@ -1,5 +1,6 @@
 import flet as ft
 from database.database import Database
+from database.periodos import limites_periodo
 from datetime import datetime, timedelta
 import locale
 from views.generic_header import create_header
@@ -226,6 +227,8 @@ class RelatorioFinanceiroView(ft.UserControl):
         try:
             data_inicial = self.data_inicial.value
             data_final = self.data_final.value
+            # Intervalo semiaberto [inicial, final + 1 dia) sobre v.data_venda (usa índice)
+            periodo_vendas = limites_periodo(data_inicial, data_final)
 
             # Valor total em estoque
             valor_estoque = self.db.get_valor_estoque()
@@ -250,12 +253,12 @@ class RelatorioFinanceiroView(ft.UserControl):
                     ) as lucro
                 FROM vendas v
                 LEFT JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE v.data_venda >= ? AND v.data_venda < ?
                     AND (v.status IS NULL OR v.status != 'Anulada')
                 GROUP BY v.forma_pagamento
             """
             
-            vendas = self.db.fetchall(vendas_query, (data_inicial, data_final), dictionary=True)
+            vendas = self.db.fetchall(vendas_query, periodo_vendas, dictionary=True)
 
             formas_pagamento = {
                 v['forma_pagamento']: v['total'] if v['total'] is not None else 0
@@ -284,9 +287,9 @@ class RelatorioFinanceiroView(ft.UserControl):
                     ), 0) as total
                 FROM vendas v
                 LEFT JOIN itens_venda iv ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE v.data_venda >= ? AND v.data_venda < ?
                     AND (v.status IS NULL OR v.status != 'Anulada')
-            """, (data_inicial, data_final), dictionary=True)
+            """, periodo_vendas, dictionary=True)
 
             custo_produtos = custos['total'] if custos and custos['total'] is not None else 0
             lucro_bruto = receita_bruta - custo_produtos
@@ -432,12 +435,12 @@ class RelatorioFinanceiroView(ft.UserControl):
                 FROM itens_venda iv
                 JOIN vendas v ON v.id = iv.venda_id
                 JOIN produtos p ON p.id = iv.produto_id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE v.data_venda >= ? AND v.data_venda < ?
                     AND (v.status IS NULL OR v.status != 'Anulada')
                 GROUP BY p.id, p.nome
                 ORDER BY quantidade DESC
                 LIMIT 10
-            """, (data_inicial, data_final), dictionary=True)
+            """, periodo_vendas, dictionary=True)
 
             # Estrutura final dos dados
             return {
@@ -721,11 +724,11 @@ class RelatorioFinanceiroView(ft.UserControl):
                 JOIN produtos p ON p.id = iv.produto_id
                 JOIN categorias c ON c.id = p.categoria_id
                 JOIN vendas v ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
+                WHERE v.data_venda >= ? AND v.data_venda < ?
                     AND v.status = 'Concluída'
                 GROUP BY c.nome
                 ORDER BY total DESC
-            """, (self.data_inicial.value, self.data_final.value))
+            """, limites_periodo(self.data_inicial.value, self.data_final.value))
             
             return {v['categoria']: {
                 'total': v['total'],
@@ -787,16 +790,18 @@ class RelatorioFinanceiroView(ft.UserControl):
     def calcular_roi(self):
         """Calcula o ROI (Return on Investment)"""
         try:
+            periodo_vendas = limites_periodo(self.data_inicial.value, self.data_final.value)
+
             # Obter lucro líquido
             lucro = self.db.fetchone("""
                 SELECT 
                     (SELECT SUM(total) FROM vendas 
-                     WHERE DATE(data_venda) BETWEEN ? AND ?
+                     WHERE data_venda >= ? AND data_venda < ?
                      AND status = 'Concluída') -
                     (SELECT SUM(valor) FROM despesas 
                      WHERE DATE(data_vencimento) BETWEEN ? AND ?
                      AND status = 'Pago') as lucro
-            """, (self.data_inicial.value, self.data_final.value,
+            """, (*periodo_vendas,
                  self.data_inicial.value, self.data_final.value))
 
             # Obter investimento total (custos + despesas)
@@ -806,9 +811,9 @@ class RelatorioFinanceiroView(ft.UserControl):
                      WHERE DATE(data_vencimento) BETWEEN ? AND ?) +
                     (SELECT SUM(preco_custo * quantidade) FROM itens_venda iv
                      JOIN vendas v ON v.id = iv.venda_id
-                     WHERE DATE(v.data_venda) BETWEEN ? AND ?) as total
+                     WHERE v.data_venda >= ? AND v.data_venda < ?) as total
             """, (self.data_inicial.value, self.data_final.value,
-                 self.data_inicial.value, self.data_final.value))
+                 *periodo_vendas))
 
             if investimento['total'] and investimento['total'] > 0:
                 return (lucro['lucro'] / investimento['total']) * 100
@@ -830,8 +835,8 @@ class RelatorioFinanceiroView(ft.UserControl):
                 FROM itens_venda iv
                 JOIN produtos p ON p.id = iv.produto_id
                 JOIN vendas v ON v.id = iv.venda_id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
-            """, (self.data_inicial.value, self.data_final.value))
+                WHERE v.data_venda >= ? AND v.data_venda < ?
+            """, limites_periodo(self.data_inicial.value, self.data_final.value))
 
             if dados['margem_media'] and dados['margem_media'] > 0:
                 return custos_fixos / dados['margem_media']